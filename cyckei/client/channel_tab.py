@@ -9,14 +9,159 @@ from pathlib import Path
 
 from PySide2.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, \
      QScrollArea, QStyleOption, QStyle, QFileDialog
-from PySide2.QtCore import QTimer, Qt, QRegExp
+from PySide2.QtCore import Qt, QRegExp
 from PySide2.QtGui import QPainter, QPalette, QRegExpValidator
 
 from . import workers
+from .federation import channel_label
+from .sparkline import Sparkline, points_setting
+from .status import status_text, is_idle
 from cyckei.functions import func, gui
 
 logger = logging.getLogger('cyckei_client')
 
+# Allowed log file names, look up regex rules for clarification
+FILE_REGEX = "^[^:\"*?/<>|\\\\]+$"
+
+
+def default_attributes(channel, config):
+    """Returns the attributes a channel starts with, before the user or server fills them in.
+
+    Args:
+        channel (int): Id number of the channel.
+        config (dict): Holds Cyckei launch settings.
+
+    Returns:
+        dict: Channel info, cell info, script info, etc.
+    |
+    """
+    return {
+        "channel": channel,
+        "path": "",
+        "cellid": None,
+        "comment": "",
+        "package": None,
+        "celltype": None,
+        "requester": None,
+        "plugins": {},
+        "record_folder": os.path.join(config["arguments"]["record_dir"], "tests"),
+        "mass": None,
+        "protocol_name": None,
+        "script_path": None,
+        "script_content": None
+    }
+
+
+def log_name(path):
+    """Returns the log file name shown for a path the server is recording to.
+
+    Args:
+        path (str): The log path, e.g. "C:\\data\\2022\\cell.pyb".
+
+    Returns:
+        str: The file name without its extension, e.g. "cell".
+    |
+    """
+    split_path = path.split('\\')
+    split_path = split_path[-1].split('.')[:-1]
+    filename = ""
+    for i in split_path:
+        filename = filename + i + "."
+    return filename[:-1]
+
+
+def follow_status(config, resource, slot):
+    """Starts an UpdateStatus worker calling slot with the channels that change.
+
+    Args:
+        config (dict): Holds Cyckei launch settings.
+        resource (dict): A dict holding the Threadpool object for threads to be pulled from.
+        slot (function): Called on the gui thread with the changed channels, see
+            ChannelTab.apply_status.
+
+    Returns:
+        workers.UpdateStatus: The worker, to be stopped with stop().
+    |
+    """
+    updater = workers.UpdateStatus(config)
+    updater.signals.info.connect(slot)
+    start_follower(resource, updater)
+    return updater
+
+
+def follow_recent(config, resource, channels, slot):
+    """Starts a FollowRecent worker calling slot with the latest measurements, for the
+    sparklines, unless they are turned off.
+
+    Args:
+        channels (list): The channel numbers.
+        config (dict): Holds Cyckei launch settings.
+        resource (dict): A dict holding the Threadpool object for threads to be pulled from.
+        slot (function): Called on the gui thread with the replies by channel, see
+            ChannelTab.apply_recent.
+
+    Returns:
+        workers.FollowRecent: The worker, to be stopped with stop(), None if the
+            "sparkline-points" setting is 0.
+    |
+    """
+    points = points_setting(config)
+    if points <= 0:
+        return None
+    follower = workers.FollowRecent(config, channels, points)
+    follower.signals.info.connect(slot)
+    start_follower(resource, follower)
+    return follower
+
+
+def follow_servers(servers, resource, apply_status, apply_recent=None):
+    """Starts following the status, and measurements, of the channels of every server.
+
+    Each server is followed by workers of its own, kept as its updater and recent.
+
+    Args:
+        apply_recent (function, optional): Called on the gui thread with the replies by
+            channel and the server. Defaults to None for no sparklines.
+        apply_status (function): Called on the gui thread with the changed channels and
+            the server.
+        resource (dict): A dict holding the Threadpool object for threads to be pulled from.
+        servers (list): The federation.Server objects.
+    |
+    """
+    for server in servers:
+        server.updater = follow_status(
+            server.config, resource,
+            lambda changes, server=server: apply_status(changes, server))
+        if apply_recent is not None:
+            server.recent = follow_recent(
+                server.config, resource, server.channels,
+                lambda replies, server=server: apply_recent(replies, server))
+
+
+def stop_servers(servers):
+    """Stops following the status and measurements of the channels of every server.
+
+    |
+    """
+    for server in servers:
+        if server.updater is not None:
+            server.updater.stop()
+            server.updater = None
+        if server.recent is not None:
+            server.recent.stop()
+            server.recent = None
+
+
+def start_follower(resource, worker):
+    """Starts a worker that keeps its thread until stopped.
+
+    |
+    """
+    # Leave as many threads for the other workers
+    threadpool = resource["threadpool"]
+    threadpool.setMaxThreadCount(threadpool.maxThreadCount() + 1)
+    threadpool.start(worker)
+
 
 class ChannelTab(QWidget):
     """Object that creates a window to interact with cycler channels from the server.
@@ -25,19 +170,23 @@ class ChannelTab(QWidget):
         config (dict): Holds Cyckei launch settings.
         resource (dict): A dict holding the Threadpool object for threads to be pulled from.
         channels (list): A list of ChannelWidget objects.
-        timer (QTimer): A timer for the status of cells.
+        rows (QVBoxLayout): Lays out the ChannelWidgets.
+        servers (list): The federation.Server of the channels, each following the status
+            and measurements of its own.
     |
     """
 
-    def __init__(self, config, resource, parent, plugin_info, channel_info):
-        """Inits ChannelTab with channels, config, resource, and timer. Creates each channel widget and place in QVBoxlayout.
+    def __init__(self, config, resource, parent, plugin_info, servers):
+        """Inits ChannelTab with channels, config, resource, and servers. Creates each channel widget and place in QVBoxlayout.
 
         Args:
             config (dict): Holds Cyckei launch settings.
             resource (dict): A dict holding the Threadpool object for threads to be pulled from.
             parent (MainWindow): The MainWindow object that created this ChannelTab.
-            plugin_info (list): A list of dicts holding info about installed plugins.
-            channel_info (dict): A dict of nested dicts holding info about each connected channel.
+            plugin_info (list): A list of dicts holding info about installed plugins, of
+                every server.
+            servers (list): The federation.Server objects that replied, with the info
+                about each of their channels.
             |
         """
         QWidget.__init__(self, parent)
@@ -46,7 +195,7 @@ class ChannelTab(QWidget):
 
         area = QScrollArea()
         contents = QWidget()
-        rows = QVBoxLayout(contents)
+        self.rows = rows = QVBoxLayout(contents)
         layout = QVBoxLayout(self)
         layout.addWidget(area)
         area.setWidget(contents)
@@ -55,27 +204,43 @@ class ChannelTab(QWidget):
         rows.setContentsMargins(0, 0, 0, 0)
         rows.setSpacing(0)
 
+        self.servers = servers
         self.channels = []
-        for channel in config["channels"]:
-            try:
-                self.channels.append(ChannelWidget(
-                    channel["channel"],
-                    config,
-                    resource,
-                    plugin_info,
-                    channel_info[str(channel["channel"])]
-                ))
-                rows.addWidget(self.channels[-1])
-            except KeyError:
-                pass
+        for server in servers:
+            self.add_channels(server)
         self.alternate_colors()
 
-        # Set initial status and set status timer
+        # Follow the status of each server's channels from a thread of its own
         self.update_status()
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_status)
-        self.timer.start(
-            int(self.config["behavior"]["update-interval"]) * 1000)
+
+    def add_channels(self, server):
+        """Adds a ChannelWidget for every channel of a server.
+
+        |
+        """
+        for channel in server.channels:
+            self.channels.append(ChannelWidget(
+                channel,
+                server.config,
+                self.resource,
+                server.plugin_info,
+                server.channel_info[str(channel)],
+                server.name
+            ))
+            self.rows.addWidget(self.channels[-1])
+
+    def add_server(self, server):
+        """Adds the channels of a server that replied late and starts following them.
+
+        Args:
+            server (federation.Server): The server, connected.
+        |
+        """
+        self.servers.append(server)
+        self.add_channels(server)
+        self.alternate_colors()
+        follow_servers([server], self.resource, self.apply_status,
+                       self.apply_recent if points_setting(self.config) > 0 else None)
 
     def alternate_colors(self):
         """Sets the channels to alternate between light and dark.
@@ -101,12 +266,78 @@ class ChannelTab(QWidget):
             )
 
     def update_status(self):
-        """Updates the status section of a channel.
+        """Starts following the status of the channels, applied by apply_status.
+
+        |
+        """
+        follow_servers(self.servers, self.resource, self.apply_status,
+                       self.apply_recent if points_setting(self.config) > 0 else None)
+
+    def stop_status(self):
+        """Stops following the status and measurements of the channels.
 
         |
         """
-        updater = workers.UpdateStatus(self.channels, self.config)
-        self.resource["threadpool"].start(updater)
+        stop_servers(self.servers)
+
+    def apply_recent(self, replies, server=None):
+        """Adds the latest measurements to the sparklines, on the gui thread.
+
+        Args:
+            replies (dict): The get_recent reply by channel.
+            server (federation.Server, optional): The server replying. Defaults to None
+                for the only server.
+        |
+        """
+        for channel in self.of_server(server):
+            key = str(channel.attributes["channel"])
+            if channel.sparkline is not None and key in replies:
+                channel.sparkline.apply(replies[key])
+
+    def read_idle(self):
+        """Reads the voltage of every idle channel, in one request to each server.
+
+        |
+        """
+        for server in self.servers:
+            worker = workers.Read(server.config, self.of_server(server), idle=True)
+            worker.signals.status.connect(gui.feedback)
+            self.resource["threadpool"].start(worker)
+
+    def of_server(self, server):
+        """Returns the channels of a server.
+
+        Args:
+            server (federation.Server): The server, None for every channel.
+
+        Returns:
+            list: Its ChannelWidget objects.
+        |
+        """
+        if server is None:
+            return self.channels
+        return [channel for channel in self.channels if channel.server == server.name]
+
+    def apply_status(self, changes, server=None):
+        """Updates the status of the channels that changed, on the gui thread.
+
+        Args:
+            changes (dict): The status fields by channel of the channels that changed,
+                None if the server did not reply.
+            server (federation.Server, optional): The server of the channels. Defaults to
+                None for the only server.
+        |
+        """
+        for channel in self.of_server(server):
+            if changes is None:
+                channel.show_status("No Response")
+                continue
+            info = changes.get(str(channel.attributes["channel"]))
+            if info is None:
+                continue
+            logger.debug("Updating channel {} with status {}".format(
+                channel.attributes["channel"], info))
+            channel.show_status(status_text(info), not is_idle(info))
 
     def paintEvent(self, event):
         """Redraws the window with the current visual settings. Overrides the defaul QT paintEvent.
@@ -129,8 +360,11 @@ class ChannelWidget(QWidget):
         divider (QWidget): Divides the channel widget vertically between info and controls.
         feedback (QLabel): A label under the controls that gives info when a control is pressed.
         json (dict): Holds the default attribtues of a ChannelWidget. Taken from an outside file.
+        locked (bool): Whether the settings are locked, None until the first status.
         script_label (QLabel): A gui label that indicates if there is a selected script.
+        server (str): Name of the channel's server, "" for the only server.
         settings (list): A list of gui elements to be added to the window, set in the set_settings function.
+        sparkline (Sparkline): Plots the voltage of the latest measurements, None if turned off.
         state (str): The step in the protocol performed on a cell.
         state_changed (bool): Indicates whether the channel state has changed.
         status (QLabel): A gui label that indicates a cell's status.
@@ -139,41 +373,32 @@ class ChannelWidget(QWidget):
     |
     """
 
-    def __init__(self, channel, config, resource, plugin_info, cur_channel_info):
+    def __init__(self, channel, config, resource, plugin_info, cur_channel_info, server=""):
         """Inits ChannelWidget with attributes, config, divider, feedback, json, script_label, status, and threadpool.
 
         Args:
             channel (int): Id number for the channel corresponding with this Widget.
-            config (dict): Holds Cyckei launch settings.
+            config (dict): Holds Cyckei launch settings, with the address of its server.
             resource (dict): A dict holding the Threadpool object for threads to be pulled from.
             plugin_info (list): A list of dicts holding info about installed plugins.
             cur_channel_info (dict): A dict holding info about the corresponding channel for this Widget.
+            server (str, optional): Name of the channel's server. Defaults to "" for the
+                only server.
         |
         """
         super(ChannelWidget, self).__init__()
         # Default Values
-        self.attributes = {
-            "channel": channel,
-            "path": "",
-            "cellid": None,
-            "comment": "",
-            "package": None,
-            "celltype": None,
-            "requester": None,
-            "plugins": {},
-            "record_folder": os.path.join(config["arguments"]["record_dir"], "tests"),
-            "mass": None,
-            "protocol_name": None,
-            "script_path": None,
-            "script_content": None
-        }
+        self.attributes = default_attributes(channel, config)
         self.config = config
+        self.server = server
         # State and state_changed currently only used for changing the color 
         # of the channel background. If state_changed wants to be used for anything
         # else you should add a new bool like "change_color", since state_changed is
         # changed to false after changing color to mitigate startup lag.
         self.state = None
         self.state_changed = False
+        # Whether the settings are locked, None until the first status
+        self.locked = None
         self.default_color = None
         self.threadpool = resource["threadpool"]
         # self.scripts = resource["scripts"]
@@ -229,6 +454,12 @@ class ChannelWidget(QWidget):
         self.feedback.setAlignment(Qt.AlignCenter)
         right.addWidget(self.feedback)
 
+        # Voltage of the latest measurements
+        self.sparkline = None
+        if points_setting(config) > 0:
+            self.sparkline = Sparkline(points_setting(config))
+            right.addWidget(self.sparkline)
+
         # Load default JSON
         self.json = json.load(open(
             func.asset_path("default_packet.json")))
@@ -249,9 +480,10 @@ class ChannelWidget(QWidget):
 
         # Cell channel label
         labels.append("")
+        label = channel_label(self.server, self.attributes["channel"])
         args = [
-            "{}:".format(self.attributes["channel"]),
-            "Channel {}".format(self.attributes["channel"]),
+            "{}:".format(label),
+            "Channel {}".format(label),
             "id_label"
         ]
         self.settings.append(gui.label(*args))
@@ -272,8 +504,7 @@ class ChannelWidget(QWidget):
             ["ID", "Cell identification", "cellid"],
             ["Comment", "Unparsed Comment", "comment"],
         ]
-        # Look up regex rules for clarification
-        file_rgx = QRegExp("^[^:\"*?/<>|\\\\]+$")
+        file_rgx = QRegExp(FILE_REGEX)
         validator = QRegExpValidator(file_rgx)
         for line in editables:
             self.settings.append(gui.line_edit(*line, self.set))
@@ -286,12 +517,7 @@ class ChannelWidget(QWidget):
         # Parses the filepath for a script, removes the extension,
         # and sets the filename slot
         if cur_channel_info['path'] != None:
-            split_path = cur_channel_info['path'].split('\\')
-            split_path = split_path[-1].split('.')[:-1]
-            filename = ""
-            for i in split_path:
-                filename = filename + i + "."
-            self.settings[2].setText(filename[:-1])
+            self.settings[2].setText(log_name(cur_channel_info['path']))
 
         # Fills in cellid slot
         if cur_channel_info['cellid'] != None:
@@ -363,11 +589,29 @@ class ChannelWidget(QWidget):
                     f"background-color: {self.default_color}")
                 self.state_changed = False
 
+    def show_status(self, text, locked=None):
+        """Sets the status text and locks or unlocks the settings, if they changed.
+
+        Args:
+            locked (bool, optional): Whether the settings are locked. Defaults to None to
+                leave them as they are.
+            text (str): The status line.
+        |
+        """
+        if text != self.status.text():
+            self.status.setText(text)
+        if locked is not None and locked != self.locked:
+            if locked:
+                self.lock_settings()
+            else:
+                self.unlock_settings()
+
     def unlock_settings(self):
         """Sets the status of each QObject in settings to be interactable
         
         |
         """
+        self.locked = False
         for setting in self.settings:
             setting.setEnabled(True)
 
@@ -376,6 +620,7 @@ class ChannelWidget(QWidget):
         
         |
         """
+        self.locked = True
         for setting in self.settings:
             setting.setDisabled(True)
             
@@ -442,7 +687,7 @@ class ChannelWidget(QWidget):
         """
         gui.feedback("{} in progress...".format(text), self)
         if text == "Check":
-            worker = workers.Read(self.config, self)
+            worker = workers.Read(self.config, [self])
         else:
             worker = workers.Control(
                 self.config, self, text.lower(), temp=False)
@@ -0,0 +1,742 @@
+"""Table of the channels, for racks with too many channels for a widget each.
+
+ChannelTab lays out a ChannelWidget per channel, with its own line edits, combo boxes and
+buttons, so startup and repaints grow with the number of channels. ChannelView shows the
+same settings, status and controls as the rows of a QTableView instead. A ChannelModel
+holds a ChannelRecord per channel, plain data the workers take in place of a
+ChannelWidget, and the view only paints the visible rows. Editors are made by
+ChannelDelegate for the cell being edited, and the control buttons of every row are
+painted by ActionDelegate.
+
+|
+"""
+
+import logging
+import os
+from pathlib import Path
+
+from PySide2.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QTableView, QHeaderView, \
+     QStyledItemDelegate, QStyleOptionButton, QStyle, QApplication, QComboBox, \
+     QLineEdit, QFileDialog, QAbstractItemView
+from PySide2.QtCore import QAbstractTableModel, QModelIndex, Qt, Signal, QEvent, \
+     QRegExp, QSize
+from PySide2.QtGui import QRegExpValidator, QFont, QColor
+
+from . import workers
+from .channel_tab import default_attributes, log_name, follow_servers, stop_servers, \
+     FILE_REGEX
+from .federation import channel_label
+from .sparkline import Trend, paint_sparkline, points_setting
+from .status import status_text, is_idle
+from cyckei.functions import gui
+
+logger = logging.getLogger('cyckei_client')
+
+ACTIONS = ("Start", "Stop", "Check", "Pause", "Resume")
+EDITABLE = ("path", "cellid", "comment")
+HEADERS = {
+    "channel": "Channel",
+    "script": "Script",
+    "path": "Log File",
+    "cellid": "Cell ID",
+    "comment": "Comment",
+    "status": "Status",
+    "trend": "Voltage",
+    "feedback": "Server Response",
+    "actions": "Controls",
+}
+TIPS = {
+    "channel": "Channel {}",
+    "script": "Current script, double click to open a script file",
+    "path": "File to log to, placed in specified logs folder",
+    "cellid": "Cell identification",
+    "comment": "Unparsed Comment",
+    "status": "Current Cell Status",
+    "trend": "Voltage of the latest measurements",
+    "feedback": "Server Response",
+    "actions": "Start, Stop, Check, Pause or Resume the cycle",
+}
+ROW_HEIGHT = 30
+PLUGIN = "plugin:"  # Prefix of the plugin source columns
+
+
+class ChannelRecord(object):
+    """Stores the settings and status of a channel shown as a row of a ChannelModel.
+
+    Workers take it in place of a ChannelWidget, through attributes, lock_settings() and
+    unlock_settings(), which may be called from their threads.
+
+    Attributes:
+        attributes (dict): Holds info about the channel: Channel info, cell info, script info, etc.
+        config (dict): Holds Cyckei launch settings, with the address of its server.
+        feedback (str): The latest response of the server to a control.
+        locked (bool): Whether the settings are locked, None until the first status.
+        model (ChannelModel): The model showing the channel, told when it changes.
+        row (int): The row of the channel in the model.
+        script (str): The name of the selected script file.
+        server (str): Name of the channel's server, "" for the only server.
+        status (str): The status line of the channel.
+        trend (Trend): The voltage of the latest measurements, None without sparklines.
+    |
+    """
+
+    def __init__(self, channel, config, cur_channel_info, server=""):
+        """Inits ChannelRecord with attributes, filled in from the server where it has a test.
+
+        Args:
+            channel (int): Id number for the channel.
+            config (dict): Holds Cyckei launch settings, with the address of its server.
+            cur_channel_info (dict): A dict holding info about the channel from the server.
+            server (str, optional): Name of the channel's server. Defaults to "" for the
+                only server.
+        |
+        """
+        self.attributes = default_attributes(channel, config)
+        self.config = config
+        self.server = server
+        self.model = None
+        self.row = None
+        self.status = "Loading Status..."
+        self.feedback = ""
+        self.locked = None
+        self.script = "None"
+        points = points_setting(config)
+        self.trend = Trend(points) if points > 0 else None
+
+        if cur_channel_info["path"] is not None:
+            self.attributes["path"] = log_name(cur_channel_info["path"])
+        if cur_channel_info["cellid"] is not None:
+            self.attributes["cellid"] = cur_channel_info["cellid"]
+        if cur_channel_info["comment"] is not None:
+            self.attributes["comment"] = cur_channel_info["comment"]
+        if cur_channel_info["protocol_name"] is not None:
+            # If a script was running when the client was closed it stays the active one
+            self.set_script(os.path.join(config["arguments"]["record_dir"], "scripts",
+                                         cur_channel_info["protocol_name"]))
+
+    def set(self, key, text):
+        """Sets the attributes dict using the corresponding key and text.
+
+        |
+        """
+        self.attributes[key] = text
+
+    def set_plugin(self, key, text):
+        """Sets the source of a plugin.
+
+        |
+        """
+        self.attributes["plugins"][key] = text
+
+    def set_script(self, filename):
+        """Sets the protocol for the channel to run from a script file.
+
+        Args:
+            filename (str): Path of the script file.
+        |
+        """
+        self.attributes["protocol_name"] = filename.split("/")[-1]
+        if filename:
+            filepath = Path(filename).resolve().absolute()
+            if filepath.is_dir() is False:
+                self.attributes['script_path'] = str(filepath)
+                try:
+                    self.attributes['script_content'] \
+                        = open(self.attributes['script_path'], "r").read()
+                    self.script = filepath.name
+                except (UnicodeDecodeError, PermissionError, FileNotFoundError) as error:
+                    logger.error(
+                        f"Could not read file: {self.attributes['script_path']}")
+                    logger.exception(error)
+        self._changed()
+
+    def unlock_settings(self):
+        """Lets the settings of the channel be edited.
+
+        |
+        """
+        self.locked = False
+        self._changed()
+
+    def lock_settings(self):
+        """Stops the settings of the channel from being edited.
+
+        |
+        """
+        self.locked = True
+        self._changed()
+
+    def _changed(self):
+        if self.model is not None:
+            # Queued to the gui thread when called from a worker
+            self.model.row_changed.emit(self.row)
+
+
+class ChannelModel(QAbstractTableModel):
+    """Table model of the channels, a ChannelRecord per row.
+
+    Attributes:
+        columns (list): The key of every column, see HEADERS, plugin columns start with
+            PLUGIN.
+        plugin_sources (dict): The sources of every plugin by name.
+        records (list): The ChannelRecord of every row.
+        row_changed (Signal): Emitted with the row of a record that changed.
+    |
+    """
+
+    row_changed = Signal(int)
+
+    def __init__(self, records, plugin_info, parent=None, sparklines=False):
+        """Inits ChannelModel with records, columns and plugin_sources.
+
+        Args:
+            parent (QObject, optional): Defaults to None.
+            plugin_info (list): A list of dicts holding info about installed plugins.
+            records (list): The ChannelRecord of every row.
+            sparklines (bool, optional): Whether to have a column plotting the voltage of
+                the latest measurements. Defaults to False.
+        |
+        """
+        super(ChannelModel, self).__init__(parent)
+        self.records = records
+        self.plugin_sources = {plugin["name"]: ["None"] + plugin["sources"]
+                               for plugin in plugin_info}
+        self.columns = (["channel", "script"] + list(EDITABLE)
+                        + [PLUGIN + name for name in self.plugin_sources]
+                        + ["status"] + (["trend"] if sparklines else [])
+                        + ["feedback", "actions"])
+        for row, record in enumerate(records):
+            record.model = self
+            record.row = row
+        self.row_changed.connect(self._row_changed)
+
+    def rowCount(self, parent=QModelIndex()):
+        """Returns the number of channels.
+
+        |
+        """
+        return 0 if parent.isValid() else len(self.records)
+
+    def columnCount(self, parent=QModelIndex()):
+        """Returns the number of columns.
+
+        |
+        """
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        """Returns the title of a column.
+
+        |
+        """
+        if orientation != Qt.Horizontal or role != Qt.DisplayRole:
+            return None
+        key = self.columns[section]
+        if key.startswith(PLUGIN):
+            return "{} Source".format(key[len(PLUGIN):])
+        return HEADERS[key]
+
+    def data(self, index, role=Qt.DisplayRole):
+        """Returns what a cell shows for a role.
+
+        |
+        """
+        if not index.isValid():
+            return None
+        record = self.records[index.row()]
+        key = self.columns[index.column()]
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self.value(record, key)
+        if role in (Qt.StatusTipRole, Qt.ToolTipRole):
+            if key.startswith(PLUGIN):
+                return "Set Measurement Source for '{}' Plugin.".format(key[len(PLUGIN):])
+            return TIPS[key].format(channel_label(record.server,
+                                                  record.attributes["channel"]))
+        if role == Qt.FontRole and key == "channel":
+            font = QFont()
+            font.setBold(True)
+            return font
+        if role == Qt.ForegroundRole and record.locked and self._settable(key):
+            return QColor(gui.gray)
+        return None
+
+    def value(self, record, key):
+        """Returns the value of a column for a record.
+
+        |
+        """
+        if key == "channel":
+            return "{}:".format(channel_label(record.server, record.attributes["channel"]))
+        if key == "script":
+            return record.script
+        if key in EDITABLE:
+            value = record.attributes[key]
+            return "" if value is None else value
+        if key.startswith(PLUGIN):
+            return record.attributes["plugins"].get(key[len(PLUGIN):], "None")
+        if key == "status":
+            return record.status
+        if key == "feedback":
+            return record.feedback
+        return None
+
+    def flags(self, index):
+        """Makes the settings of unlocked channels editable.
+
+        |
+        """
+        if not index.isValid():
+            return Qt.NoItemFlags
+        # Flags are combined as ints, "|" on the enums fails on some PySide2 builds
+        flags = int(Qt.ItemIsEnabled) | int(Qt.ItemIsSelectable)
+        key = self.columns[index.column()]
+        if (key in EDITABLE or key.startswith(PLUGIN)) \
+                and not self.records[index.row()].locked:
+            flags |= int(Qt.ItemIsEditable)
+        return Qt.ItemFlags(flags)
+
+    def setData(self, index, value, role=Qt.EditRole):
+        """Sets a setting of a channel.
+
+        Returns:
+            bool: Whether the value was taken.
+        |
+        """
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        record = self.records[index.row()]
+        key = self.columns[index.column()]
+        if record.locked:
+            return False
+        if key == "path" and value and not QRegExp(FILE_REGEX).exactMatch(value):
+            return False
+        if key in EDITABLE:
+            record.set(key, value)
+        elif key.startswith(PLUGIN):
+            record.set_plugin(key[len(PLUGIN):], value)
+        else:
+            return False
+        self.dataChanged.emit(index, index)
+        return True
+
+    def add_records(self, records):
+        """Adds rows for records, e.g. the channels of a server that replied late.
+
+        Args:
+            records (list): The ChannelRecord of every new row.
+        |
+        """
+        if not records:
+            return
+        first = len(self.records)
+        self.beginInsertRows(QModelIndex(), first, first + len(records) - 1)
+        for row, record in enumerate(records, first):
+            record.model = self
+            record.row = row
+            self.records.append(record)
+        self.endInsertRows()
+
+    def of_server(self, server):
+        """Returns the records of a server's channels.
+
+        Args:
+            server (str): Name of the server, None for every channel.
+
+        Returns:
+            list: Its ChannelRecord objects.
+        |
+        """
+        if server is None:
+            return self.records
+        return [record for record in self.records if record.server == server]
+
+    def apply_status(self, changes, server=None):
+        """Updates the status of the channels that changed.
+
+        Args:
+            changes (dict): The status fields by channel of the channels that changed,
+                None if the server did not reply.
+            server (str, optional): Name of the server of the channels. Defaults to None
+                for the only server.
+        |
+        """
+        for record in self.of_server(server):
+            if changes is None:
+                locked = record.locked
+                text = "No Response"
+            else:
+                info = changes.get(str(record.attributes["channel"]))
+                if info is None:
+                    continue
+                locked = not is_idle(info)
+                text = status_text(info)
+            if text != record.status or locked != record.locked:
+                record.status = text
+                record.locked = locked
+                self._row_changed(record.row)
+
+    def set_feedback(self, status, record):
+        """Shows the response of the server to a control, like gui.feedback.
+
+        Args:
+            record (ChannelRecord): The channel the control was for.
+            status (str): The response.
+        |
+        """
+        record.feedback = str(status)
+        index = self.index(record.row, self.columns.index("feedback"))
+        self.dataChanged.emit(index, index)
+
+    def apply_recent(self, replies, server=None):
+        """Adds the latest measurements to the trends, redrawing the cells that changed.
+
+        Args:
+            replies (dict): The get_recent reply by channel.
+            server (str, optional): Name of the server replying. Defaults to None for the
+                only server.
+        |
+        """
+        column = self.columns.index("trend")
+        for record in self.of_server(server):
+            key = str(record.attributes["channel"])
+            if key in replies and record.trend.apply(replies[key]):
+                index = self.index(record.row, column)
+                self.dataChanged.emit(index, index)
+
+    def _settable(self, key):
+        return key in EDITABLE or key == "script" or key.startswith(PLUGIN)
+
+    def _row_changed(self, row):
+        self.dataChanged.emit(self.index(row, 0),
+                              self.index(row, len(self.columns) - 1))
+
+
+class ChannelDelegate(QStyledItemDelegate):
+    """Makes the editor of a setting when it is edited: a combo box for plugin sources and
+    a line edit only taking file names for the log file.
+
+    |
+    """
+
+    def createEditor(self, parent, option, index):
+        """Returns the editor of a cell.
+
+        |
+        """
+        key = index.model().columns[index.column()]
+        if key.startswith(PLUGIN):
+            editor = QComboBox(parent)
+            editor.addItems(index.model().plugin_sources[key[len(PLUGIN):]])
+            return editor
+        editor = QLineEdit(parent)
+        if key == "path":
+            editor.setValidator(QRegExpValidator(QRegExp(FILE_REGEX), editor))
+        return editor
+
+    def setEditorData(self, editor, index):
+        """Shows the value of a cell in its editor.
+
+        |
+        """
+        if isinstance(editor, QComboBox):
+            editor.setCurrentText(index.data(Qt.EditRole))
+        else:
+            editor.setText(index.data(Qt.EditRole))
+
+    def setModelData(self, editor, model, index):
+        """Sets the value of a cell from its editor.
+
+        |
+        """
+        if isinstance(editor, QComboBox):
+            model.setData(index, editor.currentText())
+        else:
+            model.setData(index, editor.text())
+
+
+class TrendDelegate(QStyledItemDelegate):
+    """Paints the sparkline of a row's trend.
+
+    |
+    """
+
+    def paint(self, painter, option, index):
+        """Paints the cell background, then the sparkline.
+
+        |
+        """
+        super(TrendDelegate, self).paint(painter, option, index)
+        paint_sparkline(painter, option.rect, index.model().records[index.row()].trend)
+
+
+class ActionDelegate(QStyledItemDelegate):
+    """Paints the control buttons of a row and reports the ones clicked, without a widget
+    per button.
+
+    Attributes:
+        triggered (Signal): Emitted with the row and the text of the button clicked.
+    |
+    """
+
+    triggered = Signal(int, str)
+
+    def paint(self, painter, option, index):
+        """Paints a button per action.
+
+        |
+        """
+        style = option.widget.style() if option.widget else QApplication.style()
+        for text, rect in zip(ACTIONS, self.rects(option.rect)):
+            button = QStyleOptionButton()
+            button.rect = rect
+            button.text = text
+            button.state = QStyle.State_Enabled
+            style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+
+    def sizeHint(self, option, index):
+        """Leaves room for every button.
+
+        |
+        """
+        return QSize(70 * len(ACTIONS), ROW_HEIGHT)
+
+    def editorEvent(self, event, model, option, index):
+        """Emits triggered when a button is clicked.
+
+        |
+        """
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            for text, rect in zip(ACTIONS, self.rects(option.rect)):
+                if rect.contains(event.pos()):
+                    self.triggered.emit(index.row(), text)
+                    return True
+        return False
+
+    def rects(self, rect):
+        """Splits a cell into a rectangle per button.
+
+        |
+        """
+        width = rect.width() // len(ACTIONS)
+        return [rect.adjusted(i * width + 1, 1, (i + 1) * width - rect.width() - 1, -1)
+                for i in range(len(ACTIONS))]
+
+
+class ChannelView(QWidget):
+    """Object that shows the cycler channels from the server as the rows of a table.
+
+    It stands in for ChannelTab with the same constructor, channels, apply_status and
+    stop_status.
+
+    Attributes:
+        actions (ActionDelegate): Paints the control buttons.
+        channels (list): A list of ChannelRecord objects.
+        config (dict): Holds Cyckei launch settings.
+        model (ChannelModel): The channels as a table.
+        resource (dict): A dict holding the Threadpool object for threads to be pulled from.
+        servers (list): The federation.Server of the channels, each following the status
+            and measurements of its own.
+        table (QTableView): Shows the visible rows of the model.
+    |
+    """
+
+    def __init__(self, config, resource, parent, plugin_info, servers):
+        """Inits ChannelView with the channels, model and table.
+
+        Args:
+            config (dict): Holds Cyckei launch settings.
+            resource (dict): A dict holding the Threadpool object for threads to be pulled from.
+            parent (MainWindow): The MainWindow object that created this ChannelView.
+            plugin_info (list): A list of dicts holding info about installed plugins, of
+                every server.
+            servers (list): The federation.Server objects that replied, with the info
+                about each of their channels.
+        |
+        """
+        QWidget.__init__(self, parent)
+        self.config = config
+        self.resource = resource
+        self.servers = servers
+
+        self.channels = []
+        for server in servers:
+            for channel in server.channels:
+                self.channels.append(ChannelRecord(
+                    channel, server.config, server.channel_info[str(channel)],
+                    server.name))
+        self.model = ChannelModel(self.channels, plugin_info, self,
+                                  sparklines=points_setting(config) > 0)
+
+        self.table = QTableView(self)
+        self.table.setModel(self.model)
+        self.table.setItemDelegate(ChannelDelegate(self.table))
+        self.actions = ActionDelegate(self.table)
+        self.actions.triggered.connect(self.button)
+        self.table.setItemDelegateForColumn(self.model.columns.index("actions"),
+                                            self.actions)
+        if "trend" in self.model.columns:
+            self.table.setItemDelegateForColumn(self.model.columns.index("trend"),
+                                                TrendDelegate(self.table))
+        self.table.setAlternatingRowColors(True)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.table.setEditTriggers(QAbstractItemView.EditTriggers(
+            int(QAbstractItemView.DoubleClicked)
+            | int(QAbstractItemView.EditKeyPressed)
+            | int(QAbstractItemView.SelectedClicked)))
+        self.table.doubleClicked.connect(self.double_clicked)
+        # Fixed sizes, so no row or column is measured
+        rows = self.table.verticalHeader()
+        rows.setVisible(False)
+        rows.setSectionResizeMode(QHeaderView.Fixed)
+        rows.setDefaultSectionSize(ROW_HEIGHT)
+        columns = self.table.horizontalHeader()
+        columns.setSectionResizeMode(QHeaderView.Interactive)
+        columns.setStretchLastSection(False)
+        columns.setSectionResizeMode(self.model.columns.index("status"), QHeaderView.Stretch)
+        named = any(server.name for server in servers)
+        columns.resizeSection(self.model.columns.index("channel"), 140 if named else 80)
+        columns.resizeSection(self.model.columns.index("feedback"), 160)
+        if "trend" in self.model.columns:
+            columns.resizeSection(self.model.columns.index("trend"), 160)
+        columns.resizeSection(self.model.columns.index("actions"), 70 * len(ACTIONS))
+
+        # Controls applied to every selected channel in one request
+        batch = QHBoxLayout()
+        batch.addWidget(gui.label("<i><small>Selected channels:</small></i>"))
+        for text in ACTIONS:
+            batch.addWidget(gui.button(text, "{} every selected channel".format(text),
+                                       connect=self.apply_selected))
+        batch.addStretch()
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(batch)
+        layout.addWidget(self.table)
+
+        # Follow the status of each server's channels from a thread of its own
+        self.update_status()
+
+    def update_status(self):
+        """Starts following the status of the channels, applied by apply_status.
+
+        |
+        """
+        follow_servers(self.servers, self.resource, self.apply_status,
+                       self.apply_recent if "trend" in self.model.columns else None)
+
+    def add_server(self, server):
+        """Adds the channels of a server that replied late and starts following them.
+
+        Only the plugin columns the view was made with are shown.
+
+        Args:
+            server (federation.Server): The server, connected.
+        |
+        """
+        self.servers.append(server)
+        self.model.add_records([
+            ChannelRecord(channel, server.config, server.channel_info[str(channel)],
+                          server.name)
+            for channel in server.channels])
+        follow_servers([server], self.resource, self.apply_status,
+                       self.apply_recent if "trend" in self.model.columns else None)
+
+    def stop_status(self):
+        """Stops following the status and measurements of the channels.
+
+        |
+        """
+        stop_servers(self.servers)
+
+    def read_idle(self):
+        """Reads the voltage of every idle channel, in one request to each server.
+
+        |
+        """
+        for server in self.servers:
+            self.start_worker(workers.Read(server.config,
+                                           self.model.of_server(server.name), idle=True))
+
+    def apply_status(self, changes, server=None):
+        """Updates the status of the channels that changed, on the gui thread.
+
+        |
+        """
+        self.model.apply_status(changes, None if server is None else server.name)
+
+    def apply_recent(self, replies, server=None):
+        """Adds the latest measurements to the trends, on the gui thread.
+
+        |
+        """
+        self.model.apply_recent(replies, None if server is None else server.name)
+
+    def start_worker(self, worker):
+        """Starts a worker whose responses show as the feedback of the channels.
+
+        |
+        """
+        worker.signals.status.connect(self.model.set_feedback)
+        self.resource["threadpool"].start(worker)
+
+    def double_clicked(self, index):
+        """Opens a script file for the channel when its script cell is double clicked.
+
+        |
+        """
+        record = self.channels[index.row()]
+        if self.model.columns[index.column()] != "script" or record.locked:
+            return
+        filename = QFileDialog.getOpenFileName(
+            self,
+            "Open Script",
+            os.path.join(self.config["arguments"]["record_dir"], "scripts"))[0]
+        if filename:
+            record.set_script(filename)
+
+    def button(self, row, text):
+        """Runs the control of a channel whose button was clicked, like ChannelWidget.button.
+
+        Args:
+            row (int): The row of the channel.
+            text (str): Button text that determines which function to do.
+        |
+        """
+        record = self.channels[row]
+        self.model.set_feedback("{} in progress...".format(text), record)
+        if text == "Check":
+            worker = workers.Read(record.config, [record])
+        else:
+            worker = workers.Control(record.config, record, text.lower(), temp=False)
+        self.start_worker(worker)
+
+    def selected(self):
+        """Returns the channels of the selected rows.
+
+        Returns:
+            list: The ChannelRecord of every selected row, in order.
+        |
+        """
+        rows = sorted(index.row() for index in self.table.selectionModel().selectedRows())
+        return [self.channels[row] for row in rows]
+
+    def apply_selected(self, text):
+        """Runs a control on every selected channel in one request to each of their servers.
+
+        Args:
+            text (str): Button text that determines which function to do.
+        |
+        """
+        selected = self.selected()
+        for record in selected:
+            self.model.set_feedback("{} in progress...".format(text), record)
+        for server in self.servers:
+            records = [record for record in selected if record.server == server.name]
+            if not records:
+                continue
+            if text == "Check":
+                worker = workers.Read(server.config, records)
+            else:
+                worker = workers.ControlMany(server.config, records, text.lower())
+            self.start_worker(worker)
@@ -8,14 +8,18 @@ import sys
 import time
 
 from PySide2.QtWidgets import QApplication, QMainWindow
-from PySide2.QtCore import QThreadPool
+from PySide2.QtCore import QThreadPool, QTimer
 from .channel_tab import ChannelTab
-from . import workers
-from cyckei.functions import gui
-from .socket import Socket
+from .channel_view import ChannelView
+from . import federation, workers
+from cyckei.functions import gui, startup
+from .socket import POOL
 
 logger = logging.getLogger('cyckei_client')
 
+TABLE_CHANNELS = 32  # Channels from which "auto" shows them as a table
+HEALTH_INTERVAL = 1000  # Milliseconds between updates of the servers' health
+
 
 def main(config):
     """Begins execution of Cyckei.
@@ -34,29 +38,56 @@ def main(config):
     logger.debug("Creating QApplication")
     app = QApplication(sys.argv)
     gui.style(app, "icon-client.png", gui.orange)
+    startup.mark("create application")
 
     # Create Client
     logger.debug("Creating initial client window")
     main_window = MainWindow(config)
     main_window.show()
+    # Once the event loop has shown the window
+    QTimer.singleShot(0, lambda: startup.finish("show window"))
 
     return app.exec_()
 
 
+def choose_view(config, count):
+    """Returns how to show the channels, by the "channel-view" setting.
+
+    "auto" shows TABLE_CHANNELS or more channels as a table, where selected channels are
+    controlled in one request, and fewer as a widget each.
+
+    Args:
+        config (dict): Holds Cyckei launch settings.
+        count (int): Number of channels shown.
+
+    Returns:
+        type: ChannelView or ChannelTab.
+    |
+    """
+    view = str(config["behavior"].get("channel-view", "auto")).lower()
+    if view == "table" or (view == "auto" and count >= TABLE_CHANNELS):
+        return ChannelView
+    return ChannelTab
+
+
 class MainWindow(QMainWindow):
     """An object for generating the main client window and holding information about it.
 
     Attributes:
         config (dict): Holds Cyckei launch settings.
-        channel_info (dict): Holds info on channels available on the server.
         channels (list): A list of all of the ChannelWidgets in channelView
-        channelView (ChannelTab): Wrapper object that holds all of the ChannelWidgets.
+        channelView (ChannelTab): Wrapper object that holds all of the ChannelWidgets, or
+            the ChannelView table of them.
+        connecting (set): The addresses of the servers being asked for their channels.
+        health (QLabel): Shows the latency of every server in the status bar.
+        plugin_info (list): Holds info on the plugins installed on the servers.
+        servers (list): The federation.Server of every server, see the "servers" setting.
         status_bar (QStatusBar): Default status bar for the QWindow.
         threadpool (QThreadPool): Threadpool of workers for communicating with the server
     |
     """ 
     def __init__(self, config):
-        """Inits Mainwindow with config, channel_info, channels, channelView, status_bar, and threadpool.
+        """Inits Mainwindow with config, servers, channels, channelView, status_bar, and threadpool.
         
         Args:
         config (dict): Holds Cyckei launch settings. Is copied to MainWindow's version of config.
@@ -79,29 +110,39 @@ class MainWindow(QMainWindow):
         # # Load scripts
         # resource["scripts"] = ScriptList(config)
 
-        # Obtain channel information
-        logger.info("Connecting to server for channel information")
-        self.channel_info = Socket(config).info_server_file()
-        if type(self.channel_info) is not dict:
-            logger.error("Could not get any plugin info from server.")
-            raise Exception("Incorrect server response")
-
-        # Obtain plugin information
-        logger.info("Connecting to server for plugin information")
-        self.plugin_info = Socket(config).info_plugins()
-        if type(self.plugin_info) is not list:
-            logger.error("Could not get any plugin info from server.")
+        # Obtain channel and plugin information, from every server at once, the servers
+        # that do not reply in time are asked again by show_health
+        self.servers = federation.connect(config)
+        self.connecting = set()
+        connected = [server for server in self.servers if server.connected]
+        if not connected:
+            logger.error("Could not get channel and plugin info from any server.")
             raise Exception("Incorrect server response")
+        self.plugin_info = federation.merge_plugins(connected)
+        startup.mark("connect servers")
 
         # Create menu and status bar
         self.create_menu()
         self.status_bar = self.statusBar()
+        self.health = gui.label("", "Latency of the servers' replies")
+        self.status_bar.addPermanentWidget(self.health)
 
-        # Create ChannelTab
-        self.channelView = ChannelTab(config, resource, self, self.plugin_info, self.channel_info)
+        # Create ChannelTab, or a table of the channels for large racks
+        count = sum(len(server.channels) for server in connected)
+        view_class = choose_view(config, count)
+        if view_class is ChannelView:
+            logger.info("Showing {} channels as a table".format(count))
+        self.channelView = view_class(config, resource, self, self.plugin_info, connected)
         self.channels = self.channelView.channels
         self.setCentralWidget(self.channelView)
 
+        # Show how every server is doing, a dead one does not hold up the others
+        self.health_timer = QTimer(self)
+        self.health_timer.timeout.connect(self.show_health)
+        self.health_timer.start(HEALTH_INTERVAL)
+        self.show_health()
+        startup.mark("build window")
+
     def closeEvent(self, event):
         """Overridden method from QMainWindow for closing the application. 
 
@@ -117,6 +158,8 @@ class MainWindow(QMainWindow):
         if close:
             close_time = time.strftime("%m-%d-%y %H:%M", time.localtime(time.time()))
             logger.info("Client window closed by user on {} ".format(close_time))
+            self.channelView.stop_status()
+            POOL.close()
             event.accept() # let the window close
         else:
             event.ignore()
@@ -130,6 +173,10 @@ class MainWindow(QMainWindow):
             "Info": [
                 ["&Server", self.ping_server, "Test Connection to Server"],
                 ["&Plugins", self.plugin_dialog, "Check Loaded Plugins"]
+            ],
+            "Channels": [
+                ["&Read Idle Channels", self.read_idle,
+                 "Read the Voltage of Every Channel Not Running a Test"]
             ]
         }
 
@@ -139,13 +186,65 @@ class MainWindow(QMainWindow):
                 menu.addAction(gui.action(*item, parent=self))
 
     def ping_server(self):
-        """Checks for an active server and returns a result message in a new window.
+        """Checks for active servers and returns a result message in a new window for each.
         
         |
         """
-        worker = workers.Ping(self.config)
-        worker.signals.alert.connect(gui.message)
-        self.threadpool.start(worker)
+        for server in self.servers:
+            worker = workers.Ping(server.config)
+            worker.signals.alert.connect(gui.message)
+            self.threadpool.start(worker)
+
+    def show_health(self):
+        """Shows the latency of every server's replies in the status bar.
+
+        The servers that did not send their channels yet are asked again.
+        |
+        """
+        self.reconnect()
+        text = " | ".join("{}: {}".format(server.name or "Server", server.health())
+                          for server in self.servers)
+        if text != self.health.text():
+            self.health.setText(text)
+
+    def reconnect(self):
+        """Asks every server that did not send its channels yet for them, once at a time.
+
+        |
+        """
+        timeout = min(federation.CONNECT_TIMEOUT, float(self.config["zmq"]["timeout"]))
+        for server in self.servers:
+            if server.connected or server.address in self.connecting:
+                continue
+            self.connecting.add(server.address)
+            worker = workers.Connect(server, timeout)
+            worker.signals.info.connect(self.add_server)
+            worker.signals.alert.connect(
+                lambda server: self.connecting.discard(server.address))
+            self.threadpool.start(worker)
+
+    def add_server(self, server):
+        """Shows the channels of a server that replied after the window opened.
+
+        Args:
+            server (federation.Server): The server, connected.
+        |
+        """
+        self.connecting.discard(server.address)
+        if server in self.channelView.servers:
+            return
+        logger.info("Server {} replied, adding its {} channels".format(
+            server.address, len(server.channels)))
+        self.channelView.add_server(server)
+        self.plugin_info = federation.merge_plugins(
+            [server for server in self.servers if server.connected])
+
+    def read_idle(self):
+        """Reads the voltage of every idle channel, shown as the feedback of each.
+
+        |
+        """
+        self.channelView.read_idle()
 
     def plugin_dialog(self):
         """Compiles and formats info for installed plugins on the server for display.
@@ -0,0 +1,234 @@
+"""Several servers, one per bench PC, shown as the channels of one client.
+
+The "servers" setting of the zmq section lists them, comma separated, as
+"name=tcp://host:port" or "tcp://host:port". Without it the client has the one server at
+client-address and port. Each Server gets a config of its own, a copy of the client's with
+its address, so the Sockets and workers of its channels only talk to it, and its status
+is followed from a thread of its own, so a slow or dead server does not hold up updates
+from the others. Its channels are shown as "name/channel".
+
+At startup every server gets CONNECT_TIMEOUT seconds to send its channels, the client
+opens with those that did. The others are asked again by the client until they reply,
+and their channels are added then.
+
+|
+"""
+import copy
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cyckei.functions import func
+from .socket import Socket
+
+logger = logging.getLogger('cyckei_client')
+
+CONNECT_TIMEOUT = 2.0  # Seconds a server gets to send its channels, without retries
+
+
+def parse_servers(config):
+    """Returns the servers of the "servers" setting.
+
+    Args:
+        config (dict): Holds Cyckei launch settings.
+
+    Returns:
+        list: A (name, address) tuple per server, an empty list without the setting. The
+            name defaults to the host and port, e.g. "bench1:5556".
+    |
+    """
+    servers = []
+    for entry in str(config["zmq"].get("servers", "") or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, address = entry.rpartition("=")
+        if "://" not in address:
+            address = "tcp://" + address
+        servers.append((name.strip() or address.split("://", 1)[1], address.strip()))
+    return servers
+
+
+def server_config(config, address):
+    """Returns a copy of config for a server at another address.
+
+    A publish port set in config keeps the same offset from the port, an empty one stays
+    empty for the port + 1 of the server.
+
+    Args:
+        address (str): The server's zmq address, e.g. "tcp://bench1:5556".
+        config (dict): Holds Cyckei launch settings.
+
+    Returns:
+        dict: The config, with its own "zmq" section.
+    |
+    """
+    zmq_config = dict(config["zmq"])
+    offset = func.publish_port(zmq_config) - int(zmq_config["port"])
+    host, _, new_port = address.rpartition(":")
+    zmq_config["client-address"] = host
+    zmq_config["port"] = int(new_port)
+    if str(zmq_config.get("publish-port", "") or "").strip():
+        zmq_config["publish-port"] = int(new_port) + offset
+    server = copy.copy(config)
+    server["zmq"] = zmq_config
+    return server
+
+
+def channel_label(server, channel):
+    """Returns how a channel is named, with its server's name if it has one.
+
+    Args:
+        channel (int): Id number of the channel.
+        server (str): Name of the channel's server, "" for the only server.
+
+    Returns:
+        str: e.g. "3" or "bench1/3".
+    |
+    """
+    if not server:
+        return str(channel)
+    return "{}/{}".format(server, channel)
+
+
+def merge_plugins(servers):
+    """Returns the plugins of every server, with the sources of plugins of the same name.
+
+    Args:
+        servers (list): The Server objects.
+
+    Returns:
+        list: A dict per plugin with its "name", "description" and "sources".
+    |
+    """
+    merged = {}
+    for server in servers:
+        for plugin in server.plugin_info or []:
+            entry = merged.setdefault(plugin["name"], dict(plugin, sources=[]))
+            entry["sources"] += [source for source in plugin["sources"]
+                                 if source not in entry["sources"]]
+    return list(merged.values())
+
+
+class Server(object):
+    """A server, its channels and how it is doing.
+
+    Attributes:
+        address (str): The server's zmq address.
+        channel_info (dict): Holds info about each of its channels, None if it did not reply.
+        channels (list): The numbers of its channels shown.
+        config (dict): Holds Cyckei launch settings, with the server's address.
+        name (str): Shown before its channel numbers, "" for the only server.
+        plugin_info (list): A dict per plugin installed on it, None if it did not reply.
+        recent (workers.FollowRecent): Follows the latest measurements of its channels.
+        updater (workers.UpdateStatus): Follows the status of its channels.
+    |
+    """
+
+    def __init__(self, name, config, channel_info=None, plugin_info=None):
+        """Inits Server, its channels are set by load().
+
+        Args:
+            channel_info (dict, optional): Defaults to None.
+            config (dict): Holds Cyckei launch settings, with the server's address.
+            name (str): Shown before its channel numbers.
+            plugin_info (list, optional): Defaults to None.
+        |
+        """
+        self.name = name
+        self.config = config
+        self.address = Socket(config).address
+        self.channel_info = channel_info
+        self.plugin_info = plugin_info
+        self.channels = []
+        self.updater = None
+        self.recent = None
+
+    @property
+    def connected(self):
+        """Whether the server replied with its channels and plugins.
+
+        |
+        """
+        return type(self.channel_info) is dict and type(self.plugin_info) is list
+
+    def load(self, timeout=None):
+        """Asks the server for its channels and plugins.
+
+        Nothing is changed unless both replies come, they may be asked for from a thread.
+
+        Args:
+            timeout (float, optional): Seconds to wait for each reply, without retries.
+                Defaults to None for the zmq timeout and retries of the config.
+
+        Returns:
+            bool: Whether the server replied, see connected.
+        |
+        """
+        logger.info("Connecting to server {} for channel and plugin information".format(
+            self.address))
+        config = self.config
+        if timeout is not None:
+            config = dict(config, zmq=dict(config["zmq"], timeout=timeout, retries=0))
+        socket = Socket(config)
+        channel_info = socket.info_server_file()
+        if type(channel_info) is not dict:
+            logger.error("Could not get channel info from server {}.".format(self.address))
+            return False
+        plugin_info = socket.info_plugins()
+        if type(plugin_info) is not list:
+            logger.error("Could not get plugin info from server {}.".format(self.address))
+            return False
+        if self.name:
+            self.channels = sorted(int(channel) for channel in channel_info)
+        else:
+            # The only server, with the channels of the client's config
+            self.channels = [channel["channel"] for channel in self.config["channels"]
+                             if str(channel["channel"]) in channel_info]
+        self.plugin_info = plugin_info
+        self.channel_info = channel_info
+        return True
+
+    def health(self, now=None):
+        """Returns how the server is doing, from the status follower of its channels.
+
+        Args:
+            now (float, optional): Epoch time in seconds. Defaults to None for now.
+
+        Returns:
+            str: The latency of its last reply, e.g. "12 ms", "Connecting..." or "No
+                Response" if it is not replying.
+        |
+        """
+        if not self.connected:
+            return "No Response"
+        follower = None if self.updater is None else self.updater.follower
+        if follower is None or follower.replied is None:
+            return "Connecting..."
+        now = time.time() if now is None else now
+        stale = 2 * follower.poll_interval + float(self.config["zmq"]["timeout"])
+        if follower.latency is None or now - follower.replied > stale:
+            return "No Response"
+        return "{:.0f} ms".format(follower.latency * 1000)
+
+
+def connect(config, timeout=CONNECT_TIMEOUT):
+    """Makes the servers of config and asks them all at once for their channels.
+
+    Args:
+        config (dict): Holds Cyckei launch settings.
+        timeout (float, optional): Seconds each server gets to reply, at most the zmq
+            timeout. Defaults to CONNECT_TIMEOUT.
+
+    Returns:
+        list: A Server per server, see Server.connected for those that replied.
+    |
+    """
+    servers = [Server(name, server_config(config, address))
+               for name, address in parse_servers(config)]
+    if not servers:
+        servers = [Server("", config)]
+    timeout = min(timeout, float(config["zmq"]["timeout"]))
+    with ThreadPoolExecutor(max_workers=len(servers)) as executor:
+        list(executor.map(lambda server: server.load(timeout), servers))
+    return servers
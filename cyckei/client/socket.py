@@ -1,36 +1,129 @@
 import zmq
 import json
 import logging
+import threading
 
 logger = logging.getLogger('cyckei_client')
 
 
+# Requests that can be sent again when a reply is lost, without side effects on the server
+IDEMPOTENT = ("ping", "test", "info_", "query_", "get_", "measure")
+RETRIES = 2  # Times an idempotent request is sent again after a timeout
+MAX_IDLE = 8  # Idle connections kept per server
+
+
+class ConnectionPool(object):
+    """Thread-safe pool of REQ sockets to the servers, on the process-wide zmq context.
+
+    A REQ socket must receive a reply before it can send again, so a socket whose request
+    timed out cannot be reused. It is closed, and a fresh one taken the next time, as in
+    the "lazy pirate" pattern.
+
+    Attributes:
+        max_idle (int): Idle connections kept per server, others are closed when released.
+        created (int): Number of sockets opened so far.
+    |
+    """
+
+    def __init__(self, max_idle=MAX_IDLE):
+        """Inits an empty pool.
+
+        Args:
+            max_idle (int, optional): Idle connections kept per server. Defaults to MAX_IDLE.
+        |
+        """
+        self.max_idle = max_idle
+        self.created = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, address):
+        """Takes an idle connection to a server, or opens one.
+
+        Args:
+            address (str): The server's zmq address, e.g. "tcp://localhost:5556".
+
+        Returns:
+            zmq.Socket: A REQ socket ready to send, to be given back with release() or
+                discard().
+        |
+        """
+        with self._lock:
+            idle = self._idle.get(address)
+            if idle:
+                return idle.pop()
+            self.created += 1
+        socket = zmq.Context.instance().socket(zmq.REQ)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(address)
+        return socket
+
+    def release(self, address, socket):
+        """Gives back a connection that received its reply.
+
+        |
+        """
+        with self._lock:
+            idle = self._idle.setdefault(address, [])
+            if len(idle) < self.max_idle:
+                idle.append(socket)
+                return
+        socket.close()
+
+    def discard(self, socket):
+        """Closes a connection whose request got no reply.
+
+        |
+        """
+        socket.close()
+
+    def close(self):
+        """Closes every idle connection.
+
+        |
+        """
+        with self._lock:
+            sockets = [socket for idle in self._idle.values() for socket in idle]
+            self._idle = {}
+        for socket in sockets:
+            socket.close()
+
+
+POOL = ConnectionPool()
+
+
 class Socket(object):
     """Object that handles connection, communication, and control of server from the client over ZMQ.
-    
+
+    Connections are taken from the shared POOL for each request, so creating a Socket is
+    cheap and Sockets can be used from any thread.
+
     Attributes:
+        address (str): The server's zmq address.
         config (dict): Holds Cyckei launch settings.
-        socket (zmq.socket): The underlying scoket that acts as the communication between client and server.
+        pool (ConnectionPool): Where the connections come from.
     |
     """
 
-    def __init__(self, config):
-        """Inits Socket with config and socket.
+    def __init__(self, config, pool=None):
+        """Inits Socket with config, address and pool.
 
         Args:
             config (dict): Holds Cyckei launch settings.
+            pool (ConnectionPool, optional): Defaults to None for the shared POOL.
         |
         """
         self.config = config
-        self.socket = zmq.Context().socket(zmq.REQ)
-        self.socket.connect("{}:{}".format(
-            config["zmq"]["client-address"],
-            int(config["zmq"]["port"])))
-        self.socket.setsockopt(zmq.LINGER, 0)
+        self.address = "{}:{}".format(config["zmq"]["client-address"],
+                                      int(config["zmq"]["port"]))
+        self.pool = POOL if pool is None else pool
 
     def send(self, to_send):
         """Sends JSON packet from client to server over zmq socket.
-        
+
+        An idempotent request, see IDEMPOTENT, that times out is sent again on a fresh
+        connection, up to "retries" times from the zmq config, sharing the timeout.
+
         Args:
             to_send (dict): JSON in the form of a python dict to be sent to server.
 
@@ -39,18 +132,33 @@ class Socket(object):
 
         |
         """
-        logger.debug("Sending: {}".format(to_send["function"]))
+        function = to_send["function"]
+        logger.debug("Sending: {}".format(function))
+
+        attempts = 1
+        if function.startswith(IDEMPOTENT):
+            attempts += int(self.config["zmq"].get("retries", RETRIES))
+        timeout = int(float(self.config["zmq"]["timeout"]) * 1000 / attempts)
 
-        self.socket.send_json(to_send)
-        poller = zmq.Poller()
-        poller.register(self.socket, zmq.POLLIN)
-        if poller.poll(int(self.config["zmq"]["timeout"])*1000):
-            response = self.socket.recv_json()
-        else:
-            response = (
-                json.loads('{"response": "Request Timed Out", "message": ""}'))
+        for attempt in range(attempts):
+            socket = self.pool.acquire(self.address)
+            try:
+                socket.send_json(to_send)
+                if socket.poll(timeout, zmq.POLLIN):
+                    response = socket.recv_json()
+                    self.pool.release(self.address, socket)
+                    logger.debug("Received: {}".format(response))
+                    return response
+            except zmq.ZMQError as error:
+                logger.warning("Request {} failed: {}".format(function, error))
+            # The socket waits for a reply that may never come, drop it
+            self.pool.discard(socket)
+            logger.warning("No reply to {} (attempt {} of {}).".format(
+                function, attempt + 1, attempts))
+
+        response = (
+            json.loads('{"response": "Request Timed Out", "message": ""}'))
         logger.debug("Received: {}".format(response))
-        self.socket.close()
         return response
 
     def send_file(self, file):
@@ -88,6 +196,51 @@ class Socket(object):
         response = self.send(script)["response"]
         return response
 
+    def start_many(self, entries):
+        """Sends a JSON request to start many channels in one round trip.
+
+        Args:
+            entries (list): A dict per channel with its "channel", "meta" and "protocol", as
+                in the kwargs of a "start" packet.
+
+        Returns:
+            list: A dict per entry with its "channel" and the server's "response", or a
+                str if the request failed.
+        |
+        """
+        script = {"function": "start_many", "kwargs": {"entries": entries}}
+        return self.send(script)["response"]
+
+    def control_many(self, command, channels):
+        """Sends a JSON request to stop, pause or resume many channels in one round trip.
+
+        Args:
+            channels (list): The channel numbers.
+            command (str): "stop", "pause" or "resume".
+
+        Returns:
+            list: A dict per channel with its "channel" and the server's "response", or a
+                str if the request failed.
+        |
+        """
+        script = {"function": "{}_many".format(command), "kwargs": {"channels": channels}}
+        return self.send(script)["response"]
+
+    def measure(self, channels=None):
+        """Sends a JSON request for one current and voltage reading of idle channels.
+
+        Args:
+            channels (list, optional): The channel numbers. Defaults to None for every idle
+                channel.
+
+        Returns:
+            list: A dict per channel with its "channel", "current", "voltage" and the
+                server's "response", or a str if the request failed.
+        |
+        """
+        script = {"function": "measure", "kwargs": {"channels": channels}}
+        return self.send(script)["response"]
+
     def info_channel(self, channel):
         """Sends a JSON request for information on a channel to server.
         
@@ -114,6 +267,21 @@ class Socket(object):
         script = json.loads("""{"function": "info_all_channels"}""")
         return self.send(script)["response"]
 
+    def info_changes(self, since=None, epoch=None):
+        """Sends a JSON request for the status fields changed since a version.
+
+        Args:
+            epoch (str, optional): The server epoch the version is from. Defaults to None.
+            since (int, optional): The last version applied. Defaults to None for every
+                field of every channel.
+
+        Returns:
+            dict: "epoch", "version", "full" and "channels", the changed fields by channel.
+        |
+        """
+        script = {"function": "info_changes", "kwargs": {"since": since, "epoch": epoch}}
+        return self.send(script)["response"]
+
     def info_server_file(self):
         """Sends a JSON request for the server file kept by the server.
         
@@ -123,3 +291,123 @@ class Socket(object):
         """
         script = json.loads("""{"function": "info_server_file"}""")
         return self.send(script)["response"]
+
+    def info_writer(self):
+        """Sends a JSON request for the statistics of the server's data file writer.
+
+        Returns:
+            dict: Queue depth, write counts and write latency of the writer.
+        |
+        """
+        script = json.loads("""{"function": "info_writer"}""")
+        return self.send(script)["response"]
+
+    def info_archiver(self):
+        """Sends a JSON request for the statistics of the server's log archiver.
+
+        Returns:
+            dict: Number of logs archived, failed and pending and their sizes, None if the
+                server does not archive logs.
+        |
+        """
+        script = json.loads("""{"function": "info_archiver"}""")
+        return self.send(script)["response"]
+
+    def get_series(self, channel, t0=None, t1=None, max_points=1000):
+        """Sends a JSON request for the summary of a channel's data over a time range.
+
+        Args:
+            channel (int): The id number of the channel.
+            max_points (int, optional): Most points returned. Defaults to 1000.
+            t0 (float, optional): Start of the range, epoch time in seconds. Defaults to None
+                for the start of the test.
+            t1 (float, optional): End of the range, epoch time in seconds. Defaults to None for
+                the latest data.
+
+        Returns:
+            dict: "time", "count" and the "min", "max" and "mean" of every column by name, at
+                the finest resolution "level" in seconds fitting max_points.
+        |
+        """
+        script = {"function": "get_series",
+                  "kwargs": {"channel": channel, "t0": t0, "t1": t1,
+                             "max_points": max_points}}
+        return self.send(script)["response"]
+
+    def get_recent(self, cursors, max_points=None):
+        """Sends a JSON request for the latest measurements of many channels.
+
+        Args:
+            cursors (dict): The "since" sequence number and "epoch" of the last reply by
+                channel, or None for every measurement the server keeps.
+            max_points (int, optional): Most samples per channel. Defaults to None for the
+                server's default.
+
+        Returns:
+            dict: The samples by channel, None for channels without a test, see
+                cyckei.server.recent.
+        |
+        """
+        kwargs = {"channels": cursors}
+        if max_points is not None:
+            kwargs["max_points"] = max_points
+        script = {"function": "get_recent", "kwargs": kwargs}
+        return self.send(script)["response"]
+
+    def query(self, function, offset=0, limit=None, **filters):
+        """Sends a JSON request for a page of the server's state store.
+
+        Args:
+            filters: Filters of the query, e.g. status="started". None values are left out.
+            function (str): One of "query_channels", "query_transitions", "query_cycles" and
+                "query_runners".
+            limit (int, optional): Most rows returned. Defaults to None for the server's page size.
+            offset (int, optional): Number of rows to skip. Defaults to 0.
+
+        Returns:
+            dict: The rows as "items" with "offset", "limit", "total" and "next", the offset
+                of the next page or None.
+        |
+        """
+        kwargs = {key: value for key, value in filters.items() if value is not None}
+        kwargs.update(offset=offset, limit=limit)
+        script = {"function": function, "kwargs": kwargs}
+        return self.send(script)["response"]
+
+    def query_channels(self, status=None, state=None, offset=0, limit=None):
+        """Sends a JSON request for the channels with a status or step state.
+
+        Returns:
+            dict: A page of channels, see query().
+        |
+        """
+        return self.query("query_channels", offset, limit, status=status, state=state)
+
+    def query_transitions(self, since=None, channel=None, offset=0, limit=None):
+        """Sends a JSON request for the channel status and state changes since a time.
+
+        Returns:
+            dict: A page of transitions, see query().
+        |
+        """
+        return self.query("query_transitions", offset, limit, since=since,
+                          channel=channel)
+
+    def query_cycles(self, channel=None, path=None, since=None, offset=0, limit=None):
+        """Sends a JSON request for the summaries of finished cycles.
+
+        Returns:
+            dict: A page of cycle summaries, see query().
+        |
+        """
+        return self.query("query_cycles", offset, limit, channel=channel, path=path,
+                          since=since)
+
+    def query_runners(self, channel=None, status=None, offset=0, limit=None):
+        """Sends a JSON request for the tests started on the server.
+
+        Returns:
+            dict: A page of tests, see query().
+        |
+        """
+        return self.query("query_runners", offset, limit, channel=channel, status=status)
@@ -0,0 +1,168 @@
+"""Live sparklines of the voltage of the channels, fed by the server's recent-data window.
+
+A FollowRecent worker asks the server with get_recent for the measurements taken since
+those it has, of every channel in one request, decimated by the server to at most
+"sparkline-points" per channel, see cyckei.server.recent. A Trend keeps the latest points
+of a channel and paint_sparkline() draws them, in a Sparkline widget or a table cell.
+
+|
+"""
+import base64
+
+import numpy as np
+from PySide2.QtWidgets import QWidget
+from PySide2.QtCore import QPointF, QSize
+from PySide2.QtGui import QColor, QPainter, QPen, QPolygonF
+
+from cyckei.functions import gui
+
+POINTS = 120  # Points kept and drawn per channel unless configured otherwise
+DTYPE = np.dtype("<f4")
+
+
+def decode(data):
+    """Unpacks the samples of a get_recent reply.
+
+    Args:
+        data (str): The "data" of the reply.
+
+    Returns:
+        numpy.ndarray: Rows of (seconds since "t0", current, voltage).
+    |
+    """
+    return np.frombuffer(base64.b64decode(data), dtype=DTYPE).reshape(-1, 3)
+
+
+def points_setting(config):
+    """Returns the points drawn per sparkline, 0 when they are turned off.
+
+    Args:
+        config (dict): Holds Cyckei launch settings.
+
+    Returns:
+        int: The "sparkline-points" setting.
+    |
+    """
+    return int(config["behavior"].get("sparkline-points", POINTS))
+
+
+class Trend(object):
+    """The latest voltage points of a channel.
+
+    Attributes:
+        points (int): Points kept.
+        times (numpy.ndarray): Epoch time in seconds of every point.
+        voltages (numpy.ndarray): Voltage of every point, NaN where it was not read.
+    |
+    """
+
+    def __init__(self, points=POINTS):
+        """Inits an empty Trend.
+
+        Args:
+            points (int, optional): Points kept. Defaults to POINTS.
+        |
+        """
+        self.points = points
+        self.clear()
+
+    def clear(self):
+        """Drops every point.
+
+        |
+        """
+        self.times = np.empty(0)
+        self.voltages = np.empty(0, dtype=DTYPE)
+
+    def apply(self, reply):
+        """Adds the points of a get_recent reply.
+
+        Args:
+            reply (dict): The reply for the channel, None if it has no test.
+
+        Returns:
+            bool: Whether the points changed.
+        |
+        """
+        had_points = len(self.times) > 0
+        if reply is None or reply["reset"]:
+            self.clear()
+        if reply is None or not reply["points"]:
+            return had_points and not len(self.times)
+        rows = decode(reply["data"])
+        self.times = np.concatenate([self.times, reply["t0"] + rows[:, 0]])[-self.points:]
+        self.voltages = np.concatenate([self.voltages, rows[:, 2]])[-self.points:]
+        return True
+
+
+def paint_sparkline(painter, rect, trend, color=None):
+    """Draws the voltage of a trend over time, scaled to fill a rectangle.
+
+    Args:
+        color (QColor, optional): Defaults to None for gui.blue.
+        painter (QPainter): Paints the widget or cell.
+        rect (QRect): Where to draw.
+        trend (Trend): The points drawn.
+    |
+    """
+    read = ~np.isnan(trend.voltages)
+    times = trend.times[read]
+    voltages = trend.voltages[read]
+    if len(times) < 2:
+        return
+    span = times[-1] - times[0] or 1.
+    low, high = float(voltages.min()), float(voltages.max())
+    height = high - low or 1.
+    rect = rect.adjusted(2, 2, -2, -2)
+    xs = rect.left() + (times - times[0]) / span * rect.width()
+    ys = rect.bottom() - (voltages - low) / height * rect.height()
+
+    painter.save()
+    painter.setRenderHint(QPainter.Antialiasing)
+    painter.setPen(QPen(color or QColor(gui.blue), 1.2))
+    painter.drawPolyline(QPolygonF([QPointF(x, y) for x, y in zip(xs, ys)]))
+    painter.restore()
+
+
+class Sparkline(QWidget):
+    """Small plot of the voltage of a channel.
+
+    Attributes:
+        trend (Trend): The points drawn.
+    |
+    """
+
+    def __init__(self, points=POINTS, parent=None):
+        """Inits Sparkline with an empty trend.
+
+        Args:
+            parent (QWidget, optional): Defaults to None.
+            points (int, optional): Points kept. Defaults to POINTS.
+        |
+        """
+        super(Sparkline, self).__init__(parent)
+        self.trend = Trend(points)
+        self.setToolTip("Voltage of the latest measurements")
+
+    def apply(self, reply):
+        """Adds the points of a get_recent reply, redrawing if they changed.
+
+        |
+        """
+        if self.trend.apply(reply):
+            self.update()
+
+    def sizeHint(self):
+        """Returns a size fitting under the status line.
+
+        |
+        """
+        return QSize(240, 30)
+
+    def paintEvent(self, event):
+        """Draws the trend.
+
+        |
+        """
+        painter = QPainter(self)
+        paint_sparkline(painter, self.rect(), self.trend)
@@ -0,0 +1,224 @@
+"""Follows the channel status published by the server, applying only what changed.
+
+The server publishes the status fields that changed on its PUB socket, see
+cyckei.server.feed. A StatusFollower subscribes to them and keeps the fields of every
+channel. When it misses a message, the server restarted or it hears nothing for
+poll_interval seconds, it asks the server with info_changes for what changed since the
+last version it applied. Servers without info_changes are polled with info_all_channels.
+While messages keep coming it still polls every LATENCY_INTERVAL seconds, to time a round
+trip for the latency shown for the server.
+
+|
+"""
+import json
+import logging
+import time
+
+import zmq
+
+from cyckei.functions import func
+from .socket import Socket
+
+logger = logging.getLogger('cyckei_client')
+
+TOPIC = b"status"
+FIELDS = ("path", "cellid", "comment", "protocol_name", "status", "state", "current",
+          "voltage", "cycle")
+RECEIVE_TIMEOUT = 0.25  # Seconds waited for a message before checking the follower is stopped
+LATENCY_INTERVAL = 5.0  # Seconds between polls timing the server's replies
+
+
+def status_text(info):
+    """Returns the status line of a channel.
+
+    Args:
+        info (dict): The status fields of the channel.
+
+    Returns:
+        str: e.g. "started - rest | C: 0.0, V: 3.71".
+    |
+    """
+    return (func.not_none(info.get("status"))
+            + " - " + func.not_none(info.get("state"))
+            + " | C: " + func.not_none(info.get("current"))
+            + ", V: " + func.not_none(info.get("voltage")))
+
+
+def is_idle(info):
+    """Returns whether a channel can be given a new test.
+
+    |
+    """
+    return info.get("status") in ("available", "completed")
+
+
+class StatusFollower(object):
+    """Keeps the status fields of the server's channels up to date.
+
+    Attributes:
+        channels (dict): The status fields by channel.
+        epoch (str): The run of the server the version is from, None before the first sync.
+        latency (float): Seconds the last poll took, None if the server did not reply.
+        measured (float): Epoch time the last poll was sent at, None before the first.
+        polls (int): Number of requests sent to the server.
+        poll_interval (float): Seconds without a message after which the server is polled.
+        replied (float): Epoch time of the last message or reply from the server, None
+            before the first.
+        version (int): The last version applied, None without one.
+    |
+    """
+
+    def __init__(self, config, poll_interval=None, socket=None):
+        """Inits StatusFollower with the server's addresses.
+
+        Args:
+            config (dict): Holds Cyckei launch settings.
+            poll_interval (float, optional): Seconds without a message after which the
+                server is polled. Defaults to None for the "update-interval" setting.
+            socket (Socket, optional): Sends the requests. Defaults to None for a new one.
+        |
+        """
+        zmq_config = config["zmq"]
+        self.address = "{}:{}".format(zmq_config["client-address"],
+                                      func.publish_port(zmq_config))
+        if poll_interval is None:
+            poll_interval = float(config["behavior"]["update-interval"])
+        self.poll_interval = poll_interval
+        self.socket = Socket(config) if socket is None else socket
+        self.channels = {}
+        self.epoch = None
+        self.version = None
+        self.polls = 0
+        self.latency = None
+        self.measured = None
+        self.replied = None
+        self._versioned = True
+
+    def apply(self, message):
+        """Applies a message published by the server.
+
+        Args:
+            message (dict): See cyckei.server.feed.
+
+        Returns:
+            dict: The fields of the channels it changed by channel, None if a message was
+                missed and the server must be polled.
+        |
+        """
+        if message["epoch"] != self.epoch or self.version is None:
+            return None
+        if message["version"] <= self.version:
+            # Already applied by a poll
+            return {}
+        if message["previous"] != self.version:
+            return None
+        self.version = message["version"]
+        return self._merge(message["channels"], False)
+
+    def poll(self):
+        """Asks the server what changed since the last version applied.
+
+        Returns:
+            dict: The fields of the channels that changed by channel, None without a reply.
+        |
+        """
+        self.polls += 1
+        start = self.measured = time.time()
+        if self._versioned:
+            response = self.socket.info_changes(self.version, self.epoch)
+            if type(response) is dict and "version" in response:
+                self._replied(start)
+                self.epoch = response["epoch"]
+                self.version = response["version"]
+                return self._merge(response["channels"], response["full"])
+            if response != "Unknown function":
+                logger.error("Could not get status changes from server: {}".format(
+                    response))
+                self.latency = None
+                return None
+            # An older server, compare every channel instead
+            self._versioned = False
+        start = time.time()
+        response = self.socket.info_all_channels()
+        if type(response) is not dict:
+            logger.error("Could not get status from server: {}".format(response))
+            self.latency = None
+            return None
+        self._replied(start)
+        return self._merge({channel: {field: info.get(field) for field in FIELDS}
+                            for channel, info in response.items()}, True)
+
+    def follow(self, emit, running, context=None):
+        """Emits the changes until running() returns False.
+
+        Every poll_interval every channel is emitted again, so widgets changed by the
+        client, e.g. locked for a control the server refused, go back to the server's
+        status even if it did not change. Every LATENCY_INTERVAL the server is polled, even
+        if messages keep coming, so its latency stays current.
+
+        Args:
+            context (zmq.Context, optional): Defaults to None for the process-wide one.
+            emit (function): Called with the changed channels whenever some change, and
+                with None when the server does not reply.
+            running (function): Returns False to stop.
+        |
+        """
+        context = context or zmq.Context.instance()
+        subscriber = context.socket(zmq.SUB)
+        subscriber.setsockopt(zmq.LINGER, 0)
+        subscriber.setsockopt(zmq.SUBSCRIBE, TOPIC)
+        subscriber.connect(self.address)
+        try:
+            self._emit(emit, self.poll())
+            last = refreshed = time.time()
+            while running():
+                changes = {}
+                if subscriber.poll(int(RECEIVE_TIMEOUT * 1000), zmq.POLLIN):
+                    topic, body = subscriber.recv_multipart()
+                    last = self.replied = time.time()
+                    changes = self.apply(json.loads(body))
+                    if changes is None:
+                        changes = self.poll()
+                elif time.time() - last >= self.poll_interval:
+                    last = time.time()
+                    changes = self.poll()
+                if changes is not None and time.time() - self.measured >= LATENCY_INTERVAL:
+                    # Messages keep coming, time a round trip for the latency
+                    polled = self.poll()
+                    changes = None if polled is None else dict(changes, **polled)
+                if changes is not None and time.time() - refreshed >= self.poll_interval:
+                    refreshed = time.time()
+                    changes = {channel: dict(fields)
+                               for channel, fields in self.channels.items()}
+                self._emit(emit, changes)
+        finally:
+            subscriber.close()
+
+    def _replied(self, start):
+        self.replied = time.time()
+        self.latency = self.replied - start
+
+    def _emit(self, emit, changes):
+        if changes is None:
+            # Start over once the server answers again
+            self.epoch = None
+            self.version = None
+            emit(None)
+        elif changes:
+            emit(changes)
+
+    def _merge(self, channels, full):
+        """Updates the fields of the channels, returning those of the channels that changed.
+
+        |
+        """
+        changed = {}
+        for channel, fields in channels.items():
+            current = self.channels.setdefault(str(channel), {})
+            if full:
+                fields = {field: value for field, value in fields.items()
+                          if current.get(field) != value or field not in current}
+            if fields:
+                current.update(fields)
+                changed[str(channel)] = dict(current)
+        return changed
@@ -3,22 +3,26 @@ import logging
 import os
 import tempfile
 import time
-import sys
 from datetime import date, datetime
 
 from PySide2.QtCore import QRunnable, Slot, Signal, QObject
 
 from .socket import Socket
-from cyckei.functions import func
+from .status import StatusFollower
+from cyckei.functions import func, validator
 
 logger = logging.getLogger('cyckei_client')
 
+# Protocols a server loaded, by (server address, digest), so it is only asked once per protocol
+SERVER_TESTED = validator.ResultCache()
+
 
 def prepare_json(channel, function, protocol, temp):
     """Populates a new package with channel data and returns it
 
     Args:
-        channel (ChannelWidget): Channel object that stores info about itself.
+        channel (ChannelWidget): Channel object that stores info about itself, or a
+            ChannelRecord of the table view.
         function (str): Used by the server when determining what action to take.
         protocol (str): A protocol for the server to execute. 
         temp (bool): True records in a temporary file, false records to the proper record directory.
@@ -45,11 +49,16 @@ def prepare_json(channel, function, protocol, temp):
 
         os.makedirs(dir, exist_ok=True)
 
-    if channel.settings[2].text() == "":
-        channel.attributes["path"] = datetime.now().strftime(
-            '%m-%d_%H-%M-%S')
-    packet["kwargs"]["meta"]["path"] \
-        = os.path.join(dir, channel.attributes["path"])
+    # The path follows the log file line edit, or table cell, as it is edited
+    path = channel.attributes["path"]
+    if not path:
+        # Named by the channel too, channels started in the same second get their own file
+        path = "{}_ch{}".format(datetime.now().strftime('%m-%d_%H-%M-%S'),
+                                channel.attributes["channel"])
+        if getattr(channel, "server", ""):
+            path = "{}_{}".format(path, "".join(
+                character if character.isalnum() else "-" for character in channel.server))
+    packet["kwargs"]["meta"]["path"] = os.path.join(dir, path)
 
     # Force the file extension to be .pyb by simply adding it (not replacing)
     if not packet["kwargs"]["meta"]["path"].lower().endswith('.pyb'):
@@ -96,117 +105,209 @@ class Ping(QRunnable):
         response = Socket(self.config).ping()
         self.signals.alert.emit(response)
 
+class Connect(QRunnable):
+    """Object used to ask a server that did not reply yet for its channels and plugins.
+
+    Attributes:
+        server (federation.Server): The server asked.
+        signals (Signals): Used for gui signals. Emits the server once it replied.
+        timeout (float): Seconds to wait for each reply.
+    |
+    """
+
+    def __init__(self, server, timeout):
+        """Inits Connect with server, timeout and signals.
+
+        Args:
+            server (federation.Server): The server to ask.
+            timeout (float): Seconds to wait for each reply.
+        |
+        """
+        super(Connect, self).__init__()
+        self.server = server
+        self.timeout = timeout
+        self.signals = Signals()
+
+    @Slot()
+    def run(self):
+        """Asks the server, emits it on signals.info if it replied and on signals.alert if not.
+
+        |
+        """
+        if self.server.load(self.timeout):
+            self.signals.info.emit(self.server)
+        else:
+            self.signals.alert.emit(self.server)
+
 class UpdateStatus(QRunnable):
-    """Updates the status below the controls, shown after contacting server
-    
+    """Follows the status of the channels published by the server until stopped.
+
+    The changed channels are emitted on signals.info, so the widgets are updated on the
+    gui thread, and None when the server does not reply.
+
     Attributes:
-        channels (list): A list of all of the ChannelWidget objects to be updated.
         config (dict): Holds Cyckei launch settings.
+        follower (StatusFollower): Keeps the status of the channels.
+        running (bool): Cleared by stop().
+        signals (Signals): Used for gui signals. Emits the changed channels.
     |
     """
 
-    def __init__(self, channels, config):
-        """Inits UpdateStatus with channles and config
+    def __init__(self, config):
+        """Inits UpdateStatus with config, follower and signals.
 
         Args:
-            channels (list): A list of all of the ChannelWidget objects to be updated.
             config (dict): Holds Cyckei launch settings.
         |
         """
         super(UpdateStatus, self).__init__()
-        self.channels = channels
         self.config = config
+        self.signals = Signals()
+        self.follower = StatusFollower(config)
+        self.running = True
 
     @Slot()
     def run(self):
-        """Goes through the channels list and sets the gui status text depending on server response from info_all query.
-        
+        """Emits the changed channels until stopped.
+
         |
         """
-        info_all = Socket(self.config).info_all_channels()
-        for channel in self.channels:
-            if type(info_all) is not dict:
-                channel.status.setText("No Response")
-                pass
-            try:
-                info = info_all[str(channel.attributes["channel"])]
-                status = (func.not_none(info["status"])
-                          + " - " + func.not_none(info["state"])
-                          + " | C: " + func.not_none(info["current"])
-                          + ", V: " + func.not_none(info["voltage"]))
-                # This section handles enabling client gui when cell is done running
-                if info["status"] == "available" or info["status"] == "completed":
-                    channel.unlock_settings()
-                else:
-                    channel.lock_settings()
-
-            except (TypeError, KeyError) as error:
-                logger.error(f"Could not get status from server: {error}")
-                logger.error(
-                    f"Contents of info_all for diagnosis: {info_all}")
-                status = "Could not get status!"
-
-            logger.debug("Updating channel {} with status {}".format(
-                         channel.attributes["channel"], status))
-            try:
-                channel.status.setText(status)
-            except TypeError as error:
-                logger.error(f"Set status to '{status}', failed with: {error}")
-                channel.status.setText("No Status Update, Check Log")
-
-            except RuntimeError as error:
-                print(f"Looks like QTimer ran after Cyckei closed: {error}")
-                sys.exit()
+        try:
+            self.follower.follow(self.signals.info.emit, lambda: self.running)
+        except RuntimeError as error:
+            logger.warning("Status updates stopped: {}".format(error))
+
+    def stop(self):
+        """Stops following the status.
+
+        |
+        """
+        self.running = False
+
+
+class FollowRecent(QRunnable):
+    """Follows the latest measurements of the channels until stopped, for their sparklines.
+
+    Every update interval one request asks for the measurements since the last reply of
+    every channel, at most points per channel. The replies by channel are emitted on
+    signals.info.
+
+    Attributes:
+        config (dict): Holds Cyckei launch settings.
+        cursors (dict): Where to continue from by channel, see Socket.get_recent().
+        points (int): Most measurements asked for per channel.
+        running (bool): Cleared by stop().
+        signals (Signals): Used for gui signals. Emits the replies.
+    |
+    """
+
+    def __init__(self, config, channels, points):
+        """Inits FollowRecent with config, cursors and signals.
+
+        Args:
+            channels (list): The channel numbers.
+            config (dict): Holds Cyckei launch settings.
+            points (int): Most measurements asked for per channel.
+        |
+        """
+        super(FollowRecent, self).__init__()
+        self.config = config
+        self.cursors = {str(channel): None for channel in channels}
+        self.points = points
+        self.signals = Signals()
+        self.running = True
+
+    @Slot()
+    def run(self):
+        """Emits the latest measurements every update interval until stopped.
+
+        |
+        """
+        socket = Socket(self.config)
+        interval = float(self.config["behavior"]["update-interval"])
+        while self.running:
+            replies = socket.get_recent(self.cursors, self.points)
+            if replies == "Unknown function":
+                logger.info("Server does not keep recent data, no sparklines.")
+                return
+            if type(replies) is dict:
+                for channel, reply in replies.items():
+                    self.cursors[channel] = None if reply is None else {
+                        "since": reply["next"], "epoch": reply["epoch"]}
+                try:
+                    self.signals.info.emit(replies)
+                except RuntimeError as error:
+                    logger.warning("Sparkline updates stopped: {}".format(error))
+                    return
+            waited = 0.
+            while self.running and waited < interval:
+                time.sleep(0.25)
+                waited += 0.25
+
+    def stop(self):
+        """Stops following the measurements.
+
+        |
+        """
+        self.running = False
+
 
 class Read(QRunnable):
     """Object used in reading cell information from the server.
-    
+
+    The server takes one reading of each idle channel with its output off, so no test is
+    started and the channel stays available.
+
     Attributes:
-        channel (ChannelWidget): Channel object that stores info about itself.
+        channels (list): The ChannelWidget or ChannelRecord objects to read.
         config (dict): Holds Cyckei launch settings.
+        idle (bool): Whether to read every idle channel instead, showing the reading of
+            those in channels.
         signals (Signals): Used for gui signals. Shows the server's response.
     |
     """
 
-    def __init__(self, config, channel):
-        """Inits Read with channel, config, and signals.
+    def __init__(self, config, channels, idle=False):
+        """Inits Read with channels, config, and signals.
 
         Args:
-            channel (ChannelWidget): Channel object that stores info about itself.
+            channels (list): The ChannelWidget or ChannelRecord objects to read.
             config (dict): Holds Cyckei launch settings.
+            idle (bool, optional): Whether to read every idle channel instead. Defaults
+                to False.
         |
         """
         super(Read, self).__init__()
-        self.channel = channel
+        self.channels = channels
         self.config = config
+        self.idle = idle
         self.signals = Signals()
 
     @Slot()
     def run(self):
-        """Tell channel to Rest() long enough to get voltage reading on cell.
-        
+        """Reads the voltage of the cells in one request to the server.
+
         |
         """
-        # immediately lock settings so they can't be changed
-        self.channel.lock_settings()
-        status = Socket(self.config).info_channel(
-            self.channel.attributes["channel"])["response"]
-        if status["status"] == "available":
-            script = """Rest(ends=(("time", ">", "::5"),))"""
-            Control(self.config, self.channel, "start", script=script,
-                    temp=True).run()
-            time.sleep(3)
-            info_channel = Socket(self.config).info_channel(
-                self.channel.attributes["channel"])["response"]
-            try:
-                status = ("Voltage of cell: "
-                          + func.not_none(info_channel["voltage"]))
-            except Exception:
-                status = "Could not read cell voltage."
-        else:
-            status = "Cannot read voltage during cycle"
-
-        self.signals.status.emit(status, self.channel)
+        by_number = {str(channel.attributes["channel"]): channel
+                     for channel in self.channels}
+        numbers = None if self.idle else [channel.attributes["channel"]
+                                          for channel in self.channels]
+        results = Socket(self.config).measure(numbers)
+
+        if type(results) is not list:
+            for channel in self.channels:
+                self.signals.status.emit("Could not read cell voltage.", channel)
+            return
+        for result in results:
+            channel = by_number.get(str(result["channel"]))
+            if channel is None:
+                continue
+            if result["voltage"] is None:
+                status = result["response"]
+            else:
+                status = "Voltage of cell: " + func.not_none(result["voltage"])
+            self.signals.status.emit(status, channel)
 
 class Control(QRunnable):
     """Object for storing a script and sendng it to the server.
@@ -270,6 +371,78 @@ class Control(QRunnable):
         response = Socket(self.config).send(packet)["response"]
         self.signals.status.emit(response, self.channel)
 
+class ControlMany(QRunnable):
+    """Object for sending a command for many channels to the server in one request.
+
+    Scripts are checked once per distinct script, and the server tests each distinct
+    protocol once, instead of a Control, Check and server test per channel.
+
+    Attributes:
+        channels (list): The ChannelWidget or ChannelRecord objects to control.
+        command (str): "start", "stop", "pause" or "resume".
+        config (dict): Holds Cyckei launch settings.
+        signals (Signals): Used for gui signals. Shows the server's response per channel.
+    |
+    """
+
+    def __init__(self, config, channels, command):
+        """Inits ControlMany with channels, command, config and signals.
+
+        Args:
+            channels (list): The ChannelWidget or ChannelRecord objects to control.
+            command (str): "start", "stop", "pause" or "resume".
+            config (dict): Holds Cyckei launch settings.
+        |
+        """
+        super(ControlMany, self).__init__()
+        self.channels = channels
+        self.command = command
+        self.config = config
+        self.signals = Signals()
+
+    @Slot()
+    def run(self):
+        """Sends the command for every channel and emits the response of each.
+
+        |
+        """
+        for channel in self.channels:
+            channel.lock_settings()
+        by_number = {str(channel.attributes["channel"]): channel
+                     for channel in self.channels}
+
+        if self.command == "start":
+            checked = {}
+            entries = []
+            for channel in self.channels:
+                script = channel.attributes["script_content"]
+                if script is None:
+                    self.signals.status.emit("No script selected.", channel)
+                    continue
+                if script not in checked:
+                    checked[script] = Check(self.config, script).legal_test(script)
+                script_ok, msg = checked[script]
+                if script_ok is False:
+                    self.signals.status.emit("Script Failed", channel)
+                    logger.warning(msg)
+                    continue
+                entries.append(prepare_json(channel, "start", script, False)["kwargs"])
+            if not entries:
+                return
+            results = Socket(self.config).start_many(entries)
+        else:
+            results = Socket(self.config).control_many(
+                self.command, [channel.attributes["channel"] for channel in self.channels])
+
+        if type(results) is not list:
+            for channel in self.channels:
+                self.signals.status.emit(results, channel)
+            return
+        for result in results:
+            self.signals.status.emit(result["response"],
+                                     by_number[str(result["channel"])])
+
+
 class Check(QRunnable):
     """Object used for testing whether a certain protocol can be run.
 
@@ -311,7 +484,9 @@ class Check(QRunnable):
         return passed, msg
 
     def legal_test(self, protocol):
-        """Checks if script only contains valid commands.
+        """Checks the script is made of known steps with valid arguments, without the server.
+
+        See cyckei.functions.validator, results are kept by the protocol's hash.
 
         Args:
             protocol (str): The protocol being checked for legality.
@@ -321,35 +496,13 @@ class Check(QRunnable):
             str: The message that goes with the legality test results.
         |
         """
-        conditions = ["#",
-                      "for",
-                      "AdvanceCycle()",
-                      "CCCharge(",
-                      "CCDischarge(",
-                      "CVCharge(",
-                      "CVDischarge(",
-                      "Rest(",
-                      "Sleep("]
-        protocol = protocol.replace(" ", "")
-        protocol = protocol.replace("\t", "")
-        if protocol == "":
-            return False, "An empty file can not be run."
-
-        for line in protocol.splitlines():
-
-            valid = False
-            for condition in conditions:
-                if line.startswith(condition) or not line:
-                    valid = True
-                    break
-            if not valid:
-                return False, "Illegal command: \"" + line + "\"."
-
-        return True, "Passed"
+        return validator.check(protocol)
 
     def run_test(self, protocol):
         """Checks if server can load script successfully.
 
+        The server is only asked once per protocol it loaded.
+
         Args:
             protocol (str): The protocol being checked for server loading.
 
@@ -358,9 +511,14 @@ class Check(QRunnable):
             str: The message that goes with the load test results.
         |
         """
+        socket = Socket(self.config)
+        key = (socket.address, validator.digest(protocol))
+        if SERVER_TESTED.get(key):
+            return True, "Passed"
         packet = self.prepare_json(protocol)
-        response = Socket(self.config).send(packet)["response"]
+        response = socket.send(packet)["response"]
         if response == "Passed":
+            SERVER_TESTED.put(key, True)
             return True, "Passed"
         return False, \
             "Server failed to run script. Error: \"{}\".".format(response)
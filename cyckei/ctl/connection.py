@@ -0,0 +1,212 @@
+"""Qt-free asyncio client of Cyckei servers, for scripts, automation and load testing.
+
+A Connection sends requests to one server over a zmq.asyncio DEALER socket without
+waiting for the replies to the previous ones, so many requests are in flight at once. The
+server's REP socket answers them one at a time in order, so replies are matched to
+requests first in, first out. A request without a reply in time is failed together with
+those sent after it, and the socket replaced, as the "lazy pirate" pattern of the GUI
+client does. Read-only requests, see cyckei.client.socket.IDEMPOTENT, are sent again.
+
+A Fleet sends the same request to several servers at once.
+
+|
+"""
+import asyncio
+import base64
+import collections
+import json
+import logging
+import math
+import struct
+
+import zmq
+import zmq.asyncio
+
+from cyckei.client.socket import IDEMPOTENT, RETRIES
+
+logger = logging.getLogger('cyckei_client')
+
+TIMED_OUT = "Request Timed Out"
+
+
+def decode_samples(reply):
+    """Unpacks the samples of a get_recent reply, without numpy.
+
+    Args:
+        reply (dict): The reply for a channel, see cyckei.server.recent.
+
+    Returns:
+        list: A (time, current, voltage) tuple per sample, None for values not read.
+    |
+    """
+    samples = []
+    for offset, current, voltage in struct.iter_unpack(
+            "<3f", base64.b64decode(reply["data"])):
+        samples.append((reply["t0"] + offset,
+                        None if math.isnan(current) else current,
+                        None if math.isnan(voltage) else voltage))
+    return samples
+
+
+class Connection(object):
+    """Pipelined requests to a server.
+
+    Attributes:
+        address (str): The server's zmq address, e.g. "tcp://localhost:5556".
+        context (zmq.asyncio.Context): Makes the sockets.
+        retries (int): Times a read-only request is sent again after a timeout.
+        sent (int): Number of requests sent, retries included.
+        timeout (float): Seconds a request waits for its reply, retries included.
+    |
+    """
+
+    def __init__(self, address, timeout=30., retries=RETRIES, context=None):
+        """Inits Connection, the socket is made by the first request.
+
+        Args:
+            address (str): The server's zmq address.
+            context (zmq.asyncio.Context, optional): Defaults to None for the shared one.
+            retries (int, optional): Defaults to RETRIES.
+            timeout (float, optional): Seconds a request waits for its reply. Defaults
+                to 30.
+        |
+        """
+        self.address = address
+        self.timeout = timeout
+        self.retries = retries
+        self.context = context or zmq.asyncio.Context.instance()
+        self.sent = 0
+        self._socket = None
+        self._reader = None
+        self._pending = collections.deque()
+
+    async def send(self, packet):
+        """Sends a packet and waits for the reply, while other requests may be in flight.
+
+        Args:
+            packet (dict): The request, e.g. {"function": "ping"}.
+
+        Returns:
+            dict: The reply, with the "response", or TIMED_OUT as the "response".
+        |
+        """
+        function = packet["function"]
+        attempts = 1
+        if function.startswith(IDEMPOTENT):
+            attempts += self.retries
+        timeout = self.timeout / attempts
+
+        for attempt in range(attempts):
+            socket = self._connect()
+            future = asyncio.get_running_loop().create_future()
+            self._pending.append(future)
+            self.sent += 1
+            await socket.send_multipart([b"", json.dumps(packet).encode()])
+            try:
+                reply = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                logger.warning("No reply to {} from {} (attempt {} of {}).".format(
+                    function, self.address, attempt + 1, attempts))
+                self._reset()
+                continue
+            if reply is not None:
+                return reply
+            # Lost when an earlier request timed out
+        return {"response": TIMED_OUT, "message": ""}
+
+    async def call(self, function, **kwargs):
+        """Sends a request and returns the server's response.
+
+        Args:
+            function (str): The server function, e.g. "info_all_channels".
+            kwargs: Its arguments.
+
+        Returns:
+            Any: The "response" of the reply.
+        |
+        """
+        packet = {"function": function}
+        if kwargs:
+            packet["kwargs"] = kwargs
+        return (await self.send(packet))["response"]
+
+    def close(self):
+        """Closes the socket, failing the requests still in flight.
+
+        |
+        """
+        self._reset()
+
+    def _connect(self):
+        if self._socket is None:
+            self._socket = self.context.socket(zmq.DEALER)
+            self._socket.setsockopt(zmq.LINGER, 0)
+            self._socket.connect(self.address)
+            self._reader = asyncio.ensure_future(self._read(self._socket))
+        return self._socket
+
+    async def _read(self, socket):
+        """Hands every reply to the oldest request waiting.
+
+        |
+        """
+        while True:
+            frames = await socket.recv_multipart()
+            reply = json.loads(frames[-1])
+            if self._pending:
+                future = self._pending.popleft()
+                if not future.done():
+                    future.set_result(reply)
+
+    def _reset(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_result(None)
+
+
+class Fleet(object):
+    """Sends requests to several servers at once.
+
+    Attributes:
+        connections (list): A Connection per server.
+    |
+    """
+
+    def __init__(self, addresses, timeout=30., retries=RETRIES):
+        """Inits a Connection per server.
+
+        Args:
+            addresses (list): The servers' zmq addresses.
+            retries (int, optional): Defaults to RETRIES.
+            timeout (float, optional): Defaults to 30.
+        |
+        """
+        self.connections = [Connection(address, timeout, retries)
+                            for address in addresses]
+
+    async def call(self, function, **kwargs):
+        """Sends a request to every server.
+
+        Returns:
+            dict: The response of every server by address.
+        |
+        """
+        responses = await asyncio.gather(
+            *[connection.call(function, **kwargs) for connection in self.connections])
+        return {connection.address: response
+                for connection, response in zip(self.connections, responses)}
+
+    def close(self):
+        """Closes every connection.
+
+        |
+        """
+        for connection in self.connections:
+            connection.close()
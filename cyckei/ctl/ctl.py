@@ -0,0 +1,278 @@
+"""Headless command line client, run as ``cyckei ctl``.
+
+Drives one or more servers without Qt, printing every result as JSON on stdout, for
+automation and load testing. Every command is sent to every ``--server``, at once, and
+the results are keyed by server address. The exit status is 1 if a server did not reply.
+
+|
+"""
+import argparse
+import asyncio
+import configparser
+import json
+import os.path
+import sys
+import time
+from datetime import datetime
+
+from cyckei.functions import func
+from .connection import Fleet, TIMED_OUT, decode_samples
+
+CONTROLS = ("stop", "pause", "resume")
+
+
+def defaults():
+    """Returns the default server address, timeout and retries, from variables.ini.
+
+    Returns:
+        (str, float, int): As (address, timeout, retries).
+    |
+    """
+    variables = configparser.ConfigParser()
+    variables.read(func.asset_path("variables.ini"))
+    zmq_config = variables["zmq"]
+    address = "{}:{}".format(zmq_config["client-address"], int(zmq_config["port"]))
+    return address, float(zmq_config["timeout"]), int(zmq_config.get("retries", 2))
+
+
+def parse_args(argv=None):
+    """Creates and parses the command line arguments of ``cyckei ctl``.
+
+    Args:
+        argv (list, optional): The arguments after "ctl". Defaults to None for sys.argv.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    |
+    """
+    address, timeout, retries = defaults()
+    parser = argparse.ArgumentParser(
+        prog="cyckei ctl", description="Drive Cyckei servers, printing JSON.")
+    parser.add_argument("--server", action="append", metavar="ADDRESS",
+                        help="Server zmq address, can be repeated. "
+                             "Defaults to {}.".format(address))
+    parser.add_argument("--timeout", type=float, default=timeout,
+                        help="Seconds to wait for a reply.")
+    parser.add_argument("--retries", type=int, default=retries,
+                        help="Times a read-only request is sent again.")
+    parser.add_argument("--indent", type=int, default=None,
+                        help="Indent the JSON output.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("ping", help="Check the servers reply.")
+
+    status = commands.add_parser("status", help="Status of the channels.")
+    status.add_argument("channels", nargs="*", type=int,
+                        help="Channels to show. Defaults to all.")
+
+    start = commands.add_parser("start", help="Start a protocol file on channels.")
+    start.add_argument("protocol", help="The protocol (script) file.")
+    start.add_argument("channels", nargs="+", type=int)
+    start.add_argument("--log", default=None,
+                       help="Log file path, {channel} is replaced by the channel. "
+                            "Defaults to {channel}-<time>.pyb in the current directory.")
+    start.add_argument("--cellid", default="")
+    start.add_argument("--comment", default="")
+    start.add_argument("--format", default=None,
+                       choices=["text", "binary", "npy"], help="Log file format.")
+
+    for command in CONTROLS:
+        control = commands.add_parser(command, help="{} channels.".format(
+            command.capitalize()))
+        control.add_argument("channels", nargs="+", type=int)
+
+    measure = commands.add_parser(
+        "measure", help="Read the current and voltage of idle channels.")
+    measure.add_argument("channels", nargs="*", type=int,
+                         help="Channels to read. Defaults to every idle channel.")
+
+    tail = commands.add_parser("tail", help="Latest measurements of running channels.")
+    tail.add_argument("channels", nargs="+", type=int)
+    tail.add_argument("--points", type=int, default=200,
+                      help="Most measurements per channel and request.")
+    tail.add_argument("--follow", action="store_true",
+                      help="Keep printing new measurements, one JSON line each.")
+    tail.add_argument("--interval", type=float, default=2.,
+                      help="Seconds between requests with --follow.")
+
+    bench = commands.add_parser(
+        "bench", help="Send many requests at once and time the replies.")
+    bench.add_argument("--function", default="ping",
+                       help="Read-only server function to send.")
+    bench.add_argument("--requests", type=int, default=100,
+                       help="Requests per server.")
+
+    args = parser.parse_args(argv)
+    args.server = args.server or [address]
+    return args
+
+
+def start_entries(args, now=None):
+    """Builds the "start_many" entries of the start command.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+        now (datetime, optional): Time of the default log names. Defaults to None for now.
+
+    Returns:
+        list: A dict per channel with its "channel", "meta" and "protocol".
+    |
+    """
+    with open(args.protocol) as file:
+        protocol = file.read()
+    with open(func.asset_path("default_packet.json")) as file:
+        template = json.load(file)["kwargs"]["meta"]
+    stamp = (now or datetime.now()).strftime('%m-%d_%H-%M-%S')
+    log = args.log or "{channel}-" + stamp + ".pyb"
+
+    entries = []
+    for channel in args.channels:
+        meta = dict(template)
+        meta.update(channel=channel, cellid=args.cellid, comment=args.comment,
+                    protocol=protocol, protocol_name=os.path.basename(args.protocol),
+                    path=os.path.abspath(log.format(channel=channel)), plugins={})
+        if args.format is not None:
+            meta["format"] = args.format
+        entries.append({"channel": channel, "meta": meta, "protocol": protocol})
+    return entries
+
+
+async def bench(fleet, function, requests):
+    """Sends requests to every server at once and times their replies.
+
+    Returns:
+        dict: The number of "requests", "errors", "seconds" and "per_second", and the
+            "mean" and "max" latency in seconds, of every server by address.
+    |
+    """
+    async def timed(connection):
+        start = time.perf_counter()
+        reply = await connection.send({"function": function})
+        return time.perf_counter() - start, reply["response"] == TIMED_OUT
+
+    async def run(connection):
+        start = time.perf_counter()
+        results = await asyncio.gather(*[timed(connection) for i in range(requests)])
+        seconds = time.perf_counter() - start
+        latencies = [latency for latency, error in results]
+        return {"requests": requests,
+                "errors": sum(error for latency, error in results),
+                "seconds": seconds,
+                "per_second": requests / seconds if seconds else None,
+                "mean": sum(latencies) / len(latencies) if latencies else None,
+                "max": max(latencies, default=None)}
+
+    results = await asyncio.gather(*[run(connection) for connection in fleet.connections])
+    return {connection.address: result
+            for connection, result in zip(fleet.connections, results)}
+
+
+async def tail(fleet, args, write):
+    """Prints the latest measurements of channels, following them with args.follow.
+
+    Returns:
+        dict: The measurements by channel of every server by address, None with
+            args.follow, as they are printed one JSON line each.
+    |
+    """
+    cursors = {connection.address: {str(channel): None for channel in args.channels}
+               for connection in fleet.connections}
+    while True:
+        replies = await asyncio.gather(*[
+            connection.call("get_recent", channels=cursors[connection.address],
+                            max_points=args.points)
+            for connection in fleet.connections])
+        result = {}
+        for connection, channels in zip(fleet.connections, replies):
+            result[connection.address] = channels
+            if type(channels) is not dict:
+                continue
+            for channel, reply in channels.items():
+                if reply is None:
+                    cursors[connection.address][channel] = None
+                    continue
+                cursors[connection.address][channel] = {"since": reply["next"],
+                                                        "epoch": reply["epoch"]}
+                channels[channel] = [
+                    {"time": sample[0], "current": sample[1], "voltage": sample[2]}
+                    for sample in decode_samples(reply)]
+        if not args.follow:
+            return result
+        for address, channels in result.items():
+            if type(channels) is not dict:
+                write({"server": address, "response": channels})
+                continue
+            for channel, samples in channels.items():
+                for sample in samples or []:
+                    write(dict(sample, server=address, channel=channel))
+        await asyncio.sleep(args.interval)
+
+
+async def run(args, write):
+    """Runs a command.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+        write (function): Prints a JSON document.
+
+    Returns:
+        dict: The result of every server by address, None if already written.
+    |
+    """
+    fleet = Fleet(args.server, args.timeout, args.retries)
+    try:
+        if args.command == "ping":
+            return await fleet.call("ping")
+        if args.command == "status":
+            result = await fleet.call("info_all_channels")
+            if args.channels:
+                wanted = [str(channel) for channel in args.channels]
+                result = {address: ({channel: info for channel, info in channels.items()
+                                     if channel in wanted}
+                                    if type(channels) is dict else channels)
+                          for address, channels in result.items()}
+            return result
+        if args.command == "start":
+            return await fleet.call("start_many", entries=start_entries(args))
+        if args.command in CONTROLS:
+            return await fleet.call("{}_many".format(args.command),
+                                    channels=args.channels)
+        if args.command == "measure":
+            return await fleet.call("measure", channels=args.channels or None)
+        if args.command == "tail":
+            return await tail(fleet, args, write)
+        if args.command == "bench":
+            return await bench(fleet, args.function, args.requests)
+    finally:
+        fleet.close()
+
+
+def main(argv=None):
+    """Entry point of ``cyckei ctl``, prints the result as JSON.
+
+    Args:
+        argv (list, optional): The arguments after "ctl". Defaults to None for sys.argv.
+
+    Returns:
+        int: The exit status, 1 if a server did not reply.
+    |
+    """
+    args = parse_args(argv)
+
+    def write(document):
+        print(json.dumps(document, indent=args.indent), flush=True)
+
+    try:
+        result = asyncio.run(run(args, write))
+    except KeyboardInterrupt:
+        return 0
+    if result is None:
+        return 0
+    write(result)
+    if any(response == TIMED_OUT for response in result.values()):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
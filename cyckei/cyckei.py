@@ -10,9 +10,12 @@ import logging
 from logging.handlers import RotatingFileHandler
 import json
 import configparser
+import time
 from datetime import datetime
 
-from cyckei.functions import func
+from cyckei.functions import func, startup
+
+STARTED = time.perf_counter()  # When the entry point was imported, for --profile-startup
 
 server_logger = logging.getLogger('cyckei_server')
 client_logger = logging.getLogger('cyckei_client')
@@ -24,14 +27,23 @@ def main(args=None):
     Checks for and, if necessary, creates file structure at given directory.
     Compiles configuration from config and variable files.
     Starts logging to both console and file based on argument input.
-    Launches requested cyckei component (server, client, or explorer).
+    Launches requested cyckei component (server, client, or explorer), importing only
+    the modules it needs. With --profile-startup, reports where its startup time went.
+    "cyckei ctl" runs the headless command line client instead, see cyckei.ctl.ctl.
     
     |
     """
+    if args is None and sys.argv[1:2] == ["ctl"]:
+        # Headless client, without the file structure, logging or Qt
+        from cyckei.ctl import ctl
+        sys.exit(ctl.main(sys.argv[2:]))
+
     try:
         if args is None:
             args = parse_args()
             args.dir = os.path.join(os.path.expanduser("~"), "Cyckei")
+        if getattr(args, "profile_startup", False):
+            startup.start(args.launch, STARTED)
         if args.launch == "client":
             logger = client_logger
         else:
@@ -40,6 +52,7 @@ def main(args=None):
         config = make_config(args, logger)
         start_logging(config, logger)
         print("Done!\n")
+        startup.mark("setup")
 
     except Exception as error:
         print("error occured before logging began")
@@ -52,13 +65,17 @@ def main(args=None):
 
     if args.launch == "server":
         from cyckei.server import server
+        startup.mark("import server")
         plugins, plugin_names = load_plugins(config)
+        startup.mark("load plugins")
         server.main(config, plugins, plugin_names)
     elif args.launch == "client":
         from cyckei.client import client
+        startup.mark("import client")
         client.main(config)
     elif args.launch == "explorer":
         from cyckei.explorer import explorer
+        startup.mark("import explorer")
         explorer.main(config)
 
 
@@ -72,7 +89,8 @@ def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('launch', metavar="{server | client | explorer}",
                         choices=['server', 'client', 'explorer'],
-                        type=str, help='Select which component to launch.')
+                        type=str, help='Select which component to launch, '
+                             'or "ctl" for the command line client.')
     parser.add_argument('-v', action="store_true",
                         help='Toggle verbose console output.')
     parser.add_argument('-x', action="store_true",
@@ -85,6 +103,10 @@ def parse_args():
     parser.add_argument('--log_level', metavar="[log_level]",
                         default=20, type=int,
                         help='Set log file logging level.')
+    parser.add_argument('--resume', action="store_true",
+                        help='Continue the tests running when the server stopped.')
+    parser.add_argument('--profile-startup', action="store_true",
+                        help='Report the import and startup time by module and phase.')
 
     return parser.parse_args()
 
@@ -157,6 +179,7 @@ def make_config(args, logger):
     config["arguments"]["component"] = args.launch
     config["arguments"]["verbose"] = args.v
     config["arguments"]["log_level"] = args.log_level
+    config["arguments"]["resume"] = getattr(args, "resume", False)
 
     return config
 
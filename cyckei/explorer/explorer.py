@@ -3,12 +3,11 @@
 import logging
 import sys
 
-from PySide2.QtWidgets import QApplication, QMainWindow, QTabWidget
-from PySide2.QtCore import QThreadPool
+from PySide2.QtWidgets import QApplication, QMainWindow, QTabWidget, QWidget
+from PySide2.QtCore import QThreadPool, QTimer
 
-from cyckei.functions import gui
+from cyckei.functions import gui, startup
 from .script_editor import ScriptEditor
-from .log_viewer import LogViewer
 
 logger = logging.getLogger('cyckei')
 
@@ -31,11 +30,14 @@ def main(config):
     logger.debug("Creating QApplication")
     app = QApplication(sys.argv)
     gui.style(app, "icon-explorer.png", gui.teal)
+    startup.mark("create application")
 
     # Create Client
     logger.debug("Creating Window")
     main_window = MainWindow(config)
     main_window.show()
+    # Once the event loop has shown the window
+    QTimer.singleShot(0, lambda: startup.finish("show window"))
 
     return app.exec_()
 
@@ -67,6 +69,31 @@ class MainWindow(QMainWindow):
 
         resource["tabs"] = QTabWidget(self)
         self.setCentralWidget(resource["tabs"])
+        self.resource = resource
 
         resource["tabs"].addTab(ScriptEditor(config, resource), "Scripts")
-        resource["tabs"].addTab(LogViewer(config, resource), "Results")
+        # The log viewer, and matplotlib with it, is loaded when its tab is first opened
+        self.log_viewer = None
+        resource["tabs"].addTab(QWidget(), "Results")
+        resource["tabs"].currentChanged.connect(self.open_tab)
+        startup.mark("build window")
+
+    def open_tab(self, index):
+        """Loads the log viewer the first time the Results tab is opened.
+
+        Args:
+            index (int): Index of the tab opened.
+        |
+        """
+        tabs = self.resource["tabs"]
+        if self.log_viewer is not None or tabs.tabText(index) != "Results":
+            return
+        from .log_viewer import LogViewer
+        self.log_viewer = LogViewer(self.config, self.resource)
+        placeholder = tabs.widget(index)
+        tabs.blockSignals(True)
+        tabs.removeTab(index)
+        tabs.insertTab(index, self.log_viewer, "Results")
+        tabs.setCurrentIndex(index)
+        tabs.blockSignals(False)
+        placeholder.deleteLater()
@@ -6,14 +6,17 @@ import logging
 import json
 
 from PySide2.QtWidgets import QVBoxLayout, QHBoxLayout, \
-    QListWidget, QListWidgetItem, QWidget
+    QListWidget, QListWidgetItem, QWidget, QComboBox
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
 from matplotlib.figure import Figure
 
-from cyckei.functions import gui
+from cyckei.functions import archive, gui, logindex, npystore
 
 logger = logging.getLogger('cyckei')
 
+ALL_CYCLES = "All cycles"
+LAZY_SIZE = 2e6  # Logs larger than this many bytes open on their last cycle
+
 
 class LogViewer(QWidget):
     """Object of log tab"""
@@ -70,9 +73,9 @@ class LogViewer(QWidget):
     def log_clicked(self):
         """Display text of clicked file in text box"""
         try:
-            self.editor.update(self.log_list.currentItem().content)
+            self.editor.load(self.log_list.currentItem())
             self.title_bar.setText(self.log_list.currentItem().path)
-        except json.decoder.JSONDecodeError:
+        except (ValueError, UnicodeDecodeError):
             logger.warning("Log unreadable: "
                            + self.log_list.currentItem().path)
         except AttributeError:
@@ -89,7 +92,8 @@ class LogViewer(QWidget):
             files = []
         for file in files:
             abspath = path.join(self.folder_list.currentItem().path, file)
-            if not path.isdir(abspath):
+            if not path.isdir(abspath) and not file.endswith(
+                    (logindex.SUFFIX, archive.TEMPORARY_SUFFIX)):
                 logs.append(Log(abspath, file))
 
         for log in logs:
@@ -118,6 +122,7 @@ class LogViewer(QWidget):
 class LogDisplay(QWidget):
     def __init__(self):
         super(LogDisplay, self).__init__()
+        self.log = None
         layout = QVBoxLayout(self)
         info = QHBoxLayout()
         layout.addLayout(info)
@@ -130,6 +135,11 @@ class LogDisplay(QWidget):
         for key, value in self.info_elements.items():
             info.addWidget(value)
 
+        self.cycle_selector = QComboBox()
+        self.cycle_selector.setStatusTip("Cycle to display")
+        self.cycle_selector.activated[str].connect(self.select_cycle)
+        info.addWidget(self.cycle_selector)
+
         self.protocol_viewer = gui.text_edit("Protocol", readonly=True)
         layout.addWidget(self.protocol_viewer)
 
@@ -146,6 +156,38 @@ class LogDisplay(QWidget):
         data.setStretch(0, 3)
         data.setStretch(1, 2)
 
+    def load(self, log):
+        """Displays a log, reading only the cycle shown from the file.
+
+        Small logs show all their cycles, larger ones their last cycle.
+        """
+        self.log = log
+        self.show_meta(log.meta)
+
+        self.cycle_selector.clear()
+        self.cycle_selector.addItem(ALL_CYCLES)
+        for cycle, start, end in log.cycles:
+            self.cycle_selector.addItem("Cycle {}".format(cycle))
+        if log.size > LAZY_SIZE and log.cycles:
+            self.cycle_selector.setCurrentIndex(len(log.cycles))
+        self.select_cycle(self.cycle_selector.currentText())
+
+    def select_cycle(self, text):
+        """Displays the data of the selected cycle of the current log"""
+        if self.log is None:
+            return
+        if self.log.stored:
+            index = None
+            if text != ALL_CYCLES and self.log.cycles:
+                index = self.cycle_selector.findText(text) - 1
+            self.show_segments(self.log.segments(index))
+            return
+        if text == ALL_CYCLES or not self.log.cycles:
+            self.show_data(self.log.read_all())
+            return
+        index = self.cycle_selector.findText(text) - 1
+        self.show_data(self.log.read_cycle(index))
+
     def update(self, content):
         # Load data
         attr = ""
@@ -156,12 +198,16 @@ class LogDisplay(QWidget):
             else:
                 data += line + "\n"
 
-        attr = json.loads(attr)
+        self.show_meta(json.loads(attr))
+        self.show_data(data)
 
+    def show_meta(self, attr):
         # Setting info Elements
         for common_key in attr.keys() & self.info_elements.keys():
             self.info_elements[common_key].setText(str(attr[common_key]))
         self.protocol_viewer.setPlainText(attr["protocol"])
+
+    def show_data(self, data):
         self.data_viewer.setPlainText(data.replace(",", "\t"))
 
         # Setup graph
@@ -180,6 +226,13 @@ class LogDisplay(QWidget):
                     pass
         self.graph.plot(points_t, points_v)
 
+    def show_segments(self, segments):
+        """Displays the data of a store, plotting the mapped arrays as they are"""
+        self.data_viewer.setPlainText(
+            npystore.format_segments(segments).replace(",", "\t"))
+        self.graph.plot([array[:, 0] for entry, array in segments],
+                        [array[:, 2] for entry, array in segments])
+
 
 class GraphCanvas(FigureCanvasQTAgg):
     """Graphing Canvas using matplotlib"""
@@ -203,18 +256,66 @@ class GraphCanvas(FigureCanvasQTAgg):
 
 
 class Log(QListWidgetItem):
-    """Object of log, stores title and content of file for quick access"""
+    """Object of log, stores title and path of file and reads it when needed.
+
+    The cycles are found through the log's index (see logindex), so a single cycle
+    can be read without reading the whole file.
+    """
 
     def __init__(self, path, name):
         super(Log, self).__init__()
         self.path = path
         self.name = name
         self.setText(self.name)
+        self._cycles = None
+
+    @property
+    def size(self):
+        return path.getsize(self.path)
+
+    @property
+    def meta(self):
+        return logindex.read_meta(self.path)
+
+    @property
+    def content(self):
+        """The whole log as text, including the meta data"""
         try:
-            with open(self.path) as file:
-                self.content = file.read()
+            return logindex.read_range(self.path, 0)
         except UnicodeDecodeError as error:
-            self.content = "Could not decode: {}".format(error)
+            return "Could not decode: {}".format(error)
+
+    @property
+    def stored(self):
+        """Whether the data rows are in a store next to the log (see npystore)"""
+        return npystore.exists(self.path)
+
+    def segments(self, index=None):
+        """Maps the segments of the store of the log, of one cycle or of all of them"""
+        cycle = None if index is None else self.cycles[index][0]
+        return npystore.segments(self.path, cycle)
+
+    @property
+    def cycles(self):
+        """(cycle, start offset, end offset) of every cycle, from the index"""
+        if self._cycles is None:
+            self._cycles = logindex.cycles(logindex.load(self.path), self.size)
+        return self._cycles
+
+    def read_all(self):
+        """Returns the cycles of the log as text, without the meta data"""
+        if not self.cycles:
+            return "".join(line + "\n" for line in self.content.split("\n")
+                           if line and not line.startswith("#"))
+        return logindex.read_range(self.path, self.cycles[0][1])
+
+    def read_cycle(self, index):
+        """Returns a cycle of the log as text, the index counts from the first cycle"""
+        cycle, start, end = self.cycles[index]
+        if index == len(self.cycles) - 1:
+            # The last cycle may still be growing
+            end = None
+        return logindex.read_range(self.path, start, end)
 
 
 class Folder(QListWidgetItem):
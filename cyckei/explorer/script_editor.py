@@ -13,10 +13,12 @@ from PySide2.QtWidgets import QVBoxLayout, QHBoxLayout, \
 from PySide2 import QtCore
 
 from .workers import Check
-from cyckei.functions import gui
+from cyckei.functions import gui, validator
 
 logger = logging.getLogger('cyckei')
 
+CHECK_DELAY = 300  # Milliseconds after the last edit that the script is checked
+
 class ScriptEditor(QWidget):
     """ UI window for the script tab of Cyckei Explorer """
 
@@ -36,10 +38,18 @@ class ScriptEditor(QWidget):
         # Create edit_rows
         self.editor = gui.text_edit("Edit Script", self.text_modified)
         self.title_bar = gui.label("Select or open file to edit.")
+        self.check_bar = gui.label("", "Result of checking the script as it is edited")
+
+        # Checks the script once typing pauses
+        self.check_timer = QtCore.QTimer(self)
+        self.check_timer.setSingleShot(True)
+        self.check_timer.setInterval(CHECK_DELAY)
+        self.check_timer.timeout.connect(self.show_check)
 
         edit_rows.addWidget(InsertBar(self.editor))
         edit_rows.addWidget(self.title_bar)
         edit_rows.addWidget(self.editor)
+        edit_rows.addWidget(self.check_bar)
 
         controls = QHBoxLayout()
         edit_rows.addLayout(controls)
@@ -85,6 +95,16 @@ class ScriptEditor(QWidget):
         if self.file_list.currentItem() is not None:
             self.file_list.currentItem().content = self.editor.toPlainText()
             self.file_list.currentItem().update_status()
+        self.check_timer.start()
+
+    def show_check(self):
+        """Shows whether the script being edited passes the check, see validator.check"""
+        text = self.editor.toPlainText()
+        if not text.strip():
+            self.check_bar.setText("")
+            return
+        passed, msg = validator.check(text)
+        self.check_bar.setText("Check: " + msg)
 
     def update_editor(self, active_script_index):
         """Updates the UI when which script is active is changed"""
@@ -277,15 +297,15 @@ class InsertBar(QWidget):
                   f", ends=(('time', '>', '{d['end_time']}'), ))"
         elif d['protocol'] == "CCCharge" or d['protocol'] == "CVCharge":
             out = f"{d['protocol']}({d['value']}, " \
-                  f"reports=(('voltage', '{d['report_val']}'), "\
+                  f"reports=(('voltage', {d['report_val']}), "\
                   f"('time', '{d['report_time']}')), "\
-                  f"ends=(('voltage', '>', '{d['end_val']}'), "\
+                  f"ends=(('voltage', '>', {d['end_val']}), "\
                   f"('time', '>', '{d['end_time']}')))"
         elif d['protocol'] == "CCDischarge" or d['protocol'] == "CVDischarge":
             out = f"{d['protocol']}({d['value']}, "\
-                  f"reports=(('voltage', '{d['report_val']}'), "\
+                  f"reports=(('voltage', {d['report_val']}), "\
                   f"('time', '{d['report_time']}')), "\
-                  f"ends=(('voltage', '<', '{d['end_val']}'), "\
+                  f"ends=(('voltage', '<', {d['end_val']}), "\
                   f"('time', '>', '{d['end_time']}')))"
         elif d['protocol'] == "Comment":
             out = f"# {d['value']}"
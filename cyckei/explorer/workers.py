@@ -2,6 +2,7 @@ import logging
 
 from PySide2.QtCore import QRunnable, Slot, Signal, QObject
 
+from cyckei.functions import validator
 
 logger = logging.getLogger('cyckei')
 
@@ -27,30 +28,11 @@ class Check(QRunnable):
         return passed, msg
 
     def legal_test(self, protocol):
-        """Checks if script only contains valid commands"""
-        conditions = ["#",
-                      "for",
-                      "AdvanceCycle()",
-                      "CCCharge(",
-                      "CCDischarge(",
-                      "CVCharge(",
-                      "CVDischarge(",
-                      "Rest(",
-                      "Sleep("]
-
-        for line in protocol.splitlines():
-            line = line.replace(" ", "")
-            line = line.replace("\t", "")
-
-            valid = False
-            for condition in conditions:
-                if line.startswith(condition) or not line:
-                    valid = True
-                    break
-            if not valid:
-                return False, "Illegal command: \"" + line + "\"."
-
-        return True, "Passed 'Legal Arguments' Test"
+        """Checks if script only contains valid steps, see cyckei.functions.validator"""
+        passed, msg = validator.check(protocol)
+        if passed:
+            return True, "Passed 'Legal Arguments' Test"
+        return False, msg
 
 
 class Control(QRunnable):
@@ -0,0 +1,233 @@
+"""Compression of finished logs and transparent reading of compressed ones.
+
+A finished log is archived in place: it is compressed with gzip or lzma to a temporary
+file next to it, the temporary file is decompressed again and checked against the log,
+and only then swapped in under the log's own name with a single atomic rename. The path
+recorded by the server, the sidecar index and anything else pointing at the log stay
+valid, and a crash at any point leaves either the plain or the compressed log, never a
+partial one. Readers tell the two apart by their first bytes, so open_log() is all it
+takes to read either.
+
+Logs can also be archived or restored by hand with::
+
+    python -m cyckei.functions.archive [--method gzip|lzma] [--extract] log [log ...]
+|
+"""
+import argparse
+import gzip
+import hashlib
+import lzma
+import os
+import time
+
+METHODS = {
+    "gzip": gzip.open,
+    "lzma": lzma.open,
+}
+
+MAGIC = {
+    b"\x1f\x8b": "gzip",
+    b"\xfd7zXZ\x00": "lzma",
+}
+
+CHUNK_SIZE = 1 << 20  # Bytes compressed between checks of the CPU limit
+TEMPORARY_SUFFIX = ".archiving"
+
+
+def compression_of(path):
+    """Returns the compression of a file.
+
+    Args:
+        path (str): The file to check.
+
+    Returns:
+        str: "gzip" or "lzma", None if the file is not compressed.
+    |
+    """
+    with open(path, "rb") as file:
+        start = file.read(max(len(magic) for magic in MAGIC))
+    for magic, method in MAGIC.items():
+        if start.startswith(magic):
+            return method
+    return None
+
+
+def open_log(path, mode="rb"):
+    """Opens a log for reading whether it is compressed or not.
+
+    Compressed logs are decompressed while they are read. They can be seeked, but seeking
+    backwards or far ahead means decompressing from the start again.
+
+    Args:
+        mode (str, optional): "rb" or "r". Defaults to "rb".
+        path (str): The log file.
+
+    Returns:
+        file: The file object.
+    |
+    """
+    method = compression_of(path)
+    if method is None:
+        return open(path, mode)
+    if mode == "r":
+        mode = "rt"
+    return METHODS[method](path, mode)
+
+
+class Throttle(object):
+    """Keeps the CPU time of the calling process under a fraction of the elapsed time.
+
+    Attributes:
+        cpu_limit (float): Fraction of one core that may be used, None for no limit.
+        slept (float): Seconds spent sleeping so far.
+    |
+    """
+
+    def __init__(self, cpu_limit=None):
+        """Inits the throttle from now.
+
+        Args:
+            cpu_limit (float, optional): Fraction of one core that may be used, between 0
+                and 1. Defaults to None for no limit.
+
+        Raises:
+            ValueError: If cpu_limit is not in (0, 1].
+        |
+        """
+        if cpu_limit is not None and not 0 < cpu_limit <= 1:
+            raise ValueError(
+                "cpu_limit should be in (0, 1], got {}".format(cpu_limit))
+        self.cpu_limit = cpu_limit
+        self.slept = 0.0
+        self._cpu = time.process_time()
+
+    def pause(self):
+        """Sleeps long enough to bring the CPU use since the last pause down to the limit.
+
+        |
+        """
+        if self.cpu_limit is None or self.cpu_limit >= 1:
+            return
+        cpu = time.process_time()
+        seconds = (cpu - self._cpu) * (1 - self.cpu_limit) / self.cpu_limit
+        self._cpu = cpu
+        if seconds > 0:
+            time.sleep(seconds)
+            self.slept += seconds
+
+
+def _digest(file, throttle):
+    """Returns the size and SHA-256 of what is left to read from a file.
+
+    |
+    """
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+        digest.update(chunk)
+        size += len(chunk)
+        throttle.pause()
+    return size, digest.digest()
+
+
+def archive(path, method="gzip", cpu_limit=None):
+    """Compresses a log in place.
+
+    Args:
+        cpu_limit (float, optional): Fraction of one core that may be used, see Throttle.
+            Defaults to None for no limit.
+        method (str, optional): "gzip" or "lzma". Defaults to "gzip".
+        path (str): The log file.
+
+    Raises:
+        ValueError: If the method is unknown or the compressed file does not decompress to
+            the log, which is then left untouched.
+
+    Returns:
+        tuple: (size of the log, size of the compressed log) in bytes, equal if the log was
+            already compressed.
+    |
+    """
+    if method not in METHODS:
+        raise ValueError("unknown compression {}, must be one of {}".format(
+            method, list(METHODS)))
+    size = os.path.getsize(path)
+    if compression_of(path) is not None:
+        return size, size
+
+    throttle = Throttle(cpu_limit)
+    temporary = path + TEMPORARY_SUFFIX
+    try:
+        digest = hashlib.sha256()
+        with open(path, "rb") as source, METHODS[method](temporary, "wb") as out:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                out.write(chunk)
+                throttle.pause()
+            # The log may have grown since its size was taken, compare all of it
+            size = source.tell()
+        with open(temporary, "rb+") as file:
+            os.fsync(file.fileno())
+
+        with open_log(temporary) as file:
+            if _digest(file, throttle) != (size, digest.digest()):
+                raise ValueError(
+                    "compressed {} does not match the original".format(path))
+        if os.path.getsize(path) != size:
+            raise ValueError("{} changed while it was compressed".format(path))
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    return size, os.path.getsize(path)
+
+
+def extract(path):
+    """Decompresses an archived log in place, the reverse of archive().
+
+    Args:
+        path (str): The log file.
+    |
+    """
+    if compression_of(path) is None:
+        return
+    temporary = path + TEMPORARY_SUFFIX
+    try:
+        with open_log(path) as source, open(temporary, "wb") as out:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def main(args=None):
+    """Archives or extracts logs given on the command line.
+
+    Args:
+        args (list, optional): Command line arguments. Defaults to None for sys.argv.
+    |
+    """
+    parser = argparse.ArgumentParser(
+        description="Compress finished cyckei logs in place, or restore them.")
+    parser.add_argument("logs", nargs="+", help="Log files.")
+    parser.add_argument("--method", choices=list(METHODS), default="gzip",
+                        help="Compression to use. Defaults to gzip.")
+    parser.add_argument("--extract", action="store_true",
+                        help="Decompress instead.")
+    args = parser.parse_args(args)
+
+    for path in args.logs:
+        if args.extract:
+            extract(path)
+            print("Extracted {}".format(path))
+        else:
+            size, compressed = archive(path, args.method)
+            print("Archived {}: {} to {} bytes".format(path, size, compressed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+"""Binary, append-only, chunked columnar format for cycling logs.
+
+An alternative to the text .pyb format holding the same information: the meta data, cycle
+and step headers, and the data rows as float64 without rounding. A file is the magic bytes
+and a format version followed by chunks, each made of a one byte kind, the payload length,
+the payload and a CRC32 of the payload:
+
+    H  the meta data as JSON, always the first chunk
+    C  a cycle header line, JSON
+    S  a step header line, JSON
+    D  data rows stored column after column as little endian float64, preceded by the
+       number of columns (uint16) and of rows (uint32)
+
+Missing current, voltage and capacity values are stored as NaN. Chunks are only ever
+appended, so a file cut short by a crash is readable up to its last complete chunk.
+
+Files can be converted either way, streaming, with::
+
+    python -m cyckei.functions.binlog source destination
+|
+"""
+import argparse
+import json
+import math
+import struct
+import zlib
+
+from cyckei.functions import archive
+
+MAGIC = b"CYKB"
+VERSION = 1
+CHUNK_ROWS = 256  # Data rows collected before a data chunk is written
+CHUNK_SECONDS = 60.0  # Seconds of data collected before a data chunk is written
+
+HEADER = b"H"
+CYCLE = b"C"
+STEP = b"S"
+DATA = b"D"
+
+FILE_FORMATS = ("text", "binary")
+
+_PREAMBLE = struct.Struct("<4sH")
+_CHUNK = struct.Struct("<cI")
+_CRC = struct.Struct("<I")
+_DATA = struct.Struct("<HI")
+
+
+def encode_chunk(kind, payload):
+    """Frames a payload as a chunk.
+
+    Args:
+        kind (bytes): One of HEADER, CYCLE, STEP or DATA.
+        payload (bytes): The content of the chunk.
+
+    Returns:
+        bytes: The chunk ready to be appended to a file.
+    |
+    """
+    return (_CHUNK.pack(kind, len(payload)) + payload
+            + _CRC.pack(zlib.crc32(payload)))
+
+
+def encode_header(meta):
+    """Returns the start of a file: the magic bytes, the version and the meta data.
+
+    Args:
+        meta (dict): The CellRunner meta data.
+
+    Returns:
+        bytes: The start of the file.
+    |
+    """
+    payload = json.dumps(meta, sort_keys=True).encode("utf-8")
+    return _PREAMBLE.pack(MAGIC, VERSION) + encode_chunk(HEADER, payload)
+
+
+def encode_marker(kind, line):
+    """Returns a cycle or step header chunk.
+
+    Args:
+        kind (bytes): CYCLE or STEP.
+        line (str): The JSON header as it is written in a text file, without indentation.
+
+    Returns:
+        bytes: The chunk.
+    |
+    """
+    return encode_chunk(kind, line.strip().encode("utf-8"))
+
+
+def encode_data(rows):
+    """Returns a data chunk holding rows of equal length.
+
+    Args:
+        rows (list): Rows of floats, None is stored as NaN.
+
+    Returns:
+        bytes: The chunk.
+    |
+    """
+    n_rows = len(rows)
+    n_columns = len(rows[0])
+    values = [math.nan if row[i] is None else row[i]
+              for i in range(n_columns) for row in rows]
+    payload = (_DATA.pack(n_columns, n_rows)
+               + struct.pack("<{}d".format(len(values)), *values))
+    return encode_chunk(DATA, payload)
+
+
+def decode_data(payload):
+    """Returns the rows of a data chunk.
+
+    Args:
+        payload (bytes): The payload of a DATA chunk.
+
+    Returns:
+        list: The rows as tuples of floats.
+    |
+    """
+    n_columns, n_rows = _DATA.unpack_from(payload)
+    values = struct.unpack_from("<{}d".format(n_columns * n_rows), payload,
+                                _DATA.size)
+    return list(zip(*[values[i * n_rows:(i + 1) * n_rows]
+                      for i in range(n_columns)]))
+
+
+def decode_array(payload):
+    """Returns the rows of a data chunk as an array.
+
+    Args:
+        payload (bytes): The payload of a DATA chunk.
+
+    Returns:
+        numpy.ndarray: The rows, shaped (rows, columns).
+    |
+    """
+    import numpy as np
+
+    n_columns, n_rows = _DATA.unpack_from(payload)
+    return np.frombuffer(payload, dtype="<f8", count=n_columns * n_rows,
+                         offset=_DATA.size).reshape(n_columns, n_rows).T
+
+
+class ChunkEncoder(object):
+    """Collects the data rows of a file into chunks.
+
+    Rows are kept until CHUNK_ROWS of them or CHUNK_SECONDS worth of them are collected,
+    or until a header or flush() needs them written.
+
+    Attributes:
+        chunk_rows (int): Rows collected before a chunk is returned.
+        chunk_seconds (float): Span of the time column collected before a chunk is returned.
+        rows (list): The rows not written yet.
+    |
+    """
+
+    def __init__(self, chunk_rows=CHUNK_ROWS, chunk_seconds=CHUNK_SECONDS):
+        """Inits the encoder without pending rows.
+
+        Args:
+            chunk_rows (int, optional): Rows collected before a chunk is returned.
+                Defaults to CHUNK_ROWS.
+            chunk_seconds (float, optional): Span of the time column collected before a chunk
+                is returned. Defaults to CHUNK_SECONDS.
+        |
+        """
+        self.chunk_rows = chunk_rows
+        self.chunk_seconds = chunk_seconds
+        self.rows = []
+
+    def add(self, row):
+        """Adds a data row.
+
+        Args:
+            row (list): The time followed by the other columns.
+
+        Returns:
+            bytes: A data chunk if one is due, otherwise an empty bytes.
+        |
+        """
+        if self.rows and len(row) != len(self.rows[0]):
+            chunk = self.flush()
+            self.rows.append(row)
+            return chunk
+        self.rows.append(row)
+        if (len(self.rows) >= self.chunk_rows
+                or row[0] - self.rows[0][0] >= self.chunk_seconds):
+            return self.flush()
+        return b""
+
+    def marker(self, kind, line):
+        """Returns the pending rows followed by a cycle or step header.
+
+        Args:
+            kind (bytes): CYCLE or STEP.
+            line (str): The JSON header.
+
+        Returns:
+            bytes: The chunks to append.
+        |
+        """
+        return self.flush() + encode_marker(kind, line)
+
+    def flush(self):
+        """Returns the pending rows as a chunk.
+
+        Returns:
+            bytes: The data chunk, empty if there are no pending rows.
+        |
+        """
+        if not self.rows:
+            return b""
+        chunk = encode_data(self.rows)
+        self.rows = []
+        return chunk
+
+
+def is_binary(path):
+    """Checks whether a file is in the binary format.
+
+    Args:
+        path (str): The file to check.
+
+    Returns:
+        bool: True if the file starts with the magic bytes.
+    |
+    """
+    with archive.open_log(path) as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def iter_chunks(file, start=None, end=None, offsets=False):
+    """Reads the chunks of a binary file.
+
+    Stops quietly at an incomplete chunk at the end of the file, which is what a file
+    being written or cut short by a crash ends with.
+
+    Args:
+        end (int, optional): Byte offset to stop reading chunks at. Defaults to None for the
+            end of the file.
+        file (file): A binary file object positioned at the start of the file.
+        offsets (bool, optional): Also yield the byte offset of each chunk. Defaults to False.
+        start (int, optional): Byte offset of the first chunk to read, which must be the start
+            of a chunk. Defaults to None for the first chunk.
+
+    Raises:
+        ValueError: If the file is not in this format or a chunk is corrupted.
+
+    Yields:
+        tuple: (kind, payload) for every chunk, the meta data chunk included, or
+            (offset, kind, payload) if offsets is True.
+    |
+    """
+    preamble = file.read(_PREAMBLE.size)
+    if len(preamble) < _PREAMBLE.size:
+        raise ValueError("not a binary cyckei log: file too short")
+    magic, version = _PREAMBLE.unpack(preamble)
+    if magic != MAGIC:
+        raise ValueError("not a binary cyckei log")
+    if version > VERSION:
+        raise ValueError("unsupported binary log version {}".format(version))
+
+    offset = _PREAMBLE.size
+    if start is not None and start > offset:
+        file.seek(start)
+        offset = start
+    while end is None or offset < end:
+        head = file.read(_CHUNK.size)
+        if len(head) < _CHUNK.size:
+            return
+        kind, length = _CHUNK.unpack(head)
+        payload = file.read(length)
+        crc = file.read(_CRC.size)
+        if len(payload) < length or len(crc) < _CRC.size:
+            return
+        if _CRC.unpack(crc)[0] != zlib.crc32(payload):
+            raise ValueError("corrupted {} chunk at byte {}".format(
+                kind.decode("ascii", "replace"), offset))
+        if offsets:
+            yield offset, kind, payload
+        else:
+            yield kind, payload
+        offset += _CHUNK.size + length + _CRC.size
+
+
+def load(path):
+    """Loads a binary file.
+
+    Args:
+        path (str): The file to load.
+
+    Returns:
+        tuple: (meta, data, markers) where meta is the meta data dict, data a numpy array of
+            all the rows and markers a list of (row index, kind, header dict) for the cycle and
+            step headers, the row index being that of the first row after the header.
+    |
+    """
+    import numpy as np
+
+    meta = None
+    blocks = []
+    markers = []
+    rows = 0
+    with archive.open_log(path) as file:
+        for kind, payload in iter_chunks(file):
+            if kind == DATA:
+                block = decode_array(payload)
+                blocks.append(block)
+                rows += len(block)
+            elif kind == HEADER:
+                meta = json.loads(payload)
+            else:
+                markers.append((rows, kind, json.loads(payload)))
+    columns = len(meta["format"]) if meta and meta.get("format") else 4
+    data = np.concatenate(blocks) if blocks else np.empty((0, columns))
+    return meta, data, markers
+
+
+def text_row(row):
+    """Formats a data row the way CellRunner.write_data does.
+
+    Args:
+        row (tuple): The time, current, voltage and capacity followed by plugin values.
+
+    Returns:
+        str: The indented text line, without the newline.
+    |
+    """
+    if math.isnan(row[1]):
+        line = "    {:0.8g},None,None,None".format(row[0])
+    else:
+        line = "    " + ",".join(["{:0.8g}"] * 4).format(*row[:4])
+    for value in row[4:]:
+        line += ",{:0.8g}".format(value)
+    return line
+
+
+def text_chunk(kind, payload):
+    """Returns a chunk as it would be written in the text format.
+
+    Args:
+        kind (bytes): The kind of the chunk.
+        payload (bytes): The content of the chunk.
+
+    Returns:
+        str: The lines of text, each ending with a newline.
+    |
+    """
+    if kind == DATA:
+        return "".join(text_row(row) + "\n" for row in decode_data(payload))
+    if kind == HEADER:
+        header = json.dumps(json.loads(payload), indent=4, sort_keys=True)
+        return "\n".join("#{}".format(line)
+                         for line in header.split("\n")) + "\n"
+    if kind == CYCLE:
+        return payload.decode("utf-8") + "\n"
+    if kind == STEP:
+        return "  " + payload.decode("utf-8") + "\n"
+    return ""
+
+
+def to_text(source, destination):
+    """Converts a binary file to the text format.
+
+    Args:
+        destination (str): The text file to write.
+        source (str): The binary file to read.
+    |
+    """
+    with archive.open_log(source) as file, open(destination, "w") as out:
+        for kind, payload in iter_chunks(file):
+            out.write(text_chunk(kind, payload))
+
+
+def to_binary(source, destination, chunk_rows=CHUNK_ROWS):
+    """Converts a text file to the binary format.
+
+    Times in the text file are rounded to 8 significant digits, converting does not
+    bring the lost precision back.
+
+    Args:
+        chunk_rows (int, optional): Rows per data chunk. Defaults to CHUNK_ROWS.
+        destination (str): The binary file to write.
+        source (str): The text file to read.
+    |
+    """
+    encoder = ChunkEncoder(chunk_rows=chunk_rows, chunk_seconds=math.inf)
+    header = []
+    with archive.open_log(source, "r") as file, open(destination, "wb") as out:
+        for line in file:
+            if line.startswith("#"):
+                header.append(line[1:])
+                continue
+            if header is not None:
+                out.write(encode_header(json.loads("".join(header))))
+                header = None
+            if not line.strip():
+                continue
+            if line.startswith("    "):
+                out.write(encoder.add([math.nan if value.strip() == "None"
+                                       else float(value)
+                                       for value in line.split(",")]))
+            elif line.startswith("  "):
+                out.write(encoder.marker(STEP, line))
+            else:
+                out.write(encoder.marker(CYCLE, line))
+        if header is not None:
+            out.write(encode_header(json.loads("".join(header))))
+        out.write(encoder.flush())
+
+
+def main(args=None):
+    """Converts a file to the other format, judging the direction from the source file.
+
+    Args:
+        args (list, optional): Command line arguments. Defaults to None for sys.argv.
+    |
+    """
+    parser = argparse.ArgumentParser(
+        description="Convert a cyckei log between the text and binary formats.")
+    parser.add_argument("source", help="File to convert.")
+    parser.add_argument("destination", help="File to write.")
+    args = parser.parse_args(args)
+
+    if is_binary(args.source):
+        to_text(args.source, args.destination)
+    else:
+        to_binary(args.source, args.destination)
+
+
+if __name__ == "__main__":
+    main()
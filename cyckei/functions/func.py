@@ -33,3 +33,20 @@ def not_none(value):
     |
     """
     return "None" if value is None else str(value)
+
+
+def publish_port(zmq_config):
+    """Returns the port the server publishes channel status changes on.
+
+    Args:
+        zmq_config (dict): The "zmq" section of the config.
+
+    Returns:
+        int: The "publish-port" setting, or "port" + 1 if it is missing or empty, so
+            servers on other ports do not publish on the same one.
+    |
+    """
+    port = str(zmq_config.get("publish-port", "") or "").strip()
+    if not port:
+        return int(zmq_config["port"]) + 1
+    return int(port)
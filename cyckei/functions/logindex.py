@@ -0,0 +1,393 @@
+"""Sidecar index of the cycle and step headers of a log file.
+
+Next to a log file a CellRunner keeps an index file, the log path with SUFFIX appended,
+holding one JSON line per cycle or step header written to the log:
+
+    {"kind": "cycle", "offset": 1234, "row": 0, "time": 0.0, "cycle": 0}
+    {"kind": "step", "offset": 1249, "row": 0, "time": 0.0, "state": "rest"}
+
+where offset is the byte offset of the header in the log, row the number of data rows
+before it and time the seconds since the start of the test at which it was written, so
+that the rows before the header are no later and the rows after it no earlier. Readers
+can then seek straight to a cycle or step instead of reading the whole log. Both the text
+and the binary (see binlog) formats are supported, and the index of an old log or of a log
+whose index is missing or stale is rebuilt from the log itself.
+
+|
+"""
+import json
+import logging
+import os
+
+from cyckei.functions import archive, binlog
+
+logger = logging.getLogger('cyckei')
+
+SUFFIX = ".idx"
+
+KIND_NAMES = {binlog.CYCLE: "cycle", binlog.STEP: "step"}
+
+
+def index_path(path):
+    """Returns the path of the index of a log.
+
+    Args:
+        path (str): The log file.
+
+    Returns:
+        str: The index file.
+    |
+    """
+    return path + SUFFIX
+
+
+def make_entry(kind, offset, row, time, header):
+    """Returns an index entry.
+
+    Args:
+        header (dict): The cycle or step header.
+        kind (str): "cycle" or "step".
+        offset (int): Byte offset of the header in the log.
+        row (int): Number of data rows before the header.
+        time (float): Seconds since the start of the test, None if unknown.
+
+    Returns:
+        dict: The entry, with the cycle number for a cycle and the state for a step.
+    |
+    """
+    entry = {"kind": kind, "offset": offset, "row": row, "time": time}
+    if kind == "cycle":
+        entry["cycle"] = header.get("cycle")
+    else:
+        entry["state"] = header.get("state")
+    return entry
+
+
+def format_entry(entry):
+    """Returns an entry as a line of the index file.
+
+    Args:
+        entry (dict): The index entry.
+
+    Returns:
+        str: The JSON line, ending with a newline.
+    |
+    """
+    return json.dumps(entry) + "\n"
+
+
+def scan(path, start=0, row=0):
+    """Finds the cycle and step headers of a log by reading it.
+
+    Args:
+        path (str): The log file.
+        row (int, optional): Number of data rows before start. Defaults to 0.
+        start (int, optional): Byte offset of a line or chunk to start from. Defaults to 0.
+
+    Returns:
+        list: The index entries of the headers from start on.
+    |
+    """
+    if binlog.is_binary(path):
+        return _scan_binary(path, start, row)
+    return _scan_text(path, start, row)
+
+
+def _scan_text(path, start, row):
+    entries = []
+    # Entries waiting for the time of the next row
+    waiting = []
+    with archive.open_log(path) as file:
+        file.seek(start)
+        offset = start
+        for line in file:
+            if not line.endswith(b"\n"):
+                # A line still being written
+                break
+            if line.startswith(b"    "):
+                row += 1
+                if waiting:
+                    time = _float(line.split(b",", 1)[0])
+                    for entry in waiting:
+                        entry["time"] = time
+                    waiting = []
+            elif line.startswith(b"#") or not line.strip():
+                pass
+            else:
+                kind = "step" if line.startswith(b"  ") else "cycle"
+                try:
+                    header = json.loads(line)
+                except ValueError:
+                    header = {}
+                entry = make_entry(kind, offset, row, None, header)
+                entries.append(entry)
+                waiting.append(entry)
+            offset += len(line)
+    return entries
+
+
+def _scan_binary(path, start, row):
+    entries = []
+    waiting = []
+    with archive.open_log(path) as file:
+        for offset, kind, payload in binlog.iter_chunks(
+                file, start=start or None, offsets=True):
+            if kind == binlog.DATA:
+                rows = binlog.decode_data(payload)
+                row += len(rows)
+                if waiting and rows:
+                    for entry in waiting:
+                        entry["time"] = rows[0][0]
+                    waiting = []
+            elif kind in KIND_NAMES:
+                entry = make_entry(KIND_NAMES[kind], offset, row, None,
+                                   json.loads(payload))
+                entries.append(entry)
+                waiting.append(entry)
+    return entries
+
+
+def complete(path):
+    """Finds where the complete lines or chunks of a log end, e.g. after a crash.
+
+    A crash can leave a line or chunk half written at the end of a log. Anything appended
+    after it would make the rest of a binary log unreadable.
+
+    Args:
+        path (str): The log file.
+
+    Returns:
+        tuple: (size, rows), the number of bytes up to the end of the last complete line or
+            chunk and the number of data rows before it.
+    |
+    """
+    if binlog.is_binary(path):
+        return _complete_binary(path)
+    return _complete_text(path)
+
+
+def _complete_text(path):
+    size = rows = 0
+    with archive.open_log(path) as file:
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            size += len(line)
+            if line.startswith(b"    "):
+                rows += 1
+    return size, rows
+
+
+def _complete_binary(path):
+    size = rows = 0
+    with archive.open_log(path) as file:
+        try:
+            for kind, payload in binlog.iter_chunks(file):
+                # The chunk has been read to its end
+                size = file.tell()
+                if kind == binlog.DATA:
+                    rows += len(binlog.decode_data(payload))
+        except ValueError:
+            # The chunks from a corrupted one on are not complete
+            pass
+    return size, rows
+
+
+def _float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def write(path, entries):
+    """Writes the index of a log.
+
+    Args:
+        entries (list): The index entries.
+        path (str): The log file, not the index file.
+    |
+    """
+    with open(index_path(path), "w") as file:
+        file.write("".join(format_entry(entry) for entry in entries))
+
+
+def rebuild(path):
+    """Rebuilds the index of a log from the log and writes it.
+
+    Args:
+        path (str): The log file.
+
+    Returns:
+        list: The index entries.
+    |
+    """
+    entries = scan(path)
+    try:
+        write(path, entries)
+    except IOError as error:
+        logger.warning(f"Could not write index of {path}: {error}")
+    return entries
+
+
+def _read(path):
+    """Reads the entries of an index file, None if it is missing or unreadable.
+
+    |
+    """
+    try:
+        with open(index_path(path)) as file:
+            lines = file.readlines()
+    except IOError:
+        return None
+    entries = []
+    for line in lines:
+        if not line.endswith("\n"):
+            # An entry still being written
+            break
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            return None
+    return entries
+
+
+def _valid(path, entry):
+    """Checks that the log has the header an entry points to.
+
+    |
+    """
+    try:
+        with archive.open_log(path) as file:
+            if binlog.is_binary(path):
+                for offset, kind, payload in binlog.iter_chunks(
+                        file, start=entry["offset"], offsets=True):
+                    return (KIND_NAMES.get(kind) == entry["kind"]
+                            and _matches(entry, payload))
+                return False
+            if entry["offset"] > 0:
+                file.seek(entry["offset"] - 1)
+                if file.read(1) != b"\n":
+                    return False
+            line = file.readline()
+    except (IOError, ValueError, KeyError):
+        return False
+    if not line.endswith(b"\n") or line.startswith(b"#"):
+        return False
+    if (line.startswith(b"  ") and not line.startswith(b"    ")) \
+            != (entry["kind"] == "step"):
+        return False
+    return _matches(entry, line)
+
+
+def _matches(entry, header):
+    """Checks that a header is the one described by an entry.
+
+    |
+    """
+    try:
+        header = json.loads(header)
+    except ValueError:
+        return False
+    expected = make_entry(entry["kind"], 0, 0, None, header)
+    return all(entry.get(key) == value for key, value in expected.items()
+               if key in ("cycle", "state"))
+
+
+def load(path):
+    """Returns the index of a log.
+
+    The index file is used if it matches the log, the headers written to the log since are
+    added by reading the log from the last indexed header on. A missing or stale index is
+    rebuilt from the whole log and written.
+
+    Args:
+        path (str): The log file.
+
+    Returns:
+        list: The index entries in the order of the log.
+    |
+    """
+    entries = _read(path)
+    if entries is None or (entries and not _valid(path, entries[-1])):
+        return rebuild(path)
+    if not entries:
+        if os.path.getsize(path) > 0 and scan(path):
+            return rebuild(path)
+        return entries
+
+    last = entries[-1]
+    tail = scan(path, last["offset"], last["row"])
+    if tail and tail[0]["offset"] == last["offset"]:
+        tail = tail[1:]
+    return entries + tail
+
+
+def cycles(entries, size):
+    """Returns the byte ranges of the cycles of a log.
+
+    Args:
+        entries (list): The index entries.
+        size (int): The size of the log in bytes.
+
+    Returns:
+        list: (cycle, start offset, end offset) for every cycle header, in the order of the log.
+    |
+    """
+    starts = [(entry["cycle"], entry["offset"]) for entry in entries
+              if entry["kind"] == "cycle"]
+    ends = [offset for cycle, offset in starts[1:]] + [size]
+    return [(cycle, start, end)
+            for (cycle, start), end in zip(starts, ends)]
+
+
+def read_range(path, start, end=None):
+    """Reads part of a log as text, as it would be in the text format.
+
+    Args:
+        end (int, optional): Byte offset to stop at, a header or the end of the log. Defaults
+            to None for the end of the log.
+        path (str): The log file.
+        start (int): Byte offset to start from, a header.
+
+    Returns:
+        str: The lines between the offsets.
+    |
+    """
+    with archive.open_log(path) as file:
+        if binlog.is_binary(path):
+            return "".join(binlog.text_chunk(kind, payload)
+                           for kind, payload in binlog.iter_chunks(
+                               file, start=start, end=end))
+        file.seek(start)
+        if end is None:
+            content = file.read()
+        else:
+            content = file.read(max(0, end - start))
+    return content.decode("utf-8")
+
+
+def read_meta(path):
+    """Reads the meta data of a log without reading the rest of it.
+
+    Args:
+        path (str): The log file.
+
+    Returns:
+        dict: The meta data.
+
+    Raises:
+        ValueError: If the meta data can not be decoded.
+    |
+    """
+    with archive.open_log(path) as file:
+        if binlog.is_binary(path):
+            for kind, payload in binlog.iter_chunks(file):
+                return json.loads(payload)
+            raise ValueError("no meta data in {}".format(path))
+        header = []
+        for line in file:
+            if not line.startswith(b"#"):
+                break
+            header.append(line[1:].decode("utf-8"))
+    return json.loads("".join(header))
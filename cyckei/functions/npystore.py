@@ -0,0 +1,383 @@
+"""Chunked NumPy store for the data rows of a log.
+
+An alternative sink for high rate acquisition: instead of formatting every row as text,
+a CellRunner writing the "npy" format copies it into a memory-mapped .npy segment, one
+per step, in a directory next to the log (the log path with SUFFIX appended). The log
+itself still holds the meta data and the cycle and step headers, without data rows.
+
+Segments are pre-allocated for CHUNK_ROWS rows and grown CHUNK_ROWS at a time. Their
+.npy header always gives the number of rows written so far, so np.load(mmap_mode="r")
+maps exactly the rows written, without any parsing, while the rest of the file is spare
+room. Rows are float64 columns in the order of the log's "format" meta data, with NaN
+for values that could not be read.
+
+The manifest, MANIFEST in the directory, ties the segments to the log:
+
+    {"log": "data.pyb", "columns": ["time", "current", ...], "meta": {...},
+     "segments": [{"file": "0000.npy", "cycle": 0, "state": "rest", "step": 0,
+                   "start_row": 0, "rows": 360}, ...]}
+
+where meta is the log's meta data, cycle the cycle number during the step, state the
+step's state and start_row the number of rows in the earlier segments. Headers and the
+manifest are updated together on sync(), a crash loses at most the rows since.
+
+|
+"""
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+SUFFIX = ".npyd"
+MANIFEST = "manifest.json"
+CHUNK_ROWS = 4096  # Rows a segment is allocated and grown by
+SYNC_INTERVAL = 5.0  # Seconds between updates of the headers and manifest while appending
+HEADER_SIZE = 128  # Bytes of every segment's .npy header, room for any number of rows
+
+DTYPE = np.dtype("<f8")
+
+
+def store_path(path):
+    """Returns the directory of the store of a log.
+
+    Args:
+        path (str): The log file.
+
+    Returns:
+        str: The directory.
+    |
+    """
+    return path + SUFFIX
+
+
+def exists(path):
+    """Checks whether a log has its data rows in a store.
+
+    Args:
+        path (str): The log file.
+
+    Returns:
+        bool: True if the log has a manifest.
+    |
+    """
+    return os.path.isfile(os.path.join(store_path(path), MANIFEST))
+
+
+def encode_header(rows, columns):
+    """Returns a .npy (version 1.0) header padded to HEADER_SIZE bytes.
+
+    Args:
+        columns (int): Number of columns.
+        rows (int): Number of rows.
+
+    Returns:
+        bytes: The header.
+    |
+    """
+    description = "{{'descr': '{}', 'fortran_order': False, 'shape': ({}, {}), }}".format(
+        DTYPE.str, rows, columns)
+    prefix = b"\x93NUMPY\x01\x00"
+    length = HEADER_SIZE - len(prefix) - 2
+    return (prefix + length.to_bytes(2, "little")
+            + description.ljust(length - 1).encode("latin1") + b"\n")
+
+
+class Segment(object):
+    """A growing .npy file of rows, written through a memory map.
+
+    Attributes:
+        capacity (int): Number of rows the file has room for.
+        chunk_rows (int): Rows the file is grown by.
+        columns (int): Number of columns.
+        path (str): The .npy file.
+        rows (int): Number of rows appended.
+    |
+    """
+
+    def __init__(self, path, columns, chunk_rows=CHUNK_ROWS):
+        """Creates an empty segment file with room for chunk_rows rows.
+
+        Args:
+            chunk_rows (int, optional): Rows the file is allocated and grown by. Defaults to
+                CHUNK_ROWS.
+            columns (int): Number of columns.
+            path (str): The .npy file to create.
+        |
+        """
+        self.path = path
+        self.columns = columns
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self.capacity = 0
+        self._synced = 0
+        self._map = None
+        self._view = None
+        with open(path, "wb") as file:
+            file.write(encode_header(0, columns))
+        self._grow()
+
+    def _grow(self):
+        """Adds chunk_rows rows of room to the file and maps it again.
+
+        |
+        """
+        if self._map is not None:
+            self._map.flush()
+            self._map = self._view = None
+        self.capacity += self.chunk_rows
+        with open(self.path, "r+b") as file:
+            file.truncate(HEADER_SIZE + self.capacity * self.columns * DTYPE.itemsize)
+        self._map = np.memmap(self.path, dtype=DTYPE, mode="r+", offset=HEADER_SIZE,
+                              shape=(self.capacity, self.columns))
+        # Indexing a plain view of the map skips the memmap subclass overhead
+        self._view = self._map.view(np.ndarray)
+
+    def append(self, row):
+        """Appends a row.
+
+        Args:
+            row (list): One float per column, None is stored as NaN.
+        |
+        """
+        if self.rows == self.capacity:
+            self._grow()
+        if None in row:
+            row = [math.nan if value is None else value for value in row]
+        self._view[self.rows] = row
+        self.rows += 1
+
+    def sync(self):
+        """Writes the rows to the file and the number of rows to the header.
+
+        |
+        """
+        if self.rows == self._synced:
+            return
+        self._map.flush()
+        with open(self.path, "r+b") as file:
+            file.write(encode_header(self.rows, self.columns))
+        self._synced = self.rows
+
+    def close(self):
+        """Syncs and unmaps the segment, cutting the spare room off the file.
+
+        |
+        """
+        if self._map is None:
+            return
+        self.sync()
+        self._map = self._view = None
+        with open(self.path, "r+b") as file:
+            file.truncate(HEADER_SIZE + self.rows * self.columns * DTYPE.itemsize)
+
+
+class Store(object):
+    """Writes the data rows of a log to one Segment per step.
+
+    Attributes:
+        chunk_rows (int): Rows the segments are allocated and grown by.
+        columns (list): Names of the columns.
+        directory (str): The directory of the store.
+        manifest (dict): The manifest as it is written on sync().
+        rows (int): Number of rows appended to every segment.
+        segment (Segment): The segment being appended to, None before the first row of a step.
+        sync_interval (float): Seconds between syncs while appending, None to only sync
+            when asked.
+    |
+    """
+
+    def __init__(self, path, meta, chunk_rows=CHUNK_ROWS, sync_interval=SYNC_INTERVAL,
+                 resume=False):
+        """Creates the store of a log, replacing any earlier one unless resuming it.
+
+        Args:
+            chunk_rows (int, optional): Rows the segments are allocated and grown by.
+                Defaults to CHUNK_ROWS.
+            meta (dict): The meta data of the log, with the list of columns as "format".
+            path (str): The log file.
+            resume (bool, optional): Keep the segments of an existing store and append new
+                ones after them, e.g. when a test is restored after a restart. Defaults to
+                False.
+            sync_interval (float, optional): Seconds between syncs while appending, None to
+                only sync when asked. Defaults to SYNC_INTERVAL.
+        |
+        """
+        self.directory = store_path(path)
+        self.columns = list(meta["format"])
+        self.chunk_rows = chunk_rows
+        self.sync_interval = sync_interval
+        self.rows = 0
+        self.segment = None
+        self._pending = None
+        self._last_sync = time.monotonic()
+
+        if resume and exists(path):
+            self.manifest = read_manifest(path)
+            self.rows = sum(entry["rows"] for entry in self.manifest["segments"])
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            if name.endswith(".npy") or name == MANIFEST:
+                os.remove(os.path.join(self.directory, name))
+        self.manifest = {"log": os.path.basename(path), "columns": self.columns,
+                         "meta": meta, "segments": []}
+        self._write_manifest()
+
+    def mark(self, cycle, header):
+        """Starts a new step, its segment is created on its first row.
+
+        Args:
+            cycle (int): The cycle the step belongs to.
+            header (dict): The step header.
+        |
+        """
+        self._close_segment()
+        self._pending = {"cycle": cycle, "state": header.get("state")}
+
+    def append(self, row):
+        """Appends a row to the segment of the current step.
+
+        Args:
+            row (list): The time followed by the other columns, None for missing values.
+        |
+        """
+        if self.segment is None:
+            self._open_segment()
+        self.segment.append(row[:len(self.columns)])
+        self.rows += 1
+        self.manifest["segments"][-1]["rows"] += 1
+        if (self.sync_interval is not None
+                and time.monotonic() - self._last_sync >= self.sync_interval):
+            self.sync()
+
+    def sync(self):
+        """Makes every row appended so far visible to readers.
+
+        |
+        """
+        if self.segment is not None:
+            self.segment.sync()
+        self._write_manifest()
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        """Syncs and closes the store.
+
+        |
+        """
+        self._close_segment()
+        self._write_manifest()
+
+    def _open_segment(self):
+        entry = dict(self._pending or {"cycle": None, "state": None})
+        index = len(self.manifest["segments"])
+        entry.update({"file": "{:04d}.npy".format(index), "step": index,
+                      "start_row": self.rows, "rows": 0})
+        self.segment = Segment(os.path.join(self.directory, entry["file"]),
+                               len(self.columns), self.chunk_rows)
+        self.manifest["segments"].append(entry)
+        self._pending = None
+
+    def _close_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+            self._write_manifest()
+
+    def _write_manifest(self):
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + ".tmp", "w") as file:
+            json.dump(self.manifest, file)
+        os.replace(path + ".tmp", path)
+
+
+def read_manifest(path):
+    """Reads the manifest of the store of a log.
+
+    Args:
+        path (str): The log file.
+
+    Returns:
+        dict: The manifest.
+    |
+    """
+    with open(os.path.join(store_path(path), MANIFEST)) as file:
+        return json.load(file)
+
+
+def segments(path, cycle=None):
+    """Maps the segments of the store of a log.
+
+    Args:
+        cycle (int, optional): Only the segments of this cycle. Defaults to None for all.
+        path (str): The log file.
+
+    Returns:
+        list: (manifest entry, array) for every segment, the arrays being read-only memory
+            maps shaped (rows, columns).
+    |
+    """
+    manifest = read_manifest(path)
+    mapped = []
+    for entry in manifest["segments"]:
+        if cycle is not None and entry["cycle"] != cycle:
+            continue
+        array = np.load(os.path.join(store_path(path), entry["file"]), mmap_mode="r")
+        # The header may be ahead of the manifest, never behind
+        mapped.append((entry, array[:entry["rows"]]))
+    return mapped
+
+
+def history(path, cycle=None):
+    """Returns the rows of the store of a log as one array.
+
+    Unlike segments() this copies the rows, use it when one array is more convenient.
+
+    Args:
+        cycle (int, optional): Only the rows of this cycle. Defaults to None for all.
+        path (str): The log file.
+
+    Returns:
+        numpy.ndarray: The rows, shaped (rows, columns).
+    |
+    """
+    arrays = [array for entry, array in segments(path, cycle)]
+    if not arrays:
+        return np.empty((0, len(read_manifest(path)["columns"])), dtype=DTYPE)
+    return np.concatenate(arrays)
+
+
+def format_segments(mapped):
+    """Returns segments as they would be in the text format, for display.
+
+    Args:
+        mapped (list): (manifest entry, array) pairs as returned by segments().
+
+    Returns:
+        str: A step header line per segment followed by its rows.
+    |
+    """
+    from cyckei.functions import binlog
+
+    lines = []
+    for entry, array in mapped:
+        lines.append("  " + json.dumps({"state": entry["state"]}))
+        lines.extend(binlog.text_row(row) for row in array.tolist())
+    return "".join(line + "\n" for line in lines)
+
+
+def to_text(path, cycle=None):
+    """Returns the step headers and rows of the store of a log as text, for display.
+
+    Args:
+        cycle (int, optional): Only the steps of this cycle. Defaults to None for all.
+        path (str): The log file.
+
+    Returns:
+        str: The lines of text.
+    |
+    """
+    return format_segments(segments(path, cycle))
@@ -0,0 +1,233 @@
+"""Times the startup of a component, for ``cyckei <component> --profile-startup``.
+
+A StartupProfiler times the import of every module, as ``python -X importtime`` does, and
+the phases of the startup the component marks, e.g. the server binding its socket or the
+client window showing. The report lists the phases, the slowest imports and the time to
+ready against the component's budget in BUDGETS.
+
+Budgets cover Cyckei's own work. Phases spent waiting on instruments or servers, see
+WAITING, are reported but not counted against them.
+
+Components mark their phases with the module-level mark() and finish(), which do nothing
+unless a profiler was started, so they cost nothing on a normal startup.
+
+|
+"""
+import builtins
+import importlib.util
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger('cyckei')
+
+BUDGETS = {"server": 1.0, "client": 2.0, "explorer": 1.5}  # Seconds to ready
+WAITING = ("connect devices", "connect servers")  # Phases not counted against budgets
+SLOWEST = 15  # Imports listed in the report
+
+PROFILER = None  # The running StartupProfiler, None when not profiling
+
+
+class StartupProfiler(object):
+    """Times imports and startup phases, from its creation until finish().
+
+    Attributes:
+        component (str): "server", "client" or "explorer".
+        imports (list): A (module, cumulative seconds, own seconds, depth) tuple per module
+            imported, in the order they finished.
+        phases (list): A (name, seconds) tuple per phase marked, in order.
+        start (float): perf_counter() time the profiler started.
+    |
+    """
+
+    def __init__(self, component, start=None):
+        """Inits StartupProfiler, timing imports from now on.
+
+        Args:
+            component (str): "server", "client" or "explorer".
+            start (float, optional): perf_counter() time the startup began. Defaults to
+                None for now.
+        |
+        """
+        self.component = component
+        self.start = time.perf_counter() if start is None else start
+        self.imports = []
+        self.phases = []
+        self._last = self.start
+        self._stack = []
+        self._thread = threading.get_ident()
+        self._import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def mark(self, name):
+        """Ends a phase of the startup.
+
+        Args:
+            name (str): What was done since the last mark, e.g. "bind socket".
+        |
+        """
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def stop(self):
+        """Stops timing imports.
+
+        |
+        """
+        if builtins.__import__ == self._timed_import:
+            builtins.__import__ = self._import
+
+    @property
+    def total(self):
+        """Seconds from the start to the last mark.
+
+        |
+        """
+        return self._last - self.start
+
+    @property
+    def waiting(self):
+        """Seconds of the phases spent waiting on instruments or servers.
+
+        |
+        """
+        return sum(seconds for name, seconds in self.phases if name in WAITING)
+
+    @property
+    def budget(self):
+        """The component's budget in seconds, None without one.
+
+        |
+        """
+        return BUDGETS.get(self.component)
+
+    def over_budget(self):
+        """Returns whether the startup, waits left out, took longer than the budget.
+
+        |
+        """
+        return self.budget is not None and self.total - self.waiting > self.budget
+
+    def report(self):
+        """Returns the phases, slowest imports and time to ready.
+
+        Returns:
+            str: The report, a line each.
+        |
+        """
+        lines = ["Startup of {}: {:.3f} s, {:.3f} s waiting on instruments or servers"
+                 .format(self.component, self.total, self.waiting)]
+        if self.budget is not None:
+            lines[0] += ", {:.3f} s of {:.3f} s budget{}".format(
+                self.total - self.waiting, self.budget,
+                " EXCEEDED" if self.over_budget() else "")
+        lines.append("Phases:")
+        for name, seconds in self.phases:
+            lines.append("  {:8.3f} s  {}".format(seconds, name))
+        lines.append("Slowest imports (cumulative, own):")
+        slowest = sorted(self.imports, key=lambda entry: entry[1], reverse=True)
+        for module, cumulative, own, depth in slowest[:SLOWEST]:
+            lines.append("  {:8.3f} s {:8.3f} s  {}{}".format(
+                cumulative, own, "  " * depth, module))
+        return "\n".join(lines)
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        """Stands in for builtins.__import__, timing modules not imported yet.
+
+        |
+        """
+        if threading.get_ident() != self._thread:
+            return self._import(name, globals, locals, fromlist, level)
+        module = name
+        if level:
+            try:
+                module = importlib.util.resolve_name(
+                    "." * level + name, (globals or {}).get("__package__"))
+            except (ImportError, ValueError):
+                pass
+        missing = [] if module in sys.modules else [module]
+        # "from package import module" may import the module too
+        missing += [module + "." + item for item in fromlist or ()
+                    if item != "*" and module + "." + item not in sys.modules]
+        if not missing:
+            return self._import(name, globals, locals, fromlist, level)
+
+        self._stack.append(0.)
+        start = time.perf_counter()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            cumulative = time.perf_counter() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += cumulative
+            # Names imported from a module may be attributes rather than modules
+            loaded = [name for name in missing if name in sys.modules]
+            if loaded:
+                self.imports.append((_label(module, loaded), cumulative,
+                                     cumulative - children, len(self._stack)))
+
+
+def _label(module, loaded):
+    """Returns how an import is named in the report, e.g. "numpy.lib [format, +3]".
+
+    Args:
+        loaded (list): Names of the modules the import loaded.
+        module (str): Name of the module imported.
+    |
+    """
+    submodules = [name.rsplit(".", 1)[1] for name in loaded if name != module]
+    if not submodules:
+        return module
+    if len(submodules) > 3:
+        submodules = submodules[:3] + ["+{}".format(len(submodules) - 3)]
+    return "{} [{}]".format(module, ", ".join(submodules))
+
+
+def start(component, start=None):
+    """Starts profiling the startup of a component.
+
+    Args:
+        component (str): "server", "client" or "explorer".
+        start (float, optional): perf_counter() time the startup began. Defaults to None
+            for now.
+
+    Returns:
+        StartupProfiler: The profiler, also kept as PROFILER.
+    |
+    """
+    global PROFILER
+    PROFILER = StartupProfiler(component, start)
+    return PROFILER
+
+
+def mark(name):
+    """Ends a phase of the startup, if it is profiled.
+
+    |
+    """
+    if PROFILER is not None:
+        PROFILER.mark(name)
+
+
+def finish(name):
+    """Ends the last phase of the startup and prints the report, if it is profiled.
+
+    Args:
+        name (str): What was done since the last mark, e.g. "show window".
+    |
+    """
+    global PROFILER
+    profiler = PROFILER
+    if profiler is None:
+        return
+    PROFILER = None
+    profiler.mark(name)
+    profiler.stop()
+    report = profiler.report()
+    print(report, flush=True)
+    if profiler.over_budget():
+        logger.warning("Startup of {} took longer than its budget of {} s.".format(
+            profiler.component, profiler.budget))
@@ -0,0 +1,509 @@
+"""Checks protocol scripts without running them, for the client and the explorer.
+
+A protocol is Python code the server runs with exec(). check() parses it instead and walks
+its syntax tree: every statement must be a step, e.g. CCCharge(0.1, ...), or a for loop over
+range() or a tuple holding steps, and the arguments of every step are checked as the server's step
+constructors use them, down to the reports and ends tuples and their time strings. Nothing
+is run, so even a long protocol is checked in milliseconds, without a server.
+
+Results are kept by a hash of the protocol, so checking a script again, e.g. when starting
+it on many channels, is a lookup. Those of its statements are kept by their text, so the
+steps a protocol repeats are parsed once and an edit only parses the statements it changed.
+
+OPERATOR_MAP, DATA_INDEX_MAP and time_conversion() are the rules of the protocol language,
+used by cyckei.server.protocols as well, so that the check and the server agree.
+
+|
+"""
+import ast
+import hashlib
+import operator
+import threading
+from collections import OrderedDict
+
+OPERATOR_MAP = {
+    "<": operator.lt,
+    "<=": operator.le,
+    "=<": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+    "=!": operator.ne,
+    ">=": operator.ge,
+    "=>": operator.ge,
+    ">": operator.gt,
+    "lt": operator.lt,
+    "le": operator.le,
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "ge": operator.ge,
+    "gt": operator.gt}
+
+DATA_INDEX_MAP = {
+    "time": 0,
+    "current": 1,
+    "voltage": 2,
+    "capacity": 3
+}
+
+# Arguments of each step, in order: those required, then those with a default
+MIN_WAIT_TIME = 1.0  # Minimum number of seconds between I/V measurements
+OPTIONS = ("reports", "ends", "wait_time", "adaptive")
+STEPS = {
+    "CCCharge": (("current",), OPTIONS),
+    "CCDischarge": (("current",), OPTIONS),
+    "CVCharge": (("voltage",), OPTIONS),
+    "CVDischarge": (("voltage",), OPTIONS),
+    "Rest": ((), OPTIONS),
+    "Sleep": ((), OPTIONS),
+    "AdvanceCycle": ((), ()),
+}
+CACHE_SIZE = 256  # Protocols whose results are kept
+STATEMENT_CACHE_SIZE = 4096  # Statements whose results are kept
+
+# Arithmetic allowed in arguments, e.g. 0.01 * i
+ARITHMETIC = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+UNKNOWN = object()  # An argument only known when the protocol runs, e.g. a loop variable
+
+
+def time_conversion(t):
+    """Converts time in the "hh:mm:ss" format to seconds as a float.
+
+    Args:
+        t (str or float): time in the "hh:mm:ss" format, where values can be ommitted
+            e.g. "::5" would be five seconds or time in seconds.
+
+    Returns:
+        float: Calculated time in Seconds.
+    |
+    """
+    t_float = None
+    try:
+        t_float = float(t)
+    except ValueError:
+        try:
+            time_tuple = [float(x) if x else 0 for x in t.split(":")]
+            t_float = (time_tuple[0]
+                       * 3600.
+                       + time_tuple[1]
+                       * 60.0
+                       + time_tuple[2])
+        except AttributeError:
+            pass
+    return t_float
+
+
+class ResultCache(object):
+    """Results by key, dropping the least recently used beyond a size.
+
+    Attributes:
+        size (int): Most results kept.
+    |
+    """
+
+    def __init__(self, size=CACHE_SIZE):
+        """Inits an empty ResultCache.
+
+        Args:
+            size (int, optional): Most results kept. Defaults to CACHE_SIZE.
+        |
+        """
+        self.size = size
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._results)
+
+    def get(self, key, default=None):
+        """Returns the result kept for key, default if there is none.
+
+        |
+        """
+        with self._lock:
+            if key not in self._results:
+                return default
+            self._results.move_to_end(key)
+            return self._results[key]
+
+    def put(self, key, result):
+        """Keeps the result for key.
+
+        |
+        """
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.size:
+                self._results.popitem(last=False)
+
+
+CHECKED = ResultCache()  # Results of check() by digest of the protocol
+STATEMENTS = ResultCache(STATEMENT_CACHE_SIZE)  # Results of _check_text() by statement
+
+
+def digest(protocol):
+    """Returns the hash protocols are known by in caches.
+
+    |
+    """
+    return hashlib.sha1(protocol.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def check(protocol):
+    """Checks a protocol is made of steps the server can load, with valid arguments.
+
+    Args:
+        protocol (str): The protocol script.
+
+    Returns:
+        bool: True if the protocol passed, False otherwise.
+        str: "Passed", or what is wrong and on which line.
+    |
+    """
+    key = digest(protocol)
+    result = CHECKED.get(key)
+    if result is None:
+        result = _check(protocol)
+        CHECKED.put(key, result)
+    return result
+
+
+class Invalid(Exception):
+    """What is wrong with a protocol, at a node of its syntax tree.
+
+    |
+    """
+
+    def __init__(self, node, message):
+        super(Invalid, self).__init__(message)
+        self.line = getattr(node, "lineno", None)
+
+
+def _check(protocol):
+    """Checks a protocol, see check(), without the cache.
+
+    Each top-level statement, e.g. a step or a loop with its steps, is checked on its own and
+    its result kept by its text, so the steps a protocol repeats are parsed once and an edit
+    only parses the statements it changed. A statement that can not be parsed on its own,
+    e.g. when splitting the protocol went wrong, has the whole protocol checked at once.
+
+    |
+    """
+    if not protocol.strip():
+        return False, "An empty file can not be run."
+    steps = 0
+    for first, statement in _statements(protocol):
+        result = STATEMENTS.get(statement)
+        if result is None:
+            result = _check_text(statement)
+            STATEMENTS.put(statement, result)
+        count, line, message = result
+        if message is not None and count is None:
+            return _result(*_check_text(protocol))
+        if message is not None:
+            return _result(count, line + first - 1, message)
+        steps += count
+    return _result(steps, None, None)
+
+
+def _result(steps, line, message):
+    """Returns what check() returns for the result of _check_text().
+
+    |
+    """
+    if message is not None:
+        if line is None:
+            return False, "{}.".format(message)
+        return False, "Line {}: {}.".format(line, message)
+    if not steps:
+        return False, "The protocol has no steps."
+    return True, "Passed"
+
+
+def _check_text(text):
+    """Parses and checks statements.
+
+    Returns:
+        int: Number of steps written, None if the text does not parse.
+        int: Line of what is wrong, None if nothing is.
+        str: What is wrong, None if nothing is.
+    |
+    """
+    try:
+        tree = ast.parse(text)
+    except SyntaxError as error:
+        return None, error.lineno, error.msg
+    try:
+        return _check_body(tree.body, set()), None, None
+    except Invalid as error:
+        return 0, error.line, str(error)
+
+
+def _statements(protocol):
+    """Splits a protocol into its top-level statements.
+
+    A statement starts at a line that is not indented, outside of brackets. Brackets in
+    strings and after a statement's comment are counted too, a wrong split is caught by
+    _check().
+
+    Returns:
+        list: The number of its first line and the text of each statement.
+    |
+    """
+    lines = protocol.splitlines(True)
+    statements = []
+    start = depth = 0
+    for number, line in enumerate(lines):
+        if number > start and not depth and line[:1] not in ("", " ", "\t", "\r", "\n", "#"):
+            statements.append((start + 1, "".join(lines[start:number])))
+            start = number
+        if not line.lstrip().startswith("#"):
+            depth = max(0, depth + line.count("(") + line.count("[") + line.count("{")
+                        - line.count(")") - line.count("]") - line.count("}"))
+    statements.append((start + 1, "".join(lines[start:])))
+    return statements
+
+
+def _check_body(statements, names):
+    """Checks a list of statements, returns how many steps they write.
+
+    Args:
+        names (set): Names of the loop variables in scope.
+        statements (list): The ast statements.
+    |
+    """
+    steps = 0
+    for statement in statements:
+        if isinstance(statement, ast.For):
+            steps += _check_loop(statement, names)
+        elif isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Call):
+            _check_step(statement.value, names)
+            steps += 1
+        elif isinstance(statement, ast.Pass):
+            pass
+        else:
+            raise Invalid(statement, "Only steps and for loops can be used, not \"{}\"".format(
+                ast.unparse(statement).splitlines()[0]))
+    return steps
+
+
+def _check_loop(loop, names):
+    """Checks a "for name in range(...):" loop, or a loop over a tuple, and its body.
+
+    |
+    """
+    iterable = loop.iter
+    if isinstance(iterable, (ast.Tuple, ast.List)):
+        _value(iterable, names)
+    elif (isinstance(iterable, ast.Call) and isinstance(iterable.func, ast.Name)
+            and iterable.func.id == "range" and not iterable.keywords
+            and 1 <= len(iterable.args) <= 3):
+        for argument in iterable.args:
+            value = _value(argument, names)
+            if value is not UNKNOWN and type(value) is not int:
+                raise Invalid(argument, "range() takes whole numbers, not {!r}".format(value))
+    else:
+        raise Invalid(loop, "Loops should be over range() or a tuple, "
+                            "e.g. \"for i in range(10):\"")
+    if not isinstance(loop.target, ast.Name):
+        raise Invalid(loop, "Loops should have one variable, e.g. \"for i in range(10):\"")
+    if loop.orelse:
+        raise Invalid(loop, "Loops can not have an else")
+    return _check_body(loop.body, names | {loop.target.id})
+
+
+def _check_step(call, names):
+    """Checks a step and its arguments.
+
+    |
+    """
+    if not isinstance(call.func, ast.Name) or call.func.id not in STEPS:
+        raise Invalid(call, "Unknown step \"{}\", steps are {}".format(
+            ast.unparse(call.func), ", ".join(STEPS)))
+    step = call.func.id
+    required, options = STEPS[step]
+    parameters = required + options
+    if not parameters and (call.args or call.keywords):
+        raise Invalid(call, "{} takes no arguments".format(step))
+    if len(call.args) > len(parameters):
+        raise Invalid(call, "{} takes at most {} arguments".format(step, len(parameters)))
+    arguments = {}
+    for parameter, node in zip(parameters, call.args):
+        arguments[parameter] = node
+    for keyword in call.keywords:
+        if keyword.arg not in parameters:
+            raise Invalid(call, "{} has no argument \"{}\"".format(step, keyword.arg))
+        if keyword.arg in arguments:
+            raise Invalid(call, "{} got \"{}\" twice".format(step, keyword.arg))
+        arguments[keyword.arg] = keyword.value
+    for parameter in required:
+        if parameter not in arguments:
+            raise Invalid(call, "{} needs a {}".format(step, parameter))
+
+    for parameter, node in arguments.items():
+        value = _value(node, names)
+        if parameter == "current":
+            _number(node, value, "The current")
+            if value == 0:
+                raise Invalid(node, "The current should not be 0")
+        elif parameter in ("voltage", "wait_time"):
+            _number(node, value, "The {}".format(parameter.replace("_", " ")))
+        elif parameter == "adaptive":
+            _check_adaptive(node, value)
+        elif parameter == "reports":
+            for report in _pairs(node, value, "reports", 2, '(("time", ":5:"),)'):
+                _check_report(node, report)
+        elif parameter == "ends":
+            for end in _pairs(node, value, "ends", 3, '(("time", ">", "24::"),)'):
+                _check_end(node, end)
+
+
+def _check_adaptive(node, value):
+    """Checks the (min_wait, max_wait) bounds of an adaptive step.
+
+    |
+    """
+    if value is None or value is UNKNOWN:
+        return
+    if type(value) not in (tuple, list) or len(value) != 2:
+        raise Invalid(node, "adaptive should be (min_wait, max_wait)")
+    for bound in value:
+        _number(node, bound, "adaptive")
+    if UNKNOWN not in value and not MIN_WAIT_TIME <= value[0] <= value[1]:
+        raise Invalid(node, "adaptive bounds should satisfy {:g} <= min_wait <= max_wait".format(
+            MIN_WAIT_TIME))
+
+
+def _check_report(node, report):
+    """Checks a (value, delta) report, see protocols.process_reports.
+
+    |
+    """
+    key, delta = report
+    if key is UNKNOWN:
+        return
+    if key not in DATA_INDEX_MAP:
+        raise Invalid(node, "Unknown report \"{}\", reports are of {}".format(
+            key, ", ".join(DATA_INDEX_MAP)))
+    if key == "time":
+        _time(node, delta)
+    else:
+        _number(node, delta, "The {} report".format(key))
+
+
+def _check_end(node, end):
+    """Checks a (value, operator, limit) end, see protocols.process_ends.
+
+    |
+    """
+    key, comparison, limit = end[:3]
+    if key is not UNKNOWN and key not in DATA_INDEX_MAP:
+        raise Invalid(node, "Unknown end \"{}\", ends are of {}".format(
+            key, ", ".join(DATA_INDEX_MAP)))
+    if comparison is not UNKNOWN and comparison not in OPERATOR_MAP:
+        raise Invalid(node, "Unknown comparison \"{}\"".format(comparison))
+    if key == "time":
+        if len(end) > 3:
+            raise Invalid(node, "A time end takes 3 values")
+        _time(node, limit)
+    else:
+        _number(node, limit, "The {} end".format(key))
+        if len(end) > 3:
+            _number(node, end[3], "The minimum time of an end")
+
+
+def _pairs(node, value, name, length, example):
+    """Returns the tuples of a reports or ends argument, checking their length.
+
+    Ends take an optional minimum time, a fourth value.
+
+    |
+    """
+    if value is UNKNOWN:
+        return []
+    message = "{} should be a tuple of tuples, e.g. {}".format(name, example)
+    if type(value) not in (tuple, list):
+        raise Invalid(node, message)
+    for entry in value:
+        if entry is UNKNOWN:
+            continue
+        if type(entry) not in (tuple, list):
+            raise Invalid(node, message)
+        if not length <= len(entry) <= length + (name == "ends"):
+            raise Invalid(node, "Each of {} takes {} values, not {}".format(
+                name, length, len(entry)))
+    return [entry for entry in value if entry is not UNKNOWN]
+
+
+def _number(node, value, name):
+    """Checks value is a number, or only known when the protocol runs.
+
+    |
+    """
+    if value is UNKNOWN:
+        return
+    if type(value) not in (int, float):
+        raise Invalid(node, "{} should be a number, not {!r}".format(name, value))
+
+
+def _time(node, value):
+    """Checks value is a time in seconds or "hh:mm:ss", as read by time_conversion().
+
+    |
+    """
+    if value is UNKNOWN:
+        return
+    seconds = None
+    if type(value) in (int, float, str):
+        try:
+            seconds = time_conversion(value)
+        except (ValueError, IndexError):
+            pass
+    if seconds is None:
+        raise Invalid(node, "{!r} is not a time, e.g. \"1:30:00\" or 90".format(value))
+
+
+def _value(node, names):
+    """Returns the value of an argument, UNKNOWN if it depends on a loop variable.
+
+    Args:
+        names (set): Names of the loop variables in scope.
+        node (ast.expr): The argument.
+
+    Raises:
+        Invalid: If the argument is not made of numbers, strings, None, tuples, lists,
+            arithmetic and loop variables.
+    |
+    """
+    if isinstance(node, ast.Constant) and (
+            node.value is None or type(node.value) in (int, float, str, bool)):
+        return node.value
+    if isinstance(node, ast.Name):
+        if node.id in names:
+            return UNKNOWN
+        raise Invalid(node, "Unknown name \"{}\"".format(node.id))
+    if isinstance(node, (ast.Tuple, ast.List)):
+        return tuple(_value(element, names) for element in node.elts)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _value(node.operand, names)
+        _number(node, value, "\"{}\"".format(ast.unparse(node)))
+        if value is UNKNOWN:
+            return UNKNOWN
+        return -value if isinstance(node.op, ast.USub) else value
+    if isinstance(node, ast.BinOp) and type(node.op) in ARITHMETIC:
+        left, right = _value(node.left, names), _value(node.right, names)
+        _number(node, left, "\"{}\"".format(ast.unparse(node.left)))
+        _number(node, right, "\"{}\"".format(ast.unparse(node.right)))
+        if UNKNOWN in (left, right):
+            return UNKNOWN
+        try:
+            return ARITHMETIC[type(node.op)](left, right)
+        except ZeroDivisionError:
+            raise Invalid(node, "Division by zero")
+    raise Invalid(node, "\"{}\" can not be checked, use numbers, strings and tuples".format(
+        ast.unparse(node)))
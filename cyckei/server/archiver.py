@@ -0,0 +1,205 @@
+"""Archiving the logs of finished CellRunners in the background.
+
+A finished runner hands its log to the Archiver, which waits for the DataWriter to have
+written and closed it and then compresses it in place with archive.archive(). The
+compression runs in a separate, low priority process whose CPU use is also throttled, so
+it never competes with the control loop for the interpreter or for a core. The process is
+spawned rather than forked, as forking a server with threads running can copy locks held
+by them.
+
+|
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from cyckei.functions import archive, logindex
+
+logger = logging.getLogger('cyckei_server')
+
+CPU_LIMIT = 0.25  # Fraction of one core the archiving process may use
+NICE = 19  # Niceness of the archiving process where the platform supports it
+
+_STOP = object()
+
+
+def _lower_priority(nice):
+    """Lowers the priority of the archiving process.
+
+    |
+    """
+    if hasattr(os, "nice"):
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+
+
+class Archiver(object):
+    """Compresses the logs of finished tests one at a time in a background process.
+
+    Attributes:
+        archived (int): Number of logs archived so far.
+        bytes_in (int): Size of the logs archived so far, in bytes.
+        bytes_out (int): Size of the compressed logs, in bytes.
+        cpu_limit (float): Fraction of one core the archiving process may use.
+        failed (int): Number of logs that could not be archived, they are left as they are.
+        method (str): "gzip" or "lzma".
+        running (bool): Whether logs are still accepted.
+        writer (writer.DataWriter): Writes the logs, waited on before archiving, None if the
+            runners write directly.
+    |
+    """
+
+    def __init__(self, method="gzip", cpu_limit=CPU_LIMIT, writer=None, nice=NICE):
+        """Inits the archiver and starts its thread, the process is started on first use.
+
+        Args:
+            cpu_limit (float, optional): Fraction of one core the archiving process may use.
+                Defaults to CPU_LIMIT.
+            method (str, optional): "gzip" or "lzma". Defaults to "gzip".
+            nice (int, optional): Niceness added to the archiving process. Defaults to NICE.
+            writer (writer.DataWriter, optional): Writes the logs. Defaults to None.
+
+        Raises:
+            ValueError: If the method is unknown or cpu_limit is not in (0, 1].
+        |
+        """
+        if method not in archive.METHODS:
+            raise ValueError("unknown compression {}, must be one of {}".format(
+                method, list(archive.METHODS)))
+        archive.Throttle(cpu_limit)
+        self.method = method
+        self.cpu_limit = cpu_limit
+        self.writer = writer
+        self.nice = nice
+        self.archived = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.running = True
+        self._submitted = set()
+        self._executor = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="archiver",
+                                        daemon=True)
+        self._thread.start()
+
+    def submit(self, path):
+        """Queues a log for archiving, a log already waiting or being archived is ignored.
+
+        Args:
+            path (str): The log file, which nothing may write to anymore.
+
+        Returns:
+            bool: True if the log was queued.
+        |
+        """
+        if not self.running or path is None or path in self._submitted:
+            return False
+        self._submitted.add(path)
+        self._queue.put(path)
+        return True
+
+    def pending(self):
+        """Returns the number of logs waiting to be archived.
+
+        |
+        """
+        return self._queue.qsize()
+
+    def wait(self, timeout=None):
+        """Waits until every queued log was archived, or failed to be.
+
+        Args:
+            timeout (float, optional): Longest time in seconds to wait. Defaults to None.
+
+        Returns:
+            bool: False if waiting timed out, otherwise True.
+        |
+        """
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """Stops accepting logs, finishes the log being archived and stops.
+
+        Logs still queued are left as they are.
+
+        Args:
+            timeout (float, optional): Longest time in seconds to wait. Defaults to None.
+        |
+        """
+        if not self.running:
+            return
+        self.running = False
+        left = 0
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, threading.Event):
+                item.set()
+            else:
+                left += 1
+        if left:
+            logger.info("{} logs left to archive.".format(left))
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def stats(self):
+        """Returns the archiving statistics.
+
+        Returns:
+            dict: The number of logs archived, failed and pending and the total size of the
+                logs before and after compression, in bytes.
+        |
+        """
+        return {
+            "method": self.method,
+            "archived": self.archived,
+            "failed": self.failed,
+            "pending": self.pending(),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            self._archive(item)
+
+    def _archive(self, path):
+        try:
+            if self.writer is not None:
+                for written in (path, logindex.index_path(path)):
+                    self.writer.flush(written, wait=True, close=True)
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_lower_priority, initargs=(self.nice,))
+            size, compressed = self._executor.submit(
+                archive.archive, path, self.method, self.cpu_limit).result()
+        except Exception as error:
+            self.failed += 1
+            logger.error("Could not archive {}: {}".format(path, error))
+            return
+        finally:
+            # Done with, so the set only holds the logs waiting or being archived
+            self._submitted.discard(path)
+        self.archived += 1
+        self.bytes_in += size
+        self.bytes_out += compressed
+        logger.info("Archived {}: {} to {} bytes.".format(path, size, compressed))
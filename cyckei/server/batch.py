@@ -0,0 +1,508 @@
+"""Evaluates the step conditions of many channels at once with NumPy.
+
+The ConditionTable keeps the state the conditions of each running step depend on (latest
+measurement, a window of recent measurements, the last and first reported values and the
+thresholds) as one row of a struct-of-arrays table. The scheduler measures every due channel,
+evaluates the end and report conditions of all of them in one pass and dispatches the results
+back to the runners, so the cost per channel stays flat as channel counts grow.
+
+|
+"""
+import logging
+import operator
+import time
+
+import numpy as np
+
+from . import protocols
+from .protocols import STATUS, NEVER
+
+logger = logging.getLogger('cyckei_server')
+
+# Comparison operators of ConditionAbsolute the table supports, and whether they are strict
+UPPER_OPERATORS = {operator.gt: True, operator.ge: False}
+LOWER_OPERATORS = {operator.lt: True, operator.le: False}
+
+NAN = float('nan')
+
+
+def step_thresholds(step):
+    """Collects the condition thresholds of a step into the form stored by the table.
+
+    Only the plain ConditionDelta (report), ConditionAbsolute and ConditionTotalTime (end)
+    conditions created by process_reports() and process_ends() are supported, together
+    with steps using the default ProtocolStep.run().
+
+    Args:
+        step (ProtocolStep): The step to collect thresholds from.
+
+    Returns:
+        dict: Thresholds keyed by table column, None if the step is not supported.
+    |
+    """
+    if type(step).run is not protocols.ProtocolStep.run:
+        return None
+
+    thresholds = {
+        "delta": [NAN] * 4,
+        "upper": [NAN] * 4,
+        "upper_strict": [False] * 4,
+        "lower": [NAN] * 4,
+        "lower_strict": [False] * 4,
+        "min_time": NAN,
+        "total_time": NAN,
+    }
+
+    for condition in step.report_conditions:
+        if type(condition) is not protocols.ConditionDelta:
+            return None
+        # Any of several deltas on a value is met when the smallest is
+        delta = thresholds["delta"]
+        delta[condition.index] = np.fmin(delta[condition.index],
+                                         condition.delta)
+
+    min_times = set()
+    for condition in step.end_conditions:
+        if type(condition) is protocols.ConditionTotalTime:
+            if condition.comparison is not operator.ge:
+                return None
+            thresholds["total_time"] = np.fmin(thresholds["total_time"],
+                                               condition.delta)
+        elif type(condition) is protocols.ConditionAbsolute:
+            if condition.comparison in UPPER_OPERATORS:
+                side = "upper"
+                strict = UPPER_OPERATORS[condition.comparison]
+            elif condition.comparison in LOWER_OPERATORS:
+                side = "lower"
+                strict = LOWER_OPERATORS[condition.comparison]
+            else:
+                return None
+            if not np.isnan(thresholds[side][condition.index]):
+                return None
+            thresholds[side][condition.index] = float(condition.value)
+            thresholds[side + "_strict"][condition.index] = strict
+            min_times.add(condition.min_time)
+        else:
+            return None
+
+    if len(min_times) > 1:
+        return None
+    if min_times:
+        min_time = min_times.pop()
+        thresholds["min_time"] = NAN if min_time is None else min_time
+
+    return thresholds
+
+
+class ConditionTable(object):
+    """Struct-of-arrays state of the running steps of many channels.
+
+    Each runner whose current step is supported (see step_thresholds()) gets a row. Columns
+    indexed by value follow DATA_INDEX_MAP, i.e. [time, current, voltage, capacity], and values
+    that could not be read are stored as NaN.
+
+    Attributes:
+        capacity (int): Number of rows allocated, grown as needed.
+        free (list): Row numbers not in use.
+        loaded (dict): (step, end_conditions, report_conditions, row) of each runner seen,
+            row is None if the step is evaluated by the step itself.
+        tails (list): The last data row pushed into the window of each row.
+        window (int): Number of recent measurements kept for extrapolation.
+    |
+    """
+
+    def __init__(self, capacity=64, window=None):
+        """Inits the arrays with the given number of rows.
+
+        Args:
+            capacity (int, optional): Initial number of rows. Defaults to 64.
+            window (int, optional): Number of recent measurements kept for extrapolation.
+                Defaults to protocols.EXTRAPOLATION_WINDOW.
+        |
+        """
+        self.window = window or protocols.EXTRAPOLATION_WINDOW
+        self.capacity = 0
+        self.free = []
+        self.loaded = {}
+        self.tails = []
+
+        w = self.window
+        self.data = np.empty((0, w, 4))
+        self.head = np.empty(0, dtype=int)
+        self.latest = np.empty((0, 4))
+        self.has_report = np.empty(0, dtype=bool)
+        self.report_last = np.empty((0, 4))
+        self.report_first = np.empty(0)
+        self.pause_time = np.empty(0)
+        self.delta = np.empty((0, 4))
+        self.upper = np.empty((0, 4))
+        self.upper_strict = np.empty((0, 4), dtype=bool)
+        self.lower = np.empty((0, 4))
+        self.lower_strict = np.empty((0, 4), dtype=bool)
+        self.min_time = np.empty(0)
+        self.total_time = np.empty(0)
+
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        """Grows the arrays to the given number of rows.
+
+        Args:
+            capacity (int): The new number of rows.
+        |
+        """
+        extra = capacity - self.capacity
+        if extra <= 0:
+            return
+
+        def grow(array, fill):
+            padding = np.full((extra,) + array.shape[1:], fill,
+                              dtype=array.dtype)
+            return np.concatenate([array, padding])
+
+        self.data = grow(self.data, NAN)
+        self.head = grow(self.head, 0)
+        self.latest = grow(self.latest, NAN)
+        self.has_report = grow(self.has_report, False)
+        self.report_last = grow(self.report_last, NAN)
+        self.report_first = grow(self.report_first, NAN)
+        self.pause_time = grow(self.pause_time, 0.)
+        self.delta = grow(self.delta, NAN)
+        self.upper = grow(self.upper, NAN)
+        self.upper_strict = grow(self.upper_strict, False)
+        self.lower = grow(self.lower, NAN)
+        self.lower_strict = grow(self.lower_strict, False)
+        self.min_time = grow(self.min_time, NAN)
+        self.total_time = grow(self.total_time, NAN)
+
+        self.tails.extend([None] * extra)
+        self.free.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    def row(self, runner):
+        """Returns the row of a runner's current step, loading the step if it changed.
+
+        Args:
+            runner (CellRunner): A started runner.
+
+        Returns:
+            int: The row number, None if the step is not supported by the table.
+        |
+        """
+        step = runner.step
+        loaded = self.loaded.get(runner)
+        if (loaded is not None and loaded[0] is step
+                and loaded[1] is step.end_conditions
+                and loaded[2] is step.report_conditions):
+            return loaded[3]
+
+        if loaded is not None and loaded[3] is not None:
+            self.free.append(loaded[3])
+
+        row = None
+        thresholds = step_thresholds(step)
+        if thresholds is not None:
+            if not self.free:
+                self._allocate(max(2 * self.capacity, 1))
+            row = self.free.pop()
+            for column, values in thresholds.items():
+                getattr(self, column)[row] = values
+            # Fill the window from the step's data on the next update
+            self.tails[row] = None
+            self.head[row] = 0
+            self.data[row] = NAN
+
+        self.loaded[runner] = (step, step.end_conditions,
+                               step.report_conditions, row)
+        return row
+
+    def release(self, runner):
+        """Frees the row of a runner that is no longer running.
+
+        Args:
+            runner (CellRunner): The runner to forget.
+        |
+        """
+        loaded = self.loaded.pop(runner, None)
+        if loaded is not None and loaded[3] is not None:
+            self.tails[loaded[3]] = None
+            self.free.append(loaded[3])
+
+    def update(self, rows, steps):
+        """Copies the latest measurement and reports of each step into its row.
+
+        Args:
+            rows (list): Row numbers.
+            steps (list): The step loaded in each row, each having just measured.
+        |
+        """
+        # None (a failed read) becomes NaN when converted to float arrays
+        latest = []
+        pushed = []
+        has_report = []
+        first = []
+        pause_time = []
+        last_report = []
+        tails = self.tails
+        no_report = [None] * 4
+        for row, step in zip(rows, steps):
+            data = step.data
+            last = data[-1]
+            latest.append(last[:4])
+            pushed.append(len(data) > 1 and tails[row] is data[-2])
+            if not pushed[-1]:
+                self._fill(row, data)
+            tails[row] = last
+
+            report = step.report
+            pause_time.append(step.pause_time)
+            if report:
+                has_report.append(True)
+                first.append(report[0][0])
+                last_report.append(report[-1][:4])
+            else:
+                has_report.append(False)
+                first.append(None)
+                last_report.append(no_report)
+
+        latest = np.array(latest, dtype=float)
+        rows = np.array(rows, dtype=int)
+        self.latest[rows] = latest
+
+        pushed = np.array(pushed, dtype=bool)
+        push = rows[pushed]
+        head = self.head[push]
+        self.data[push, head] = latest[pushed]
+        self.head[push] = (head + 1) % self.window
+
+        self.has_report[rows] = has_report
+        self.report_first[rows] = np.array(first, dtype=float)
+        self.pause_time[rows] = pause_time
+        self.report_last[rows] = np.array(last_report, dtype=float)
+
+    def _fill(self, row, data):
+        """Replaces the window of a row with the most recent rows of data.
+
+        Args:
+            row (int): Row number.
+            data (list): The step's data.
+        |
+        """
+        recent = data[-self.window:]
+        self.data[row] = NAN
+        self.data[row, :len(recent)] = np.array(
+            [entry[:4] for entry in recent], dtype=float)
+        self.head[row] = len(recent) % self.window
+
+    def trends(self, rows):
+        """Fits least-squares trends to the window of every row, as protocols.fit_trend() does.
+
+        Args:
+            rows (numpy.ndarray): Row numbers.
+
+        Returns:
+            tuple: (t_ref, v_ref, slope, slope_error, ok) arrays of shape (len(rows), 4),
+                ok is False where no trend could be fitted.
+        |
+        """
+        w = self.window
+        # Chronological order of each ring buffer, oldest first
+        order = (self.head[rows, None] + np.arange(w)) % w
+        window = self.data[rows[:, None], order]
+        times = window[:, :, :1]
+        valid = ~np.isnan(window) & ~np.isnan(times)
+
+        # The reference is the latest valid point of each value
+        last = w - 1 - np.argmax(valid[:, ::-1], axis=1)
+        t_ref = np.take_along_axis(np.broadcast_to(times, window.shape),
+                                   last[:, None], axis=1)[:, 0]
+        v_ref = np.take_along_axis(window, last[:, None], axis=1)[:, 0]
+
+        t = np.where(valid, times - t_ref[:, None], 0.)
+        v = np.where(valid, window - v_ref[:, None], 0.)
+        n = valid.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s_t = t.sum(axis=1)
+            s_v = v.sum(axis=1)
+            s_tt = (t * t).sum(axis=1) - s_t * s_t / n
+            s_tv = (t * v).sum(axis=1) - s_t * s_v / n
+            slope = s_tv / s_tt
+            residual = (v * v).sum(axis=1) - s_v * s_v / n - slope * s_tv
+            slope_error = np.where(
+                (n > 2) & (residual > 0.),
+                np.sqrt(np.maximum(residual, 0.) / (n - 2) / s_tt), 0.)
+        ok = (n >= 2) & (s_tt > 0.)
+        return t_ref, v_ref, slope, slope_error, ok
+
+    @staticmethod
+    def project(trend, k, target):
+        """Vectorized protocols.project_time() for column k of the trends.
+
+        Args:
+            trend (tuple): The result of trends().
+            k (int): The value column.
+            target (numpy.ndarray): Target value of each row.
+
+        Returns:
+            numpy.ndarray: When each row will reach its target, NEVER where it cannot be estimated.
+        |
+        """
+        t_ref, v_ref, slope, slope_error, ok = (x[:, k] for x in trend)
+        gap = target - v_ref
+        confidence = protocols.EXTRAPOLATION_CONFIDENCE
+        approach = np.where(gap > 0, slope, -slope) + confidence * slope_error
+        with np.errstate(divide="ignore", invalid="ignore"):
+            projected = np.where(approach > 0., t_ref + np.abs(gap) / approach,
+                                 NEVER)
+        projected = np.where(gap == 0., t_ref, projected)
+        return np.where(ok & ~np.isnan(target), projected, NEVER)
+
+    def evaluate(self, rows, now):
+        """Evaluates the end and report conditions of the given rows.
+
+        Matches the compiled conditions of protocols.ConditionDelta, ConditionAbsolute and
+        ConditionTotalTime.
+
+        Args:
+            rows (numpy.ndarray): Row numbers.
+            now (float): The current timestamp.
+
+        Returns:
+            tuple: (end_met, end_next_time, report_met, report_next_time) arrays.
+        |
+        """
+        trend = self.trends(rows)
+        slope = trend[2]
+        latest = self.latest[rows]
+        has_report = self.has_report[rows]
+        report_last = self.report_last[rows]
+        report_first = self.report_first[rows]
+        pause_time = self.pause_time[rows]
+        never = np.full(len(rows), NEVER)
+
+        # Report conditions, all deltas
+        delta = self.delta[rows]
+        first_report = ~has_report & ~np.isnan(delta).all(axis=1)
+        report_met = first_report.copy()
+        report_next = np.where(first_report, now, never)
+
+        valid = has_report & ~np.isnan(delta[:, 0])
+        elapsed = np.abs(now - report_last[:, 0])
+        report_met |= valid & (elapsed >= delta[:, 0])
+        report_next = np.fmin(report_next, np.where(
+            valid, delta[:, 0] - elapsed + pause_time + now, never))
+
+        for k in (1, 2, 3):
+            value = latest[:, k]
+            reference = report_last[:, k]
+            valid = (has_report & ~np.isnan(delta[:, k])
+                     & ~np.isnan(value) & ~np.isnan(reference))
+            if not valid.any():
+                continue
+            met = valid & (np.abs(value - reference) >= delta[:, k])
+            report_met |= met
+            # A met point is about to be reported
+            reference = np.where(met, value, reference)
+            target = reference + np.copysign(delta[:, k], slope[:, k])
+            report_next = np.fmin(report_next, np.where(
+                valid, self.project(trend, k, target), never))
+
+        # End conditions, absolute limits and total time
+        min_time = self.min_time[rows]
+        execute = np.isnan(min_time) | (
+            has_report & (latest[:, 0] - report_first > min_time))
+        end_met = np.zeros(len(rows), dtype=bool)
+        end_next = never.copy()
+        for limits, strict, compare, compare_strict in (
+                (self.upper, self.upper_strict, np.greater_equal, np.greater),
+                (self.lower, self.lower_strict, np.less_equal, np.less)):
+            limits = limits[rows]
+            strict = strict[rows]
+            for k in range(4):
+                limit = limits[:, k]
+                value = latest[:, k]
+                valid = execute & ~np.isnan(limit) & ~np.isnan(value)
+                if not valid.any():
+                    continue
+                met = valid & np.where(strict[:, k],
+                                       compare_strict(value, limit),
+                                       compare(value, limit))
+                end_met |= met
+                end_next = np.fmin(end_next, np.where(
+                    valid & ~met, self.project(trend, k, limit), never))
+
+        total_time = self.total_time[rows]
+        valid = has_report & ~np.isnan(total_time)
+        elapsed = np.abs(now - report_first) - pause_time
+        met = valid & (elapsed >= total_time)
+        end_met |= met
+        end_next = np.fmin(end_next, np.where(
+            valid & ~met, total_time - elapsed + now, never))
+
+        return end_met, end_next, report_met, report_next
+
+    def run(self, runners, now=None):
+        """Runs every started runner that is due, evaluating supported steps together.
+
+        Due runners are measured one after the other, their conditions are evaluated in one
+        pass and the outcome is then dispatched to each runner as CellRunner.run() would.
+        Runners with unsupported steps are simply run.
+
+        Args:
+            runners (list): CellRunner objects, pending runners are skipped.
+            now (float, optional): Time used to decide which runners are due. Defaults to the clock.
+
+        Returns:
+            int: The number of runners run.
+        |
+        """
+        if now is None:
+            now = time.time()
+
+        if len(self.loaded) > len(runners):
+            for runner in set(self.loaded) - set(runners):
+                self.release(runner)
+
+        count = 0
+        batch = []
+        for runner in runners:
+            if runner.status != STATUS.started or runner.next_time > now:
+                continue
+            count += 1
+            row = self.row(runner)
+            if row is None:
+                runner.run()
+            elif runner.prepare():
+                step = runner.step
+                if step.measure():
+                    batch.append((runner, step, row))
+                else:
+                    runner.record(None)
+                    runner.advance()
+
+        if batch:
+            runners_run, steps, rows = zip(*batch)
+            self.update(rows, steps)
+            now = time.time()
+            end_met, end_next, report_met, report_next = self.evaluate(
+                np.array(rows, dtype=int), now)
+            for runner, step, end, end_time, report, report_time in zip(
+                    runners_run, steps, end_met.tolist(), end_next.tolist(),
+                    report_met.tolist(), report_next.tolist()):
+                if end:
+                    step.status = STATUS.completed
+                if (step.status == STATUS.completed
+                        or step.status == STATUS.nocontrol):
+                    report = True
+                elif step.compressor is not None:
+                    report = False
+                elif report_time < end_time:
+                    end_time = report_time
+                if end_time < step.next_time:
+                    step.next_time = end_time
+                runner.record(step.conclude(report))
+                runner.advance()
+                if runner.status == STATUS.completed:
+                    self.release(runner)
+
+        return count
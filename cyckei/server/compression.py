@@ -0,0 +1,199 @@
+"""Error-bounded compression of the data points reported by a protocol step.
+
+Instead of writing a point whenever a value moved by a fixed delta, a SwingingDoor only
+writes the points needed to redraw the measured curve, by linear interpolation between
+written points, within a tolerance of every measured point. A cell crawling up a plateau
+then takes a handful of rows instead of one per millivolt, while knees keep their detail.
+
+Each compressed value keeps a "door", the range of slopes from the last written point
+(the anchor) that pass within tolerance of every measurement since. A new measurement is
+held back as long as the line from the anchor to it stays inside the doors of the
+measurements before it. Once it does not, the previous measurement is written and
+becomes the anchor. Unlike the classic swinging door algorithm the written line is
+checked, rather than the doors only, so the tolerance is a hard bound.
+
+|
+"""
+
+TOLERANCE_INDEX_MAP = {
+    "current": 1,
+    "voltage": 2,
+    "capacity": 3
+}
+
+
+def parse_tolerance(tolerance):
+    """Checks a tolerance mapping and converts it to data column indices.
+
+    Args:
+        tolerance (dict): Largest interpolation error allowed by value name, any of
+            "current" (A), "voltage" (V) and "capacity" (mAh), and optionally "time", the
+            largest number of seconds between written points.
+
+    Raises:
+        ValueError: If a name is unknown, a value is not a positive number or no value
+            is compressed.
+
+    Returns:
+        tuple: ({column index: tolerance}, max interval in seconds or None).
+    |
+    """
+    columns = {}
+    max_interval = None
+    for key, value in tolerance.items():
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError("tolerance of {} should be a number, got {!r}".format(
+                key, value))
+        if not value > 0:
+            raise ValueError("tolerance of {} should be positive, got {}".format(
+                key, value))
+        if key == "time":
+            max_interval = value
+        elif key in TOLERANCE_INDEX_MAP:
+            columns[TOLERANCE_INDEX_MAP[key]] = value
+        else:
+            raise ValueError("unknown tolerance {}, must be one of {}".format(
+                key, ["time"] + list(TOLERANCE_INDEX_MAP)))
+    if not columns:
+        raise ValueError("tolerance should include at least one of {}".format(
+            list(TOLERANCE_INDEX_MAP)))
+    return columns, max_interval
+
+
+class SwingingDoor(object):
+    """Decides which data points of a step to write, within a tolerance.
+
+    Points are rows as stored in ProtocolStep.data, [time, current, voltage, capacity,
+    plugin values]. Plugin values are not compressed and may be lost in between written
+    points. A point missing a compressed value is always written, along with the point
+    held before it.
+
+    Attributes:
+        anchor (list): The last point written, None before the first point.
+        candidate (list): The latest point, held back until it is known whether it is
+            needed, None if there is none.
+        columns (dict): The tolerance of each compressed column by data index.
+        doors (dict): The (lowest, highest) slope from the anchor passing within tolerance
+            of every point between the anchor and the candidate, by data index.
+        max_interval (float): Largest number of seconds between written points, None for
+            no limit.
+    |
+    """
+
+    def __init__(self, tolerance):
+        """Inits the compressor without any point.
+
+        Args:
+            tolerance (dict): See parse_tolerance().
+        |
+        """
+        self.columns, self.max_interval = parse_tolerance(tolerance)
+        self.anchor = None
+        self.candidate = None
+        self.doors = {}
+
+    def _door(self, point, index):
+        """Returns the range of slopes from the anchor within tolerance of a point.
+
+        |
+        """
+        span = point[0] - self.anchor[0]
+        offset = point[index] - self.anchor[index]
+        tolerance = self.columns[index]
+        return (offset - tolerance) / span, (offset + tolerance) / span
+
+    def _fits(self, point, doors):
+        """Checks that the line from the anchor to a point fits doors.
+
+        |
+        """
+        span = point[0] - self.anchor[0]
+        if span <= 0:
+            return False
+        for index, (low, high) in doors.items():
+            slope = (point[index] - self.anchor[index]) / span
+            if not low <= slope <= high:
+                return False
+        return True
+
+    def _complete(self, point):
+        return all(point[index] is not None for index in self.columns)
+
+    def _restart(self, anchor):
+        self.anchor = anchor
+        self.candidate = None
+        self.doors = {}
+
+    def _skips_candidate(self, point):
+        """Checks whether the candidate can be dropped for a line from the anchor to a point.
+
+        Narrows the doors to the candidate, which the line has to fit as well.
+        |
+        """
+        if self.max_interval is not None \
+                and point[0] - self.anchor[0] > self.max_interval:
+            return False
+        doors = {}
+        for index in self.columns:
+            low, high = self._door(self.candidate, index)
+            if index in self.doors:
+                low = max(low, self.doors[index][0])
+                high = min(high, self.doors[index][1])
+            doors[index] = (low, high)
+        if not self._fits(point, doors):
+            return False
+        self.doors = doors
+        return True
+
+    def add(self, point):
+        """Adds a measured point.
+
+        Args:
+            point (list): The measurement.
+
+        Returns:
+            list: The points to write now, in order, usually none.
+        |
+        """
+        if self.anchor is None or not self._complete(point) \
+                or not self._complete(self.anchor) \
+                or point[0] <= self.anchor[0]:
+            return self.flush(point)
+
+        if self.candidate is None:
+            self.candidate = point
+            return []
+
+        if self._skips_candidate(point):
+            self.candidate = point
+            return []
+
+        # The line to the held point fitted the doors before it, write it
+        written = self.candidate
+        self._restart(written)
+        self.candidate = point
+        return [written]
+
+    def flush(self, point):
+        """Writes a point regardless of tolerance, along with the one held before it if needed.
+
+        Used for the first and last points of a step and for forced reports.
+
+        Args:
+            point (list): The measurement.
+
+        Returns:
+            list: The points to write now, in order.
+        |
+        """
+        written = []
+        if self.candidate is not None and self.candidate is not point \
+                and not (self._complete(point)
+                         and self._skips_candidate(point)):
+            written.append(self.candidate)
+        if self.anchor is not point:
+            written.append(point)
+        self._restart(point)
+        return written
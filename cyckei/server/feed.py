@@ -0,0 +1,155 @@
+"""Versioned deltas of the channel status shown by clients, pushed and polled.
+
+Clients used to fetch every channel with info_all_channels on a timer, whether anything
+changed or not. The main loop now hands each snapshot to StatusFeed.update(), which keeps
+the FIELDS of every channel and bumps a version number whenever one of them changes. The
+changed fields are published on a zmq PUB socket as one message:
+
+    {"epoch": ..., "version": 12, "previous": 11, "channels": {"1": {"voltage": 3.71}}}
+
+and a message with "channels" empty is sent every HEARTBEAT seconds when nothing changes.
+A subscriber that sees "previous" differ from the last version it applied, or that hears
+nothing for a while, asks changes() for what changed since its version instead. The epoch
+is new every time the server starts, so versions from another run get a full snapshot.
+
+|
+"""
+import json
+import logging
+import time
+import uuid
+
+import zmq
+
+logger = logging.getLogger('cyckei_server')
+
+TOPIC = b"status"
+FIELDS = ("path", "cellid", "comment", "protocol_name", "status", "state", "current",
+          "voltage", "cycle")
+HEARTBEAT = 5.0  # Seconds between messages when nothing changes
+
+
+class StatusFeed(object):
+    """Keeps the versioned status of the channels and publishes what changes.
+
+    Attributes:
+        epoch (str): Identifies this run of the server.
+        heartbeat (float): Seconds between messages when nothing changes.
+        published (int): Number of messages published.
+        version (int): Number of snapshots that changed a field.
+    |
+    """
+
+    def __init__(self, address=None, heartbeat=HEARTBEAT, context=None):
+        """Inits the feed, binding the PUB socket if given an address.
+
+        Args:
+            address (str, optional): The zmq address to publish on, e.g. "tcp://*:5557".
+                Defaults to None to only answer changes().
+            context (zmq.Context, optional): Defaults to None for the process-wide one.
+            heartbeat (float, optional): Seconds between messages when nothing changes.
+                Defaults to HEARTBEAT.
+        |
+        """
+        self.epoch = uuid.uuid4().hex
+        self.version = 0
+        self.heartbeat = heartbeat
+        self.published = 0
+        # Per channel, the fields and the version each last changed in
+        self._fields = {}
+        self._versions = {}
+        self._last_publish = 0.
+        self._socket = None
+        if address is not None:
+            context = context or zmq.Context.instance()
+            socket = context.socket(zmq.PUB)
+            socket.setsockopt(zmq.LINGER, 0)
+            try:
+                socket.bind(address)
+            except zmq.ZMQError as error:
+                logger.warning("Cannot publish status on {}, clients will poll: {}".format(
+                    address, error))
+                socket.close()
+            else:
+                self._socket = socket
+
+    def update(self, channels):
+        """Records a snapshot of the channels and publishes the fields that changed.
+
+        Args:
+            channels (dict): The info of every channel by channel, as from
+                server.info_all_channels().
+
+        Returns:
+            dict: The changed fields by channel, empty if none.
+        |
+        """
+        delta = {}
+        for channel, info in channels.items():
+            channel = str(channel)
+            fields = self._fields.setdefault(channel, {})
+            changed = {field: info.get(field) for field in FIELDS
+                       if field not in fields or fields[field] != info.get(field)}
+            if changed:
+                delta[channel] = changed
+        if delta:
+            self.version += 1
+            for channel, changed in delta.items():
+                self._fields[channel].update(changed)
+                versions = self._versions.setdefault(channel, {})
+                for field in changed:
+                    versions[field] = self.version
+            self._publish(self.version - 1, delta)
+        elif time.time() - self._last_publish >= self.heartbeat:
+            self._publish(self.version, {})
+        return delta
+
+    def changes(self, since=None, epoch=None):
+        """Returns the fields changed since a version, every field if it is unknown.
+
+        Args:
+            epoch (str, optional): The epoch the version is from. Defaults to None.
+            since (int, optional): The last version the client applied. Defaults to None
+                for every field.
+
+        Returns:
+            dict: "epoch", "version", "full", True if every field is included, and
+                "channels", the fields by channel.
+        |
+        """
+        full = since is None or epoch != self.epoch or since > self.version
+        channels = {}
+        for channel, fields in self._fields.items():
+            if full:
+                changed = dict(fields)
+            else:
+                versions = self._versions[channel]
+                changed = {field: value for field, value in fields.items()
+                           if versions[field] > since}
+            if changed:
+                channels[channel] = changed
+        return {"epoch": self.epoch, "version": self.version, "full": full,
+                "channels": channels}
+
+    def close(self):
+        """Closes the PUB socket.
+
+        |
+        """
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def _publish(self, previous, delta):
+        if self._socket is None:
+            return
+        message = {"epoch": self.epoch, "version": self.version, "previous": previous,
+                   "channels": delta}
+        try:
+            self._socket.send_multipart([TOPIC, json.dumps(message).encode()],
+                                        zmq.NOBLOCK)
+        except zmq.ZMQError as error:
+            logger.debug("Could not publish status: {}".format(error))
+            return
+        self.published += 1
+        self._last_publish = time.time()
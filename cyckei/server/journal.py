@@ -0,0 +1,234 @@
+"""Append-only journal of runner checkpoints, to continue tests after a restart.
+
+Without it every running test is lost when the server process dies. The main loop hands
+its runners to Journal.record(), which appends one JSON line per event:
+
+    {"kind": "start", "channel": "1", "path": ..., "format": "text", "meta": {...}}
+    {"kind": "checkpoint", "channel": "1", "path": ..., "state": {...}}
+    {"kind": "end", "channel": "1", "path": ...}
+
+"start" is written when a runner is first seen, with the protocol as "protocol" if the
+meta data does not hold it, "checkpoint" with CellRunner.checkpoint() every
+CHECKPOINT_INTERVAL seconds and whenever the runner moves on to another step or cycle or
+is paused or resumed, and "end" once the runner is gone or lost control. The
+journal is rewritten with only the latest lines of the live runners once it grows past
+COMPACT_SIZE, and is read back by recover() when the server is started with --resume.
+
+A torn last line, as left by a crash while appending, is ignored.
+
+|
+"""
+import json
+import logging
+import os
+import time
+
+from .protocols import STATUS, CellRunner
+
+logger = logging.getLogger('cyckei_server')
+
+FILE_NAME = "runners.journal"
+CHECKPOINT_INTERVAL = 10.0  # Seconds between checkpoints of a runner
+COMPACT_SIZE = 4 * 1024 * 1024  # Bytes after which the journal is rewritten
+
+LIVE = (STATUS.started, STATUS.paused)
+
+
+def read(path):
+    """Reads the runners still live at the end of a journal.
+
+    Args:
+        path (str): The journal file.
+
+    Returns:
+        dict: The "start" line of every live runner by channel, with its latest "checkpoint"
+            line as "checkpoint", None if none was written.
+    |
+    """
+    live = {}
+    try:
+        file = open(path)
+    except IOError:
+        return live
+    with file:
+        for number, line in enumerate(file):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                logger.warning("Skipping unreadable line {} of {}.".format(
+                    number + 1, path))
+                continue
+            channel = entry["channel"]
+            if entry["kind"] == "start":
+                live[channel] = dict(entry, checkpoint=None)
+            elif channel in live and live[channel]["path"] == entry["path"]:
+                if entry["kind"] == "checkpoint":
+                    live[channel]["checkpoint"] = entry
+                elif entry["kind"] == "end":
+                    del live[channel]
+    return live
+
+
+class Journal(object):
+    """Appends checkpoints of runners to a journal file.
+
+    Attributes:
+        checkpoints (int): Number of checkpoints written.
+        compact_size (int): Bytes after which the journal is rewritten.
+        interval (float): Seconds between checkpoints of a runner.
+        path (str): The journal file.
+    |
+    """
+
+    def __init__(self, path, interval=CHECKPOINT_INTERVAL, compact_size=COMPACT_SIZE):
+        """Opens the journal, keeping the runners already in it.
+
+        Args:
+            compact_size (int, optional): Bytes after which the journal is rewritten.
+                Defaults to COMPACT_SIZE.
+            interval (float, optional): Seconds between checkpoints of a runner. Defaults
+                to CHECKPOINT_INTERVAL.
+            path (str): The journal file.
+        |
+        """
+        self.path = path
+        self.interval = interval
+        self.compact_size = compact_size
+        self.checkpoints = 0
+        # Per channel, the path, time and (step, cycle, status) of the last checkpoint
+        self._tracked = {}
+        self._lines = {}
+        self._file = None
+        self._compact(read(path))
+
+    def recover(self, sources, plugin_objects=None, writer=None):
+        """Rebuilds the live runners of the journal, continuing their tests.
+
+        Args:
+            plugin_objects (list, optional): The PluginControllers of the server. Defaults to None.
+            sources (list): The sources of the server, a runner whose channel has none is
+                left out.
+            writer (writer.DataWriter, optional): Writes the data files of the runners.
+                Defaults to None.
+
+        Returns:
+            list: The restored CellRunners.
+        |
+        """
+        runners = []
+        sources = {str(source.channel): source for source in sources}
+        for channel, entry in read(self.path).items():
+            source = sources.get(channel)
+            if source is None:
+                logger.error("Cannot resume channel {}, it has no source.".format(channel))
+                continue
+            if entry["checkpoint"] is None:
+                logger.error("Cannot resume channel {}, it was never checkpointed.".format(
+                    channel))
+                continue
+            try:
+                runner = CellRunner(plugin_objects,
+                                    **dict(entry["meta"], format=entry["format"]))
+                runner.meta.update(entry["meta"])
+                runner.writer = writer
+                runner.set_source(source)
+                runner.load_protocol(entry.get("protocol", entry["meta"]["protocol"]))
+                runner.restore(entry["checkpoint"]["state"])
+            except Exception as error:
+                logger.error("Cannot resume channel {}: {}".format(channel, error))
+                continue
+            logger.info("Resumed channel {} at step {} of cycle {}.".format(
+                channel, runner.i_current_step, runner.cycle))
+            runners.append(runner)
+        return runners
+
+    def clear(self):
+        """Forgets every runner in the journal.
+
+        |
+        """
+        self._compact({})
+
+    def record(self, runners):
+        """Writes the checkpoints that are due and ends the runners that are gone.
+
+        Args:
+            runners (list): The runners of the server.
+        |
+        """
+        now = time.time()
+        lines = []
+        seen = set()
+        for runner in runners:
+            if runner.status not in LIVE or runner.step is None:
+                continue
+            channel = runner.channel
+            seen.add(channel)
+            tracked = self._tracked.get(channel)
+            key = (runner.i_current_step, runner.cycle, runner.status)
+            if tracked is None or tracked[0] != runner.fpath:
+                entry = {"kind": "start", "channel": channel, "path": runner.fpath,
+                         "format": runner.file_format, "meta": runner.meta}
+                if runner.protocol != runner.meta["protocol"]:
+                    entry["protocol"] = runner.protocol
+                lines.append(self._line(entry))
+            elif tracked[2] == key and now - tracked[1] < self.interval:
+                continue
+            entry = {"kind": "checkpoint", "channel": channel, "path": runner.fpath,
+                     "state": runner.checkpoint()}
+            lines.append(self._line(entry))
+            self._tracked[channel] = (runner.fpath, now, key)
+            self.checkpoints += 1
+        # Runners gone since the last call, or never resumed from the journal
+        for channel in [channel for channel in self._lines if channel not in seen]:
+            self._tracked.pop(channel, None)
+            path = self._lines.pop(channel)["path"]
+            lines.append(json.dumps({"kind": "end", "channel": channel, "path": path})
+                         + "\n")
+
+        if lines:
+            self._file.write("".join(lines))
+            self._file.flush()
+            if self._file.tell() > self.compact_size:
+                self._compact(None)
+
+    def close(self):
+        """Closes the journal file, the runners in it stay live.
+
+        |
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _line(self, entry):
+        line = json.dumps(entry) + "\n"
+        if entry["kind"] == "start":
+            self._lines[entry["channel"]] = {"path": entry["path"]}
+        self._lines[entry["channel"]][entry["kind"]] = line
+        return line
+
+    def _compact(self, live):
+        """Rewrites the journal with the latest lines of the live runners.
+
+        Args:
+            live (dict): The runners as returned by read(), None for those recorded.
+        |
+        """
+        if live is not None:
+            self._lines = {}
+            for channel, entry in live.items():
+                checkpoint = entry.pop("checkpoint")
+                self._lines[channel] = {"path": entry["path"],
+                                        "start": json.dumps(entry) + "\n"}
+                if checkpoint is not None:
+                    self._lines[channel]["checkpoint"] = json.dumps(checkpoint) + "\n"
+        self.close()
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as file:
+            for lines in self._lines.values():
+                file.write(lines["start"] + lines.get("checkpoint", ""))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path)
+        self._file = open(self.path, "a")
@@ -3,8 +3,6 @@
 import logging
 import time
 
-import pyvisa as visa
-
 from cyckei.functions import func
 
 logger = logging.getLogger('cyckei_server')
@@ -31,6 +29,29 @@ def parse_gpib_address(gpib_address):
 
     return full_address
 
+def clean_iv(current, voltage):
+    """Zeroes the out of range and noise level readings of the Keithley.
+
+    The Keithley will report totally out of range numbers like 9.91e+37
+    if asked to e.g. charge to 3.9V when the cell is already at 4.2V
+    It is basically its way of saying the condition cannot be achieved
+    The actual current sent is 0.0 A.
+
+    Args:
+        current (float): The current read, in Amps.
+        voltage (float): The voltage read, in Volts.
+
+    Returns:
+        (float, float): The (current, voltage) as a tuple.
+    |
+    """
+    if abs(current) > 1.0e10 or abs(current) < 1.0e-8:
+        current = 0.0
+    if abs(voltage) < 5.0e-4:
+        voltage = 0.0
+    return current, voltage
+
+
 def with_safety(fn):
     """Wrapper function for the Source class to enforce the use of a safety script
     
@@ -77,29 +98,35 @@ class DeviceController(object):
                       100e-6, 1e-3, 0.01,
                       0.1, 1.0, 3.0]
 
-    def __init__(self, gpib_addr, load_scripts=True, safety_reset_seconds=120):
+    def __init__(self, gpib_addr, load_scripts=True, safety_reset_seconds=120,
+                 reset=True):
         """Inits Device Controller with gpib_addr, safety_reset_seconds, and
         source_meter. 
 
-        Also resets the source meter and initializes it with either a startup
-        scrip or a safety shut off script.
+        Also resets the source meter, unless asked not to, and initializes it with either
+        a startup scrip or a safety shut off script.
 
         Args:
             gpib_addr (int or str): Either the int part of the GPIB address or the full
                 GPIB address as a str.
             load_scripts (bool, optional): Defaults to True. Whether the source should be
                 able to load scripts.
+            reset (bool, optional): Defaults to True. Whether to reset the source meter,
+                which turns its outputs off. Tests resumed after a restart need them on.
             safety_reset_seconds (int, optional): How many seconds the Keithley can go without being
                 checked before being shut off.
         |
         """
+        # Imported here, so importing the server does not pay for pyvisa
+        import pyvisa as visa
         resource_manager = visa.ResourceManager()
         self.gpib_addr = gpib_addr
         self.source_meter = resource_manager.open_resource(
             parse_gpib_address(gpib_addr), timeout = 5000)
         # TODO do not reset? Do something else, clear buffers I think
         self.source_meter.write("abort")
-        self.source_meter.write("reset()")
+        if reset:
+            self.source_meter.write("reset()")
         if load_scripts:
             logger.info(f'Initializing device at address {gpib_addr}')
             self.source_meter.write(self.script_startup)
@@ -380,15 +407,57 @@ smu{ch}.source.output = smu{ch}.OUTPUT_ON"""
             return None, None
 
         logger.debug(f'Current: {current}, Voltage: {voltage}')
-        # The Keithley will report totally out of range numbers like 9.91e+37
-        # if asked to e.g. charge to 3.9V when the cell is already at 4.2V
-        # It is basically its way of saying the condition cannot be achieved
-        # The actual current sent is 0.0 A.
-        if abs(current) > 1.0e10 or abs(current) < 1.0e-8:
-            current = 0.0
-        if abs(voltage) < 5.0e-4:
-            voltage = 0.0
-        return current, voltage
+        return clean_iv(current, voltage)
+
+    @staticmethod
+    def measure_many(sources, v_limit=5.0):
+        """Reads the current and voltage of idle sources with their outputs off.
+
+        Each source is switched off to source 0 A, measured and left in high
+        impedance off mode, as off() does. The sources of a Keithley are all read by
+        one script and one query, instead of a write and two queries each.
+
+        Args:
+            sources (list): The Source objects to read, none of them running a test.
+            v_limit (float, optional): Voltage limit while measuring. Defaults to 5.0.
+
+        Returns:
+            list: The (current, voltage) of every source, in order, (None, None) for
+                the sources of a Keithley that could not be read.
+        |
+        """
+        readings = {}
+        instruments = {}
+        for source in sources:
+            instruments.setdefault(id(source.source_meter), []).append(source)
+
+        for group in instruments.values():
+            source_meter = group[0].source_meter
+            script = []
+            names = []
+            for source in group:
+                smu = source.identification
+                script += [f"{smu}.source.output = {smu}.OUTPUT_OFF",
+                           f"{smu}.source.offfunc = {smu}.OUTPUT_DCAMPS",
+                           f"{smu}.source.offlimitv = {v_limit}",
+                           f"{smu}.source.offmode = {smu}.OUTPUT_NORMAL",
+                           f"i{source.kch}, v{source.kch} = {smu}.measure.iv()",
+                           f"{smu}.source.offmode = {smu}.OUTPUT_HIGH_Z"]
+                names += [f"i{source.kch}", f"v{source.kch}"]
+            try:
+                source_meter.write('abort')
+                source_meter.write('errorqueue.clear()')
+                source_meter.write("\n".join(script))
+                values = [float(value) for value in source_meter.query(
+                    "print({})".format(", ".join(names))).split()]
+                for source in group:
+                    index = names.index(f"i{source.kch}")
+                    readings[source] = clean_iv(values[index], values[index + 1])
+                source_meter.write(f'safetycutoff({group[0].safety_reset_seconds})')
+            except Exception as error:
+                logger.warning(f"Could not measure device: {error}")
+
+        return [readings.get(source, (None, None)) for source in sources]
 
     @with_safety
     def read_data(self):
@@ -3,42 +3,30 @@
 |
 """
 import json
+import math
 import time
 from datetime import datetime
-import operator
 import logging
+import os
 from typing import Type
 
+from .compression import SwingingDoor, parse_tolerance
+from .recent import RecentWindow
+from .writer import HANDLES
+from cyckei.functions import binlog, logindex, npystore
+# The rules of the protocol language, shared with the client's check of protocols
+from cyckei.functions.validator import (OPERATOR_MAP, DATA_INDEX_MAP, MIN_WAIT_TIME,
+                                        time_conversion)
+
 logger = logging.getLogger('cyckei_server')
 
 
 DATETIME_FORMAT = '%Y-%m-%d_%H:%M:%S.%f'
 NEVER = float('inf')
-MIN_WAIT_TIME = 1.0  # Minimum number of seconds between I/V measurements
-
-OPERATOR_MAP = {
-    "<": operator.lt,
-    "<=": operator.le,
-    "=<": operator.le,
-    "==": operator.eq,
-    "!=": operator.ne,
-    "=!": operator.ne,
-    ">=": operator.ge,
-    "=>": operator.ge,
-    ">": operator.gt,
-    "lt": operator.lt,
-    "le": operator.le,
-    "eq": operator.eq,
-    "ne": operator.ne,
-    "ge": operator.ge,
-    "gt": operator.gt}
-
-DATA_INDEX_MAP = {
-    "time": 0,
-    "current": 1,
-    "voltage": 2,
-    "capacity": 3
-}
+FILE_FORMATS = binlog.FILE_FORMATS + ("npy",)
+EXTRAPOLATION_WINDOW = 8  # Number of recent samples used to fit a trend
+EXTRAPOLATION_CONFIDENCE = 2.0  # Standard errors of slope allowed for when extrapolating
+ADAPTIVE_FRACTION = 1.0  # Fraction of a report delta the signal may move between adaptive reads
 
 DATA_NAME_MAP = {v: k for (k, v) in DATA_INDEX_MAP.items()}
 
@@ -66,6 +54,250 @@ STATUS.string_map = {
 }
 
 
+class StepStats(object):
+    """Running statistics of the measurements taken during a ProtocolStep.
+
+    Every sample updates the statistics in constant time and memory, so they stay cheap
+    however long a step runs. Capacity and energy are integrated with the trapezoidal
+    rule using the absolute current, like the capacity column of the data file.
+
+    Attributes:
+        capacity (float): Charge passed in mAh.
+        count (int): Number of samples with both current and voltage available.
+        current_max (float): Highest absolute current in A, None before the first sample.
+        current_min (float): Lowest absolute current in A, None before the first sample.
+        end_time (float): Epoch time in seconds of the latest sample, None before the first one.
+        energy (float): Energy passed in Wh.
+        start_time (float): Epoch time in seconds of the first sample, None before the first one.
+        voltage_max (float): Highest voltage in V, None before the first sample.
+        voltage_min (float): Lowest voltage in V, None before the first sample.
+    |
+    """
+
+    def __init__(self):
+        """Inits all the statistics to those of an empty series.
+
+        |
+        """
+        self.count = 0
+        self.start_time = None
+        self.end_time = None
+        self.capacity = 0.0
+        self.energy = 0.0
+        self.current_min = None
+        self.current_max = None
+        self.voltage_min = None
+        self.voltage_max = None
+        # (time, current, voltage) of the previous sample to integrate from
+        self._last = None
+
+    def add(self, timestamp, current, voltage):
+        """Adds a sample to the statistics.
+
+        Samples where the current or the voltage could not be read are ignored.
+
+        Args:
+            current (float): Measured current in A, its sign is ignored.
+            timestamp (float): Epoch time in seconds of the measurement.
+            voltage (float): Measured voltage in V.
+        |
+        """
+        if current is None or voltage is None:
+            return
+        current = abs(current)
+
+        if self._last is not None:
+            last_time, last_current, last_voltage = self._last
+            dt = timestamp - last_time
+            self.capacity += dt * (last_current + current) / 2.0 / 3.6
+            self.energy += (dt * (last_current * last_voltage + current * voltage)
+                            / 2.0 / 3600.)
+        self._last = (timestamp, current, voltage)
+
+        if self.count == 0:
+            self.start_time = timestamp
+            self.current_min = self.current_max = current
+            self.voltage_min = self.voltage_max = voltage
+        else:
+            self.current_min = min(self.current_min, current)
+            self.current_max = max(self.current_max, current)
+            self.voltage_min = min(self.voltage_min, voltage)
+            self.voltage_max = max(self.voltage_max, voltage)
+        self.end_time = timestamp
+        self.count += 1
+
+    def interrupt(self):
+        """Stops integrating across the gap before the next sample, e.g. during a pause.
+
+        |
+        """
+        self._last = None
+
+    def merge(self, other):
+        """Adds the statistics of another, already finished, series of samples.
+
+        Args:
+            other (StepStats): The statistics to add to these.
+        |
+        """
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.start_time = other.start_time
+            self.end_time = other.end_time
+            self.current_min = other.current_min
+            self.current_max = other.current_max
+            self.voltage_min = other.voltage_min
+            self.voltage_max = other.voltage_max
+        else:
+            self.start_time = min(self.start_time, other.start_time)
+            self.end_time = max(self.end_time, other.end_time)
+            self.current_min = min(self.current_min, other.current_min)
+            self.current_max = max(self.current_max, other.current_max)
+            self.voltage_min = min(self.voltage_min, other.voltage_min)
+            self.voltage_max = max(self.voltage_max, other.voltage_max)
+        self.count += other.count
+        self.capacity += other.capacity
+        self.energy += other.energy
+
+    def copy(self):
+        """Returns an independent copy of these statistics.
+
+        Returns:
+            StepStats: A copy that can be merged into without affecting this one.
+        |
+        """
+        stats = StepStats()
+        stats.merge(self)
+        stats._last = self._last
+        return stats
+
+    @property
+    def duration(self):
+        """Returns the time in seconds between the first and the latest sample.
+
+        Returns:
+            float: The duration in seconds, 0 with fewer than two samples.
+        |
+        """
+        if self.count == 0:
+            return 0.0
+        return self.end_time - self.start_time
+
+    @property
+    def mean_current(self):
+        """Returns the time averaged absolute current.
+
+        Returns:
+            float: The mean current in A, None with fewer than two samples.
+        |
+        """
+        duration = self.duration
+        if duration <= 0:
+            return None
+        return self.capacity * 3.6 / duration
+
+    def as_dict(self):
+        """Returns the statistics as a JSON serializable dict.
+
+        Returns:
+            dict: The count, duration, capacity (mAh), energy (Wh), mean current and extrema.
+        |
+        """
+        return {"count": self.count,
+                "duration": self.duration,
+                "capacity": self.capacity,
+                "energy": self.energy,
+                "current_mean": self.mean_current,
+                "current_min": self.current_min,
+                "current_max": self.current_max,
+                "voltage_min": self.voltage_min,
+                "voltage_max": self.voltage_max}
+
+
+class CycleStats(object):
+    """Statistics of the steps run during one cycle of a CellRunner.
+
+    The StepStats of every finished step are merged in once, according to whether
+    the step charges, discharges or does neither.
+
+    Attributes:
+        charge (StepStats): Combined statistics of the charge steps.
+        cycle (int): The cycle number these statistics belong to.
+        discharge (StepStats): Combined statistics of the discharge steps.
+        total (StepStats): Combined statistics of all the steps.
+    |
+    """
+
+    def __init__(self, cycle):
+        """Inits cycle and empty charge, discharge and total statistics.
+
+        Args:
+            cycle (int): The cycle number these statistics belong to.
+        |
+        """
+        self.cycle = cycle
+        self.charge = StepStats()
+        self.discharge = StepStats()
+        self.total = StepStats()
+
+    def add_step(self, step):
+        """Merges the statistics of a step into those of the cycle.
+
+        Args:
+            step (ProtocolStep): A step of this cycle which will not take more measurements.
+        |
+        """
+        if step.state_str.startswith("charge"):
+            self.charge.merge(step.stats)
+        elif step.state_str.startswith("discharge"):
+            self.discharge.merge(step.stats)
+        self.total.merge(step.stats)
+
+    @property
+    def coulombic_efficiency(self):
+        """Returns the ratio of discharge capacity to charge capacity.
+
+        Returns:
+            float: The coulombic efficiency, None if nothing was charged yet.
+        |
+        """
+        if self.charge.capacity <= 0:
+            return None
+        return self.discharge.capacity / self.charge.capacity
+
+    def summary(self, step=None):
+        """Returns a compact summary of the cycle.
+
+        Args:
+            step (ProtocolStep, optional): The step currently running, whose statistics so far
+                are included without merging them into the cycle. Defaults to None.
+
+        Returns:
+            dict: Cycle number, charge and discharge capacity (mAh) and energy (Wh),
+                coulombic efficiency, sample count, duration and voltage extrema.
+        |
+        """
+        stats = self
+        if step is not None and step.stats.count:
+            stats = CycleStats(self.cycle)
+            stats.charge = self.charge.copy()
+            stats.discharge = self.discharge.copy()
+            stats.total = self.total.copy()
+            stats.add_step(step)
+
+        return {"cycle": stats.cycle,
+                "count": stats.total.count,
+                "duration": stats.total.duration,
+                "charge_capacity": stats.charge.capacity,
+                "discharge_capacity": stats.discharge.capacity,
+                "charge_energy": stats.charge.energy,
+                "discharge_energy": stats.discharge.energy,
+                "coulombic_efficiency": stats.coulombic_efficiency,
+                "voltage_min": stats.total.voltage_min,
+                "voltage_max": stats.total.voltage_max}
+
+
 class CellRunner(object):
     """Turns a protocol into a list of held ProtocolSteps that are executed to complete the protocol. Also 
     holds meta information about the protocol being run.
@@ -73,22 +305,46 @@ class CellRunner(object):
     Attributes:
         channel (str): The Keithley channel this protocol should be run on. 
         current_step (ProtocolStep): The active ProtocolStep. UNUSED.
+        encoder (binlog.ChunkEncoder): Collects the data rows of a binary data file, None for
+            a text data file.
+        cycle_stats (CycleStats): Statistics of the steps finished during the current cycle.
+        file_size (int): Number of bytes written to fpath so far.
+        file_format (str): The file format, one of FILE_FORMATS.
         fpath (str): The file path to the file that will have data written to it.
         i_current_step (int): The index of the ProtocolStep being run from the steps list.
         isTest (bool): Controls whether this is a real protocol run or a test protocol being run.
+        last_cycle_stats (CycleStats): Statistics of the previous cycle, None during the first one.
         last_data (list): A list of values from the previous measurement recorded in a ProtocolStep.
         meta (dict): Meta data for: channel, path, cellid, comment, package, celltype, requester, plugins,
-            protocol, protocol_name, cycler, start_cycle, and format.
+            protocol, protocol_name, cycler, start_cycle, and format. Passing "binary", "text" or "npy"
+            as the format selects the file format, it is replaced by the list of data columns. A "tolerance"
+            dict, see compression.parse_tolerance(), turns on error-bounded reporting for every
+            step and is recorded too.
+        rows_written (int): Number of data rows written to fpath so far.
         _next_time (float): The next time at which a ProtocolStep should read data from the Keithley.
         plugin_objects (list): A list of PluginControllers extending the BaseController object. 
             (The same as 'plugins' and 'plugin_objects' in functions of server.py)
         prev_cycle (int): The previous cycle number. UNUSED.
+        protocol (str): The protocol loaded, None before load_protocol().
+        pyramid (pyramid.Pyramid): Summarizes the rows written at several time resolutions,
+            None to not summarize them.
+        recent (recent.RecentWindow): The latest measurements of every step, for live plots.
         safety_reset_seconds (float): The number of seconds before the Keithley's safety reset.
         source (keithley2602.Source): The Keithley being controlled by this CellRunner.
+        store (npystore.Store): Holds the data rows of an "npy" format log, whose fpath file
+            then only has the meta data and headers. None for the other formats.
+        store_rows (bool): Whether the data rows go to a store.
         start_time (float): The epoch time in seconds at which the CellRunenr started running the protocol (ProtocolSteps).
         status (int): The status that maps to the STATUS string map. Values -1 to 5.
         steps (list): A list of the ProtocolSteps to be run in order to complete a protocol.
+        tolerance (dict): Error-bounded reporting tolerance of the channel, None to report on
+            the steps' report conditions.
         total_pause_time (float): The time in seconds that a ProtoclStep has been paused for.
+        handles (writer.HandlePool): Keeps the data file open when it is written directly.
+        writer (writer.DataWriter): Writes the data file from a separate thread, None to write
+            it directly.
+        write_error (str): Why the writer last dropped writes to the runner's files, None if
+            it never did.
     |
     """
 
@@ -120,11 +376,22 @@ class CellRunner(object):
         self.meta = self.META.copy()
         for k in self.meta.keys():
             self.meta[k] = meta.get(k, None)
+        file_format = self.meta["format"]
+        if not isinstance(file_format, str):
+            file_format = "text"
+        if file_format not in FILE_FORMATS:
+            raise ValueError("unknown file format {}, must be one of {}".format(
+                file_format, FILE_FORMATS))
         if self.meta["cycler"] is None:
             self.meta["cycler"] = "Keithley2602"
         if self.meta["celltype"] is None:
             self.meta["celltype"] = "unknown"
         self.meta["format"] = ["time", "current", "voltage", "capacity"]
+        self.file_format = file_format
+        self.tolerance = meta.get("tolerance")
+        if self.tolerance:
+            parse_tolerance(self.tolerance)
+            self.meta["tolerance"] = self.tolerance
 
         self.plugin_objects = plugin_objects
         if self.plugin_objects and self.meta["plugins"]:
@@ -135,6 +402,7 @@ class CellRunner(object):
         # Enforce a str channel
         self.meta["channel"] = str(self.meta["channel"])
         self.fpath = self.meta["path"]
+        self.protocol = None
         self.steps = []
         self.status = STATUS.pending
         self.current_step = None
@@ -144,6 +412,8 @@ class CellRunner(object):
             self.cycle = self.meta["start_cycle"]
         else:
             self.cycle = 0
+        self.cycle_stats = CycleStats(self.cycle)
+        self.last_cycle_stats = None
         self.prev_cycle = None
         self._next_time = -1
         self.channel = self.meta["channel"]
@@ -151,6 +421,18 @@ class CellRunner(object):
         self.total_pause_time = 0.0
         self.source = None
         self.safety_reset_seconds = None
+        self.writer = None
+        self.write_error = None
+        self.handles = HANDLES
+        self.encoder = binlog.ChunkEncoder() if file_format == "binary" else None
+        # Created along with the header, see write_header()
+        self.store = None
+        self.store_rows = file_format == "npy"
+        self.pyramid = None
+        self.recent = RecentWindow()
+        # Where the next header goes, for the logindex sidecar file
+        self.file_size = 0
+        self.rows_written = 0
 
     @property
     def next_time(self):
@@ -254,6 +536,7 @@ class CellRunner(object):
         # The CellRunner instance must be present as "parent" in the globals
         # so that the ProtocolSteps can add themselves to the .steps list
         self.isTest = isTest
+        self.protocol = protocol
         exec(protocol, globals().update({"parent": self}))
         # Set the signs for the capacity calculations
         self.set_cap_signs()
@@ -261,10 +544,14 @@ class CellRunner(object):
     def add_step(self, step):
         """Adds a ProtocolStep to the steps list.
 
+        Gives the step a SwingingDoor if the channel has a reporting tolerance.
+
         Args:
             step (ProtocolStep): ProtocolStep to be added to the steps list.
         |
         """
+        if self.tolerance:
+            step.compressor = SwingingDoor(self.tolerance)
         self.steps.append(step)
 
     def next_step(self):
@@ -292,6 +579,119 @@ class CellRunner(object):
         self.next_time = time.time()
         return True
 
+    def checkpoint(self):
+        """Returns what restore() needs to continue the protocol, e.g. after a restart.
+
+        Only the state that cannot be rebuilt from the meta data and protocol is included:
+        the position in the protocol, the statistics, and the first and last reported points
+        and latest capacity of the current step.
+
+        Returns:
+            dict: The JSON serializable state.
+        |
+        """
+        step = self.step
+        state = {"status": self.status,
+                 "step": self.i_current_step,
+                 "cycle": self.cycle,
+                 "start_time": self.start_time,
+                 "total_pause_time": self.total_pause_time,
+                 "last_data": self.last_data,
+                 "rows_written": self.rows_written,
+                 "cycle_stats": _cycle_stats_state(self.cycle_stats),
+                 "last_cycle_stats": _cycle_stats_state(self.last_cycle_stats),
+                 "time": time.time()}
+        if step is not None:
+            state["step_state"] = {
+                "status": step.status,
+                "state": step.state_str,
+                "pause_time": step.pause_time,
+                "pause_start": step.pause_start,
+                # Time conditions look at the first report, delta conditions at the last
+                "report": step.report[:1] + step.report[1:][-1:],
+                "capacity": step.data[-1][3] if step.data else None,
+                "starting_capacity": step.starting_capacity,
+                "stats": _stats_state(step.stats)}
+        return state
+
+    def restore(self, state):
+        """Continues the protocol from a checkpoint() of a runner with the same meta data.
+
+        The protocol must be loaded and the source set. The data file is appended to, with
+        no header written again, after its last complete line or chunk, and the current step is started again on the source unless
+        it was paused. The time from the checkpoint to the restore counts as a pause of the
+        step, and the charge passed meanwhile, if any, is not counted.
+
+        Args:
+            state (dict): The checkpoint.
+        |
+        """
+        self.status = state["status"]
+        self.i_current_step = state["step"]
+        self.cycle = state["cycle"]
+        self.start_time = state["start_time"]
+        self.total_pause_time = state["total_pause_time"]
+        self.last_data = state["last_data"]
+        self.rows_written = state["rows_written"]
+        self.cycle_stats = _load_cycle_stats(state["cycle_stats"])
+        self.last_cycle_stats = _load_cycle_stats(state["last_cycle_stats"])
+        self.restore_file()
+        if self.store_rows:
+            self.store = npystore.Store(self.fpath, self.meta, resume=True)
+            self.rows_written = self.store.rows
+
+        step = self.step
+        step_state = state.get("step_state")
+        if step is None or step_state is None:
+            return
+        downtime = max(0.0, time.time() - state["time"])
+        step.report = step_state["report"]
+        step.starting_capacity = step_state["starting_capacity"]
+        if step_state["capacity"] is not None:
+            # Measurements go on from the latest capacity
+            step.starting_capacity = step_state["capacity"]
+        step.stats = _load_stats(step_state["stats"])
+        # Nothing is known of the gap, don't integrate across it
+        step.stats.interrupt()
+        step.pause_time = step_state["pause_time"]
+        if self.store is not None:
+            self.store.mark(self.cycle, {"state": step.state_str})
+
+        if step_state["status"] == STATUS.paused:
+            step.status = STATUS.paused
+            step.pause_start = step_state["pause_start"]
+            self.off()
+            self.next_time = NEVER
+        elif step_state["status"] == STATUS.started:
+            step.pause_time += downtime
+            self.total_pause_time += downtime
+            step._start()
+            step.compile_conditions()
+            self.next_time = time.time()
+        else:
+            self.next_time = time.time()
+
+    def restore_file(self):
+        """Cuts the data file after its last complete line or chunk and counts what is left.
+
+        The file size and number of rows written are taken from the file, a checkpoint can
+        be older than the last rows written.
+
+        |
+        """
+        try:
+            self.file_size, rows = logindex.complete(self.fpath)
+            if os.path.getsize(self.fpath) > self.file_size:
+                logger.warning("Cutting the incomplete end of {} at byte {}".format(
+                    self.fpath, self.file_size))
+                os.truncate(self.fpath, self.file_size)
+        except (OSError, ValueError) as error:
+            logger.error(f"Error reading file in restore_file(): {error}")
+            self.file_size = 0
+            return
+        if not self.store_rows:
+            self.rows_written = rows
+
     def _start(self):
         """Initializes the protocol. 
         
@@ -338,6 +738,23 @@ class CellRunner(object):
         |
         """
         logger.debug("Entering method for channel {}".format(self.channel))
+        if not self.prepare():
+            return False
+
+        self.read_and_write(force_report=force_report)
+        self.advance()
+
+        return True
+
+    def prepare(self):
+        """Gets the runner ready to run its current step.
+
+        Starts the protocol and writes the header of the current step if they have not been yet.
+
+        Returns:
+            bool: False if the runner is completed, out of control or paused, otherwise True.
+        |
+        """
         if self.status == STATUS.completed:
             return False
 
@@ -353,26 +770,41 @@ class CellRunner(object):
         if self.step.status != STATUS.started:
             self.write_step_header()
 
-        self.read_and_write(force_report=force_report)
+        return True
+
+    def advance(self):
+        """Acts on the status of the current step after it has run.
 
+        Closes the runner if the step lost control, moves on to the next step if it completed
+        and closes the runner once there are no steps left.
+        |
+        """
         if self.step.status == STATUS.nocontrol:
             self.close()
             self.status = STATUS.nocontrol
 
         if self.step.status == STATUS.completed:
+            self.cycle_stats.add_step(self.step)
+            self.write_pending()
+            if self.writer is not None:
+                self.writer.flush(self.fpath)
+                self.writer.flush(logindex.index_path(self.fpath))
             self.next_step()
 
         if self.status == STATUS.completed:
+            self.write_cycle_summary()
             self.close()
 
-        return True
-
     def advance_cycle(self):
         """Advances the cycle stored in CellRunner by 1.
-        
+
+        Writes the summary of the finished cycle and starts collecting statistics for the new one.
         |
         """
+        self.write_cycle_summary()
+        self.last_cycle_stats = self.cycle_stats
         self.cycle += 1
+        self.cycle_stats = CycleStats(self.cycle)
         self.write_cycle_header()
 
     def write_header(self):
@@ -381,12 +813,22 @@ class CellRunner(object):
         |
         """
         try:
-            with open(self.fpath, 'w') as fo:
+            if self.encoder is not None:
+                self.write_text(binlog.encode_header(self.meta), mode='wb',
+                                flush=True)
+            else:
                 header = json.dumps(self.meta, indent=4, sort_keys=True)
                 header = "\n".join(
                     ["#{}".format(line) for line in header.split("\n")]
                 )
-                fo.write(header + "\n")
+                self.write_text(header + "\n", mode='w', flush=True)
+            self.rows_written = 0
+            if self.store_rows:
+                if self.store is not None:
+                    self.store.close()
+                self.store = npystore.Store(self.fpath, self.meta)
+            # Start a new index along with the file
+            self.write_text("", mode='w', path=logindex.index_path(self.fpath))
         except IOError as error:
             logger.error(f"Error opening file in write_header(): {error}")
 
@@ -395,13 +837,29 @@ class CellRunner(object):
         
         |
         """
+        cycle_header = json.dumps({"cycle": self.cycle})
         try:
-            with open(self.fpath, 'a') as fo:
-                cycle_header = json.dumps({"cycle": self.cycle}) + "\n"
-                fo.write(cycle_header)
+            self.write_marker(binlog.CYCLE, cycle_header)
         except IOError as error:
             logger.error(f"Error opening file in write_cycle_header(): {error}")
 
+    def write_cycle_summary(self):
+        """Writes the summary of the current cycle to the file stored in fpath.
+
+        The summary is written like a step header with the state "cycle_summary", so readers
+        that split the file on step headers see it as a step without data. Nothing is written
+        for a cycle without measurements.
+        |
+        """
+        if self.cycle_stats.total.count == 0:
+            return
+        summary = {"state": "cycle_summary"}
+        summary.update(self.cycle_stats.summary())
+        try:
+            self.write_marker(binlog.STEP, json.dumps(summary))
+        except IOError as error:
+            logger.error(f"Error opening file in write_cycle_summary(): {error}")
+
     def write_step_header(self):
         """Collects the header from the current ProtocolStep and writes it to the file stored in fpath.
         
@@ -410,8 +868,7 @@ class CellRunner(object):
         header = self.step.header()
         if header:
             try:
-                with open(self.fpath, 'a') as fo:
-                    fo.write("  " + header + "\n")
+                self.write_marker(binlog.STEP, header)
             except IOError as error:
                 logger.error(f"Error opening file in write_step_header(): {error}")
 
@@ -425,12 +882,112 @@ class CellRunner(object):
             force_report (bool, optional): Passed to the ProtocolStep run() function to control reporting. Defaults to False.
         |
         """
-        data = self.step.run(force_report=force_report)
+        self.record(self.step.run(force_report=force_report))
+
+    def record(self, data):
+        """Takes on the next_time of the current step and writes data returned by it, if any.
+
+        Points the step reported earlier but held back are written first.
+
+        Args:
+            data (list): The reported data returned by running the step, or None.
+        |
+        """
         self.next_time = self.step.next_time
+        held = self.step.held_reports
+        while held:
+            self.write_data(*held.pop(0))
         if data:
             self.write_data(*data)
             self.last_data = data
 
+    def write_text(self, text, mode='a', flush=False, path=None):
+        """Writes text to the fpath file, through the writer if there is one.
+
+        Args:
+            flush (bool, optional): Have the writer write the file right away. Defaults to False.
+            mode (str, optional): 'a' to append the text, 'w' to replace the file, with 'b' added
+                for bytes. Defaults to 'a'.
+            path (str, optional): The file to write to instead of fpath. Defaults to None.
+            text (str or bytes): The text to write.
+
+        Raises:
+            IOError: If the file could not be written directly.
+        |
+        """
+        if path is None:
+            path = self.fpath
+            if mode.startswith('w'):
+                self.file_size = 0
+            if isinstance(text, bytes):
+                self.file_size += len(text)
+            else:
+                # Newlines are translated when writing text
+                self.file_size += (len(text.encode("utf-8"))
+                                   + (len(os.linesep) - 1) * text.count("\n"))
+        if self.writer is not None:
+            self.writer.write(path, text, mode=mode, flush=flush)
+            failure = self.writer.failure(path)
+            if failure is not None:
+                self.write_error = failure
+                logger.critical("Writes to {} were lost: {}".format(path, failure))
+            return
+        self.handles.write(path, text, mode)
+
+    def write_marker(self, kind, line):
+        """Writes a cycle or step header to the fpath file in its format.
+
+        Args:
+            kind (bytes): binlog.CYCLE or binlog.STEP.
+            line (str): The JSON header.
+
+        Raises:
+            IOError: If the file could not be written directly.
+        |
+        """
+        if self.encoder is not None:
+            self.write_pending()
+            offset = self.file_size
+            self.write_text(binlog.encode_marker(kind, line), mode='ab')
+        else:
+            offset = self.file_size
+            if kind == binlog.STEP:
+                self.write_text("  " + line + "\n")
+            else:
+                self.write_text(line + "\n")
+
+        if self.store is not None and kind == binlog.STEP:
+            self.store.mark(self.cycle, json.loads(line))
+
+        try:
+            now = time.time() - self.start_time
+        except TypeError:
+            now = None
+        entry = logindex.make_entry(logindex.KIND_NAMES[kind], offset,
+                                    self.rows_written, now, json.loads(line))
+        try:
+            self.write_text(logindex.format_entry(entry),
+                            path=logindex.index_path(self.fpath))
+        except IOError as error:
+            logger.error(f"Error opening file in write_marker(): {error}")
+
+    def write_pending(self):
+        """Writes the data rows a binary data file or a store still holds back, if any.
+
+        |
+        """
+        if self.store is not None:
+            try:
+                self.store.sync()
+            except (IOError, ValueError) as error:
+                logger.error(f"Error writing store in write_pending(): {error}")
+        if self.encoder is None or not self.encoder.rows:
+            return
+        try:
+            self.write_text(self.encoder.flush(), mode='ab')
+        except IOError as error:
+            logger.error(f"Error opening file in write_pending(): {error}")
+
     def write_data(self, timestamp, current, voltage, capacity, plugin):
         """Attempts to write the passed in data to the fpath file.
 
@@ -442,27 +999,47 @@ class CellRunner(object):
             voltage (float): The recorded voltage data of the controlled cell.
         |
         """
+        if self.pyramid is not None:
+            self.pyramid.add(timestamp, (current, voltage, capacity))
         if current == None:
             current = "None"
             voltage = "None"
             capacity = "None"
         try:
-            with open(self.fpath, 'a') as file:
-                try:
-                    time = timestamp - self.start_time - self.total_pause_times
-                except AttributeError:
-                    time = timestamp - self.start_time
-                if current == "None":
-                    data_format = "    {:0.8g},{},{},{}"
-                else:
-                    data_format = "    " + ",".join(["{:0.8g}"] * 4)
-                writeout = data_format.format(time, current, voltage, capacity)
-                for value in plugin:
-                    writeout += ",{:0.8g}".format(value[1])
-                writeout += "\n"
-
-                file.write(writeout)
-                logger.debug("Wrote data point to file.")
+            time = timestamp - self.start_time - self.total_pause_times
+        except AttributeError:
+            time = timestamp - self.start_time
+
+        self.rows_written += 1
+        if self.encoder is not None or self.store is not None:
+            row = [time] + [None if value == "None" else value
+                            for value in (current, voltage, capacity)]
+            row += [value[1] for value in plugin]
+            try:
+                if self.store is not None:
+                    self.store.append(row)
+                    return
+                chunk = self.encoder.add(row)
+                if chunk:
+                    self.write_text(chunk, mode='ab')
+            except PermissionError as e:
+                logger.critical("Permission Error, could not write data: %s", e)
+            except IOError as error:
+                logger.error(f"Error opening file in write_data(): {error}")
+            return
+
+        if current == "None":
+            data_format = "    {:0.8g},{},{},{}"
+        else:
+            data_format = "    " + ",".join(["{:0.8g}"] * 4)
+        writeout = data_format.format(time, current, voltage, capacity)
+        for value in plugin:
+            writeout += ",{:0.8g}".format(value[1])
+        writeout += "\n"
+
+        try:
+            self.write_text(writeout)
+            logger.debug("Wrote data point to file.")
         except PermissionError as e:
             logger.critical("Permission Error, could not write data: %s", e)
         except IOError as error:
@@ -477,6 +1054,7 @@ class CellRunner(object):
         """
         success = False
         self.read_and_write(force_report=True)
+        self.write_pending()
         self.status = STATUS.paused
         if self.step.pause():
             self.next_time = self.step.next_time
@@ -495,11 +1073,21 @@ class CellRunner(object):
         return self.run()
 
     def close(self):
-        """Calls the off() function for the stored source.
-        
+        """Calls the off() function for the stored source and closes the data file.
+
+        The file is reopened if anything else is written to it afterwards.
         |
         """
         self.source.off()
+        self.write_pending()
+        if self.store is not None:
+            self.store.close()
+        if self.pyramid is not None:
+            self.pyramid.flush()
+        for path in (self.fpath, logindex.index_path(self.fpath)):
+            if self.writer is not None:
+                self.writer.flush(path, close=True)
+            self.handles.close(path)
 
     def off(self):
         """Calls the off() function for the stored source.
@@ -520,6 +1108,53 @@ class CellRunner(object):
         return True
 
 
+def _stats_state(stats):
+    """Returns the attributes of a StepStats as a JSON serializable dict.
+
+    |
+    """
+    return dict(vars(stats))
+
+
+def _load_stats(state):
+    """Returns a StepStats with the attributes from _stats_state().
+
+    |
+    """
+    stats = StepStats()
+    vars(stats).update(state)
+    if stats._last is not None:
+        stats._last = tuple(stats._last)
+    return stats
+
+
+def _cycle_stats_state(stats):
+    """Returns a CycleStats as a JSON serializable dict, None for None.
+
+    |
+    """
+    if stats is None:
+        return None
+    return {"cycle": stats.cycle,
+            "charge": _stats_state(stats.charge),
+            "discharge": _stats_state(stats.discharge),
+            "total": _stats_state(stats.total)}
+
+
+def _load_cycle_stats(state):
+    """Returns a CycleStats from _cycle_stats_state(), None for None.
+
+    |
+    """
+    if state is None:
+        return None
+    stats = CycleStats(state["cycle"])
+    stats.charge = _load_stats(state["charge"])
+    stats.discharge = _load_stats(state["discharge"])
+    stats.total = _load_stats(state["total"])
+    return stats
+
+
 class ProtocolStep(object):
     """
     Base class for a protocol step, needs to be subclassed with implementation of a start function.
@@ -530,12 +1165,18 @@ class ProtocolStep(object):
     variables as "parent".
 
     Attributes:
+        adaptive (tuple): (min_wait, max_wait) bounds in seconds for the adaptive measurement interval,
+            None if the fixed wait_time is used.
         cap_sign (float): The cap sign determines whether the capacitiy increases or decreases during
             charge and discharge. Either 1 or -1. 
         data (list): A list of lists. Each list is a set of measurements, [[time,current,voltage,capacity],
             [time,current,voltage,capacity], ...] current is stored in absolute value. Contains every measurement taken.
+        compressor (SwingingDoor): Decides which measurements are reported within the channel's
+            tolerance instead of the report conditions, None to use the report conditions.
         data_max_len (int): The max number ofitems in the data list.
         end_conditions (list): A list of conditions that determine when the ProtocolStep should be ended.
+        held_reports (list): Reported measurements not yet written, older than the one returned
+            by run().
         in_control (bool): Indicates if the protocol step is operating within it's designed parameters.
         last_time (float): The previous measured time in seconds.
         next_time (float): This is the time in seconds since epoch at which this protocol step is expecting to do another read
@@ -548,6 +1189,7 @@ class ProtocolStep(object):
             specified to be reported.
         report_conditions (list): A list of Condition objects used to determine when a data measurement is reported.
         starting_capacity (float): The initital capacity of the cell. This gets set at the protocol level (parent).
+        stats (StepStats): Running statistics of the measurements taken during this step.
         state_str (str): A string representation of the state of the cell i.e charging, discharging, etc.
         status (int): An int representation of the status of the step, i.e started, paused, etc.
         wait_time (float): Time between data measurements in seconds.
@@ -555,17 +1197,24 @@ class ProtocolStep(object):
     """
 
     def __init__(self, wait_time: float = 10.0,
-                 cellrunner_parent: CellRunner = None):
+                 cellrunner_parent: CellRunner = None,
+                 adaptive: tuple = None):
         """Inits ProtocolStep with parent, data_max_len, status, state_str, last_time, pause_start, pause_time, cap_sign, next_time,  starting_capacity, 
-        wait_time, end_conditions, report_conditions, in_control.
+        wait_time, adaptive, end_conditions, report_conditions, in_control.
 
         Base class for protocols the variable "parent" must be a CellRunner
         instance and be present in the globals during instantiation.
 
         Args:
+            adaptive (tuple, optional): (min_wait, max_wait) in seconds. If given, the interval between
+                measurements follows the rate of change of the reported values within these bounds
+                instead of using wait_time. Defaults to None.
             cellrunner_parent (CellRunner): The CellRunner this protocol is attached to.
             wait_time (float): Default waiting time in seconds.
                 If no other conditions are met, the step will check V & I at this interval.
+
+        Raises:
+            ValueError: If the adaptive bounds are not MIN_WAIT_TIME <= min_wait <= max_wait.
         |
         """
         # the parent is the CellRunner
@@ -581,6 +1230,12 @@ class ProtocolStep(object):
         self.data_max_len = 10000
         # same format as data but only for the reported points
         self.report = []
+        # Error-bounded reporting, replaces the report conditions when set by the parent
+        self.compressor = None
+        # Reported points to write before the one returned by run(), see conclude()
+        self.held_reports = []
+        # running statistics over every measurement, unlike data these are never truncated
+        self.stats = StepStats()
 
         # Status must be one of the values in STATUS module variable
         self.status = STATUS.pending
@@ -614,9 +1269,21 @@ class ProtocolStep(object):
         # assumming no other conditions are present
         self.wait_time = wait_time
 
+        # Bounds for the adaptive measurement interval, None to always use wait_time
+        if adaptive is not None:
+            adaptive = (float(adaptive[0]), float(adaptive[1]))
+            if not MIN_WAIT_TIME <= adaptive[0] <= adaptive[1]:
+                raise ValueError(
+                    "adaptive bounds should satisfy {} <= min_wait <= max_wait, "
+                    "got {}".format(MIN_WAIT_TIME, adaptive))
+        self.adaptive = adaptive
+
         # Lists which will hold the conditions for reporting and ending
         self.end_conditions = []
         self.report_conditions = []
+        # Compiled versions of the above, see compile_conditions()
+        self._end_evaluator = None
+        self._report_evaluator = None
 
         # Boolean indicating if the protocol step is occurring within
         # it's designed parameters
@@ -659,26 +1326,66 @@ class ProtocolStep(object):
         """
         logger.debug("Running {} protocol on channel {}".format(
             self.state_str, self.parent.channel))
+        if not self.measure():
+            return None
+
+        now = time.time()
+        self.check_end_conditions(now)
+
+        if self.status == STATUS.completed or self.status == STATUS.nocontrol:
+            report_data = True
+
+        elif self.compressor is not None:
+            # The compressor decides, report conditions would only hurry measurements
+            report_data = False
+
+        else:
+            report_data = self.check_report_conditions(now)
+
+        return self.conclude(report_data, force_report)
+
+    def measure(self):
+        """Starts the step if needed and takes a measurement, the first phase of run().
+
+        Also sets next_time using the measurement interval, conditions may then bring it forward.
+
+        Returns:
+            bool: False if the step is paused and nothing was measured, otherwise True.
+        |
+        """
         if self.status == STATUS.paused:
             self.next_time = NEVER
-            return None
+            return False
 
         if self.status != STATUS.started:
             self._start()
+            self.compile_conditions()
 
         self.read_data()
 
-        # Set the next read time using the default wait_time
+        # Set the next read time using the measurement interval
         # this may get modified by the evaluations of conditions
-        self.next_time = self.data[-1][0] + self.wait_time
+        self.next_time = self.data[-1][0] + self.measurement_interval()
+        return True
 
-        self.check_end_conditions()
+    def conclude(self, report_data, force_report=False):
+        """Finishes a run once the conditions have been evaluated, the last phase of run().
 
-        if self.status == STATUS.completed or self.status == STATUS.nocontrol:
-            report_data = True
+        Args:
+            report_data (bool): Whether the conditions call for the measurement to be reported.
+            force_report (bool, optional): Report the measurement regardless. Defaults to False.
 
-        else:
-            report_data = self.check_report_conditions()
+        Returns:
+            list: The measurement to report (write to file), None if there is nothing to report.
+        |
+        """
+        # Condition extrapolations may converge on a threshold in ever smaller
+        # steps, so always leave the minimum interval between measurements
+        min_wait = MIN_WAIT_TIME if self.adaptive is None else self.adaptive[0]
+        self.next_time = max(self.next_time, self.data[-1][0] + min_wait)
+
+        if self.compressor is not None:
+            return self.compress(force_report)
 
         if report_data or force_report:
             self.report.append(self.data[-1])
@@ -686,30 +1393,117 @@ class ProtocolStep(object):
         else:
             return None
 
-    def check_end_conditions(self):
+    def compress(self, force_report=False):
+        """Reports the points the compressor needs to redraw the data within tolerance.
+
+        Report conditions are not used, the first and last points of the step and forced
+        reports are always reported. A point is only known to be needed once the next one
+        is measured, so reported points can be older than the latest measurement, and there
+        can be two at once. All but the last are left in held_reports for the parent to
+        write first.
+
+        Args:
+            force_report (bool, optional): Report the measurement regardless. Defaults to False.
+
+        Returns:
+            list: The last point to report (write to file), None if there is nothing to report.
+        |
+        """
+        point = self.data[-1]
+        if (force_report or self.status == STATUS.completed
+                or self.status == STATUS.nocontrol):
+            points = self.compressor.flush(point)
+        else:
+            points = self.compressor.add(point)
+        if not points:
+            return None
+        self.report.extend(points)
+        self.held_reports.extend(points[:-1])
+        return points[-1]
+
+    def measurement_interval(self):
+        """Returns the time to wait before the next measurement if no condition asks for one sooner.
+
+        Without adaptive bounds this is wait_time. With them, the interval is chosen so that each
+        value with a delta report condition moves at most ADAPTIVE_FRACTION of its delta between
+        measurements, judging by the fitted trend of recent data, and clamped to the bounds.
+        Plateaus are then sampled at max_wait and fast changes such as knees at min_wait.
+
+        Returns:
+            float: The measurement interval in seconds.
+        |
+        """
+        if self.adaptive is None:
+            return self.wait_time
+        min_wait, max_wait = self.adaptive
+
+        interval = max_wait
+        for condition in self.report_conditions:
+            if not isinstance(condition, ConditionDelta) or condition.index == 0:
+                continue
+            trend = fit_trend(self.data, condition.index)
+            if trend is None:
+                # Not enough data for a trend yet, gather it quickly
+                return min_wait
+            rate = abs(trend[2]) + EXTRAPOLATION_CONFIDENCE * trend[3]
+            if rate > 0:
+                interval = min(interval,
+                               ADAPTIVE_FRACTION * condition.delta / rate)
+
+        return max(min_wait, interval)
+
+    def compile_conditions(self):
+        """Compiles the end and report conditions into ConditionEvaluators.
+
+        Called when the step starts. The conditions are compiled again automatically
+        if the end_conditions or report_conditions lists are replaced afterwards.
+        |
+        """
+        self._end_evaluator = ConditionEvaluator(self.end_conditions)
+        self._report_evaluator = ConditionEvaluator(self.report_conditions)
+
+    def check_end_conditions(self, now=None):
         """Checks if it's time for step to be ended.
 
+        Args:
+            now (float, optional): The current timestamp. Read from the clock if None.
+
         Returns:        
             bool: True if the end condition was satisfied, otherwise False
         |
         """
-        for condition in self.end_conditions:
-            if condition.check(self):
-                self.status = STATUS.completed
-                return True
-        return False
+        evaluator = self._end_evaluator
+        if evaluator is None or evaluator.conditions is not self.end_conditions:
+            evaluator = self._end_evaluator = ConditionEvaluator(
+                self.end_conditions)
+
+        met, next_time = evaluator.evaluate(self, now, stop_on_met=True)
+        if next_time < self.next_time:
+            self.next_time = next_time
+        if met:
+            self.status = STATUS.completed
+        return met
 
-    def check_report_conditions(self):
+    def check_report_conditions(self, now=None):
         """Check if it's time for step info to be reported.
 
+        Args:
+            now (float, optional): The current timestamp. Read from the clock if None.
+
         Returns:        
             bool: True if the end condition was satisfied, otherwise False
         |
         """
-        for condition in self.report_conditions:
-            if condition.check(self):
-                return True
-        return False
+        evaluator = self._report_evaluator
+        if (evaluator is None
+                or evaluator.conditions is not self.report_conditions):
+            evaluator = self._report_evaluator = ConditionEvaluator(
+                self.report_conditions)
+
+        met, next_time = evaluator.evaluate(self, now)
+        if next_time < self.next_time:
+            self.next_time = next_time
+        return met
 
     def check_in_control(self, last_time, current, voltage):
         """Abstract Method for checking if the desired condition is actually met.
@@ -793,6 +1587,8 @@ class ProtocolStep(object):
 
         self.data.append([self.last_time, current,
                           voltage, capacity, plugin_values])
+        self.stats.add(self.last_time, current, voltage)
+        self.parent.recent.add(self.last_time, current, voltage)
 
         if len(self.data) > self.data_max_len:
             # we pop 1 and not 0
@@ -816,6 +1612,8 @@ class ProtocolStep(object):
         self.pause_start = time.time()
         self.parent.off()
         self.next_time = NEVER
+        # Nothing passes while paused, so don't integrate over the pause
+        self.stats.interrupt()
         return True
 
     def resume(self):
@@ -893,7 +1691,7 @@ class CurrentStep(ProtocolStep):
     def __init__(self, current,
                  reports=(("voltage", 0.01), ("time", ":5:")),
                  ends=(("voltage", ">", 4.2), ("time", ">", "24::")),
-                 wait_time=10.0):
+                 wait_time=10.0, adaptive=None):
         """Inits current, end_conditions, report_conditions, state_str, and v_limit. Calls parent ProtocolStep constructor with wait_time.
 
         Args:
@@ -903,12 +1701,14 @@ class CurrentStep(ProtocolStep):
             reports (tuple, optional): A tuple of tuples, holds the change in voltage or time for a report to occur, time in in hours:minutes:seconds format.
                 Defaults to (("voltage", 0.01), ("time", ":5:")).
             wait_time (float, optional): Time between data measurements in seconds. Defaults to 10.0.
+            adaptive (tuple, optional): (min_wait, max_wait) bounds in seconds for an adaptive
+                measurement interval replacing wait_time. Defaults to None.
 
         Raises:
             ValueError: Current should not be 0 during a CurrentStep, this is raised if current is 0.
         |
         """
-        super().__init__(wait_time=wait_time)
+        super().__init__(wait_time=wait_time, adaptive=adaptive)
         if current > 0:
             self.state_str = "charge_constant_current"
             sign = 1
@@ -984,7 +1784,7 @@ class CCCharge(CurrentStep):
     def __init__(self, current,
                  reports=(("voltage", 0.01), ("time", ":5:")),
                  ends=(("voltage", ">", 4.2), ("time", ">", "24::")),
-                 wait_time=10.0):
+                 wait_time=10.0, adaptive=None):
         """Inits state_str, calls the parent CurrentStep constructor with current, ends, reports, and wait_time.
 
         Args:
@@ -994,13 +1794,15 @@ class CCCharge(CurrentStep):
             reports (tuple, optional): A tuple of tuples, holds the change in voltage or time for a report to occur, time in in hours:minutes:seconds format.
                 Defaults to (("voltage", 0.01), ("time", ":5:")).
             wait_time (float, optional): Time between data measurements in seconds. Defaults to 10.0.
+            adaptive (tuple, optional): (min_wait, max_wait) bounds in seconds for an adaptive
+                measurement interval replacing wait_time. Defaults to None.
         |
         """
         # Enforce positive current
         current = abs(current)
         super().__init__(current,
                          reports=reports, ends=ends,
-                         wait_time=wait_time)
+                         wait_time=wait_time, adaptive=adaptive)
         self.state_str = "charge_constant_current"
 
 
@@ -1012,7 +1814,7 @@ class CCDischarge(CurrentStep):
     def __init__(self, current,
                  reports=(("voltage", 0.01), ("time", ":5:")),
                  ends=(("voltage", "<", 3), ("time", ">", "24::")),
-                 wait_time=10.0):
+                 wait_time=10.0, adaptive=None):
         """Inits state_str, calls the parent CurrentStep constructor with current, ends, reports, and wait_time.
 
         Args:
@@ -1022,13 +1824,15 @@ class CCDischarge(CurrentStep):
             reports (tuple, optional): A tuple of tuples, holds the change in voltage or time for a report to occur, time in in hours:minutes:seconds format.
                 Defaults to (("voltage", 0.01), ("time", ":5:")).
             wait_time (float, optional): Time between data measurements in seconds. Defaults to 10.0.
+            adaptive (tuple, optional): (min_wait, max_wait) bounds in seconds for an adaptive
+                measurement interval replacing wait_time. Defaults to None.
         |
         """
         # Enforce negative current
         current = -abs(current)
         super().__init__(current,
                          reports=reports, ends=ends,
-                         wait_time=wait_time)
+                         wait_time=wait_time, adaptive=adaptive)
         self.state_str = "discharge_constant_current"
 
 
@@ -1043,7 +1847,7 @@ class VoltageStep(ProtocolStep):
     def __init__(self, voltage,
                  reports=(("current", 0.01), ("time", ":5:")),
                  ends=(("current", "<", 0.001), ("time", ">", "24::")),
-                 wait_time=10.0):
+                 wait_time=10.0, adaptive=None):
         """Inits i_limit, end_conditions, report_conditions, and voltage.
 
         Args:
@@ -1053,9 +1857,11 @@ class VoltageStep(ProtocolStep):
                 Defaults to (("current", 0.01), ("time", ":5:")).
             voltage (float): The desired voltage for the cell to reach.
             wait_time (float, optional): Time between data measurements in seconds. Defaults to 10.0.
+            adaptive (tuple, optional): (min_wait, max_wait) bounds in seconds for an adaptive
+                measurement interval replacing wait_time. Defaults to None.
         |
         """
-        super().__init__(wait_time=wait_time)
+        super().__init__(wait_time=wait_time, adaptive=adaptive)
         self.i_limit = None
         self.voltage = voltage
         self.report_conditions = process_reports(reports)
@@ -1143,7 +1949,7 @@ class CVCharge(VoltageStep):
     def __init__(self, voltage,
                  reports=(("current", 0.01), ("time", ":5:")),
                  ends=(("current", "<", 0.001), ("time", ">", "24::")),
-                 wait_time=10.0):
+                 wait_time=10.0, adaptive=None):
         """[summary]
 
         Args:
@@ -1153,11 +1959,13 @@ class CVCharge(VoltageStep):
                 Defaults to (("current", 0.01), ("time", ":5:")).
             voltage (float): The desired voltage for the cell to reach.
             wait_time (float, optional): Time between data measurements in seconds. Defaults to 10.0.
+            adaptive (tuple, optional): (min_wait, max_wait) bounds in seconds for an adaptive
+                measurement interval replacing wait_time. Defaults to None.
         |
         """
         super().__init__(voltage,
                          reports=reports, ends=ends,
-                         wait_time=wait_time)
+                         wait_time=wait_time, adaptive=adaptive)
         self.state_str = "charge_constant_voltage"
         if parent.isTest:  # noqa: F821
             pass
@@ -1173,7 +1981,7 @@ class CVDischarge(VoltageStep):
     def __init__(self, voltage,
                  reports=(("current", 0.01), ("time", ":5:")),
                  ends=(("current", "<", 0.001), ("time", ">", "24::")),
-                 wait_time=10.0):
+                 wait_time=10.0, adaptive=None):
         """Inits state_str, calls Parent Class' constructor with voltage, reports, ends, and wait_time.
 
         Args:
@@ -1183,11 +1991,13 @@ class CVDischarge(VoltageStep):
                 Defaults to (("current", 0.01), ("time", ":5:")).
             voltage (float): The desired voltage for the cell to reach.
             wait_time (float, optional): Time between data measurements in seconds. Defaults to 10.0.
+            adaptive (tuple, optional): (min_wait, max_wait) bounds in seconds for an adaptive
+                measurement interval replacing wait_time. Defaults to None.
         |
         """
         super().__init__(voltage,
                          reports=reports, ends=ends,
-                         wait_time=wait_time)
+                         wait_time=wait_time, adaptive=adaptive)
         self.state_str = "discharge_constant_voltage"
         if parent.isTest:  # noqa: F821
             pass
@@ -1238,16 +2048,18 @@ class Rest(ProtocolStep):
     """
     def __init__(self,
                  reports=(("time", ":5:"),), ends=(("time", ">", "24::"),),
-                 wait_time=10.0):
+                 wait_time=10.0, adaptive=None):
         """Inits end_conditions, report_conditions, and state_str.
 
         Args:
             ends (tuple, optional): The total time the protocol should run for in hours:minutes:seconds format. Defaults to (("time", ">", "24::"),).
             reports (tuple, optional): The time betweem reports in hours:minutes:seconds format. Defaults to (("time", ":5:"),).
             wait_time (float, optional): Time between data measurements in seconds. Defaults to 10.0.
+            adaptive (tuple, optional): (min_wait, max_wait) bounds in seconds for an adaptive
+                measurement interval replacing wait_time. Defaults to None.
         |
         """
-        super().__init__(wait_time=wait_time)
+        super().__init__(wait_time=wait_time, adaptive=adaptive)
 
         self.state_str = "rest"
         self.report_conditions = process_reports(reports)
@@ -1357,16 +2169,18 @@ class Sleep(ProtocolStep):
     """
     def __init__(self,
                  reports=(("time", ":5:"),), ends=(("time", ">", "24::"),),
-                 wait_time=10.0):
+                 wait_time=10.0, adaptive=None):
         """Inits end_conditions, report_conditions, and state_str.
 
         Args:
             ends (tuple, optional): The total time the protocol should run for in hours:minutes:seconds format. Defaults to (("time", ">", "24::"),).
             reports (tuple, optional): The time betweem reports in hours:minutes:seconds format. Defaults to (("time", ":5:"),).
             wait_time (float, optional): Time between data measurements in seconds. Defaults to 10.0.
+            adaptive (tuple, optional): (min_wait, max_wait) bounds in seconds for an adaptive
+                measurement interval replacing wait_time. Defaults to None.
         |
         """
-        super().__init__(wait_time=wait_time)
+        super().__init__(wait_time=wait_time, adaptive=adaptive)
 
         self.state_str = "sleep"
         self.report_conditions = process_reports(reports)
@@ -1428,15 +2242,17 @@ class Sleep(ProtocolStep):
         report_data = False
         if self.status != STATUS.started:
             self._start()
+            self.compile_conditions()
             report_data = True
-        self.next_time = time.time() + self.wait_time
+        now = time.time()
+        self.next_time = now + self.measurement_interval()
 
-        self.check_end_conditions()
+        self.check_end_conditions(now)
 
         if self.status == STATUS.completed:
             report_data = True
         else:
-            report_data = report_data or self.check_report_conditions()
+            report_data = report_data or self.check_report_conditions(now)
 
         if report_data or force_report:
             self.read_data()
@@ -1495,6 +2311,25 @@ class Condition(object):
         """
         raise NotImplementedError
 
+    def compile(self):
+        """Creates a function that evaluates this condition for use by a ConditionEvaluator.
+
+        The function takes (step, now), where now is the current timestamp, and returns a
+        (met, next_time) tuple with next_time being when the condition expects to be met.
+        Subclasses override this with a specialized function. By default check() is wrapped and
+        left to adjust the step's next_time itself.
+
+        Returns:
+            function: The evaluation function.
+        |
+        """
+        check = self.check
+
+        def evaluate(step, now):
+            return check(step), NEVER
+
+        return evaluate
+
 
 class ConditionDelta(Condition):
     """Condition that checks change between latest reported value and latest measured value.
@@ -1525,6 +2360,7 @@ class ConditionDelta(Condition):
         """Checks the provided step's value against the delta value.
 
         Takes the most recent list of readings from the data list in step and indexes into the matching value to compare against delta.
+        The step's next_time is pulled in to when the fitted trend of recent readings is expected to reach the delta.
 
         Args:
             step (ProtocolStep): The step to have data pulled from its data list.
@@ -1533,43 +2369,50 @@ class ConditionDelta(Condition):
             bool: True if the end condition was satisfied, otherwise False
         |
         """
-        try:
-            if len(step.report) == 0:
-                step.next_time = time.time()
-                return True
-            else:
-                if self.is_time:
-                    val = time.time()
-                    delta = (abs(val - step.report[-1][self.index])
-                             - step.pause_time)
-                    next_time = self.delta - delta + val
-                    step.next_time = min(next_time, step.next_time)
-                else:
-                    val = step.data[-1][self.index]
-                    if step.state_str.lower().startswith('discharge') \
-                            and self.value_str == 'voltage':
-                        target_value = val - self.delta
-                    else:
-                        target_value = val + self.delta
-
-                    next_time = extrapolate_time(step.data,
-                                                 target_value,
-                                                 self.index)
-                    step.next_time = min(next_time, step.next_time)
-
-                logger.debug("Set next_time to {:.2f} (in {:.2f} sec)".format(
-                    step.next_time, step.next_time-time.time()
-                ))
-                print(abs(val - step.report[-1][self.index]))
-                print(step.report[-1])
-                print()
-                if self.comparison(abs(val - step.report[-1][self.index]),
-                                   self.delta):
-                    return True
-                else:
-                    return False
-        except IndexError or ValueError or TypeError:
-            return False
+        met, next_time = self.compile()(step, time.time())
+        step.next_time = min(step.next_time, next_time)
+        return met
+
+    def compile(self):
+        """Creates a function comparing the change since the last report against delta.
+
+        Before anything has been reported the condition is always met.
+
+        Returns:
+            function: The evaluation function, see Condition.compile().
+        |
+        """
+        index = self.index
+        delta = self.delta
+
+        if self.is_time:
+            def evaluate(step, now):
+                report = step.report
+                if not report:
+                    return True, now
+                elapsed = abs(now - report[-1][0])
+                return elapsed >= delta, delta - elapsed + step.pause_time + now
+
+            return evaluate
+
+        def evaluate(step, now):
+            report = step.report
+            if not report:
+                return True, now
+            data = step.data
+            if not data:
+                return False, NEVER
+            value = data[-1][index]
+            reference = report[-1][index]
+            if value is None or reference is None:
+                return False, NEVER
+            met = abs(value - reference) >= delta
+            if met:
+                # This point is about to be reported
+                reference = value
+            return met, extrapolate_delta_time(data, reference, delta, index)
+
+        return evaluate
 
 
 class ConditionTotalDelta(Condition):
@@ -1610,11 +2453,33 @@ class ConditionTotalDelta(Condition):
             bool: True if the end condition was satisfied, otherwise False.
         |
         """
-        try:
-            delta = abs(step.data[-1][self.index] - step.report[0][self.index])
-            return self.comparison(delta, self.delta)
-        except IndexError or ValueError or TypeError:
-            return False
+        met, next_time = self.compile()(step, time.time())
+        step.next_time = min(step.next_time, next_time)
+        return met
+
+    def compile(self):
+        """Creates a function comparing the change since the first report against delta.
+
+        Returns:
+            function: The evaluation function, see Condition.compile().
+        |
+        """
+        index = self.index
+        delta = self.delta
+        comparison = self.comparison
+
+        def evaluate(step, now):
+            report = step.report
+            data = step.data
+            if not report or not data:
+                return False, NEVER
+            value = data[-1][index]
+            first = report[0][index]
+            if value is None or first is None:
+                return False, NEVER
+            return comparison(abs(value - first), delta), NEVER
+
+        return evaluate
 
 
 class ConditionTotalTime(ConditionTotalDelta):
@@ -1633,38 +2498,29 @@ class ConditionTotalTime(ConditionTotalDelta):
         """
         super().__init__("time", delta)
 
-    def check(self, step):
-        """Checks the provided step's value against the delta value.
+    def compile(self):
+        """Creates a function comparing the time elapsed since the first report, less pauses, against delta.
 
-        Takes the first list of readings from the data list in step and indexes into the matching value to compare against delta.
+        The clock time is used rather than the latest measurement, as the condition may be
+        evaluated before any measurement is performed.
 
-        Args:
-            step (ProtocolStep): The step to have data pulled from its data list.
-
-        Returns:        
-            bool: True if the end condition was satisfied, otherwise False.
+        Returns:
+            function: The evaluation function, see Condition.compile().
         |
         """
-        try:
-            # Previously was using the last step.data to do the check, however,
-            # in the case where no measurements are
-            # performed prioir to evaluating the condition this does not give
-            # the correct result
-            # I see no downside to taking the clock time instead
-            delta = abs(time.time() - step.report[0][self.index]) \
-                - step.pause_time
-
-            if self.comparison(delta, self.delta):
-                return True
-            else:
-                next_time = self.delta - delta + time.time()
-                step.next_time = min(step.next_time, next_time)
-                logger.debug("{}, set next_time to {}".format(
-                    self.value_str,
-                    step.next_time))
-                return False
-        except IndexError or ValueError or TypeError:
-            return False
+        delta = self.delta
+        comparison = self.comparison
+
+        def evaluate(step, now):
+            report = step.report
+            if not report:
+                return False, NEVER
+            elapsed = abs(now - report[0][0]) - step.pause_time
+            if comparison(elapsed, delta):
+                return True, NEVER
+            return False, delta - elapsed + now
+
+        return evaluate
 
 
 class ConditionAbsolute(Condition):
@@ -1711,29 +2567,90 @@ class ConditionAbsolute(Condition):
             bool: True if the end condition was satisfied, otherwise False
         |
         """
-        try:
-            execute_check = True
-            if self.min_time is not None:
-                execute_check = (
-                    step.data[-1][0] - step.report[0][0] > self.min_time
-                )
+        met, next_time = self.compile()(step, time.time())
+        step.next_time = min(step.next_time, next_time)
+        return met
 
-            if execute_check:
-                if self.comparison(step.data[-1][self.index], self.value):
-                    return True
-                else:
-                    next_time = extrapolate_time(step.data,
-                                                 self.value,
-                                                 self.index)
-                    step.next_time = min(next_time, step.next_time)
-                    logger.debug(f"{self.value_str} set next_time to \
-                                   {step.next_time:.2f} (in \
-                                   {step.next_time - time.time():.2f} sec)")
-                    return False
-            else:
-                return False
-        except IndexError or ValueError or TypeError:
-            return False
+    def compile(self):
+        """Creates a function comparing the latest measurement against the set value.
+
+        If the value is not met yet, next_time is extrapolated from the recent trend.
+
+        Returns:
+            function: The evaluation function, see Condition.compile().
+        |
+        """
+        index = self.index
+        value = self.value
+        comparison = self.comparison
+        min_time = self.min_time
+
+        def evaluate(step, now):
+            data = step.data
+            if not data:
+                return False, NEVER
+            last = data[-1]
+            if min_time is not None:
+                report = step.report
+                if not report or not last[0] - report[0][0] > min_time:
+                    return False, NEVER
+            if last[index] is None:
+                return False, NEVER
+            if comparison(last[index], value):
+                return True, NEVER
+            return False, project_time(fit_trend(data, index), value)
+
+        return evaluate
+
+
+class ConditionEvaluator(object):
+    """Evaluates a list of Conditions against a step in a single pass.
+
+    The conditions are compiled once into specialized functions, so each evaluation only
+    reads the clock once and combines the next_time of every condition as it goes.
+
+    Attributes:
+        conditions (list): The Conditions this evaluator was compiled from.
+        functions (list): The compiled evaluation functions, see Condition.compile().
+    |
+    """
+    def __init__(self, conditions):
+        """Inits with conditions and compiles them into functions.
+
+        Args:
+            conditions (list): A list of Condition objects.
+        |
+        """
+        self.conditions = conditions
+        self.functions = [condition.compile() for condition in conditions]
+
+    def evaluate(self, step, now=None, stop_on_met=False):
+        """Evaluates all conditions against the step.
+
+        Args:
+            step (ProtocolStep): The step to evaluate the conditions against.
+            now (float, optional): The current timestamp. Read from the clock if None.
+            stop_on_met (bool, optional): Stop at the first met condition, for when the
+                next_time is not needed once any condition is met. Defaults to False.
+
+        Returns:
+            tuple: (met, next_time) where met is True if any condition is met and next_time
+                is the earliest time at which a condition expects to be met.
+        |
+        """
+        if now is None:
+            now = time.time()
+        met = False
+        next_time = NEVER
+        for function in self.functions:
+            condition_met, condition_next_time = function(step, now)
+            if condition_next_time < next_time:
+                next_time = condition_next_time
+            if condition_met:
+                met = True
+                if stop_on_met:
+                    break
+        return met, next_time
 
 
 def condition_end_voltage(voltage, operator_str):
@@ -1870,12 +2787,98 @@ def condition_dc(dc):
     return ConditionDelta("capacity", dc)
 
 
+def fit_trend(data, index, window=EXTRAPOLATION_WINDOW):
+    """Fits a least-squares slope through the most recent measurements of a value.
+
+    Rows where the value could not be read (None) are skipped.
+
+    Args:
+        data (list): A list of lists of measurements, time is expected at index 0.
+        index (int): Which of the values to fit i.e. [0:self.last_time, 1:current,
+                2:voltage, 3:capacity, 4:plugin_values]
+        window (int, optional): The number of most recent rows to fit.
+            Defaults to EXTRAPOLATION_WINDOW.
+
+    Returns:
+        tuple: (time, value, slope, slope_error) where time and value are the latest
+            measurement and slope_error is the standard error of the slope.
+            None if there are fewer than two usable points or no spread in time.
+    |
+    """
+    # Single pass over offsets from the latest usable point, which keeps the sums
+    # small compared to epoch timestamps
+    n = 0
+    t_ref = v_ref = None
+    s_t = s_v = s_tt = s_tv = s_vv = 0.0
+    for row in reversed(data[-window:]):
+        value = row[index]
+        if value is None:
+            continue
+        if t_ref is None:
+            t_ref = row[0]
+            v_ref = value
+        t = row[0] - t_ref
+        v = value - v_ref
+        n += 1
+        s_t += t
+        s_v += v
+        s_tt += t * t
+        s_tv += t * v
+        s_vv += v * v
+
+    if n < 2:
+        return None
+    s_tt -= s_t * s_t / n
+    if s_tt <= 0.0:
+        return None
+    s_tv -= s_t * s_v / n
+    slope = s_tv / s_tt
+
+    slope_error = 0.0
+    if n > 2:
+        residual = s_vv - s_v * s_v / n - slope * s_tv
+        if residual > 0.0:
+            slope_error = math.sqrt(residual / (n - 2) / s_tt)
+
+    return t_ref, v_ref, slope, slope_error
+
+
+def project_time(trend, target, confidence=EXTRAPOLATION_CONFIDENCE):
+    """Estimates when a fitted trend will reach a target value.
+
+    The estimate is clamped to the confidence band of the fit: the fastest rate of
+    approach that is still plausible given the standard error of the slope is used,
+    so noise makes the estimate early rather than late.
+
+    Args:
+        trend (tuple): The result of fit_trend(), may be None.
+        target (float): The value being extrapolated to.
+        confidence (float, optional): Number of standard errors used for clamping.
+            Defaults to EXTRAPOLATION_CONFIDENCE.
+
+    Returns:
+        float: The time at which the target will be hit, NEVER if it cannot be estimated
+            or the value is confidently moving away from the target.
+    |
+    """
+    if trend is None:
+        return NEVER
+    t_ref, v_ref, slope, slope_error = trend
+    gap = target - v_ref
+    if gap == 0.0:
+        return t_ref
+    approach = (slope if gap > 0 else -slope) + confidence * slope_error
+    if approach <= 0.0:
+        return NEVER
+    return t_ref + abs(gap) / approach
+
+
 def extrapolate_time(data, target, index):
-    """Estimates the time until a voltage cutoff is reached.
+    """Estimates the time until a target value is reached.
 
     Args:
         data (list): A list of lists of measurements taken (voltages, currents, times) at each time.
-        target (float): The target voltage being extrapolated to.
+        target (float): The target value being extrapolated to.
         index (int): Which of the values being tested against i.e. [0:self.last_time, 1:current,
                 2:voltage, 3:capacity, 4:plugin_values]
 
@@ -1884,52 +2887,38 @@ def extrapolate_time(data, target, index):
     |
     """
     try:
-        # Project when it will be hit
-        d1 = data[-1]
-        # require at least 10 mV of difference for projection
-        for i in range(2, 100):
-            d0 = data[-i]
-            if abs(d1[2] - d0[2]) > 0.0001:
-                break
-        next_time = ((target - d1[index])
-                     / (d1[index] - d0[index])
-                     * (d1[0] - d0[0]) + d1[0])
-        current_time = time.time()
-        logger.debug("Current time {:.2f}, \
-                      Extrapolated time {:.2f} (in {:.2f} sec) \
-                      using {} index and target value {}".format(
-            current_time, next_time, next_time-current_time,
-            DATA_NAME_MAP[index], target))
-
-    except (NameError, IndexError, ZeroDivisionError):
+        next_time = project_time(fit_trend(data, index), target)
+        logger.debug("Extrapolated time {:.2f} using {} index and target "
+                     "value {}".format(next_time, DATA_NAME_MAP[index], target))
+    except (NameError, IndexError, TypeError, ZeroDivisionError):
         next_time = NEVER
         logger.debug("Failed extrapolating, next_time: {}".format(next_time))
 
     return next_time
 
 
-def time_conversion(t):
-    """Converts time in the "hh:mm:ss" format to seconds as a float.
+def extrapolate_delta_time(data, reference, delta, index):
+    """Estimates the time until a value moves a given amount away from a reference.
+
+    The direction of the move is taken from the fitted trend, so rising and falling
+    values are handled alike.
 
     Args:
-        t (str or float): time in the "hh:mm:ss" format, where values can be ommitted
-            e.g. "::5" would be five seconds or time in seconds.
+        data (list): A list of lists of measurements taken (voltages, currents, times) at each time.
+        reference (float): The value the change is measured from, usually the last reported value.
+        delta (float): The absolute change being extrapolated to.
+        index (int): Which of the values being tested against i.e. [0:self.last_time, 1:current,
+                2:voltage, 3:capacity, 4:plugin_values]
 
     Returns:
-        float: Calculated time in Seconds.
+        float: The time at which the change will be reached.
     |
     """
-    t_float = None
     try:
-        t_float = float(t)
-    except ValueError:
-        try:
-            time_tuple = [float(x) if x else 0 for x in t.split(":")]
-            t_float = (time_tuple[0]
-                       * 3600.
-                       + time_tuple[1]
-                       * 60.0
-                       + time_tuple[2])
-        except AttributeError:
-            pass
-    return t_float
+        trend = fit_trend(data, index)
+        if trend is None:
+            return NEVER
+        target = reference + math.copysign(abs(delta), trend[2])
+        return project_time(trend, target)
+    except (IndexError, TypeError):
+        return NEVER
@@ -0,0 +1,380 @@
+"""Multi-resolution min/max/mean summaries of a channel's data, kept during acquisition.
+
+Remote viewers asking for days of a channel would otherwise have to read the whole log.
+A Pyramid is fed every row written to the log and keeps, for each of LEVELS, one bucket
+per bucket width of epoch time holding the number of rows and, for each of COLUMNS, the
+minimum, maximum, sum and number of values. Only buckets with data are kept.
+
+Rows only update the finest level. Each bucket it finishes is merged into the next level,
+and so on, so a row costs the same however many levels there are. The latest buckets of
+each level are in memory. Older ones are appended to a file per level in a directory next
+to the log (the log path with SUFFIX appended) and read back through a memory map, so
+memory stays bounded however long the test runs.
+
+series() picks the finest level whose buckets over the requested time range fit in
+max_points, and merges neighbouring buckets if even the coarsest does not. It finds the
+range by bisection, so its time and the size of its result depend on max_points, not on
+the length of the test.
+
+|
+"""
+import bisect
+import math
+import os
+
+import numpy as np
+
+SUFFIX = ".pyr"
+LEVELS = (1, 60, 900, 3600)  # Bucket widths in seconds, each a multiple of the one before
+COLUMNS = ("current", "voltage", "capacity")
+MEMORY_BUCKETS = 512  # Buckets of a level kept in memory beyond those written to disk
+MAX_POINTS = 1000  # Buckets returned by series() unless asked otherwise
+
+DTYPE = np.dtype("<f8")
+
+
+def pyramid_path(path):
+    """Returns the directory of the pyramid of a log.
+
+    Args:
+        path (str): The log file.
+
+    Returns:
+        str: The directory.
+    |
+    """
+    return path + SUFFIX
+
+
+class _Starts(object):
+    """The bucket start times of rows, for bisect, without copying them.
+
+    |
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index][0]
+
+
+def combine(rows, groups, columns):
+    """Merges groups of consecutive buckets into one bucket each.
+
+    Args:
+        columns (int): Number of columns.
+        groups (numpy.ndarray): Index of the first bucket of every group, increasing.
+        rows (numpy.ndarray): Buckets as rows of (start, count, minimums, maximums, sums,
+            value counts).
+
+    Returns:
+        numpy.ndarray: The merged buckets, starting at the start of their first bucket.
+    |
+    """
+    n = columns
+    merged = np.empty((len(groups), rows.shape[1]), dtype=DTYPE)
+    merged[:, 0] = rows[groups, 0]
+    merged[:, 1] = np.add.reduceat(rows[:, 1], groups)
+    merged[:, 2:2 + n] = np.fmin.reduceat(rows[:, 2:2 + n], groups)
+    merged[:, 2 + n:2 + 2 * n] = np.fmax.reduceat(rows[:, 2 + n:2 + 2 * n], groups)
+    merged[:, 2 + 2 * n:] = np.add.reduceat(rows[:, 2 + 2 * n:], groups)
+    return merged
+
+
+def merge(rows, size, columns):
+    """Merges every size consecutive buckets into one.
+
+    Args:
+        columns (int): Number of columns.
+        rows (numpy.ndarray): Buckets as rows, see combine().
+        size (int): Number of buckets merged into one.
+
+    Returns:
+        numpy.ndarray: The merged buckets.
+    |
+    """
+    if size <= 1 or not len(rows):
+        return rows
+    return combine(rows, np.arange(0, len(rows), size), columns)
+
+
+class Level(object):
+    """The buckets of one width, the older ones on disk.
+
+    Attributes:
+        bucket (list): The bucket being filled, None before the first row.
+        columns (int): Number of columns.
+        memory (int): Buckets kept in memory beyond those written to disk.
+        path (str): The file the older buckets are appended to, None to keep all in memory.
+        rows (list): The finished buckets not written to disk.
+        width (float): The bucket width in seconds.
+    |
+    """
+
+    def __init__(self, width, columns, path=None, memory=MEMORY_BUCKETS):
+        """Inits the level, with the buckets already written to path if any.
+
+        Args:
+            columns (int): Number of columns.
+            memory (int, optional): Buckets kept in memory beyond those written to disk.
+                Defaults to MEMORY_BUCKETS.
+            path (str, optional): The file to write older buckets to. Defaults to None to
+                keep them all in memory.
+            width (float): The bucket width in seconds.
+        |
+        """
+        self.width = width
+        self.columns = columns
+        self.path = path
+        self.memory = memory
+        self.rows = []
+        self.bucket = None
+        self._size = 2 + 4 * columns
+        self._disk = None
+        if path is not None and os.path.isfile(path):
+            self._map()
+
+    def add(self, bucket):
+        """Merges a row or a finer bucket into the level.
+
+        Args:
+            bucket (list): A bucket, see combine(), whose start is floored to the width.
+
+        Returns:
+            list: The bucket finished by this one, None if it is still being filled.
+        |
+        """
+        start = math.floor(bucket[0] / self.width) * self.width
+        current = self.bucket
+        if current is not None and current[0] == start:
+            n = self.columns
+            current[1] += bucket[1]
+            for i in range(2, 2 + n):
+                # NaN stands for no value, any value replaces it
+                if bucket[i] < current[i] or current[i] != current[i]:
+                    current[i] = bucket[i]
+                if bucket[i + n] > current[i + n] or current[i + n] != current[i + n]:
+                    current[i + n] = bucket[i + n]
+            for i in range(2 + 2 * n, 2 + 4 * n):
+                current[i] += bucket[i]
+            return None
+
+        self.bucket = [start] + list(bucket[1:])
+        if current is None:
+            return None
+        self.rows.append(current)
+        if self.path is not None and len(self.rows) >= 2 * self.memory:
+            self._spill(self.memory)
+        return current
+
+    def flush(self):
+        """Writes every finished bucket to disk.
+
+        |
+        """
+        if self.path is not None and self.rows:
+            self._spill(len(self.rows))
+
+    def buckets(self, t0, t1):
+        """Returns the buckets overlapping a time range, the one being filled included.
+
+        Args:
+            t0 (float): Start of the range, epoch time in seconds.
+            t1 (float): End of the range, epoch time in seconds.
+
+        Returns:
+            numpy.ndarray: The buckets as rows, see combine().
+        |
+        """
+        parts = []
+        for rows in (self._disk, self.rows):
+            if rows is None or not len(rows):
+                continue
+            starts = _Starts(rows)
+            low = bisect.bisect_right(starts, t0 - self.width)
+            high = bisect.bisect_right(starts, t1)
+            if high > low:
+                parts.append(np.array(rows[low:high], dtype=DTYPE))
+        if self.bucket is not None and t0 - self.width < self.bucket[0] <= t1:
+            parts.append(np.array([self.bucket], dtype=DTYPE))
+        if not parts:
+            return np.empty((0, self._size), dtype=DTYPE)
+        return np.concatenate(parts)
+
+    def count(self, t0, t1):
+        """Returns the number of buckets overlapping a time range, the one being filled included.
+
+        |
+        """
+        total = 0
+        for rows in (self._disk, self.rows):
+            if rows is not None and len(rows):
+                starts = _Starts(rows)
+                total += (bisect.bisect_right(starts, t1)
+                          - bisect.bisect_right(starts, t0 - self.width))
+        if self.bucket is not None and t0 - self.width < self.bucket[0] <= t1:
+            total += 1
+        return total
+
+    def _spill(self, count):
+        with open(self.path, "ab") as file:
+            np.array(self.rows[:count], dtype=DTYPE).tofile(file)
+        del self.rows[:count]
+        self._map()
+
+    def _map(self):
+        rows = os.path.getsize(self.path) // (self._size * DTYPE.itemsize)
+        if rows:
+            self._disk = np.memmap(self.path, dtype=DTYPE, mode="r",
+                                   shape=(rows, self._size))
+
+
+class Pyramid(object):
+    """Summaries of a channel's data at several time resolutions.
+
+    Attributes:
+        columns (tuple): Names of the columns.
+        levels (list): The Level of every bucket width, finest first.
+        path (str): The directory the older buckets are written to, None to keep them all in
+            memory.
+        rows (int): Number of rows added.
+    |
+    """
+
+    def __init__(self, path=None, levels=LEVELS, columns=COLUMNS, memory=MEMORY_BUCKETS):
+        """Inits the levels, reading the buckets already written to path if any.
+
+        Args:
+            columns (tuple, optional): Names of the columns. Defaults to COLUMNS.
+            levels (tuple, optional): Bucket widths in seconds, finest first, each a
+                multiple of the one before. Defaults to LEVELS.
+            memory (int, optional): Buckets of a level kept in memory beyond those written
+                to disk. Defaults to MEMORY_BUCKETS.
+            path (str, optional): The directory to write older buckets to, see
+                pyramid_path(). Defaults to None to keep them all in memory.
+
+        Raises:
+            ValueError: If a level is not a multiple of the one before.
+        |
+        """
+        for finer, coarser in zip(levels, levels[1:]):
+            if coarser % finer:
+                raise ValueError("pyramid levels must be multiples of each other, got "
+                                 "{} and {}".format(finer, coarser))
+        self.path = path
+        self.columns = tuple(columns)
+        self.rows = 0
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+        self.levels = [
+            Level(width, len(self.columns),
+                  None if path is None else os.path.join(path, "{}.bin".format(width)),
+                  memory)
+            for width in levels]
+
+    def add(self, timestamp, values):
+        """Adds a row.
+
+        Args:
+            timestamp (float): Epoch time of the row in seconds.
+            values (list): One value per column, None where it could not be read.
+        |
+        """
+        self.rows += 1
+        minimums, sums, counts = [], [], []
+        for value in values:
+            if value is None or value != value:
+                minimums.append(math.nan)
+                sums.append(0.)
+                counts.append(0.)
+            else:
+                minimums.append(value)
+                sums.append(value)
+                counts.append(1.)
+        bucket = [timestamp, 1.] + minimums + minimums + sums + counts
+        for level in self.levels:
+            bucket = level.add(bucket)
+            if bucket is None:
+                break
+
+    def flush(self):
+        """Writes every finished bucket to disk.
+
+        |
+        """
+        for level in self.levels:
+            level.flush()
+
+    def series(self, t0=None, t1=None, max_points=MAX_POINTS):
+        """Returns the summary of a time range at the finest resolution fitting max_points.
+
+        Args:
+            max_points (int, optional): Most buckets returned. Defaults to MAX_POINTS.
+            t0 (float, optional): Start of the range, epoch time in seconds. Defaults to None
+                for the start of the data.
+            t1 (float, optional): End of the range, epoch time in seconds. Defaults to None
+                for the end of the data.
+
+        Returns:
+            dict: "level", the bucket width in seconds, "t0", "t1", "time", the start of
+                every bucket, "count", the number of rows in it, and "min", "max" and
+                "mean", the statistics of every column by name, None without values.
+        |
+        """
+        max_points = max(1, int(max_points))
+        t0 = -math.inf if t0 is None else float(t0)
+        t1 = math.inf if t1 is None else float(t1)
+        n = len(self.columns)
+
+        chosen = self.levels[-1]
+        for level in self.levels:
+            if level.count(t0, t1) <= max_points:
+                chosen = level
+                break
+        rows = chosen.buckets(t0, t1)
+        rows = self._with_pending(chosen, rows, t0, t1)
+        width = chosen.width
+        if len(rows) > max_points:
+            size = int(math.ceil(len(rows) / max_points))
+            rows = merge(rows, size, n)
+            width *= size
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = rows[:, 2 + 2 * n:2 + 3 * n] / rows[:, 2 + 3 * n:]
+        result = {"level": width, "t0": None if math.isinf(t0) else t0,
+                  "t1": None if math.isinf(t1) else t1,
+                  "time": rows[:, 0].tolist(), "count": rows[:, 1].astype(int).tolist(),
+                  "min": {}, "max": {}, "mean": {}}
+        for i, column in enumerate(self.columns):
+            result["min"][column] = _values(rows[:, 2 + i])
+            result["max"][column] = _values(rows[:, 2 + n + i])
+            result["mean"][column] = _values(means[:, i])
+        return result
+
+    def _with_pending(self, chosen, rows, t0, t1):
+        """Adds the rows not yet merged up from the finer levels to the last buckets.
+
+        |
+        """
+        index = self.levels.index(chosen)
+        pending = [level.bucket for level in self.levels[:index]
+                   if level.bucket is not None
+                   and t0 - level.width < level.bucket[0] <= t1]
+        if not pending:
+            return rows
+        pending = np.array(pending, dtype=DTYPE)
+        pending[:, 0] = np.floor(pending[:, 0] / chosen.width) * chosen.width
+        rows = np.concatenate([rows, pending])
+        rows = rows[np.argsort(rows[:, 0], kind="stable")]
+        starts, first = np.unique(rows[:, 0], return_index=True)
+        if len(starts) == len(rows):
+            return rows
+        return combine(rows, first, len(self.columns))
+
+
+def _values(array):
+    return [None if value != value else value for value in array.tolist()]
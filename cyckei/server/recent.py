@@ -0,0 +1,134 @@
+"""Window of the latest measurements of a running channel, for live plots in the client.
+
+Every measurement a CellRunner's steps take is added to its RecentWindow, numbered by a
+sequence number that keeps counting across steps. A client passes the sequence number
+after the last sample it has, and since() returns the newer samples still in the window,
+decimated to max_points, so a reply stays the same size however many samples were taken.
+
+The samples are sent as little-endian float32 rows of (seconds since "t0", current,
+voltage), base64 encoded to travel in the JSON replies. Decimation keeps the lowest and
+highest voltage of equal groups of samples, so spikes show on the plot.
+
+|
+"""
+import base64
+import uuid
+
+import numpy as np
+
+SAMPLES = 2048  # Measurements kept per channel
+MAX_POINTS = 200  # Samples returned by since() unless asked otherwise
+DTYPE = np.dtype("<f4")
+
+
+def decimate(values, max_points):
+    """Picks the samples with the lowest and highest value of equal groups of samples.
+
+    Args:
+        max_points (int): Most samples picked.
+        values (numpy.ndarray): The values, NaN for those not read.
+
+    Returns:
+        numpy.ndarray: The indexes of the picked samples, increasing.
+    |
+    """
+    count = len(values)
+    if count <= max_points:
+        return np.arange(count)
+    size = -(-count // max(max_points // 2, 1))  # Samples per group
+    groups = -(-count // size)
+    starts = np.arange(groups) * size
+    # Pad the last group, values not read are never picked over those read
+    low = np.full(groups * size, np.inf)
+    low[:count] = np.where(np.isnan(values), np.inf, values)
+    high = np.full(groups * size, -np.inf)
+    high[:count] = np.where(np.isnan(values), -np.inf, values)
+    picked = np.concatenate([starts + low.reshape(groups, size).argmin(axis=1),
+                             starts + high.reshape(groups, size).argmax(axis=1)])
+    return np.unique(picked)[:max_points]
+
+
+def decode(data):
+    """Unpacks the samples of a since() reply.
+
+    Args:
+        data (str): The "data" of the reply.
+
+    Returns:
+        numpy.ndarray: Rows of (seconds since "t0", current, voltage).
+    |
+    """
+    return np.frombuffer(base64.b64decode(data), dtype=DTYPE).reshape(-1, 3)
+
+
+class RecentWindow(object):
+    """Ring buffer of the latest measurements of a channel.
+
+    Attributes:
+        count (int): Number of measurements added, the sequence number of the next one.
+        epoch (str): Identifies the window, sequence numbers of another are meaningless.
+        size (int): Measurements kept.
+    |
+    """
+
+    def __init__(self, size=SAMPLES):
+        """Inits an empty window.
+
+        Args:
+            size (int, optional): Measurements kept. Defaults to SAMPLES.
+        |
+        """
+        self.epoch = uuid.uuid4().hex
+        self.size = size
+        self.count = 0
+        self.times = np.zeros(size)
+        self.values = np.zeros((size, 2), dtype=DTYPE)
+
+    def add(self, timestamp, current, voltage):
+        """Adds a measurement, replacing the oldest once the window is full.
+
+        Args:
+            current (float): Current in Amps, None if it was not read.
+            timestamp (float): Epoch time in seconds.
+            voltage (float): Voltage in Volts, None if it was not read.
+        |
+        """
+        index = self.count % self.size
+        self.times[index] = timestamp
+        self.values[index] = (np.nan if current is None else current,
+                              np.nan if voltage is None else voltage)
+        self.count += 1
+
+    def since(self, sequence=None, epoch=None, max_points=MAX_POINTS):
+        """Returns the measurements from a sequence number on.
+
+        Args:
+            epoch (str, optional): The epoch the sequence number is from. Defaults to None.
+            max_points (int, optional): Most samples returned. Defaults to MAX_POINTS.
+            sequence (int, optional): Sequence number of the first measurement wanted.
+                Defaults to None for every measurement in the window.
+
+        Returns:
+            dict: The "epoch", the sequence numbers "first" returned and "next" to ask for,
+                "reset" when the samples do not follow those of sequence, e.g. ones were
+                dropped from the window, the "points" returned, their "t0" and "data".
+        |
+        """
+        oldest = max(self.count - self.size, 0)
+        reset = (epoch != self.epoch or sequence is None
+                 or not oldest <= sequence <= self.count)
+        first = oldest if reset else sequence
+
+        indexes = np.arange(first, self.count) % self.size
+        values = self.values[indexes]
+        picked = decimate(values[:, 1], max_points)
+        times = self.times[indexes][picked]
+        t0 = float(times[0]) if len(times) else None
+
+        rows = np.empty((len(picked), 3), dtype=DTYPE)
+        if len(picked):
+            rows[:, 0] = times - t0
+            rows[:, 1:] = values[picked]
+        return {"epoch": self.epoch, "first": first, "next": self.count, "reset": reset,
+                "points": len(picked), "t0": t0,
+                "data": base64.b64encode(rows.tobytes()).decode("ascii")}
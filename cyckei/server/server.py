@@ -3,16 +3,23 @@
 import logging
 import time
 import traceback
-from os.path import isfile, basename, join as joinPaths
+from os.path import abspath, isfile, basename, join as joinPaths
 from collections import OrderedDict
-import json
 
-from pyvisa.constants import VI_ERROR_TMO
 import zmq
-from pyvisa import VisaIOError
 
 from .protocols import STATUS, CellRunner
+from .batch import ConditionTable
+from .archiver import Archiver, CPU_LIMIT
+from .state import StateStore, FILE_NAME as STATE_FILE_NAME, BATCH_INTERVAL
+from .journal import Journal, FILE_NAME as JOURNAL_FILE_NAME, CHECKPOINT_INTERVAL
+from .pyramid import Pyramid, pyramid_path, MAX_POINTS
+from .recent import MAX_POINTS as RECENT_POINTS
+from .feed import StatusFeed
+from .writer import (DataWriter, HANDLES, FLUSH_POINTS, FLUSH_INTERVAL,
+                     QUEUE_SIZE, MAX_OPEN_FILES)
 from . import keithley2602 as device_module
+from cyckei.functions import func, startup
 
 logger = logging.getLogger('cyckei_server')
 
@@ -46,6 +53,7 @@ def main(config, plugins, plugin_names):
             "It appears the server is already running: {}".format(error))
         return
     logger.debug("Socket bound successfully")
+    startup.mark("bind socket")
 
     # Start server event loop
     event_loop(config, socket, plugins, plugin_names, device_module)
@@ -74,14 +82,22 @@ def event_loop(config, socket, plugins, plugin_names, device_module):
         socket (zmq.Socket): An object that acts as a socket that can send and receive messages.
     |
     """
+    writer = None
+    archiver = None
+    store = None
+    journal = None
+    feed = None
     try:
         logger.debug("Starting server event loop")
+        # Tests resumed from the journal need the outputs left on
+        resume = bool(config["arguments"].get("resume", False))
 
         # Create list of sources (outputs)
         keithleys = []
         sources = []
 
-        # Initialize sources
+        # Initialize sources, pyvisa is slow to import and only needed from here
+        from pyvisa import VisaIOError
         logger.info("Attemping {} channels.".format(len(config["channels"])))
         for channel in config["channels"]:
             gpib_addr = channel["gpib_address"]
@@ -91,7 +107,11 @@ def event_loop(config, socket, plugins, plugin_names, device_module):
                     keithley = k
             if keithley is None:
                 try:
-                    keithley = device_module.DeviceController(gpib_addr)
+                    if resume:
+                        keithley = device_module.DeviceController(
+                            gpib_addr, reset=False)
+                    else:
+                        keithley = device_module.DeviceController(gpib_addr)
                 except (ValueError, VisaIOError) as e:
                     logger.error("Could not establish connection: "
                                  "Channel {}, GPIB {}.".format(
@@ -108,6 +128,10 @@ def event_loop(config, socket, plugins, plugin_names, device_module):
             sources.append(source_object)
 
         logger.info("Connected {} channels.".format(len(sources)))
+        if keithleys:
+            # Let the instruments settle
+            time.sleep(2)
+        startup.mark("connect devices")
 
         # Initialize socket
         runners = []
@@ -117,12 +141,71 @@ def event_loop(config, socket, plugins, plugin_names, device_module):
                 int(config["zmq"]["port"]))
         )
 
-        time.sleep(2)
         max_counter = 1e9
         counter = 0
         initial_time = time.time()
         data_path = config["arguments"]["record_dir"]
 
+        # Optionally evaluate the conditions of all due channels together
+        table = None
+        if str(config["behavior"].get("batch-conditions", "false")).lower() \
+                in ("true", "yes", "on", "1"):
+            logger.info("Evaluating step conditions in batches.")
+            table = ConditionTable()
+
+        # Data files are written from a separate thread, keeping a bounded number open
+        behavior = config["behavior"]
+        max_open = int(behavior.get("open-files", MAX_OPEN_FILES))
+        HANDLES.max_open = max_open
+        writer = DataWriter(
+            flush_points=int(behavior.get("flush-points", FLUSH_POINTS)),
+            flush_interval=float(behavior.get("flush-interval", FLUSH_INTERVAL)),
+            fsync=str(behavior.get("fsync", "false")).lower()
+            in ("true", "yes", "on", "1"),
+            queue_size=int(behavior.get("write-queue", QUEUE_SIZE)),
+            max_open=max_open)
+
+        # Logs of finished tests are compressed in the background
+        method = str(behavior.get("archive", "none")).lower()
+        if method not in ("none", "false", "off", "no", ""):
+            logger.info("Archiving finished logs with {}.".format(method))
+            archiver = Archiver(
+                method, cpu_limit=float(behavior.get("archive-cpu", CPU_LIMIT)),
+                writer=writer)
+
+        # Channel status and history are kept in SQLite, written in batches from a thread
+        store = StateStore(
+            joinPaths(data_path, STATE_FILE_NAME),
+            batch_interval=float(behavior.get("state-interval", BATCH_INTERVAL)))
+
+        # Status changes are published to subscribed clients, and polled by version
+        zmq_config = config["zmq"]
+        feed = StatusFeed("{}:{}".format(
+            zmq_config["server-address"],
+            func.publish_port(zmq_config)))
+
+        # Running tests are checkpointed, to be continued after a restart with --resume
+        journal = Journal(
+            joinPaths(data_path, JOURNAL_FILE_NAME),
+            interval=float(behavior.get("checkpoint-interval", CHECKPOINT_INTERVAL)))
+        # Summaries of the data of every channel's latest test, for get_series
+        pyramids = {}
+        if resume:
+            recovery_start = time.time()
+            runners = journal.recover(sources, plugins, writer)
+            for runner in runners:
+                runner.pyramid = pyramids[runner.channel] = Pyramid(
+                    pyramid_path(runner.fpath))
+            logger.info("Resumed {} tests in {:.2f} s.".format(
+                len(runners), time.time() - recovery_start))
+        else:
+            journal.clear()
+        # Recorded before the first request, so info_server_file has every channel
+        store.update(info_all_channels(runners, sources))
+        startup.finish("start writers and state")
+        # Logs of the runners out of control, already submitted for archiving
+        no_control = set()
+
         while True:
             current_time = '{0:02.0f}.{1:02.0f}'.format(
                 *divmod((time.time() - initial_time) * 60, 60)
@@ -134,7 +217,8 @@ def event_loop(config, socket, plugins, plugin_names, device_module):
             # main loop without problem
             # logger.debug("Processing socket messages")
             process_socket(config, socket, runners, sources, current_time,
-                           plugins, plugin_names)
+                           plugins, plugin_names, writer, archiver, store, pyramids,
+                           feed)
 
             # execute runners or sleep if none
             if runners:
@@ -158,8 +242,11 @@ def event_loop(config, socket, plugins, plugin_names, device_module):
                                           + "/"
                                           + str(relative_next_time)[:5])
 
-                        if relative_next_time <= 0.0:
+                        if relative_next_time <= 0.0 and table is None:
                             runner.run()
+
+                if table is not None:
+                    table.run(runners)
                 # logger.debug(
                 #    "Channel {} will be \
                 #     checked in approx {} seconds...".format(
@@ -174,61 +261,46 @@ def event_loop(config, socket, plugins, plugin_names, device_module):
                     reverse=True
                 )
                 for i in ipop:
-                    runners.pop(i)
+                    finished = runners.pop(i)
+                    if archiver is not None:
+                        archiver.submit(finished.fpath)
+                if archiver is not None:
+                    # Submitted once, when the runner loses control
+                    lost = {runner.fpath for runner in runners
+                            if runner.status == STATUS.nocontrol}
+                    for path in lost - no_control:
+                        archiver.submit(path)
+                    no_control = lost
 
             time.sleep(0.1)
 
-            # records server status
-            record_data(data_path, info_all_channels(runners, sources))
+            # records server status and publishes what changed
+            channels = info_all_channels(runners, sources)
+            store.update(channels)
+            feed.update(channels)
+            journal.record(runners)
 
             # mod it by a large value to avoid ever overflowing
             counter = counter % max_counter + 1
     except Exception as e:
         logger.error("Failed with uncaught exception:")
         logger.exception(e)
+    finally:
+        if feed is not None:
+            feed.close()
+        if journal is not None:
+            journal.close()
+        if store is not None:
+            store.close()
+        if archiver is not None:
+            archiver.close()
+        if writer is not None:
+            logger.info("Writing buffered data.")
+            writer.close()
 
-def record_data(data_path, data):
-    """Saves server status to a file.
-
-    Uses the data_path to open an existing or new file, converts the data to a json,
-    then writes the data to the file. If there is already existing data in channels
-    it is not overwritten by the same channels now being empty.
-        
-    Args:
-        data (dict): The data to be stored in a file.
-        data_path (str): The path to the area where the user wants the server_data file stored.
-    |
-    """
-    data_path = joinPaths(data_path, "server_data.txt")
-    #loads server_file into a dict
-    try:
-        data_file = open(data_path, "r")
-        old_data = json.load(data_file)
-        data_file.close()
-        try:
-        #This section is to avoid overwriting the previous protocol with the nulls
-        #from when a cell runner finishes and is deleted from runners
-            for i in old_data:
-                if old_data[i]["state"] != None and data[i]["state"] == None:
-                    data[i] = old_data[i]
-        except KeyError:
-            pass
-    # The server_data file does not exist yet
-    except IOError:
-        pass
-    
-    #writes the data to the server file
-    try:
-        data_file = open(data_path, "w")
-        data_file.write(json.dumps(data))
-        data_file.close()
-    except OSError as e:
-        logger.error(f"Server status could not be saved. \n" +
-                        f"Opening {data_path} failed with exception:")
-        logger.error(e)
-        
 def process_socket(config, socket, runners, sources, server_time,
-                   plugins, plugin_names):
+                   plugins, plugin_names, writer=None, archiver=None, store=None,
+                   pyramids=None, feed=None):
     """Checks the running socket for messages and then parses them into actions to take.
 
     Args:
@@ -240,6 +312,12 @@ def process_socket(config, socket, runners, sources, server_time,
         socket (zmq.REP socket): Receives messages in a non-blocking way.
             If a message is received it processes it and sends a response
         sources (list): A list of all of the Keithley channels connected to the server.
+        writer (writer.DataWriter, optional): Writes the data files of new runners. Defaults to None.
+        archiver (archiver.Archiver, optional): Archives the logs of finished runners. Defaults to None.
+        store (state.StateStore, optional): Keeps the channel status and history. Defaults to None.
+        pyramids (dict, optional): The pyramid.Pyramid of every channel's latest test, new
+            runners get theirs added. Defaults to None.
+        feed (feed.StatusFeed, optional): Keeps the versioned channel status. Defaults to None.
     |
     """
 
@@ -264,11 +342,21 @@ def process_socket(config, socket, runners, sources, server_time,
                     try:
                         resp = start(kwargs["channel"], kwargs["meta"],
                                      kwargs["protocol"], runners, sources,
-                                     plugins)
+                                     plugins, writer, pyramids)
                     except Exception as e:
                         resp = "Error occured when running script."
                         logger.warning(e)
 
+                elif fun == "start_many":
+                    resp = start_many(kwargs["entries"], runners, sources, plugins,
+                                      writer, pyramids)
+
+                elif fun in CONTROLS:
+                    resp = control_many(fun, kwargs["channels"], runners)
+
+                elif fun == "measure":
+                    resp = measure(kwargs.get("channels"), runners, sources)
+
                 elif fun == "pause":
                     resp = pause(kwargs["channel"], runners)
 
@@ -304,8 +392,30 @@ def process_socket(config, socket, runners, sources, server_time,
                 elif fun == "info_all_channels":
                     resp = info_all_channels(runners, sources)
 
+                elif fun == "info_changes":
+                    resp = info_changes(feed, runners, sources, kwargs.get("since"),
+                                        kwargs.get("epoch"))
+
                 elif fun == "info_server_file":
-                    resp = info_server_file(config)
+                    resp = info_server_file(store)
+
+                elif fun == "info_writer":
+                    resp = writer.stats() if writer is not None else None
+
+                elif fun == "info_archiver":
+                    resp = archiver.stats() if archiver is not None else None
+
+                elif fun == "get_series":
+                    resp = get_series(kwargs["channel"], pyramids, kwargs.get("t0"),
+                                      kwargs.get("t1"),
+                                      kwargs.get("max_points", MAX_POINTS))
+
+                elif fun == "get_recent":
+                    resp = get_recent(kwargs["channels"], runners,
+                                      kwargs.get("max_points", RECENT_POINTS))
+
+                elif fun in QUERIES:
+                    resp = query(store, fun, kwargs)
 
                 logger.debug("Sending response: {}".format(resp))
                 response["response"] = resp
@@ -324,28 +434,103 @@ def process_socket(config, socket, runners, sources, server_time,
                     response['response']))
                 socket.send_json(response)
 
-def info_server_file(config):
-    """Return the dict of channels in the server file
+def info_server_file(store):
+    """Return the dict of channels in the server state store
         
     Args:
-        config (dict): Holds Cyckei launch settings.
+        store (state.StateStore): Keeps the channel status and history.
 
     Returns:
-        dict: The json data of channels recorded in a file, converted to a dict.
+        dict: The latest info of every channel recorded, None if there is none yet.
     |
     """
-    data_path = joinPaths(config["arguments"]["record_dir"], "server_data.txt")
-    #loads server_file into a dict
-    try:
-        data_file = open(data_path, "r")
-        server_data = json.load(data_file)
-        data_file.close()
-    #Server file doesn't exist
-    except IOError:
-        server_data = None
-    return server_data
-    
-    
+    if store is None:
+        return None
+    return store.server_file()
+
+
+# Paged queries of the state store, by socket function
+QUERIES = {
+    "query_channels": ("channels", ("status", "state")),
+    "query_transitions": ("transitions", ("since", "channel")),
+    "query_cycles": ("cycles", ("channel", "path", "since")),
+    "query_runners": ("runners", ("channel", "status")),
+}
+
+
+def query(store, function, kwargs):
+    """Runs a paged query of the server state store.
+
+    Args:
+        function (str): The socket function, a key of QUERIES.
+        kwargs (dict): The filters of the query and its "offset" and "limit", all optional.
+        store (state.StateStore): Keeps the channel status and history.
+
+    Returns:
+        dict: The page of rows as "items" with "offset", "limit", "total" and "next", the
+            offset of the next page or None, or None if the server keeps no state.
+    |
+    """
+    if store is None:
+        return None
+    method, filters = QUERIES[function]
+    kwargs = kwargs or {}
+    return getattr(store, method)(
+        offset=kwargs.get("offset", 0), limit=kwargs.get("limit"),
+        **{key: kwargs.get(key) for key in filters})
+
+
+def get_series(channel, pyramids, t0=None, t1=None, max_points=MAX_POINTS):
+    """Return the summary of a channel's data over a time range.
+
+    Args:
+        channel (int or str): The channel number associated with the desired Keithley.
+        max_points (int, optional): Most points returned. Defaults to MAX_POINTS.
+        pyramids (dict): The pyramid.Pyramid of every channel's latest test.
+        t0 (float, optional): Start of the range, epoch time in seconds. Defaults to None for
+            the start of the test.
+        t1 (float, optional): End of the range, epoch time in seconds. Defaults to None for
+            the latest data.
+
+    Returns:
+        dict: The min, max and mean of every column at the finest resolution fitting
+        max_points, see pyramid.Pyramid.series(), or a message if the channel has none.
+    |
+    """
+    pyramid = (pyramids or {}).get(str(channel))
+    if pyramid is None:
+        return "Channel {} has no data series.".format(channel)
+    series = pyramid.series(t0, t1, max_points)
+    series["channel"] = str(channel)
+    return series
+
+
+def get_recent(cursors, runners, max_points=RECENT_POINTS):
+    """Return the latest measurements of running channels since the last ones a client has.
+
+    Args:
+        cursors (dict): The "since" sequence number and "epoch" of the last reply by
+            channel, either None for every measurement kept.
+        max_points (int, optional): Most samples returned per channel. Defaults to
+            RECENT_POINTS.
+        runners (list): A sorted list of active CellRunner objects.
+
+    Returns:
+        dict: The samples by channel, see recent.RecentWindow.since(), None for channels
+        without a test.
+    |
+    """
+    recent = {}
+    for channel, cursor in cursors.items():
+        runner = get_runner_by_channel(channel, runners)
+        if runner is None:
+            recent[channel] = None
+            continue
+        cursor = cursor or {}
+        recent[channel] = runner.recent.since(cursor.get("since"), cursor.get("epoch"),
+                                              max_points)
+    return recent
+
 
 def info_all_channels(runners, sources):
     """Return info on all channels
@@ -367,6 +552,27 @@ def info_all_channels(runners, sources):
     return info
 
 
+def info_changes(feed, runners, sources, since=None, epoch=None):
+    """Return the status fields of the channels changed since a version.
+
+    Args:
+        epoch (str, optional): The feed epoch the version is from. Defaults to None.
+        feed (feed.StatusFeed): Keeps the versioned channel status, None to send every
+            channel at version 0.
+        runners (list): A sorted list of active CellRunner objects.
+        since (int, optional): The last version the client applied. Defaults to None.
+        sources (list): A list of all of the Keithley channels connected to the server.
+
+    Returns:
+        dict: See feed.StatusFeed.changes().
+    |
+    """
+    if feed is None:
+        feed = StatusFeed()
+        feed.update(info_all_channels(runners, sources))
+    return feed.changes(since, epoch)
+
+
 def info_channel(channel, runners, sources):
     """Return info about the specified channel.
         
@@ -377,11 +583,13 @@ def info_channel(channel, runners, sources):
 
     Returns:
         dict: Information about the requested channel from the CellRunner's
-        meta, e.g. path, status, current, voltage, etc.
+        meta, e.g. path, status, current, voltage, etc., the running statistics
+        of the current step and cycle and why writes to its file were lost, if they were.
     |
     """
     info = OrderedDict(channel=channel, path=None, cellid=None, comment=None, protocol_name=None, protocol=None, status=None, state=None,
-                       current=None, voltage=None)
+                       current=None, voltage=None, cycle=None, step_stats=None, cycle_stats=None, last_cycle_stats=None,
+                       write_error=None)
     runner = get_runner_by_channel(channel, runners)
     if runner:
         info['path'] = runner.meta['path']
@@ -405,6 +613,14 @@ def info_channel(channel, runners, sources):
             info["current"] = "Not Available"
             info["voltage"] = "Not Available"
 
+        info["cycle"] = runner.cycle
+        info["write_error"] = runner.write_error
+        if runner.step is not None:
+            info["step_stats"] = runner.step.stats.as_dict()
+        info["cycle_stats"] = runner.cycle_stats.summary(runner.step)
+        if runner.last_cycle_stats is not None:
+            info["last_cycle_stats"] = runner.last_cycle_stats.summary()
+
     else:
         info["status"] = STATUS.string_map[STATUS.available]
     # for src in sources:
@@ -414,7 +630,8 @@ def info_channel(channel, runners, sources):
     return info
 
 
-def start(channel, meta, protocol, runners, sources, plugin_objects):
+def start(channel, meta, protocol, runners, sources, plugin_objects,
+          writer=None, pyramids=None):
     """Start channel with given protocol.
         
     Args:
@@ -424,6 +641,10 @@ def start(channel, meta, protocol, runners, sources, plugin_objects):
         protocol (str): The protocol to be loaded onto a CellRunner.
         runners (list): A sorted list of active CellRunner objects.
         sources (list): A list of all of the Keithley channels connected to the server.
+        writer (writer.DataWriter, optional): Writes the data file of the runner, None to have
+            the runner write it directly. Defaults to None.
+        pyramids (dict, optional): The pyramid.Pyramid of every channel's latest test, the
+            runner's is added. Defaults to None to not summarize its data.
 
     Returns:
         str: The result message of trying to start a channel.
@@ -435,9 +656,10 @@ def start(channel, meta, protocol, runners, sources, plugin_objects):
         return "Channel {} already in use.".format(channel)
 
     path = meta["path"]
-    if isfile(path):
+    if isfile(path) or path_in_use(path, runners):
         return("Log file '{}' already in use.").format(basename(path))
     runner = CellRunner(plugin_objects, **meta)
+    runner.writer = writer
     # Set the channel source
     for source in sources:
         if runner.channel == source.channel:
@@ -450,10 +672,144 @@ def start(channel, meta, protocol, runners, sources, plugin_objects):
     if runner.source is None:
         return "Failed to start channel {}. No source found.".format(channel)
 
+    if pyramids is not None:
+        runner.pyramid = pyramids[runner.channel] = Pyramid(pyramid_path(path))
     runners.append(runner)
     return "Succeeded in starting channel {}.".format(channel)
 
 
+def path_in_use(path, runners):
+    """Returns whether a runner is writing to the data file at path.
+
+    The file may not exist yet, when the writer has not written to it.
+
+    Args:
+        path (str): Path of a data file.
+        runners (list): A sorted list of active CellRunner objects.
+
+    Returns:
+        bool: True if a runner writes to path, False otherwise.
+    |
+    """
+    path = abspath(path)
+    return any(abspath(runner.fpath) == path for runner in runners
+               if runner.fpath)
+
+
+def start_many(entries, runners, sources, plugin_objects, writer=None, pyramids=None):
+    """Starts many channels in one request, testing each distinct protocol once.
+
+    Args:
+        entries (list): A dict per channel with its "channel", "meta" and "protocol", as
+            passed to start().
+        plugin_objects (list): A list of PluginControllers extending the BaseController object.
+        pyramids (dict, optional): The pyramid.Pyramid of every channel's latest test.
+            Defaults to None.
+        runners (list): A sorted list of active CellRunner objects.
+        sources (list): A list of all of the Keithley channels connected to the server.
+        writer (writer.DataWriter, optional): Writes the data files of the runners.
+            Defaults to None.
+
+    Returns:
+        list: A dict per entry, in order, with its "channel" and the "response" of start(),
+            or of test() if its protocol failed. An entry logging to the same file as an
+            earlier one fails.
+    |
+    """
+    tested = {}
+    paths = set()
+    results = []
+    for entry in entries:
+        channel = entry["channel"]
+        protocol = entry["protocol"]
+        path = abspath(entry["meta"]["path"])
+        if path in paths:
+            # Only the first channel of the request logging to a file may start
+            results.append({"channel": channel, "response": "Log file '{}' already in use."
+                            .format(basename(path))})
+            continue
+        paths.add(path)
+        if protocol not in tested:
+            tested[protocol] = test(protocol)
+        if tested[protocol] != "Passed":
+            response = "Server failed to run script. Error: \"{}\".".format(
+                tested[protocol])
+        else:
+            try:
+                response = start(channel, entry["meta"], protocol, runners, sources,
+                                 plugin_objects, writer, pyramids)
+            except Exception as e:
+                response = "Error occured when running script."
+                logger.warning(e)
+        results.append({"channel": channel, "response": response})
+    return results
+
+
+def control_many(function, channels, runners):
+    """Stops, pauses or resumes many channels in one request.
+
+    Args:
+        channels (list): The channel numbers.
+        function (str): "stop_many", "pause_many" or "resume_many", a key of CONTROLS.
+        runners (list): A sorted list of active CellRunner objects.
+
+    Returns:
+        list: A dict per channel, in order, with its "channel" and the "response" of the
+            control.
+    |
+    """
+    control = CONTROLS[function]
+    return [{"channel": channel, "response": control(channel, runners)}
+            for channel in channels]
+
+
+def measure(channels, runners, sources):
+    """Takes one current and voltage reading of idle channels, with their outputs off.
+
+    No runner or file is created, and the channels of each Keithley are read together.
+
+    Args:
+        channels (list): The channel numbers, None for every idle channel.
+        runners (list): A sorted list of active CellRunner objects.
+        sources (list): A list of all of the Keithley channels connected to the server.
+
+    Returns:
+        list: A dict per channel, in order, with its "channel", "current", "voltage",
+            None if it was not read, and the "response" message.
+    |
+    """
+    if channels is None:
+        channels = [source.channel for source in sources
+                    if get_runner_by_channel(source.channel, runners) is None]
+
+    by_channel = {str(source.channel): source for source in sources}
+    results = []
+    idle = []
+    for channel in channels:
+        result = {"channel": channel, "current": None, "voltage": None}
+        source = by_channel.get(str(channel))
+        if source is None:
+            result["response"] = "Channel {} not found.".format(channel)
+        elif get_runner_by_channel(channel, runners) is not None:
+            result["response"] = "Cannot read channel {} during a test.".format(channel)
+        else:
+            idle.append((result, source))
+        results.append(result)
+
+    # Each kind of source reads its channels together, see keithley2602.Source.measure_many
+    for kind in {type(source): None for result, source in idle}:
+        group = [(result, source) for result, source in idle if type(source) is kind]
+        readings = kind.measure_many([source for result, source in group])
+        for (result, source), (current, voltage) in zip(group, readings):
+            if voltage is None:
+                result["response"] = "Could not read channel {}.".format(
+                    result["channel"])
+            else:
+                result.update(current=current, voltage=voltage,
+                              response="Read channel {}.".format(result["channel"]))
+    return results
+
+
 def pause(channel, runners):
     """Pauses the specified channel.
         
@@ -535,6 +891,14 @@ def test(protocol):
         return str(e).splitlines()[-1]
 
 
+# Controls applied to many channels at once, by socket function
+CONTROLS = {
+    "stop_many": stop,
+    "pause_many": pause,
+    "resume_many": resume,
+}
+
+
 def get_runner_by_channel(channel, runners, status=None):
     """Get runner currently on given channel.
 
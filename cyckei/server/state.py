@@ -0,0 +1,475 @@
+"""SQLite store of the server's channel status and history.
+
+Replaces the server_data.txt JSON file, which was rewritten whole on every pass of the
+main loop and kept no history. The store is a SQLite database in WAL mode, so queries
+can read it while it is written, holding:
+
+    channels     the latest status of every channel, as returned by info_channel()
+    runners      the meta data of every test started, with its start and end times
+    transitions  every change of a channel's status or step state
+    cycles       the summary of every finished cycle
+
+The main loop only queues snapshots of info_all_channels(). A thread turns them into
+rows and writes them in one transaction per batch_interval, off the control path.
+Queries are paged by offset and limit.
+
+|
+"""
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger('cyckei_server')
+
+FILE_NAME = "server_state.db"
+LEGACY_FILE_NAME = "server_data.txt"
+BATCH_INTERVAL = 1.0  # Seconds between write transactions
+FLUSH_TIMEOUT = 5.0  # Seconds server_file() waits for the queued snapshots to be written
+PAGE_LIMIT = 100  # Rows returned by a query unless asked otherwise
+MAX_PAGE_LIMIT = 1000  # Most rows returned by a query
+
+# Channel info fields kept in columns of their own, the rest is in "info" as JSON
+CHANNEL_FIELDS = ("status", "state", "path", "cellid", "comment", "protocol_name",
+                  "current", "voltage", "cycle")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channels (
+    channel TEXT PRIMARY KEY,
+    status TEXT,
+    state TEXT,
+    path TEXT,
+    cellid TEXT,
+    comment TEXT,
+    protocol_name TEXT,
+    current REAL,
+    voltage REAL,
+    cycle INTEGER,
+    updated REAL,
+    info TEXT
+);
+CREATE INDEX IF NOT EXISTS channels_status ON channels (status);
+CREATE INDEX IF NOT EXISTS channels_state ON channels (state);
+CREATE TABLE IF NOT EXISTS runners (
+    path TEXT PRIMARY KEY,
+    channel TEXT,
+    cellid TEXT,
+    protocol_name TEXT,
+    status TEXT,
+    started REAL,
+    finished REAL,
+    meta TEXT
+);
+CREATE INDEX IF NOT EXISTS runners_channel ON runners (channel, started);
+CREATE TABLE IF NOT EXISTS transitions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    time REAL,
+    channel TEXT,
+    path TEXT,
+    status_from TEXT,
+    status_to TEXT,
+    state_from TEXT,
+    state_to TEXT
+);
+CREATE INDEX IF NOT EXISTS transitions_time ON transitions (time);
+CREATE INDEX IF NOT EXISTS transitions_channel ON transitions (channel, time);
+CREATE TABLE IF NOT EXISTS cycles (
+    path TEXT,
+    cycle INTEGER,
+    channel TEXT,
+    time REAL,
+    summary TEXT,
+    PRIMARY KEY (path, cycle)
+);
+CREATE INDEX IF NOT EXISTS cycles_channel ON cycles (channel, time);
+CREATE INDEX IF NOT EXISTS cycles_time ON cycles (time);
+"""
+
+_STOP = object()
+
+
+def connect(path):
+    """Opens the database, creating its tables if needed.
+
+    Args:
+        path (str): The database file.
+
+    Returns:
+        sqlite3.Connection: The connection, returning rows as sqlite3.Row.
+    |
+    """
+    connection = sqlite3.connect(path, timeout=10)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def _page(offset, limit):
+    offset = max(0, int(offset or 0))
+    limit = PAGE_LIMIT if limit is None else min(max(1, int(limit)), MAX_PAGE_LIMIT)
+    return offset, limit
+
+
+class StateStore(object):
+    """Keeps the server state in SQLite, written in batches from a thread.
+
+    Attributes:
+        batch_interval (float): Seconds between write transactions.
+        errors (int): Number of batches that could not be written.
+        path (str): The database file.
+        running (bool): Whether snapshots are still accepted.
+        transactions (int): Number of write transactions so far.
+    |
+    """
+
+    def __init__(self, path, batch_interval=BATCH_INTERVAL):
+        """Opens the database and starts the writer thread.
+
+        A server_data.txt next to a new database is imported as the initial channel status.
+
+        Args:
+            batch_interval (float, optional): Seconds between write transactions. Defaults
+                to BATCH_INTERVAL.
+            path (str): The database file.
+        |
+        """
+        self.path = path
+        self.batch_interval = batch_interval
+        self.transactions = 0
+        self.errors = 0
+        self.running = True
+        self._queue = queue.Queue()
+        # Last known info of every channel, as seen by the writer thread
+        self._last = {}
+        self._reader = connect(path)
+        self._load()
+        self._thread = threading.Thread(target=self._run, name="state store",
+                                        daemon=True)
+        self._thread.start()
+
+    def update(self, channels):
+        """Queues a snapshot of the channels, returns right away.
+
+        Args:
+            channels (dict): info_channel() dicts by channel, as from info_all_channels().
+        |
+        """
+        if self.running:
+            self._queue.put((time.time(), channels))
+
+    def flush(self, timeout=None):
+        """Waits until every queued snapshot is written.
+
+        Args:
+            timeout (float, optional): Longest time in seconds to wait. Defaults to None.
+
+        Returns:
+            bool: False if waiting timed out, otherwise True.
+        |
+        """
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """Writes the queued snapshots and stops the writer thread.
+
+        Args:
+            timeout (float, optional): Longest time in seconds to wait. Defaults to None.
+        |
+        """
+        if not self.running:
+            return
+        self.running = False
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._reader.close()
+
+    # Queries, run on the calling thread's connection
+
+    def _query(self, table, where, arguments, order, offset, limit):
+        offset, limit = _page(offset, limit)
+        condition = " WHERE " + " AND ".join(where) if where else ""
+        total = self._reader.execute(
+            "SELECT COUNT(*) FROM {}{}".format(table, condition), arguments).fetchone()[0]
+        rows = self._reader.execute(
+            "SELECT * FROM {}{} ORDER BY {} LIMIT ? OFFSET ?".format(
+                table, condition, order), arguments + [limit, offset]).fetchall()
+        items = []
+        for row in rows:
+            item = dict(row)
+            for key in ("info", "meta", "summary"):
+                if item.get(key) is not None:
+                    item[key] = json.loads(item[key])
+            items.append(item)
+        following = offset + len(items)
+        return {"items": items, "offset": offset, "limit": limit, "total": total,
+                "next": following if following < total else None}
+
+    def channels(self, status=None, state=None, offset=0, limit=None):
+        """Returns the latest status of the channels.
+
+        Args:
+            limit (int, optional): Most channels returned. Defaults to None for PAGE_LIMIT.
+            offset (int, optional): Number of channels to skip. Defaults to 0.
+            state (str, optional): Only channels whose step has this state. Defaults to None.
+            status (str, optional): Only channels with this status, e.g. "started".
+                Defaults to None.
+
+        Returns:
+            dict: "items", the channel rows in channel order, "offset", "limit", "total", the
+                number of matching channels, and "next", the offset of the next page or None.
+        |
+        """
+        where, arguments = [], []
+        if status is not None:
+            where.append("status = ?")
+            arguments.append(status)
+        if state is not None:
+            where.append("state = ?")
+            arguments.append(state)
+        return self._query("channels", where, arguments, "channel", offset, limit)
+
+    def transitions(self, since=None, channel=None, offset=0, limit=None):
+        """Returns the changes of channel status and step state, oldest first.
+
+        Args:
+            channel (str, optional): Only this channel. Defaults to None.
+            limit (int, optional): Most transitions returned. Defaults to None for PAGE_LIMIT.
+            offset (int, optional): Number of transitions to skip. Defaults to 0.
+            since (float, optional): Only transitions after this epoch time. Defaults to None.
+
+        Returns:
+            dict: A page of transitions, see channels().
+        |
+        """
+        where, arguments = [], []
+        if since is not None:
+            where.append("time > ?")
+            arguments.append(float(since))
+        if channel is not None:
+            where.append("channel = ?")
+            arguments.append(str(channel))
+        return self._query("transitions", where, arguments, "id", offset, limit)
+
+    def cycles(self, channel=None, path=None, since=None, offset=0, limit=None):
+        """Returns the summaries of finished cycles, oldest first.
+
+        Args:
+            channel (str, optional): Only this channel. Defaults to None.
+            limit (int, optional): Most cycles returned. Defaults to None for PAGE_LIMIT.
+            offset (int, optional): Number of cycles to skip. Defaults to 0.
+            path (str, optional): Only the test with this log. Defaults to None.
+            since (float, optional): Only cycles finished after this epoch time. Defaults to None.
+
+        Returns:
+            dict: A page of cycles, see channels().
+        |
+        """
+        where, arguments = [], []
+        if channel is not None:
+            where.append("channel = ?")
+            arguments.append(str(channel))
+        if path is not None:
+            where.append("path = ?")
+            arguments.append(path)
+        if since is not None:
+            where.append("time > ?")
+            arguments.append(float(since))
+        return self._query("cycles", where, arguments, "time, cycle", offset, limit)
+
+    def runners(self, channel=None, status=None, offset=0, limit=None):
+        """Returns the tests started, most recent first.
+
+        Args:
+            channel (str, optional): Only this channel. Defaults to None.
+            limit (int, optional): Most tests returned. Defaults to None for PAGE_LIMIT.
+            offset (int, optional): Number of tests to skip. Defaults to 0.
+            status (str, optional): Only tests with this status. Defaults to None.
+
+        Returns:
+            dict: A page of tests, see channels().
+        |
+        """
+        where, arguments = [], []
+        if channel is not None:
+            where.append("channel = ?")
+            arguments.append(str(channel))
+        if status is not None:
+            where.append("status = ?")
+            arguments.append(status)
+        return self._query("runners", where, arguments, "started DESC", offset, limit)
+
+    def server_file(self):
+        """Returns the latest info of every channel, like the former server_data.txt.
+
+        The snapshots queued so far are written first, so a new store answers with the
+        first snapshot instead of waiting for its batch.
+
+        Returns:
+            dict: info_channel() dicts by channel, None if no channel was recorded yet.
+        |
+        """
+        if self.running and not self.flush(FLUSH_TIMEOUT):
+            logger.warning("Server state was not written within {} s.".format(FLUSH_TIMEOUT))
+        rows = self._reader.execute("SELECT channel, info FROM channels").fetchall()
+        if not rows:
+            return None
+        return {row["channel"]: json.loads(row["info"]) for row in rows}
+
+    # Writing, on the writer thread
+
+    def _load(self):
+        """Reads the last known channel info, importing server_data.txt into a new store.
+
+        |
+        """
+        for row in self._reader.execute("SELECT channel, info FROM channels"):
+            self._last[row["channel"]] = json.loads(row["info"])
+        if self._last:
+            return
+        legacy = os.path.join(os.path.dirname(self.path), LEGACY_FILE_NAME)
+        try:
+            with open(legacy) as file:
+                channels = json.load(file)
+        except (IOError, ValueError):
+            return
+        with self._reader:
+            for channel, info in channels.items():
+                self._write_channel(self._reader, str(channel), info,
+                                    os.path.getmtime(legacy))
+                self._last[str(channel)] = info
+        logger.info("Imported channel status from {}.".format(legacy))
+
+    def _run(self):
+        connection = connect(self.path)
+        snapshots = []
+        waiting = []
+        deadline = None
+        stop = False
+        while not stop:
+            timeout = None if deadline is None else max(0., deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiting.append(item)
+                else:
+                    snapshots.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.batch_interval
+                    continue
+            except queue.Empty:
+                pass
+            if snapshots:
+                self._write(connection, snapshots)
+                snapshots = []
+            deadline = None
+            for event in waiting:
+                event.set()
+            waiting = []
+        connection.close()
+
+    def _write(self, connection, snapshots):
+        """Writes snapshots in one transaction, keeping only the latest status of a channel.
+
+        |
+        """
+        try:
+            with connection:
+                latest = {}
+                for now, channels in snapshots:
+                    for channel, info in channels.items():
+                        channel = str(channel)
+                        info = self._diff(connection, now, channel, info)
+                        latest[channel] = (now, info)
+                for channel, (now, info) in latest.items():
+                    self._write_channel(connection, channel, info, now)
+            self.transactions += 1
+        except (sqlite3.Error, TypeError, ValueError) as error:
+            self.errors += 1
+            logger.error("Could not write server state: {}".format(error))
+
+    def _diff(self, connection, now, channel, info):
+        """Records what changed since the last info of a channel.
+
+        Returns:
+            dict: The info to keep for the channel. A channel whose test ended keeps the
+                details of that test, with the new status.
+        |
+        """
+        last = self._last.get(channel)
+        if last is not None and info.get("path") is None and last.get("path") is not None:
+            if last.get("status") != info.get("status"):
+                # The runner is gone, finish its test
+                if last.get("cycle_stats"):
+                    self._write_cycle(connection, now, channel, last["path"],
+                                      last["cycle_stats"])
+                connection.execute(
+                    "UPDATE runners SET status = ?, finished = ? WHERE path = ?",
+                    (info.get("status"), now, last["path"]))
+            # Instead of the nulls of a channel without runner
+            info = dict(last, status=info.get("status"), state=None,
+                        current=info.get("current"), voltage=info.get("voltage"))
+
+        if last is None or last.get("status") != info.get("status") \
+                or last.get("state") != info.get("state"):
+            connection.execute(
+                "INSERT INTO transitions (time, channel, path, status_from, status_to, "
+                "state_from, state_to) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (now, channel, info.get("path"),
+                 None if last is None else last.get("status"), info.get("status"),
+                 None if last is None else last.get("state"), info.get("state")))
+
+        path = info.get("path")
+        if path is not None and (last is None or last.get("path") != path):
+            connection.execute(
+                "INSERT OR REPLACE INTO runners (path, channel, cellid, protocol_name, "
+                "status, started, finished, meta) VALUES (?, ?, ?, ?, ?, ?, NULL, ?)",
+                (path, channel, info.get("cellid"), info.get("protocol_name"),
+                 info.get("status"), now, json.dumps(
+                     {key: info.get(key) for key in ("cellid", "comment", "protocol_name",
+                                                     "protocol", "path")})))
+        elif path is not None and last.get("status") != info.get("status"):
+            connection.execute("UPDATE runners SET status = ? WHERE path = ?",
+                               (info.get("status"), path))
+
+        finished = info.get("last_cycle_stats")
+        if path is not None and finished and (
+                last is None or last.get("last_cycle_stats") != finished):
+            self._write_cycle(connection, now, channel, path, finished)
+
+        self._last[channel] = info
+        return info
+
+    def _write_cycle(self, connection, now, channel, path, summary):
+        if not summary.get("count"):
+            return
+        connection.execute(
+            "INSERT OR REPLACE INTO cycles (path, cycle, channel, time, summary) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (path, summary.get("cycle"), channel, now, json.dumps(summary)))
+
+    def _write_channel(self, connection, channel, info, now):
+        connection.execute(
+            "INSERT OR REPLACE INTO channels (channel, {}, updated, info) "
+            "VALUES (?, {}, ?, ?)".format(
+                ", ".join(CHANNEL_FIELDS), ", ".join("?" * len(CHANNEL_FIELDS))),
+            [channel] + [_column(info.get(field)) for field in CHANNEL_FIELDS]
+            + [now, json.dumps(info)])
+
+
+def _column(value):
+    """Returns a value as stored in a column, e.g. "Not Available" for a current is kept.
+
+    |
+    """
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    return json.dumps(value)
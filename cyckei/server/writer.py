@@ -0,0 +1,472 @@
+"""Writing the data files of the CellRunners.
+
+Appending every point with its own open/write/close on the control thread makes the
+measurement loop wait on the file system, which hurts on slow network shares with many
+channels. A DataWriter instead takes text to append through a bounded queue, buffers it per
+file and writes each file's buffer in one go according to its flush policy.
+
+Both the DataWriter and runners writing directly keep their files open in a HandlePool,
+which bounds the number of open files by closing the least recently used one.
+
+|
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('cyckei_server')
+
+FLUSH_POINTS = 50  # Buffered writes to a file before it is flushed
+FLUSH_INTERVAL = 5.0  # Seconds a write may wait in the buffer before it is flushed
+QUEUE_SIZE = 10000  # Writes that may wait in the queue before write() blocks
+MAX_OPEN_FILES = 512  # Files a HandlePool keeps open at most
+FLUSH_RETRIES = 5  # Failed writes of a buffer that are retried before its text is dropped
+
+_STOP = object()
+
+
+class HandlePool(object):
+    """Open file handles for appending, limited in number.
+
+    Handles are kept open between writes and closed least recently used first once more
+    than max_open files are open; a closed file is simply reopened on its next write.
+    Every write is flushed to the operating system, so readers of the files see the same
+    content as with an open/write/close per write. The pool is safe to use from several
+    threads.
+
+    Attributes:
+        closes (int): Number of handles closed so far, evictions included.
+        evictions (int): Number of handles closed to stay within max_open.
+        max_open (int): Number of files kept open at most.
+        opens (int): Number of files opened so far.
+    |
+    """
+
+    def __init__(self, max_open=MAX_OPEN_FILES):
+        """Inits an empty pool.
+
+        Args:
+            max_open (int, optional): Number of files kept open at most. Defaults to MAX_OPEN_FILES.
+        |
+        """
+        self.max_open = max(1, int(max_open))
+        self.opens = 0
+        self.closes = 0
+        self.evictions = 0
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._handles)
+
+    def __contains__(self, path):
+        return path in self._handles
+
+    def write(self, path, text, mode="a"):
+        """Writes text to a file, opening it if it is not open yet.
+
+        Args:
+            mode (str, optional): "a" to append, "w" to replace the file with the text,
+                with "b" added for bytes. Defaults to "a".
+            path (str): The file to write to.
+            text (str or bytes): The text to write.
+
+        Raises:
+            IOError: If the file could not be opened or written, its handle is then closed.
+        |
+        """
+        with self._lock:
+            if mode.startswith("w"):
+                self._close(path)
+            handle = self._handles.get(path)
+            if handle is None:
+                handle = self._open(path, mode)
+            else:
+                self._handles.move_to_end(path)
+            try:
+                handle.write(text)
+                handle.flush()
+            except (IOError, ValueError):
+                self._close(path)
+                raise
+
+    def fsync(self, path):
+        """Has the operating system write an open file to disk.
+
+        Args:
+            path (str): The file to sync, nothing is done if it is not open.
+        |
+        """
+        with self._lock:
+            handle = self._handles.get(path)
+            if handle is not None:
+                os.fsync(handle.fileno())
+
+    def close(self, path=None):
+        """Closes the handle of a file, or of every file.
+
+        Args:
+            path (str, optional): The file to close, None for all of them. Defaults to None.
+        |
+        """
+        with self._lock:
+            if path is not None:
+                self._close(path)
+                return
+            for open_path in list(self._handles):
+                self._close(open_path)
+
+    def _open(self, path, mode):
+        """Opens a file into the pool, evicting the least recently used one if needed.
+
+        |
+        """
+        while len(self._handles) >= self.max_open:
+            self._close(next(iter(self._handles)))
+            self.evictions += 1
+        handle = open(path, mode)
+        self.opens += 1
+        self._handles[path] = handle
+        return handle
+
+    def _close(self, path):
+        """Closes the handle of a file if it is open.
+
+        |
+        """
+        handle = self._handles.pop(path, None)
+        if handle is None:
+            return
+        self.closes += 1
+        try:
+            handle.close()
+        except (IOError, ValueError) as error:
+            logger.error(f"Error closing file in HandlePool: {error}")
+
+
+# Shared by the CellRunners writing their files directly
+HANDLES = HandlePool()
+
+
+class _FileBuffer(object):
+    """Text waiting to be written to one file.
+
+    Attributes:
+        failures (int): Number of times writing the buffer failed in a row.
+        mode (str): The mode to open the file with, "w" or "wb" if the buffer starts with a
+            truncating write, otherwise "a" or "ab".
+        parts (list): The strings or bytes to write, in order.
+        retry (float): Time before which writing the buffer is not tried again after a failure.
+        times (list): The time each string was queued at, for the latency statistics.
+    |
+    """
+
+    def __init__(self, mode="a"):
+        self.failures = 0
+        self.mode = mode
+        self.parts = []
+        self.retry = 0.
+        self.times = []
+
+
+class DataWriter(object):
+    """Writes text to files from a dedicated thread.
+
+    Writes are buffered per file. A file's buffer is written when it holds flush_points
+    writes, when its oldest write has waited flush_interval seconds, when a write asks for it
+    and when flush() or close() is called. A buffer that could not be written is kept and
+    tried again flush_interval seconds later, up to FLUSH_RETRIES times; after that its text
+    is dropped and failure() reports it for the file.
+
+    Attributes:
+        flush_interval (float): Seconds a write may wait in a buffer before it is written.
+        flush_points (int): Number of buffered writes to a file that triggers writing it.
+        fsync (bool): Whether to fsync each file after writing its buffer.
+        handles (HandlePool): The open files written to.
+    |
+    """
+
+    def __init__(self, flush_points=FLUSH_POINTS, flush_interval=FLUSH_INTERVAL,
+                 fsync=False, queue_size=QUEUE_SIZE, max_open=MAX_OPEN_FILES):
+        """Inits the queue, the buffers and the statistics and starts the writer thread.
+
+        Args:
+            flush_interval (float, optional): Seconds a write may wait in a buffer.
+                Defaults to FLUSH_INTERVAL.
+            flush_points (int, optional): Buffered writes to a file that trigger writing it.
+                Defaults to FLUSH_POINTS.
+            fsync (bool, optional): Whether to fsync files after writing them. Defaults to False.
+            max_open (int, optional): Files kept open at most. Defaults to MAX_OPEN_FILES.
+            queue_size (int, optional): Writes that may be queued before write() blocks.
+                Defaults to QUEUE_SIZE.
+        |
+        """
+        self.flush_points = max(1, int(flush_points))
+        self.flush_interval = float(flush_interval)
+        self.fsync = fsync
+        self.handles = HandlePool(max_open)
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._buffers = {}
+        # Earliest time at which a buffered write may be due
+        self._next_due = float('inf')
+
+        self._queued = 0
+        self._blocked = 0
+        self._queue_max = 0
+        self._written = 0
+        self._flushes = 0
+        self._errors = 0
+        self._dropped = 0
+        self._failures = {}
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="cyckei-writer",
+                                        daemon=True)
+        self._thread.start()
+
+    @property
+    def running(self):
+        """Returns whether the writer thread is accepting writes.
+
+        Returns:
+            bool: True until close() was called.
+        |
+        """
+        return not self._closed and self._thread.is_alive()
+
+    def write(self, path, text, mode="a", flush=False):
+        """Queues text to be written to a file.
+
+        Blocks while the queue is full. Once the writer is closed the text is written directly.
+
+        Args:
+            flush (bool, optional): Write the file's buffer as soon as this text is added.
+                Defaults to False.
+            mode (str, optional): "a" to append, "w" to replace the file with this text,
+                with "b" added for bytes. Defaults to "a".
+            path (str): The file to write to.
+            text (str or bytes): The text to write.
+        |
+        """
+        if not self.running:
+            with open(path, mode) as file:
+                file.write(text)
+            return
+        self._put((path, text, mode, flush, time.time()))
+        self._queued += 1
+
+    def flush(self, path=None, wait=False, timeout=None, close=False):
+        """Asks for the buffer of a file, or of every file, to be written.
+
+        Args:
+            close (bool, optional): Also close the file until it is written to again.
+                Defaults to False.
+            path (str, optional): The file to flush, None for all of them. Defaults to None.
+            timeout (float, optional): Longest time in seconds to wait. Defaults to None.
+            wait (bool, optional): Wait until the buffers were written. Defaults to False.
+
+        Returns:
+            bool: False if waiting timed out, otherwise True.
+        |
+        """
+        if not self.running:
+            return True
+        done = threading.Event()
+        self._put((path, None, "close" if close else None, True, done))
+        if wait:
+            return done.wait(timeout)
+        return True
+
+    def close(self, timeout=None):
+        """Writes everything still queued or buffered and stops the writer thread.
+
+        Args:
+            timeout (float, optional): Longest time in seconds to wait. Defaults to None.
+        |
+        """
+        if not self.running:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def failure(self, path):
+        """Returns why writes to a file were dropped since this was last asked, if they were.
+
+        Args:
+            path (str): The file written to.
+
+        Returns:
+            str: The error the writes were dropped after, None if none were dropped.
+        |
+        """
+        return self._failures.pop(path, None)
+
+    def stats(self):
+        """Returns statistics about the queue and the writes.
+
+        Returns:
+            dict: The current and highest queue depth, the number of queued, written and
+                buffered writes, of file flushes, of failed flushes, of writes dropped after
+                FLUSH_RETRIES failures and of writes that had to wait for room in the queue, the mean and highest latency in seconds between
+                queueing a write and writing it to its file, and the number of open files and
+                of times files were opened.
+        |
+        """
+        return {"queue_depth": self._queue.qsize(),
+                "queue_max": self._queue_max,
+                "queued": self._queued,
+                "written": self._written,
+                "buffered": sum(len(buffer.parts)
+                                for buffer in list(self._buffers.values())),
+                "flushes": self._flushes,
+                "errors": self._errors,
+                "dropped": self._dropped,
+                "blocked": self._blocked,
+                "latency_mean": (self._latency_total / self._written
+                                 if self._written else None),
+                "latency_max": self._latency_max,
+                "open_files": len(self.handles),
+                "file_opens": self.handles.opens}
+
+    def _put(self, item):
+        """Queues an item, waiting for room if the queue is full.
+
+        |
+        """
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._blocked += 1
+            self._queue.put(item)
+        self._queue_max = max(self._queue_max, self._queue.qsize())
+
+    def _run(self):
+        """Main loop of the writer thread.
+
+        |
+        """
+        while True:
+            try:
+                item = self._queue.get(timeout=self._timeout())
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush_all()
+                self.handles.close()
+                return
+            if item is not None:
+                self._handle(item)
+            if time.time() >= self._next_due:
+                self._flush_due()
+
+    def _timeout(self):
+        """Returns the seconds until the oldest buffered write may be due.
+
+        |
+        """
+        if self._next_due == float('inf'):
+            return self.flush_interval
+        return max(0.0, self._next_due - time.time())
+
+    def _handle(self, item):
+        """Buffers a write or carries out a flush request.
+
+        |
+        """
+        path, text, mode, flush, extra = item
+        if text is None:
+            # A flush request, extra is the event to set once done
+            if path is None:
+                self._flush_all()
+            else:
+                self._flush(path)
+            if mode == "close":
+                self.handles.close(path)
+            extra.set()
+            return
+
+        if mode.startswith("w"):
+            # Whatever was buffered would be overwritten anyway
+            buffer = _FileBuffer(mode)
+            self._buffers[path] = buffer
+        else:
+            buffer = self._buffers.get(path)
+            if buffer is None:
+                buffer = self._buffers[path] = _FileBuffer(mode)
+        buffer.parts.append(text)
+        buffer.times.append(extra)
+        if len(buffer.times) == 1:
+            self._next_due = min(self._next_due, extra + self.flush_interval)
+
+        if (flush or len(buffer.parts) >= self.flush_points) and buffer.retry <= time.time():
+            self._flush(path)
+
+    def _flush_due(self):
+        """Writes the buffers whose oldest write waited flush_interval or longer.
+
+        |
+        """
+        now = time.time()
+        for path, buffer in list(self._buffers.items()):
+            if buffer.times and buffer.times[0] <= now - self.flush_interval \
+                    and buffer.retry <= now:
+                self._flush(path)
+        self._next_due = min((max(buffer.times[0] + self.flush_interval, buffer.retry)
+                              for buffer in self._buffers.values()
+                              if buffer.times), default=float('inf'))
+
+    def _flush_all(self):
+        """Writes all the buffers.
+
+        |
+        """
+        for path in list(self._buffers):
+            self._flush(path)
+
+    def _flush(self, path):
+        """Writes the buffer of a file, keeping it to try again if that fails.
+
+        |
+        """
+        buffer = self._buffers.get(path)
+        if buffer is None or not buffer.parts:
+            self._buffers.pop(path, None)
+            return
+        try:
+            self.handles.write(path, buffer.parts[0][:0].join(buffer.parts),
+                               buffer.mode)
+            if self.fsync:
+                self.handles.fsync(path)
+        except IOError as error:
+            self._errors += 1
+            if isinstance(error, PermissionError):
+                logger.critical("Permission Error, could not write data: %s", error)
+            else:
+                logger.error(f"Error opening file in DataWriter: {error}")
+            buffer.failures += 1
+            if buffer.failures > FLUSH_RETRIES:
+                logger.critical("Dropped {} writes to {} after {} failures".format(
+                    len(buffer.parts), path, buffer.failures))
+                self._dropped += len(buffer.parts)
+                self._failures[path] = str(error)
+                del self._buffers[path]
+            else:
+                buffer.retry = time.time() + self.flush_interval
+            return
+        del self._buffers[path]
+
+        now = time.time()
+        for queued in buffer.times:
+            latency = now - queued
+            self._latency_total += latency
+            self._latency_max = max(self._latency_max, latency)
+        self._written += len(buffer.parts)
+        self._flushes += 1
@@ -0,0 +1,123 @@
+"""Per-channel CPU cost of a scheduler tick for growing channel counts.
+
+Every channel runs a CC charge on the simulated backend and is due on every tick. A tick
+either runs each runner on its own, as the server loop does, or goes through a
+batch.ConditionTable which evaluates the conditions of all due channels together. File
+output is disabled so only measurement, condition evaluation and dispatch are timed.
+The condition evaluation is also timed on its own, since measuring the simulated
+instruments is the same either way.
+
+Run from the repository root with::
+
+    python -m tests.bench_batch
+"""
+import time
+
+import numpy as np
+
+from cyckei.server import batch, protocols
+from tests.sim_backend import SimClock, SimSource
+
+PROTOCOL = """from cyckei.server import protocols
+protocols.CCCharge(0.01, reports=(("voltage", 0.005), ("time", ":5:")),
+                   ends=(("voltage", ">", 4.2), ("time", ">", "24::")))
+"""
+
+
+def make_runners(clock, count):
+    runners = []
+    for i in range(count):
+        source = SimSource(clock, channel=str(i), noise_v=2e-4, seed=i,
+                           soc=20 + 30. * i / count)
+        runner = protocols.CellRunner(channel=str(i), path=None, plugins={})
+        runner.write_header = runner.write_cycle_header = lambda: None
+        runner.write_step_header = lambda: None
+        runner.write_data = lambda *args: None
+        runner.set_source(source)
+        runner.load_protocol(PROTOCOL)
+        runners.append(runner)
+    return runners
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def tick_cost(count, use_table, ticks=20):
+    """Returns the median CPU seconds per channel of a full tick."""
+    clock = SimClock()
+    with clock.patch(protocols, batch):
+        runners = make_runners(clock, count)
+        table = batch.ConditionTable() if use_table else None
+        for runner in runners:
+            runner.run()
+
+        costs = []
+        for tick in range(ticks + 5):
+            clock.sleep(10.)
+            start = time.process_time()
+            if table is None:
+                for runner in runners:
+                    if runner.next_time <= clock.time():
+                        runner.run()
+            else:
+                table.run(runners)
+            if tick >= 5:
+                costs.append(time.process_time() - start)
+    return median(costs) / count
+
+
+def evaluation_cost(count, ticks=20):
+    """Returns the median CPU seconds per channel of evaluating the conditions alone.
+
+    Each tick all channels are measured first, then the same state is evaluated by the
+    compiled per-step evaluators and by a ConditionTable.
+    """
+    clock = SimClock()
+    with clock.patch(protocols, batch):
+        runners = make_runners(clock, count)
+        table = batch.ConditionTable()
+        for runner in runners:
+            runner.run()
+        rows = [table.row(runner) for runner in runners]
+
+        step_costs = []
+        table_costs = []
+        for tick in range(ticks):
+            clock.sleep(10.)
+            steps = [runner.step for runner in runners]
+            for step in steps:
+                step.measure()
+            now = clock.time()
+
+            start = time.process_time()
+            table.update(rows, steps)
+            table.evaluate(np.array(rows), now)
+            table_costs.append(time.process_time() - start)
+
+            start = time.process_time()
+            for step in steps:
+                step.check_end_conditions(now)
+                step.check_report_conditions(now)
+            step_costs.append(time.process_time() - start)
+
+            for runner, step in zip(runners, steps):
+                runner.record(step.conclude(False))
+    return median(step_costs) / count, median(table_costs) / count
+
+
+def main():
+    print("CPU time per channel in us, medians over ticks with every channel due")
+    print("{:>9} {:>16} {:>16} {:>16} {:>16}".format(
+        "channels", "eval per step", "eval table", "tick per step",
+        "tick table"))
+    for count in (10, 100, 1000, 3000):
+        evaluation = evaluation_cost(count)
+        print("{:>9} {:>16.2f} {:>16.2f} {:>16.1f} {:>16.1f}".format(
+            count, 1e6 * evaluation[0], 1e6 * evaluation[1],
+            1e6 * tick_cost(count, False), 1e6 * tick_cost(count, True)))
+
+
+if __name__ == "__main__":
+    main()
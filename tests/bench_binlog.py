@@ -0,0 +1,90 @@
+"""File size, read speed and time precision of the binary log format vs the text format.
+
+Writes a synthetic long test, one data row every 10 s for 60 days with one plugin column
+and a step header every 100 rows, in the text format exactly as CellRunner.write_data
+would, converts it with binlog.to_binary and reads both back: the text file with a plain
+line parser as used by analysis scripts, the binary file with binlog.load and with
+binlog.iter_chunks/decode_data without numpy. The binary file written directly by a
+CellRunner keeps the times unrounded, so the error of the text times is reported too.
+
+Run from the repository root with::
+
+    python -m tests.bench_binlog
+"""
+import math
+import os
+import tempfile
+import time
+
+from cyckei.functions import binlog
+
+ROWS = 60 * 24 * 360
+STEP_ROWS = 100
+
+
+def make_rows():
+    for i in range(ROWS):
+        t = i * 10. + 0.0123456789 * (i % 7)
+        yield (t, 0.1 + 1e-5 * math.sin(i), 3.7 + 0.5 * math.sin(i / 500.),
+               t / 36., 25. + math.sin(i / 1000.))
+
+
+def write_text(path):
+    with open(path, "w") as file:
+        file.write('#{\n#    "format": ["time", "current", "voltage", '
+                   '"capacity", "temperature:t1"]\n#}\n{"cycle": 0}\n')
+        for i, row in enumerate(make_rows()):
+            if i % STEP_ROWS == 0:
+                file.write('  {"state": "charge_constant_current"}\n')
+            file.write(binlog.text_row(row) + "\n")
+
+
+def read_text(path):
+    rows = []
+    with open(path) as file:
+        for line in file:
+            if line.startswith("    "):
+                rows.append([float(value) for value in line.split(",")])
+    return rows
+
+
+def read_binary_python(path):
+    rows = []
+    with open(path, "rb") as file:
+        for kind, payload in binlog.iter_chunks(file):
+            if kind == binlog.DATA:
+                rows.extend(binlog.decode_data(payload))
+    return rows
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    root = tempfile.mkdtemp()
+    text_path = os.path.join(root, "log.pyb")
+    binary_path = os.path.join(root, "log.cyb")
+    write_text(text_path)
+    binlog.to_binary(text_path, binary_path)
+
+    print("{} rows, {} columns".format(ROWS, 5))
+    print("{:>26} {:>10} {:>10}".format("", "size MB", "read s"))
+    text_time, rows = timed(read_text, text_path)
+    print("{:>26} {:>10.1f} {:>10.2f}".format(
+        "text", os.path.getsize(text_path) / 1e6, text_time))
+    binary_time, (meta, data, markers) = timed(binlog.load, binary_path)
+    print("{:>26} {:>10.1f} {:>10.2f}".format(
+        "binary, load (numpy)", os.path.getsize(binary_path) / 1e6, binary_time))
+    python_time, python_rows = timed(read_binary_python, binary_path)
+    print("{:>26} {:>10} {:>10.2f}".format("binary, decode_data", "", python_time))
+    assert len(rows) == len(data) == len(python_rows) == ROWS
+
+    error = max(abs(row[0] - true[0]) for row, true in zip(rows, make_rows()))
+    print("Largest time error of the text format: {:.3g} s".format(error))
+
+
+if __name__ == "__main__":
+    main()
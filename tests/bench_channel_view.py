@@ -0,0 +1,67 @@
+"""Startup time of the channel widgets and of the channel table.
+
+Builds a ChannelTab and a ChannelView for 64, 256 and 1024 channels offscreen, without a
+server, and times building and showing them. Status updates are left out, so only the
+views are timed.
+
+Run from the repository root with::
+
+    QT_QPA_PLATFORM=offscreen python -m tests.bench_channel_view
+"""
+import sys
+import tempfile
+import time
+
+from PySide2.QtWidgets import QApplication
+from PySide2.QtCore import QThreadPool
+
+from cyckei.client.channel_tab import ChannelTab
+from cyckei.client.channel_view import ChannelView
+from cyckei.client.federation import Server
+
+COUNTS = (64, 256, 1024)
+PLUGINS = [{"name": "thermo", "sources": ["probe 1", "probe 2"]}]
+
+
+class QuietTab(ChannelTab):
+    def update_status(self):
+        pass
+
+
+class QuietView(ChannelView):
+    def update_status(self):
+        pass
+
+
+def measure(app, view_class, count, record_dir):
+    config = {"arguments": {"record_dir": record_dir}, "behavior": {},
+              "zmq": {"client-address": "tcp://localhost", "port": 5556},
+              "channels": [{"channel": channel} for channel in range(1, count + 1)]}
+    info = {str(channel): {"path": None, "cellid": None, "comment": None,
+                           "protocol_name": None} for channel in range(1, count + 1)}
+    server = Server("", config, info, PLUGINS)
+    server.channels = list(range(1, count + 1))
+    start = time.perf_counter()
+    view = view_class(config, {"threadpool": QThreadPool()}, None, PLUGINS, [server])
+    view.resize(1400, 800)
+    view.show()
+    app.processEvents()
+    startup = time.perf_counter() - start
+    view.close()
+    view.deleteLater()
+    app.processEvents()
+    return startup
+
+
+def main():
+    app = QApplication.instance() or QApplication(sys.argv)
+    record_dir = tempfile.mkdtemp()
+    print("{:>8} {:>10} {:>10}".format("channels", "widgets", "table"))
+    for count in COUNTS:
+        print("{:>8} {:>9.3f}s {:>9.3f}s".format(
+            count, measure(app, QuietTab, count, record_dir),
+            measure(app, QuietView, count, record_dir)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Latency of client requests with a new zmq context per request and with the pool.
+
+Starts a stub REP server on a local port and sends it REQUESTS pings, first the way the
+client used to, with a new context and socket per request, then through Socket and its
+shared ConnectionPool, from one thread and from several at once.
+
+Run from the repository root with::
+
+    python -m tests.bench_client_socket
+"""
+import statistics
+import threading
+import time
+
+import zmq
+
+from cyckei.client import socket as client_socket
+from tests.stub_server import StubServer
+
+REQUESTS = 2000
+THREADS = 8
+
+
+def per_request(address):
+    # The previous client: a new context and socket for every request
+    context = zmq.Context()
+    socket = context.socket(zmq.REQ)
+    socket.connect(address)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.send_json({"function": "ping"})
+    socket.poll(30000, zmq.POLLIN)
+    response = socket.recv_json()
+    socket.close()
+    context.term()
+    return response
+
+
+def measure(send, count):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        send()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name, latencies, elapsed):
+    latencies = sorted(latencies)
+    print("{:<24} {:>9.0f} req/s  median {:>7.1f} us  p99 {:>7.1f} us".format(
+        name, len(latencies) / elapsed, statistics.median(latencies) * 1e6,
+        latencies[int(0.99 * len(latencies))] * 1e6))
+
+
+def threaded(send):
+    latencies = []
+    lock = threading.Lock()
+
+    def work():
+        result = measure(send, REQUESTS // THREADS)
+        with lock:
+            latencies.extend(result)
+
+    threads = [threading.Thread(target=work) for _ in range(THREADS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    server = StubServer()
+    sock = client_socket.Socket(server.config(timeout=30))
+    try:
+        start = time.perf_counter()
+        latencies = measure(lambda: per_request(sock.address), REQUESTS)
+        report("context per request", latencies, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        latencies = measure(sock.ping, REQUESTS)
+        report("pooled", latencies, time.perf_counter() - start)
+
+        report("context per request x{}".format(THREADS),
+               *threaded(lambda: per_request(sock.address)))
+        report("pooled x{}".format(THREADS), *threaded(sock.ping))
+        print("connections opened by the pool: {}".format(client_socket.POOL.created))
+    finally:
+        client_socket.POOL.close()
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
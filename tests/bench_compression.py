@@ -0,0 +1,99 @@
+"""File size and reconstruction error of delta reports vs error-bounded reports.
+
+Runs a full CellRunner cycle (CC charge, CV taper, rest, CC discharge) measured every
+10 s on the simulated backend and virtual clock, once reporting on the usual delta
+conditions and once per tolerance with the SwingingDoor. The reconstruction error is
+the largest distance between a measurement and the linear interpolation of the rows
+written to the file, over every measurement taken.
+
+Run from the repository root with::
+
+    python -m tests.bench_compression
+"""
+import math
+import os
+import tempfile
+
+from cyckei.server import protocols
+from tests.sim_backend import SimClock, SimSource
+
+PROTOCOL = """from cyckei.server import protocols
+protocols.CCCharge(0.1, reports=(("voltage", 0.001), ("time", ":5:")),
+                   ends=(("voltage", ">", 4.2), ("time", ">", "24::")))
+protocols.CVCharge(4.2, reports=(("current", 0.0005), ("time", ":5:")),
+                   ends=(("current", "<", 0.005), ("time", ">", "24::")))
+protocols.Rest(reports=(("time", ":5:"),), ends=(("time", ">", "1::"),))
+protocols.CCDischarge(0.1, reports=(("voltage", 0.001), ("time", ":5:")),
+                      ends=(("voltage", "<", 3.5), ("time", ">", "24::")))
+"""
+
+MODES = {
+    "delta 1 mV / 0.5 mA": None,
+    "tolerance 1 mV": {"voltage": 0.001, "current": 0.0005},
+    "tolerance 2 mV": {"voltage": 0.002, "current": 0.0005},
+    "tolerance 5 mV": {"voltage": 0.005, "current": 0.001},
+}
+
+
+def interpolate(points, t, index):
+    """Value of column index at time t on the line through the reported points."""
+    low, high = 0, len(points) - 1
+    while high - low > 1:
+        middle = (low + high) // 2
+        if points[middle][0] <= t:
+            low = middle
+        else:
+            high = middle
+    a, b = points[low], points[high]
+    if b[0] == a[0]:
+        return a[index]
+    return a[index] + (t - a[0]) / (b[0] - a[0]) * (b[index] - a[index])
+
+
+def run(tolerance, noise_v, noise_i, path):
+    clock = SimClock()
+    with clock.patch(protocols):
+        source = SimSource(clock, channel="a", noise_v=noise_v,
+                           noise_i=noise_i, seed=1)
+        runner = protocols.CellRunner(channel="a", path=path, plugins={},
+                                      tolerance=tolerance)
+        runner.set_source(source)
+        runner.load_protocol(PROTOCOL)
+        for step in runner.steps:
+            step.data_max_len = math.inf
+        while runner.run():
+            clock.advance_to(runner.next_time)
+
+    error_v = error_i = 0.
+    for step in runner.steps:
+        for row in step.data:
+            error_v = max(error_v, abs(
+                row[2] - interpolate(step.report, row[0], 2)))
+            error_i = max(error_i, abs(
+                row[1] - interpolate(step.report, row[0], 1)))
+    return {
+        "measured": sum(len(step.data) for step in runner.steps),
+        "rows": sum(len(step.report) for step in runner.steps),
+        "size": os.path.getsize(path),
+        "error_v": error_v,
+        "error_i": error_i,
+    }
+
+
+def main():
+    root = tempfile.mkdtemp()
+    print("{:>22} {:>9} {:>9} {:>7} {:>9} {:>12} {:>12}".format(
+        "mode", "noise mV", "measured", "rows", "size kB", "max err mV",
+        "max err mA"))
+    for noise_v, noise_i in [(0.0, 0.0), (3e-4, 3e-5)]:
+        for i, (name, tolerance) in enumerate(MODES.items()):
+            path = os.path.join(root, "{}_{}.txt".format(noise_v, i))
+            result = run(tolerance, noise_v, noise_i, path)
+            print("{:>22} {:>9.1f} {:>9} {:>7} {:>9.1f} {:>12.2f} {:>12.3f}".format(
+                name, noise_v * 1000, result["measured"], result["rows"],
+                result["size"] / 1e3, result["error_v"] * 1e3,
+                result["error_i"] * 1e3))
+
+
+if __name__ == "__main__":
+    main()
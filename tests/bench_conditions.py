@@ -0,0 +1,166 @@
+"""Micro-benchmark of end and report condition evaluation.
+
+Times a step's end and report condition checks on a CC charge step holding a typical
+amount of data, once with the Condition.check() loops the steps used before conditions
+were compiled and once with the step's compiled ConditionEvaluators.
+
+Run from the repository root with::
+
+    python -m tests.bench_conditions
+"""
+import time
+import timeit
+
+from cyckei.server import protocols
+from tests.sim_backend import SimClock, SimSource
+
+
+class LegacyConditionDelta(protocols.ConditionDelta):
+    """ConditionDelta.check as it was before compilation."""
+
+    def check(self, step):
+        try:
+            if len(step.report) == 0:
+                step.next_time = time.time()
+                return True
+            else:
+                if self.is_time:
+                    val = time.time()
+                    delta = (abs(val - step.report[-1][self.index])
+                             - step.pause_time)
+                    next_time = self.delta - delta + val
+                    step.next_time = min(next_time, step.next_time)
+                else:
+                    val = step.data[-1][self.index]
+                    reference = step.report[-1][self.index]
+                    if self.comparison(abs(val - reference), self.delta):
+                        reference = val
+                    next_time = protocols.extrapolate_delta_time(
+                        step.data, reference, self.delta, self.index)
+                    step.next_time = min(next_time, step.next_time)
+
+                protocols.logger.debug(
+                    "Set next_time to {:.2f} (in {:.2f} sec)".format(
+                        step.next_time, step.next_time-time.time()))
+                if self.comparison(abs(val - step.report[-1][self.index]),
+                                   self.delta):
+                    return True
+                else:
+                    return False
+        except IndexError or ValueError or TypeError:
+            return False
+
+
+class LegacyConditionTotalTime(protocols.ConditionTotalTime):
+    """ConditionTotalTime.check as it was before compilation."""
+
+    def check(self, step):
+        try:
+            delta = abs(time.time() - step.report[0][self.index]) \
+                - step.pause_time
+
+            if self.comparison(delta, self.delta):
+                return True
+            else:
+                next_time = self.delta - delta + time.time()
+                step.next_time = min(step.next_time, next_time)
+                protocols.logger.debug("{}, set next_time to {}".format(
+                    self.value_str,
+                    step.next_time))
+                return False
+        except IndexError or ValueError or TypeError:
+            return False
+
+
+class LegacyConditionAbsolute(protocols.ConditionAbsolute):
+    """ConditionAbsolute.check as it was before compilation."""
+
+    def check(self, step):
+        try:
+            execute_check = True
+            if self.min_time is not None:
+                execute_check = (
+                    step.data[-1][0] - step.report[0][0] > self.min_time
+                )
+
+            if execute_check:
+                if self.comparison(step.data[-1][self.index], self.value):
+                    return True
+                else:
+                    next_time = protocols.extrapolate_time(step.data,
+                                                           self.value,
+                                                           self.index)
+                    step.next_time = min(next_time, step.next_time)
+                    protocols.logger.debug(
+                        f"{self.value_str} set next_time to \
+                                   {step.next_time:.2f} (in \
+                                   {step.next_time - time.time():.2f} sec)")
+                    return False
+            else:
+                return False
+        except IndexError or ValueError or TypeError:
+            return False
+
+
+def legacy_check(step):
+    """The check_end_conditions() and check_report_conditions() loops before compilation."""
+    for condition in step.end_conditions:
+        if condition.check(step):
+            step.status = protocols.STATUS.completed
+            return True
+    for condition in step.report_conditions:
+        if condition.check(step):
+            return True
+    return False
+
+
+def compiled_check(step):
+    now = time.time()
+    if step.check_end_conditions(now):
+        return True
+    return step.check_report_conditions(now)
+
+
+def make_step(legacy):
+    """Returns a started CC charge step with a few hundred measurements."""
+    clock = SimClock()
+    with clock.patch(protocols):
+        source = SimSource(clock, channel="a", noise_v=2e-4, seed=1)
+        runner = protocols.CellRunner(channel="a", path=None, plugins={})
+        runner.set_source(source)
+        runner.write_header = runner.write_cycle_header = lambda: None
+        runner.write_step_header = lambda: None
+        runner.write_data = lambda *args: None
+        runner.load_protocol(
+            "from cyckei.server import protocols\n"
+            "protocols.CCCharge(0.01, "
+            "reports=(('voltage', 0.005), ('time', ':5:')), "
+            "ends=(('voltage', '>', 4.2), ('time', '>', '24::')))")
+        step = runner.steps[0]
+        if legacy:
+            step.report_conditions = [
+                LegacyConditionDelta("voltage", 0.005),
+                LegacyConditionDelta("time", 300)]
+            step.end_conditions = [
+                LegacyConditionAbsolute("voltage", ">", 4.2),
+                LegacyConditionTotalTime(24 * 3600)]
+        for _ in range(300):
+            runner.run()
+            clock.advance_to(runner.next_time)
+    return step
+
+
+def main():
+    number = 20000
+    for name, check, legacy in [("Condition.check loops", legacy_check, True),
+                                ("ConditionEvaluator", compiled_check, False)]:
+        step = make_step(legacy)
+        # Evaluations happen well within the step, as on a running channel
+        step.report[0][0] = time.time() - 3600
+        best = min(timeit.repeat(lambda: check(step), number=number, repeat=5))
+        print("{:>22}: {:>9.0f} checks/s ({:.2f} us each, {} data rows)".format(
+            name, number / best, 1e6 * best / number, len(step.data)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Accuracy-vs-reads benchmark for next_time extrapolation.
+
+Simulates a CC charge to 4.2 V (voltage reports) followed by a CV taper (current
+reports) on the simulated backend, scheduling every read the way ProtocolStep does:
+the default wait_time, pulled in by the delta report condition and the end condition.
+The legacy two-point projection is compared with the windowed least-squares predictor
+and with plain fixed-interval polling for increasing measurement noise, so the number
+of reads can be compared at equal report fidelity.
+
+Run from the repository root with::
+
+    python -m tests.bench_extrapolation
+"""
+import time
+
+from cyckei.server import protocols
+from tests.sim_backend import SimClock, SimSource
+
+NEVER = protocols.NEVER
+WAIT_TIME = 60.0
+
+
+def legacy_extrapolate_time(data, target, index):
+    """The two-point projection used before the least-squares predictor."""
+    try:
+        d1 = data[-1]
+        for i in range(2, 100):
+            d0 = data[-i]
+            if abs(d1[2] - d0[2]) > 0.0001:
+                break
+        return ((target - d1[index]) / (d1[index] - d0[index])
+                * (d1[0] - d0[0]) + d1[0])
+    except (IndexError, ZeroDivisionError):
+        return NEVER
+
+
+def legacy_delta(data, reference, delta, index, falling):
+    value = data[-1][index]
+    target = value - delta if falling else value + delta
+    return legacy_extrapolate_time(data, target, index)
+
+
+def fitted_delta(data, reference, delta, index, falling):
+    return protocols.extrapolate_delta_time(data, reference, delta, index)
+
+
+def no_prediction(*args):
+    return NEVER
+
+
+# name: (delta predictor, end predictor, wait_time)
+PREDICTORS = {
+    "legacy": (legacy_delta, legacy_extrapolate_time, WAIT_TIME),
+    "least-squares": (fitted_delta, protocols.extrapolate_time, WAIT_TIME),
+    "poll 20s": (no_prediction, no_prediction, 20.0),
+    "poll 10s": (no_prediction, no_prediction, 10.0),
+    "poll 5s": (no_prediction, no_prediction, 5.0),
+}
+
+
+def run_phase(clock, source, index, delta, end_value, end_op, falling,
+              predict_delta, predict_end, wait_time):
+    """Runs one step until its end condition, returns (reads, reports, lateness, overshoot)."""
+    data = []
+    reported = None
+    reported_true = None
+    reports = 0
+    lateness = []
+    while True:
+        current, voltage = source.read_iv()
+        true = source.true_iv()
+        now = clock.time()
+        data.append([now, abs(current), voltage, 0.0])
+        true_value = abs(true[0]) if index == 1 else true[1]
+        value = data[-1][index]
+
+        if end_op(value, end_value):
+            return source.read_count, reports, lateness, abs(true_value - end_value)
+
+        if reported is None or abs(value - reported) >= delta:
+            if reported_true is not None:
+                lateness.append(abs(true_value - reported_true) - delta)
+            reported = value
+            reported_true = true_value
+            reports += 1
+
+        next_time = now + wait_time
+        next_time = min(next_time, predict_delta(data, reported, delta,
+                                                 index, falling))
+        next_time = min(next_time, predict_end(data, end_value, index))
+        clock.advance_to(max(next_time, now + protocols.MIN_WAIT_TIME))
+
+
+def run(name, noise_v, noise_i):
+    predict_delta, predict_end, wait_time = PREDICTORS[name]
+    clock = SimClock()
+    source = SimSource(clock, noise_v=noise_v, noise_i=noise_i, seed=1)
+
+    source.set_current(0.1)
+    cc = run_phase(clock, source, 2, 0.005, 4.2, lambda a, b: a >= b, False,
+                   predict_delta, predict_end, wait_time)
+    source.set_voltage(4.2)
+    cv = run_phase(clock, source, 1, 0.002, 0.005, lambda a, b: a <= b, True,
+                   predict_delta, predict_end, wait_time)
+    # The first report of each step has no history to extrapolate from
+    late = [x / 0.005 for x in cc[2][1:]] + [x / 0.002 for x in cv[2][1:]]
+    late.sort()
+    return {
+        "reads": source.read_count,
+        "reports": cc[1] + cv[1],
+        "late_mean": 100 * sum(late) / len(late),
+        "late_p95": 100 * late[int(0.95 * (len(late) - 1))],
+        "cutoff_mv": 1000 * cc[3],
+    }
+
+
+def main():
+    print("Report lateness is the overshoot of the report threshold in % of it.")
+    print("{:>14} {:>9} {:>7} {:>8} {:>10} {:>10} {:>10}".format(
+        "predictor", "noise mV", "reads", "reports", "late mean",
+        "late p95", "cutoff mV"))
+    for noise_v, noise_i in [(0.0, 0.0), (0.2e-3, 0.02e-3), (1e-3, 0.1e-3)]:
+        for name in PREDICTORS:
+            start = time.perf_counter()
+            result = run(name, noise_v, noise_i)
+            elapsed = time.perf_counter() - start
+            print("{:>14} {:>9.1f} {:>7} {:>8} {:>9.1f}% {:>9.1f}% "
+                  "{:>10.2f}  ({:.2f}s)".format(
+                      name, noise_v * 1000, result["reads"],
+                      result["reports"], result["late_mean"],
+                      result["late_p95"], result["cutoff_mv"], elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Cost of appending data points with an open file per write vs a HandlePool.
+
+Simulates a rack of channels that each append one data line per second to their own
+file, the way CellRunner.write_text does when there is no DataWriter. Opening and
+closing the file for every point is compared with a writer.HandlePool large enough for
+every channel and with one that is too small, where round-robin writes defeat the LRU
+and every write has to reopen its file.
+
+Run from the repository root with::
+
+    python -m tests.bench_handles [directory]
+"""
+import sys
+import tempfile
+import time
+
+from cyckei.server import writer
+
+LINE = "    {:0.8g},0.1,3.7512345,12.345678\n"
+CHANNELS = 1000
+SECONDS = 20
+
+
+def open_per_write(paths, seconds):
+    for second in range(seconds):
+        for path in paths:
+            with open(path, "a") as file:
+                file.write(LINE.format(second))
+
+
+def pooled(paths, seconds, pool):
+    for second in range(seconds):
+        for path in paths:
+            pool.write(path, LINE.format(second))
+    pool.close()
+
+
+def main():
+    root = sys.argv[1] if len(sys.argv) > 1 else tempfile.mkdtemp()
+    writes = CHANNELS * SECONDS
+    print("{} channels writing at 1 Hz for {} s".format(CHANNELS, SECONDS))
+    print("{:>22} {:>12} {:>12} {:>8}".format("", "wall us", "cpu us", "opens"))
+
+    cases = [("open per write", None),
+             ("pool of {}".format(CHANNELS), writer.HandlePool(CHANNELS)),
+             ("pool of {}".format(CHANNELS // 4),
+              writer.HandlePool(CHANNELS // 4))]
+    for i, (name, pool) in enumerate(cases):
+        paths = ["{}/{}_{}.txt".format(root, i, channel)
+                 for channel in range(CHANNELS)]
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        if pool is None:
+            open_per_write(paths, SECONDS)
+            opens = writes
+        else:
+            pooled(paths, SECONDS, pool)
+            opens = pool.opens
+        print("{:>22} {:>12.2f} {:>12.2f} {:>8}".format(
+            name, 1e6 * (time.perf_counter() - wall) / writes,
+            1e6 * (time.process_time() - cpu) / writes, opens))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Cost of writing and reading data rows as text vs in a chunked NumPy store.
+
+Writes the same rows through CellRunner.write_data to a text log, directly through the
+HandlePool as with no DataWriter, and to an "npy" format log whose rows go to an
+npystore.Store, then reads the whole history back: the text log with a plain line
+parser, the store by mapping its segments.
+
+Run from the repository root with::
+
+    python -m tests.bench_npystore [directory]
+"""
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from cyckei.functions import npystore
+from cyckei.server import protocols
+
+ROWS = 200000
+STEP_ROWS = 20000
+
+
+def write(path, file_format):
+    runner = protocols.CellRunner(channel="a", path=path, plugins={},
+                                  format=file_format)
+    runner.start_time = 0.
+    runner.write_header()
+    start = time.perf_counter()
+    for i in range(ROWS):
+        if i % STEP_ROWS == 0:
+            runner.write_marker(b"S", '{"state": "charge_constant_current"}')
+        runner.write_data(i * 0.1, 0.1 + 1e-5 * math.sin(i), 3.7 + 1e-3 * math.sin(i / 500.),
+                          i / 360., [])
+    runner.write_pending()
+    elapsed = time.perf_counter() - start
+    runner.handles.close()
+    if runner.store is not None:
+        runner.store.close()
+    return elapsed
+
+
+def read_text(path):
+    rows = []
+    with open(path) as file:
+        for line in file:
+            if line.startswith("    "):
+                rows.append([float(value) for value in line.split(",")])
+    return np.array(rows)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    root = sys.argv[1] if len(sys.argv) > 1 else tempfile.mkdtemp()
+    text_path = os.path.join(root, "text.pyb")
+    npy_path = os.path.join(root, "npy.pyb")
+    print("{} rows of 4 columns, a step every {} rows".format(ROWS, STEP_ROWS))
+    print("{:>8} {:>12} {:>10} {:>12}".format("", "write us/row", "size MB", "read ms"))
+
+    elapsed = write(text_path, "text")
+    read_time, rows = timed(read_text, text_path)
+    print("{:>8} {:>12.2f} {:>10.1f} {:>12.1f}".format(
+        "text", 1e6 * elapsed / ROWS, os.path.getsize(text_path) / 1e6, 1e3 * read_time))
+
+    elapsed = write(npy_path, "npy")
+    size = sum(os.path.getsize(os.path.join(npystore.store_path(npy_path), name))
+               for name in os.listdir(npystore.store_path(npy_path)))
+    map_time, mapped = timed(npystore.segments, npy_path)
+    history_time, history = timed(npystore.history, npy_path)
+    print("{:>8} {:>12.2f} {:>10.1f} {:>12.1f}".format(
+        "npy", 1e6 * elapsed / ROWS, size / 1e6, 1e3 * map_time))
+    print("Copying the mapped segments into one array took {:.1f} ms".format(
+        1e3 * history_time))
+    assert len(rows) == len(history) == ROWS
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Cost of keeping a pyramid during acquisition and of serving series from it.
+
+Feeds a Pyramid one row every 10 s for tests of increasing length, spilling to a
+temporary directory, and times get_series() for the last day and for the whole test.
+Query time and payload should stay flat as the test grows, while reading the log
+grows with it.
+
+Run from the repository root with::
+
+    python -m tests.bench_pyramid [directory]
+"""
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+from cyckei.server import pyramid
+
+START = 1.6e9
+INTERVAL = 10.
+DAYS = (1, 10, 100)
+QUERIES = 200
+
+
+def build(path, days):
+    summary = pyramid.Pyramid(path)
+    rows = int(days * 86400 / INTERVAL)
+    start = time.perf_counter()
+    for i in range(rows):
+        summary.add(START + i * INTERVAL,
+                    (0.1 * math.cos(i / 300.), 3.7 + 0.3 * math.sin(i / 500.), i / 360.))
+    return summary, rows, time.perf_counter() - start
+
+
+def timed_series(summary, t0, t1):
+    start = time.perf_counter()
+    for _ in range(QUERIES):
+        series = summary.series(t0, t1, 1000)
+    elapsed = (time.perf_counter() - start) / QUERIES
+    return elapsed, len(json.dumps(series)), series["level"]
+
+
+def main():
+    root = sys.argv[1] if len(sys.argv) > 1 else tempfile.mkdtemp()
+    print("{:>5} {:>9} {:>9} {:>14} {:>14} {:>10}".format(
+        "days", "rows", "add us", "last day ms", "whole ms", "payload kB"))
+    for days in DAYS:
+        summary, rows, elapsed = build(os.path.join(root, "{}.pyr".format(days)), days)
+        end = START + rows * INTERVAL
+        day_time, day_size, day_level = timed_series(summary, end - 86400, end)
+        whole_time, whole_size, whole_level = timed_series(summary, None, None)
+        print("{:>5} {:>9} {:>9.2f} {:>14.3f} {:>14.3f} {:>10.1f}".format(
+            days, rows, 1e6 * elapsed / rows, 1e3 * day_time, 1e3 * whole_time,
+            max(day_size, whole_size) / 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Size and server time of the get_recent replies feeding the client's sparklines.
+
+Fills the RecentWindow of CHANNELS channels with SAMPLES measurements, then times a first
+request for every channel, which gets the whole window decimated to MAX_POINTS each, and
+following requests after NEW measurements per channel. The bytes are compared with the
+same measurements sent as JSON lists, without decimation.
+
+Run from the repository root with::
+
+    python -m tests.bench_recent
+"""
+import json
+import math
+import time
+
+from cyckei.server import recent
+
+CHANNELS = (64, 256, 1024)
+SAMPLES = recent.SAMPLES
+NEW = 4  # Measurements per channel between requests, 6 s apart at 1.5 s per measurement
+MAX_POINTS = 120
+
+
+def fill(window, start, count):
+    for i in range(start, start + count):
+        window.add(1.6e9 + i, 0.1, 3.7 + 0.2 * math.sin(i / 50))
+
+
+def request(windows, cursors):
+    start = time.perf_counter()
+    replies = {channel: window.since(max_points=MAX_POINTS, **cursors.get(channel, {}))
+               for channel, window in windows.items()}
+    elapsed = time.perf_counter() - start
+    for channel, reply in replies.items():
+        cursors[channel] = {"sequence": reply["next"], "epoch": reply["epoch"]}
+    return elapsed, len(json.dumps(replies))
+
+
+def main():
+    print("{:>8} {:>12} {:>12} {:>12} {:>12}".format(
+        "channels", "first", "first raw", "next", "next raw"))
+    for count in CHANNELS:
+        windows = {str(channel): recent.RecentWindow() for channel in range(count)}
+        for window in windows.values():
+            fill(window, 0, SAMPLES)
+        cursors = {}
+        first_time, first_bytes = request(windows, cursors)
+        raw_first = len(json.dumps({channel: [[1.6e9 + i, 0.1, 3.7] for i in range(SAMPLES)]
+                                    for channel in windows}))
+        for window in windows.values():
+            fill(window, SAMPLES, NEW)
+        next_time, next_bytes = request(windows, cursors)
+        raw_next = len(json.dumps({channel: [[1.6e9 + i, 0.1, 3.7] for i in range(NEW)]
+                                   for channel in windows}))
+        print("{:>8} {:>7.0f} kB {:>9.0f} kB {:>9.1f} kB {:>9.1f} kB".format(
+            count, first_bytes / 1e3, raw_first / 1e3, next_bytes / 1e3, raw_next / 1e3))
+        print("{:>8} {:>10.1f}ms {:>12} {:>10.1f}ms".format(
+            "", first_time * 1e3, "", next_time * 1e3))
+
+
+if __name__ == "__main__":
+    main()
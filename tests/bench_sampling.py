@@ -0,0 +1,96 @@
+"""Instrument transactions vs report fidelity for fixed and adaptive sampling.
+
+Runs a full CellRunner protocol (CC charge, CV taper, rest, CC discharge) on the
+simulated backend and virtual clock, once with the fixed default wait_time and once
+with adaptive measurement intervals. Report fidelity is the amount by which the true
+signal had moved past each delta report threshold by the time it was reported.
+
+Run from the repository root with::
+
+    python -m tests.bench_sampling
+"""
+import os
+import tempfile
+import time
+
+from cyckei.server import protocols
+from tests.sim_backend import SimClock, SimSource
+
+PROTOCOL = """from cyckei.server import protocols
+protocols.CCCharge(0.1, reports=(("voltage", 0.005), ("time", ":5:")),
+                   ends=(("voltage", ">", 4.2), ("time", ">", "24::")){options})
+protocols.CVCharge(4.2, reports=(("current", 0.002), ("time", ":5:")),
+                   ends=(("current", "<", 0.005), ("time", ">", "24::")){options})
+protocols.Rest(reports=(("time", ":5:"),), ends=(("time", ">", "1::"),){options})
+protocols.CCDischarge(0.1, reports=(("voltage", 0.005), ("time", ":5:")),
+                      ends=(("voltage", "<", 3.5), ("time", ">", "24::")){options})
+"""
+
+MODES = {
+    "fixed 10s": "",
+    "adaptive 1-60s": ", adaptive=(1, 60)",
+    "adaptive 2-120s": ", adaptive=(2, 120)",
+}
+
+
+def overshoot(runner, source):
+    """Returns the per-report overshoot of delta thresholds in % of the threshold."""
+    late = []
+    for step in runner.steps:
+        for condition in step.report_conditions:
+            if condition.index not in (1, 2):
+                continue
+            true = [source.history[row[0]] for row in step.report]
+            values = [abs(iv[0]) if condition.index == 1 else iv[1]
+                      for iv in true]
+            # The first interval of a step has no history to extrapolate from
+            for a, b in zip(values[1:], values[2:]):
+                late.append(100 * max(0.0, abs(b - a) - condition.delta)
+                            / condition.delta)
+    return late
+
+
+def run(options, noise_v, noise_i, path):
+    clock = SimClock()
+    with clock.patch(protocols):
+        source = SimSource(clock, channel="a", noise_v=noise_v,
+                           noise_i=noise_i, seed=1)
+        runner = protocols.CellRunner(channel="a", path=path, plugins={})
+        runner.set_source(source)
+        runner.load_protocol(PROTOCOL.format(options=options))
+        start = clock.time()
+        while runner.run():
+            clock.advance_to(runner.next_time)
+        days = (clock.time() - start) / 86400.
+
+    late = sorted(overshoot(runner, source))
+    return {
+        "reads_per_day": source.read_count / days,
+        "reports": sum(len(step.report) for step in runner.steps),
+        "late_mean": sum(late) / len(late),
+        "late_p95": late[int(0.95 * (len(late) - 1))],
+        "hours": days * 24,
+    }
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), "bench_sampling.txt")
+    print("Overshoot is how far past a report threshold the true value was "
+          "when reported, in % of it.")
+    print("{:>16} {:>9} {:>10} {:>8} {:>10} {:>10} {:>7}".format(
+        "mode", "noise mV", "reads/day", "reports", "over mean",
+        "over p95", "hours"))
+    for noise_v, noise_i in [(0.0, 0.0), (1e-3, 0.1e-3)]:
+        for name, options in MODES.items():
+            elapsed = time.perf_counter()
+            result = run(options, noise_v, noise_i, path)
+            elapsed = time.perf_counter() - elapsed
+            print("{:>16} {:>9.1f} {:>10.0f} {:>8} {:>9.1f}% {:>9.1f}% "
+                  "{:>7.2f}  ({:.2f}s)".format(
+                      name, noise_v * 1000, result["reads_per_day"],
+                      result["reports"], result["late_mean"],
+                      result["late_p95"], result["hours"], elapsed))
+
+
+if __name__ == "__main__":
+    main()
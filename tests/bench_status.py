@@ -0,0 +1,85 @@
+"""Cost of keeping 128 channel widgets up to date by polling and by following deltas.
+
+Simulates CHANNELS channels measured every MEASURE_INTERVAL seconds for DURATION seconds
+of server loops. Polling, as the client used to, sends info_all_channels every
+update-interval and sets the text and lock of every widget. Following sends each
+changed field once, published by StatusFeed, and touches only the widgets that changed.
+Prints the bytes sent, the widget calls and the server time spent per loop.
+
+Run from the repository root with::
+
+    python -m tests.bench_status
+"""
+import json
+import random
+import time
+
+from cyckei.server import feed
+
+CHANNELS = 128
+MEASURE_INTERVAL = 10.  # Seconds between measurements of a channel
+UPDATE_INTERVAL = 6.  # The client's update-interval, seconds between polls
+LOOP = 0.1  # Seconds between server loops
+DURATION = 3600.
+
+
+def channel_info(channel, voltage, cycle):
+    stats = {"points": 100, "min_voltage": voltage - 0.1, "max_voltage": voltage + 0.1,
+             "capacity": voltage * 0.1, "energy": voltage * 0.4}
+    return {"channel": channel, "path": "/data/{}.pyb".format(channel),
+            "cellid": "cell {}".format(channel), "comment": "", "protocol_name": "cc.py",
+            "protocol": "CCCharge(0.1, reports=(('time', 60),))", "status": "started",
+            "state": "charge_constant_current", "current": 0.1, "voltage": voltage,
+            "cycle": cycle, "step_stats": stats, "cycle_stats": stats,
+            "last_cycle_stats": stats}
+
+
+def main():
+    rng = random.Random(1)
+    offsets = [rng.uniform(0, MEASURE_INTERVAL) for _ in range(CHANNELS)]
+    voltages = [3.7] * CHANNELS
+    status = feed.StatusFeed()
+    published = [0, 0]  # Bytes and widgets changed
+
+    def publish(previous, delta):
+        if delta:
+            published[0] += len(json.dumps({"epoch": status.epoch, "version": status.version,
+                                            "previous": previous, "channels": delta}))
+            published[1] += len(delta)
+
+    status._publish = publish
+
+    polled_bytes = 0
+    polled_calls = 0
+    feed_time = 0.
+    loops = int(DURATION / LOOP)
+    next_poll = 0.
+    for loop in range(loops):
+        now = loop * LOOP
+        for i in range(CHANNELS):
+            if (now - offsets[i]) % MEASURE_INTERVAL < LOOP:
+                voltages[i] = round(voltages[i] + rng.uniform(-1e-3, 2e-3), 4)
+        channels = {str(i + 1): channel_info(i + 1, voltages[i], int(now // 1800))
+                    for i in range(CHANNELS)}
+
+        start = time.perf_counter()
+        status.update(channels)
+        feed_time += time.perf_counter() - start
+
+        if now >= next_poll:
+            next_poll += UPDATE_INTERVAL
+            polled_bytes += len(json.dumps({"response": channels, "message": None}))
+            # setText and lock or unlock of every widget
+            polled_calls += 2 * CHANNELS
+
+    print("{} channels, {:.0f} s, measured every {:.0f} s".format(
+        CHANNELS, DURATION, MEASURE_INTERVAL))
+    print("polling every {:.0f} s   {:>10.1f} kB/s  {:>8.1f} widget calls/s".format(
+        UPDATE_INTERVAL, polled_bytes / DURATION / 1e3, polled_calls / DURATION))
+    print("following deltas     {:>10.1f} kB/s  {:>8.1f} widget calls/s".format(
+        published[0] / DURATION / 1e3, published[1] / DURATION))
+    print("feed update          {:>10.1f} us per loop".format(feed_time / loops * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Time to check a protocol, by the client without the server and by the server.
+
+Protocols of growing length are made of the steps of the example script. Each is checked
+by validator.check() the first time, again from its cache, and after one of its lines is
+edited, and by the server's test(), which loads the protocol into a CellRunner and which
+every check used to wait for, on top of the round trip to the server.
+
+Run from the repository root with::
+
+    python -m tests.bench_validator
+"""
+import time
+
+from cyckei.functions import validator
+from cyckei.server import server
+
+STEPS = """AdvanceCycle()
+CCCharge(0.01, reports=(("voltage", 0.01), ("time", ":5:")), ends=(("voltage", ">", 4.2), ("time", ">", "20::")))
+Rest(reports=(("time", "::15"),), ends=(("time", ">", ":5:"),))
+CCDischarge(0.01, reports=(("voltage", 0.01), ("time", ":5:")), ends=(("voltage", "<", 3), ("time", ">", "20::")))
+Rest(reports=(("time", "::15"),), ends=(("time", ">", ":5:"),))
+"""
+LINES = (100, 1000, 10000)
+
+
+def measure(function, protocol, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(protocol)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print("{:>8} {:>12} {:>12} {:>12} {:>12}".format(
+        "lines", "check", "cached", "edited", "server"))
+    for lines in LINES:
+        protocol = STEPS * (lines // 5)
+        start = time.perf_counter()
+        assert validator.check(protocol)[0]
+        cold = time.perf_counter() - start
+        cached = measure(validator.check, protocol)
+        edited = protocol.replace("CCCharge(0.01,", "CCCharge(0.02,", 1)
+        start = time.perf_counter()
+        assert validator.check(edited)[0]
+        edit = time.perf_counter() - start
+        loaded = measure(server.test, protocol, repeat=1)
+        print("{:>8} {:>10.2f}ms {:>10.3f}ms {:>10.2f}ms {:>10.2f}ms".format(
+            lines, cold * 1e3, cached * 1e3, edit * 1e3, loaded * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Control thread cost of writing data points, directly vs through the DataWriter.
+
+Writes the same data lines to a number of files the way CellRunner.write_data does,
+once with an open/append/close per point and once through a writer.DataWriter. The time
+spent on the calling thread is what delays the next measurement, the writer's own time
+is reported separately together with its latency statistics.
+
+Run from the repository root with::
+
+    python -m tests.bench_writer [directory]
+
+The directory defaults to a temporary one; point it at a network share to see the
+effect of a slow file system.
+"""
+import sys
+import tempfile
+import time
+
+from cyckei.server import writer
+
+LINE = "    {:0.8g},0.1,3.7512345,12.345678\n"
+
+
+def direct(paths, points):
+    for i in range(points):
+        for path in paths:
+            with open(path, "a") as file:
+                file.write(LINE.format(i * 10.))
+
+
+def buffered(paths, points, data_writer):
+    for i in range(points):
+        for path in paths:
+            data_writer.write(path, LINE.format(i * 10.))
+
+
+def main():
+    root = sys.argv[1] if len(sys.argv) > 1 else tempfile.mkdtemp()
+    points = 200
+    print("Seconds per point on the calling thread, {} points per file".format(points))
+    print("{:>6} {:>12} {:>12} {:>12} {:>12}".format(
+        "files", "direct us", "writer us", "close ms", "latency ms"))
+    for count in (10, 100, 300):
+        paths = ["{}/direct_{}.txt".format(root, i) for i in range(count)]
+        start = time.perf_counter()
+        direct(paths, points)
+        direct_time = time.perf_counter() - start
+
+        paths = ["{}/writer_{}.txt".format(root, i) for i in range(count)]
+        data_writer = writer.DataWriter()
+        start = time.perf_counter()
+        buffered(paths, points, data_writer)
+        writer_time = time.perf_counter() - start
+        start = time.perf_counter()
+        data_writer.close()
+        close_time = time.perf_counter() - start
+
+        stats = data_writer.stats()
+        print("{:>6} {:>12.2f} {:>12.2f} {:>12.1f} {:>12.1f}".format(
+            count, 1e6 * direct_time / (count * points),
+            1e6 * writer_time / (count * points), 1e3 * close_time,
+            1e3 * stats["latency_mean"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -70,6 +70,10 @@ class MockSource():
     def read_iv(self):
         return self.current, self.voltage
 
+    @staticmethod
+    def measure_many(sources, v_limit=5.0):
+        return [source.read_iv() for source in sources]
+
     def off(self):
         self.read_iv()
         self._current = 0
@@ -0,0 +1,143 @@
+"""Deterministic simulated cycler backend for benchmarks.
+
+Everything runs on a virtual clock, so days of cycling on hundreds of channels can be
+simulated in seconds. The cell model is the same Nernst-like curve used by
+mock_source.MockSource, with optional measurement noise.
+
+Typical use::
+
+    clock = SimClock()
+    with clock.patch(protocols):
+        source = SimSource(clock, channel="1", noise_v=2e-4)
+        ...
+"""
+import contextlib
+import math
+import random
+import types
+
+
+class SimClock(object):
+    """A virtual clock exposing the parts of the time module used by the server."""
+
+    def __init__(self, start=1.6e9):
+        self.now = float(start)
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+    def advance_to(self, timestamp):
+        self.now = max(self.now, timestamp)
+
+    @contextlib.contextmanager
+    def patch(self, *modules):
+        """Temporarily replaces the time module in each given module with this clock."""
+        originals = [module.time for module in modules]
+        fake = types.SimpleNamespace(time=self.time, sleep=self.sleep)
+        for module in modules:
+            module.time = fake
+        try:
+            yield self
+        finally:
+            for module, original in zip(modules, originals):
+                module.time = original
+
+
+class SimSource(object):
+    """Simulated keithley2602.Source driven by a SimClock.
+
+    Attributes:
+        history (dict): Noiseless (current, voltage) keyed by clock time for every read_iv call.
+        read_count (int): Number of instrument transactions (read_iv calls) so far.
+        x (float): State of charge in mAh.
+    """
+
+    current_ranges = [100 * 1e-9, 1e-6, 10e-6,
+                      100e-6, 1e-3, 0.01,
+                      0.1, 1.0, 3.0]
+
+    w = 100.  # mAh
+    s = -1.  # shift to avoid dropping too low in voltage
+    R = 2.  # internal resistance in Ohms
+
+    def __init__(self, clock, channel="a", noise_v=0.0, noise_i=0.0,
+                 seed=0, soc=0.0):
+        self.clock = clock
+        self.channel = str(channel)
+        self.safety_reset_seconds = 120
+        self.noise_v = noise_v
+        self.noise_i = noise_i
+        self.random = random.Random(seed)
+        self.read_count = 0
+        self.history = {}
+        self.x = soc
+        self.t = clock.time()
+        self.mode = "constant_current"
+        self._current = 0.0
+        self._voltage = 0.0
+
+    def ocv(self, x):
+        """Open circuit voltage at a state of charge in mAh."""
+        x = min(max(x, self.s + 1e-6), self.w - 1e-6)
+        return 3.7 + 0.2 * (math.log(1. / (1. / (x - self.s)
+                                           - 1. / (self.w - self.s)))
+                            - math.log(self.w))
+
+    def _advance(self):
+        """Integrates the state of charge up to the current clock time."""
+        dt = self.clock.time() - self.t
+        self.t = self.clock.time()
+        if dt <= 0:
+            return
+        if self.mode == "constant_current":
+            self.x += self._current * 1000. * dt / 3600.
+        else:
+            steps = max(1, int(math.ceil(dt / 5.0)))
+            h = dt / steps
+            for _ in range(steps):
+                current = (self._voltage - self.ocv(self.x)) / self.R
+                self.x += current * 1000. * h / 3600.
+
+    def true_iv(self):
+        """Returns the noiseless (current, voltage) at the current clock time."""
+        self._advance()
+        if self.mode == "constant_current":
+            return self._current, self.ocv(self.x) + self._current * self.R
+        return (self._voltage - self.ocv(self.x)) / self.R, self._voltage
+
+    def read_iv(self):
+        self.read_count += 1
+        current, voltage = self.true_iv()
+        self.history[self.clock.time()] = (current, voltage)
+        if self.noise_i and current != 0.0:
+            # An idle output reads a clean zero so rest steps stay in control
+            current += self.random.gauss(0.0, self.noise_i)
+        if self.noise_v:
+            voltage += self.random.gauss(0.0, self.noise_v)
+        return current, voltage
+
+    def off(self):
+        self._advance()
+        self._current = 0.0
+        self.mode = "constant_current"
+
+    def pause(self):
+        self.off()
+
+    def rest(self, v_limit=5.0):
+        self.off()
+
+    def set_current(self, current=0.0, v_limit=None):
+        self.off()
+        self._current = current
+
+    def set_voltage(self, voltage=3.0, i_limit=1.0):
+        self.off()
+        self._voltage = voltage
+        self.mode = "constant_voltage"
+
+    def set_text(self, text1="", text2=""):
+        pass
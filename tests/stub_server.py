@@ -0,0 +1,87 @@
+"""A stub of the Cyckei server's REP socket for the client and ctl tests.
+
+Typical use::
+
+    server = StubServer(lambda request, count: {"response": "pong", "message": None})
+    try:
+        ...  # connect to server.address
+    finally:
+        server.close()
+"""
+import json
+import threading
+
+import zmq
+
+
+def echo(request, count):
+    """Answers with the function asked for and the number of the request."""
+    return {"response": request["function"], "message": count}
+
+
+class StubServer(object):
+    """Server answering one request at a time from a thread, as the Cyckei server does.
+
+    It is a ROUTER framed as REP, so a dropped request does not block the replies to the
+    next ones.
+
+    Attributes:
+        address (str): The address to connect to.
+        lock (threading.Lock): Held while answering a request and during tick().
+        port (int): The port the server is bound to.
+        received (list): The requests received, in order.
+    """
+
+    def __init__(self, respond=echo, drop=(), tick=None):
+        """Binds to a random port and starts answering.
+
+        Args:
+            drop (iterable, optional): Numbers of the requests, counted from 1, to not answer.
+            respond (callable, optional): Takes the request and its number and returns the
+                reply. Defaults to echo().
+            tick (callable, optional): Called about every 50 ms, like the server loop.
+        """
+        self.respond = respond
+        self.drop = set(drop)
+        self.tick = tick
+        self.received = []
+        self.lock = threading.Lock()
+        self.socket = zmq.Context.instance().socket(zmq.ROUTER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.port = self.socket.bind_to_random_port("tcp://127.0.0.1")
+        self.address = "tcp://127.0.0.1:{}".format(self.port)
+        self.running = True
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        poller = zmq.Poller()
+        poller.register(self.socket, zmq.POLLIN)
+        while self.running:
+            if self.tick is not None:
+                with self.lock:
+                    self.tick()
+            if not poller.poll(50):
+                continue
+            identity, empty, body = self.socket.recv_multipart()
+            request = json.loads(body)
+            with self.lock:
+                self.received.append(request)
+                if len(self.received) in self.drop:
+                    continue
+                reply = self.respond(request, len(self.received))
+            self.socket.send_multipart([identity, empty, json.dumps(reply).encode()])
+
+    def functions(self):
+        """Returns the functions of the requests received, in order."""
+        return [request["function"] for request in self.received]
+
+    def config(self, timeout=1, retries=2):
+        """Returns client settings for connecting to the server."""
+        return {"zmq": {"client-address": "tcp://127.0.0.1", "port": self.port,
+                        "timeout": timeout, "retries": retries}}
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        self.socket.close()
@@ -0,0 +1,145 @@
+import os
+
+from PySide2.QtCore import Qt, QThreadPool
+from PySide2.QtWidgets import QApplication, QAbstractItemView
+
+from cyckei.client import channel_view
+from cyckei.client.federation import Server
+from cyckei.server.recent import RecentWindow
+
+
+def make_model(tmp_path, count=4):
+    scripts = tmp_path / "scripts"
+    scripts.mkdir()
+    (scripts / "cc.py").write_text("CCCharge(0.1)")
+    config = {"arguments": {"record_dir": str(tmp_path)}, "behavior": {}}
+    records = []
+    for channel in range(1, count + 1):
+        info = {"path": None, "cellid": None, "comment": None, "protocol_name": None}
+        if channel == 2:
+            info = {"path": "C:\\data\\2022\\cell.2.pyb", "cellid": "cell 2",
+                    "comment": "running", "protocol_name": "cc.py"}
+        records.append(channel_view.ChannelRecord(channel, config, info))
+    plugins = [{"name": "thermo", "sources": ["probe 1", "probe 2"]}]
+    return channel_view.ChannelModel(records, plugins, sparklines=True), records
+
+
+def test_model(tmp_path):
+    model, records = make_model(tmp_path)
+    assert model.rowCount() == 4
+    assert model.columns == ["channel", "script", "path", "cellid", "comment",
+                             "plugin:thermo", "status", "trend", "feedback", "actions"]
+    assert model.headerData(5, Qt.Horizontal) == "thermo Source"
+
+    # Settings of a test still running are filled in from the server
+    column = model.columns.index
+    assert model.data(model.index(1, column("path"))) == "cell.2"
+    assert model.data(model.index(1, column("cellid"))) == "cell 2"
+    assert model.data(model.index(1, column("script"))) == "cc.py"
+    assert records[1].attributes["script_content"] == "CCCharge(0.1)"
+    assert model.data(model.index(0, column("plugin:thermo"))) == "None"
+
+    assert model.setData(model.index(0, column("path")), "cell 1")
+    assert records[0].attributes["path"] == "cell 1"
+    assert not model.setData(model.index(0, column("path")), "a/b")
+    assert model.setData(model.index(0, column("plugin:thermo")), "probe 2")
+    assert records[0].attributes["plugins"] == {"thermo": "probe 2"}
+    records[0].lock_settings()
+    assert not model.setData(model.index(0, column("comment")), "locked")
+
+
+def test_apply_status(tmp_path):
+    model, records = make_model(tmp_path)
+    changed = []
+    model.dataChanged.connect(lambda first, last: changed.append(first.row()))
+    info = {"status": "started", "state": "rest", "current": 0., "voltage": 3.7}
+    model.apply_status({"3": info})
+    assert changed == [2]
+    assert records[2].status == "started - rest | C: 0.0, V: 3.7"
+    assert records[2].locked
+    # The same status again touches nothing
+    model.apply_status({"3": info})
+    assert changed == [2]
+    model.apply_status({"3": dict(info, status="available")})
+    assert changed == [2, 2] and records[2].locked is False
+
+    model.set_feedback("Started", records[0])
+    assert model.data(model.index(0, model.columns.index("feedback"))) == "Started"
+    model.apply_status(None)
+    assert all(record.status == "No Response" for record in records)
+
+
+def test_apply_recent(tmp_path):
+    model, records = make_model(tmp_path)
+    changed = []
+    model.dataChanged.connect(lambda first, last: changed.append(
+        (first.row(), model.columns[first.column()])))
+    window = RecentWindow()
+    for i in range(10):
+        window.add(100. + i, 0.1, 3.7 + i / 100)
+    model.apply_recent({"2": window.since(), "3": None})
+    assert changed == [(1, "trend")]
+    assert len(records[1].trend.voltages) == 10
+
+
+def test_apply_status_of_server(tmp_path):
+    model, records = make_model(tmp_path)
+    for record in records[2:]:
+        record.server = "bench2"
+    info = {"status": "started", "state": "rest", "current": 0., "voltage": 3.7}
+    # Channels of other servers with the same number are left alone
+    model.apply_status({"1": info, "3": info}, "bench2")
+    assert records[0].status == "Loading Status..."
+    assert records[2].locked
+    model.apply_status(None, "bench2")
+    assert [record.status for record in records[:2]] == ["Loading Status..."] * 2
+    assert records[3].status == "No Response"
+    assert model.data(model.index(2, 0)) == "bench2/3:"
+
+
+class QuietView(channel_view.ChannelView):
+    """ChannelView not following the status of a server."""
+
+    def update_status(self):
+        pass
+
+
+def test_view(tmp_path, monkeypatch):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QApplication.instance() or QApplication([])
+    (tmp_path / "scripts").mkdir()
+    config = {"arguments": {"record_dir": str(tmp_path)}, "behavior": {},
+              "zmq": {"client-address": "tcp://localhost", "port": 5556},
+              "channels": [{"channel": channel} for channel in range(1, 41)]}
+    info = {str(channel): {"path": None, "cellid": None, "comment": None,
+                           "protocol_name": None} for channel in range(1, 41)}
+    plugins = [{"name": "thermo", "sources": ["probe 1"]}]
+    server = Server("", config, info, plugins)
+    server.channels = list(range(1, 41))
+    view = QuietView(config, {"threadpool": QThreadPool()}, None, plugins, [server])
+    view.show()
+    app.processEvents()
+
+    model = view.table.model()
+    assert model.rowCount() == 40
+    triggers = int(view.table.editTriggers())
+    for trigger in (QAbstractItemView.DoubleClicked, QAbstractItemView.EditKeyPressed,
+                    QAbstractItemView.SelectedClicked):
+        assert triggers & int(trigger)
+    path = model.index(0, model.columns.index("path"))
+    assert int(model.flags(path)) & int(Qt.ItemIsEditable)
+    view.channels[0].lock_settings()
+    assert not int(model.flags(path)) & int(Qt.ItemIsEditable)
+
+    # A server replying after the window opened
+    followed = []
+    monkeypatch.setattr(channel_view, "follow_servers",
+                        lambda servers, *args: followed.extend(servers))
+    late = Server("bench2", config, {"1": info["1"], "2": info["2"]}, plugins)
+    late.channels = [1, 2]
+    view.add_server(late)
+    assert followed == [late] and view.servers[-1] is late
+    assert model.rowCount() == 42
+    assert model.data(model.index(41, 0)) == "bench2/2:"
+    assert view.channels[41].row == 41
+    view.close()
@@ -0,0 +1,13 @@
+from cyckei.client import client
+from cyckei.client.channel_tab import ChannelTab
+from cyckei.client.channel_view import ChannelView
+
+
+def test_choose_view():
+    auto = {"behavior": {"channel-view": "auto"}}
+    assert client.choose_view(auto, 8) is ChannelTab
+    # A formation batch of 32 channels gets the table and its batch controls
+    assert client.choose_view(auto, client.TABLE_CHANNELS) is ChannelView
+    assert client.choose_view({"behavior": {}}, 64) is ChannelView
+    assert client.choose_view({"behavior": {"channel-view": "Table"}}, 1) is ChannelView
+    assert client.choose_view({"behavior": {"channel-view": "widgets"}}, 64) is ChannelTab
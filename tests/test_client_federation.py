@@ -0,0 +1,145 @@
+import time
+
+import zmq
+
+from cyckei.client import federation, status
+from cyckei.functions import func
+from tests.stub_server import StubServer
+
+
+def stub(channels):
+    """A server answering info_server_file and info_plugins."""
+    def respond(request, count):
+        if request["function"] == "info_server_file":
+            response = {str(channel): {"channel": channel} for channel in channels}
+        elif request["function"] == "info_plugins":
+            response = [{"name": "thermo", "description": "",
+                         "sources": ["probe {}".format(channels[0])]}]
+        else:
+            response = "Unknown function"
+        return {"response": response, "message": None}
+    return StubServer(respond)
+
+
+def free_port():
+    socket = zmq.Context.instance().socket(zmq.REP)
+    port = socket.bind_to_random_port("tcp://127.0.0.1")
+    socket.close()
+    return port
+
+
+def config(servers, timeout=0.6):
+    return {"zmq": {"client-address": "tcp://127.0.0.1", "port": 5556,
+                    "publish-port": 5558, "timeout": timeout, "retries": 0,
+                    "servers": servers},
+            "behavior": {"update-interval": 6},
+            "channels": [{"channel": 1}, {"channel": 2}]}
+
+
+def test_parse_servers():
+    servers = federation.parse_servers(
+        config("bench1=tcp://pc1:5556, pc2:6000 ,"))
+    assert servers == [("bench1", "tcp://pc1:5556"), ("pc2:6000", "tcp://pc2:6000")]
+    assert federation.parse_servers(config("")) == []
+
+
+def test_server_config():
+    base = config("")
+    server = federation.server_config(base, "tcp://pc2:6000")
+    assert server["zmq"]["client-address"] == "tcp://pc2"
+    assert server["zmq"]["port"] == 6000
+    # The publish port keeps its offset
+    assert server["zmq"]["publish-port"] == 6002
+    assert base["zmq"]["port"] == 5556
+    assert server["channels"] is base["channels"]
+    # Left empty, each server publishes on its port + 1
+    base["zmq"]["publish-port"] = ""
+    server = federation.server_config(base, "tcp://pc2:6000")
+    assert func.publish_port(server["zmq"]) == 6001
+    assert status.StatusFollower(server).address == "tcp://pc2:6001"
+
+
+def test_channel_label():
+    assert federation.channel_label("", 3) == "3"
+    assert federation.channel_label("bench1", 3) == "bench1/3"
+
+
+def test_connect():
+    stubs = [stub([1, 2, 3]), stub([7, 8])]
+    dead = [free_port(), free_port()]
+    entries = ["a={}".format(stubs[0].address)]
+    entries += ["tcp://127.0.0.1:{}".format(port) for port in dead]
+    entries += ["b={}".format(stubs[1].address)]
+    try:
+        start = time.time()
+        servers = federation.connect(config(",".join(entries)))
+        # The dead servers time out at the same time, not one after the other
+        assert time.time() - start < 1.1
+    finally:
+        for server in stubs:
+            server.close()
+
+    assert [server.connected for server in servers] == [True, False, False, True]
+    assert servers[0].channels == [1, 2, 3]
+    assert servers[3].channels == [7, 8]
+    assert servers[3].name == "b"
+    assert servers[3].address == stubs[1].address
+    assert servers[1].health() == "No Response"
+    plugins = federation.merge_plugins(servers)
+    assert plugins == [{"name": "thermo", "description": "",
+                        "sources": ["probe 1", "probe 7"]}]
+
+
+def test_connect_timeout():
+    server = stub([4])
+    late = federation.Server("late", federation.server_config(config("", timeout=30),
+                                                               server.address))
+    dead = "tcp://127.0.0.1:{}".format(free_port())
+    try:
+        start = time.time()
+        # A dead server does not hold up the others for the whole zmq timeout
+        servers = federation.connect(config("dead=" + dead, timeout=30), timeout=0.3)
+        assert time.time() - start < 1
+        assert not servers[0].connected and servers[0].channel_info is None
+        assert late.load(0.3)
+    finally:
+        server.close()
+    assert late.connected and late.channels == [4]
+
+
+def test_connect_single():
+    server = stub([2, 3])
+    try:
+        base = config("")
+        base["zmq"]["port"] = server.port
+        servers = federation.connect(base)
+    finally:
+        server.close()
+    assert len(servers) == 1 and servers[0].name == ""
+    # The channels of the client's config the server has
+    assert servers[0].channels == [2]
+
+
+class Follower(object):
+    poll_interval = 6.
+    latency = None
+    replied = None
+
+
+class Updater(object):
+    def __init__(self):
+        self.follower = Follower()
+
+
+def test_health():
+    server = federation.Server("a", config(""), {}, [])
+    assert server.health() == "Connecting..."
+    server.updater = Updater()
+    assert server.health() == "Connecting..."
+    server.updater.follower.replied = 100.
+    server.updater.follower.latency = 0.012
+    assert server.health(now=101.) == "12 ms"
+    # Nothing heard for too long
+    assert server.health(now=200.) == "No Response"
+    server.updater.follower.latency = None
+    assert server.health(now=101.) == "No Response"
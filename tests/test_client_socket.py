@@ -0,0 +1,63 @@
+import threading
+
+from cyckei.client import socket as client_socket
+from tests.stub_server import StubServer
+
+
+def test_reuse():
+    server = StubServer()
+    pool = client_socket.ConnectionPool()
+    try:
+        for i in range(20):
+            response = client_socket.Socket(server.config(), pool).send({"function": "ping"})
+            assert response == {"response": "ping", "message": i + 1}
+        # One connection served every request
+        assert pool.created == 1
+    finally:
+        pool.close()
+        server.close()
+
+
+def test_lazy_pirate():
+    server = StubServer(drop=[1, 3, 4, 5, 6])
+    pool = client_socket.ConnectionPool()
+    try:
+        sock = client_socket.Socket(server.config(timeout=0.6), pool)
+        # A lost reply to a read-only request is retried on a new connection
+        assert sock.send({"function": "info_all_channels"})["message"] == 2
+        assert pool.created == 2
+        # Commands are not sent twice
+        assert sock.send({"function": "start"})["response"] == "Request Timed Out"
+        assert server.functions() == ["info_all_channels"] * 2 + ["start"]
+        # Retries give up once the timeout is used up
+        assert sock.ping() == "Request Timed Out"
+        assert sock.send({"function": "ping"}) == {"response": "ping", "message": 7}
+        assert server.functions().count("ping") == 4
+    finally:
+        pool.close()
+        server.close()
+
+
+def test_threads():
+    server = StubServer()
+    pool = client_socket.ConnectionPool(max_idle=4)
+    responses = []
+
+    def work():
+        sock = client_socket.Socket(server.config(), pool)
+        for _ in range(25):
+            responses.append(sock.send({"function": "ping"}))
+
+    try:
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(responses) == 200
+        assert sorted(response["message"] for response in responses) == list(range(1, 201))
+        assert pool.created <= 8
+        assert len(pool._idle[client_socket.Socket(server.config(), pool).address]) <= 4
+    finally:
+        pool.close()
+        server.close()
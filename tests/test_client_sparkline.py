@@ -0,0 +1,32 @@
+import numpy as np
+
+from cyckei.client.sparkline import Trend
+from cyckei.server.recent import RecentWindow
+
+
+def test_trend():
+    window = RecentWindow(size=64)
+    trend = Trend(points=8)
+    assert not trend.apply(None)
+    for i in range(5):
+        window.add(100. + i, 0.1, 3.0 + i / 10)
+    reply = window.since()
+    assert trend.apply(reply)
+    assert np.allclose(trend.times, [100., 101., 102., 103., 104.])
+    assert np.allclose(trend.voltages, [3.0, 3.1, 3.2, 3.3, 3.4])
+
+    # Nothing new changes nothing, new points are added and the oldest dropped
+    reply = window.since(reply["next"], reply["epoch"])
+    assert not trend.apply(reply)
+    for i in range(5, 10):
+        window.add(100. + i, 0.1, None)
+    assert trend.apply(window.since(reply["next"], reply["epoch"]))
+    assert len(trend.times) == 8 and trend.times[-1] == 109.
+    assert np.isnan(trend.voltages[-1])
+
+    # A new test starts over, a channel without one is cleared
+    other = RecentWindow()
+    other.add(200., 0.1, 4.0)
+    assert trend.apply(other.since(10, window.epoch))
+    assert list(trend.times) == [200.]
+    assert trend.apply(None) and len(trend.times) == 0
@@ -0,0 +1,168 @@
+import threading
+import time
+
+import zmq
+
+from cyckei.client import status
+from cyckei.client import socket as client_socket
+from cyckei.server import feed
+from tests.stub_server import StubServer
+
+
+def snapshot(count, voltage=3.7, state="rest"):
+    return {str(channel): {"channel": channel, "status": "started", "state": state,
+                           "current": 0., "voltage": voltage, "cycle": 0}
+            for channel in range(1, count + 1)}
+
+
+class FeedServer(StubServer):
+    """Server answering info_changes from a feed, or only info_all_channels.
+
+    Like the server loop, it updates the feed with channels about every 50 ms.
+    """
+
+    def __init__(self, status_feed, channels, versioned=True):
+        self.feed = status_feed
+        self.channels = channels
+        self.versioned = versioned
+        super(FeedServer, self).__init__(self.answer, tick=self.update)
+
+    def update(self):
+        self.feed.update(self.channels)
+
+    def answer(self, request, count):
+        if request["function"] == "info_changes" and self.versioned:
+            kwargs = request["kwargs"]
+            response = self.feed.changes(kwargs["since"], kwargs["epoch"])
+        elif request["function"] == "info_all_channels":
+            response = self.feed.changes()["channels"]
+        else:
+            response = "Unknown function"
+        return {"response": response, "message": None}
+
+
+def config(port, publish_port, poll_interval=60):
+    return {"zmq": {"client-address": "tcp://127.0.0.1", "port": port,
+                    "publish-port": publish_port, "timeout": 2},
+            "behavior": {"update-interval": poll_interval}}
+
+
+def client(port):
+    return client_socket.Socket(config(port, 0), client_socket.ConnectionPool())
+
+
+def wait(condition, timeout=5):
+    end = time.time() + timeout
+    while not condition():
+        assert time.time() < end
+        time.sleep(0.02)
+
+
+def test_follow():
+    status_feed = feed.StatusFeed("tcp://127.0.0.1:*", heartbeat=0.2)
+    publish_port = int(status_feed._socket.getsockopt_string(zmq.LAST_ENDPOINT)
+                       .split(":")[-1])
+    server = FeedServer(status_feed, snapshot(128))
+    follower = status.StatusFollower(config(server.port, publish_port),
+                                     socket=client(server.port))
+    emitted = []
+    running = [True]
+    thread = threading.Thread(target=follower.follow,
+                              args=(emitted.append, lambda: running[0]))
+    thread.start()
+    try:
+        # The first poll gets every channel
+        wait(lambda: emitted)
+        assert len(emitted[0]) == 128
+        assert emitted[0]["5"]["voltage"] == 3.7
+        # Timed, for the health of the server
+        assert 0 < follower.latency < 2 and follower.replied is not None
+
+        # Then only the channels that changed, pushed without polling
+        # Heartbeats until the subscription is through
+        time.sleep(0.5)
+        polls = follower.polls
+        channels = snapshot(128)
+        channels["7"]["voltage"] = 3.9
+        server.channels = channels
+        wait(lambda: len(emitted) > 1)
+        assert list(emitted[1]) == ["7"]
+        assert emitted[1]["7"]["voltage"] == 3.9
+        assert follower.polls == polls
+
+        # A missed message is made up for by a poll
+        with server.lock:
+            status_feed.version += 1
+            channels = snapshot(128)
+            channels["7"]["voltage"] = 3.9
+            channels["8"]["state"] = "charge"
+            server.channels = channels
+        wait(lambda: follower.polls > polls)
+        wait(lambda: follower.channels["8"]["state"] == "charge")
+        assert follower.channels["7"]["voltage"] == 3.9
+    finally:
+        running[0] = False
+        thread.join()
+        server.close()
+        status_feed.close()
+
+
+def test_latency(monkeypatch):
+    monkeypatch.setattr(status, "LATENCY_INTERVAL", 0.3)
+    status_feed = feed.StatusFeed("tcp://127.0.0.1:*", heartbeat=0.05)
+    publish_port = int(status_feed._socket.getsockopt_string(zmq.LAST_ENDPOINT)
+                       .split(":")[-1])
+    server = FeedServer(status_feed, snapshot(4))
+    follower = status.StatusFollower(config(server.port, publish_port),
+                                     socket=client(server.port))
+    running = [True]
+    thread = threading.Thread(target=follower.follow,
+                              args=(lambda changes: None, lambda: running[0]))
+    thread.start()
+    try:
+        wait(lambda: follower.polls >= 1 and follower.latency is not None)
+        # Heartbeats keep coming, the round trip is still timed again
+        follower.latency = None
+        wait(lambda: follower.latency is not None)
+        assert follower.polls >= 2
+        assert server.functions().count("info_changes") == follower.polls
+    finally:
+        running[0] = False
+        thread.join()
+        server.close()
+        status_feed.close()
+
+
+def test_apply():
+    follower = status.StatusFollower(config(1, 2))
+    follower.epoch, follower.version = "a", 4
+    follower.channels = {"1": {"status": "started", "voltage": 3.7}}
+    assert follower.apply({"epoch": "a", "version": 4, "previous": 3,
+                           "channels": {"1": {"voltage": 3.6}}}) == {}
+    assert follower.apply({"epoch": "a", "version": 5, "previous": 4,
+                           "channels": {"1": {"voltage": 3.8}}}) \
+        == {"1": {"status": "started", "voltage": 3.8}}
+    # Gaps and restarts call for a poll
+    assert follower.apply({"epoch": "a", "version": 7, "previous": 6,
+                           "channels": {}}) is None
+    assert follower.apply({"epoch": "b", "version": 1, "previous": 0,
+                           "channels": {}}) is None
+    assert status.status_text({"status": "started", "state": "rest", "current": 0.,
+                               "voltage": 3.7}) == "started - rest | C: 0.0, V: 3.7"
+
+
+def test_unversioned_server():
+    server = FeedServer(feed.StatusFeed(), snapshot(4), versioned=False)
+    follower = status.StatusFollower(config(server.port, 1), socket=client(server.port))
+    try:
+        assert sorted(follower.poll()) == ["1", "2", "3", "4"]
+        # Unchanged channels are left out
+        assert follower.poll() == {}
+        channels = snapshot(4)
+        channels["2"]["voltage"] = 4.0
+        server.channels = channels
+        time.sleep(0.2)
+        assert list(follower.poll()) == ["2"]
+        assert server.functions() == ["info_changes"] + ["info_all_channels"] * 3
+    finally:
+        server.close()
@@ -0,0 +1,74 @@
+from cyckei.client import channel_view, workers
+
+EXAMPLE = open("cyckei/assets/scripts/example").read()
+
+
+class StartSocket(object):
+    """Socket answering start_many and control_many, keeping what was sent."""
+    requests = []
+
+    def __init__(self, config):
+        self.address = "tcp://bench1:5556"
+
+    def start_many(self, entries):
+        StartSocket.requests.append(("start", entries))
+        return [{"channel": entry["channel"], "response": "Succeeded"} for entry in entries]
+
+    def control_many(self, command, channels):
+        StartSocket.requests.append((command, channels))
+        return [{"channel": channel, "response": "Stopped"} for channel in channels]
+
+
+class StubSocket(object):
+    """Socket answering the server's test of a protocol, counting requests."""
+    sent = []
+
+    def __init__(self, config):
+        self.address = "tcp://bench1:5556"
+
+    def send(self, packet):
+        StubSocket.sent.append(packet["kwargs"]["protocol"])
+        return {"response": "Passed"}
+
+
+def test_check_asks_server_once(monkeypatch):
+    monkeypatch.setattr(workers, "Socket", StubSocket)
+    protocol = EXAMPLE + "\n# asked once"
+    assert workers.Check({}, protocol).run() == (True, "Passed")
+    assert workers.Check({}, protocol).run() == (True, "Passed")
+    assert StubSocket.sent == [protocol]
+
+    # A protocol that fails the check is not sent to the server
+    passed, msg = workers.Check({}, "CCCharge(0)").run()
+    assert not passed and msg == "Line 1: The current should not be 0."
+    assert StubSocket.sent == [protocol]
+
+
+def test_control_many(tmp_path, monkeypatch):
+    monkeypatch.setattr(workers, "Socket", StartSocket)
+    (tmp_path / "scripts").mkdir()
+    config = {"arguments": {"record_dir": str(tmp_path)}, "behavior": {}}
+    info = {"path": None, "cellid": None, "comment": None, "protocol_name": None}
+    records = [channel_view.ChannelRecord(channel, config, info) for channel in (1, 2, 3)]
+    for record in records[:2]:
+        record.attributes["script_content"] = EXAMPLE
+    records[2].attributes["script_content"] = "CCCharge(0)"
+    records[1].server = "bench1:5556"
+
+    worker = workers.ControlMany(config, records, "start")
+    responses = []
+    worker.signals.status.connect(
+        lambda response, channel: responses.append((response, channel.attributes["channel"])))
+    worker.run()
+    assert all(record.locked for record in records)
+    # The script failing the check is not sent
+    assert sorted(responses, key=lambda response: response[1]) == [
+        ("Succeeded", 1), ("Succeeded", 2), ("Script Failed", 3)]
+    command, entries = StartSocket.requests[-1]
+    assert command == "start" and [entry["channel"] for entry in entries] == [1, 2]
+    # Channels started without a log file name in the same second get a file each
+    paths = [entry["meta"]["path"] for entry in entries]
+    assert paths[0].endswith("_ch1.pyb") and paths[1].endswith("_ch2_bench1-5556.pyb")
+
+    workers.ControlMany(config, records, "stop").run()
+    assert StartSocket.requests[-1] == ("stop", [1, 2, 3])
@@ -0,0 +1,158 @@
+import asyncio
+import base64
+import json
+import subprocess
+import sys
+
+import pytest
+
+from cyckei.ctl import connection, ctl
+from tests.stub_server import StubServer
+
+
+def rep_server(drop=(), response=None):
+    """A server answering with response, or with what it was asked and the request number."""
+    def respond(request, count):
+        return {"response": response or [request["function"], count, request.get("kwargs")],
+                "message": ""}
+    return StubServer(respond, drop=drop)
+
+
+@pytest.fixture
+def server():
+    server = rep_server()
+    yield server
+    server.close()
+
+
+def test_pipelined_requests(server):
+    async def run():
+        conn = connection.Connection(server.address, timeout=2)
+        replies = await asyncio.gather(*[conn.call("get_{}".format(i))
+                                         for i in range(50)])
+        conn.close()
+        return replies
+
+    replies = asyncio.run(run())
+    # Every reply matched to its own request
+    assert [reply[0] for reply in replies] == ["get_{}".format(i) for i in range(50)]
+    assert len(server.received) == 50
+
+
+def test_timeout_retries_idempotent():
+    server = rep_server(drop=[1])
+    try:
+        async def run():
+            conn = connection.Connection(server.address, timeout=0.9, retries=2)
+            read = await conn.call("info_all_channels")
+            control = await conn.call("stop_many", channels=[1])
+            conn.close()
+            return read, control, conn.sent
+
+        read, control, sent = asyncio.run(run())
+        assert read[0] == "info_all_channels"
+        assert control[0] == "stop_many"
+        assert sent == 3
+    finally:
+        server.close()
+
+
+def test_timeout_not_retried():
+    server = rep_server(drop=[1])
+    try:
+        async def run():
+            conn = connection.Connection(server.address, timeout=0.3, retries=2)
+            lost = await conn.call("start_many", entries=[])
+            # The socket was replaced, the next request is answered
+            after = await conn.call("ping")
+            conn.close()
+            return lost, after
+
+        lost, after = asyncio.run(run())
+        assert lost == connection.TIMED_OUT
+        assert after[0] == "ping"
+        assert [request["function"] for request in server.received] == [
+            "start_many", "ping"]
+    finally:
+        server.close()
+
+
+def test_fleet():
+    servers = [rep_server(), rep_server()]
+    try:
+        async def run():
+            fleet = connection.Fleet([server.address for server in servers], timeout=2)
+            replies = await fleet.call("measure", channels=[1, 2])
+            fleet.close()
+            return replies
+
+        replies = asyncio.run(run())
+        assert set(replies) == {server.address for server in servers}
+        for reply in replies.values():
+            assert reply[0] == "measure"
+            assert reply[2] == {"channels": [1, 2]}
+    finally:
+        for server in servers:
+            server.close()
+
+
+def test_decode_samples():
+    import numpy as np
+    rows = np.array([[0, 0.1, 3.5], [1, np.nan, 3.6]], dtype="<f4")
+    reply = {"t0": 100., "data": base64.b64encode(rows.tobytes()).decode("ascii")}
+    samples = connection.decode_samples(reply)
+    assert samples[0] == (100., pytest.approx(0.1), 3.5)
+    assert samples[1][0] == 101. and samples[1][1] is None
+
+
+def test_ctl_json_output(server, capsys):
+    status = ctl.main(["--server", server.address, "--timeout", "2", "stop", "1", "2"])
+    assert status == 0
+    output = json.loads(capsys.readouterr().out)
+    assert output[server.address] == ["stop_many", 1, {"channels": [1, 2]}]
+
+
+def test_ctl_status_filter(capsys):
+    server = rep_server(response={"1": {"status": "Idle"}, "2": {"status": "Idle"}})
+    try:
+        assert ctl.main(["--server", server.address, "status", "2"]) == 0
+        output = json.loads(capsys.readouterr().out)
+        assert output == {server.address: {"2": {"status": "Idle"}}}
+    finally:
+        server.close()
+
+
+def test_ctl_timeout_status(capsys):
+    server = rep_server(drop=[1])
+    try:
+        status = ctl.main(["--server", server.address, "--timeout", "0.3",
+                           "--retries", "0", "ping"])
+        assert status == 1
+        output = json.loads(capsys.readouterr().out)
+        assert output[server.address] == connection.TIMED_OUT
+    finally:
+        server.close()
+
+
+def test_start_entries(tmp_path):
+    protocol = tmp_path / "charge.py"
+    protocol.write_text("CCCharge(0.1)\n")
+    args = ctl.parse_args(["start", str(protocol), "1", "2",
+                           "--log", str(tmp_path / "cell-{channel}.pyb"),
+                           "--cellid", "A1"])
+    entries = ctl.start_entries(args)
+    assert [entry["channel"] for entry in entries] == [1, 2]
+    meta = entries[1]["meta"]
+    assert meta["path"] == str(tmp_path / "cell-2.pyb")
+    assert meta["protocol_name"] == "charge.py"
+    assert meta["cellid"] == "A1"
+    assert entries[0]["protocol"] == "CCCharge(0.1)\n"
+
+
+def test_no_gui_imports():
+    code = ("import sys, cyckei.ctl.ctl; "
+            "print(any(m.split('.')[0] in ('PySide2', 'matplotlib') "
+            "for m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True,
+                            text=True, check=True).stdout
+    assert output.strip() == "False"
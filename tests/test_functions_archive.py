@@ -0,0 +1,75 @@
+import os
+import time
+
+import pytest
+
+from cyckei.functions import archive, binlog, logindex
+from tests.test_functions_logindex import run_protocol
+
+
+@pytest.mark.parametrize("method", ["gzip", "lzma"])
+@pytest.mark.parametrize("file_format", [None, "binary"])
+def test_archive_round_trip(tmp_path, method, file_format):
+    path = str(tmp_path / "data.pyb")
+    run_protocol(path, file_format)
+    with open(path, "rb") as file:
+        original = file.read()
+    entries = logindex.load(path)
+    cycle_text = logindex.read_range(path, *logindex.cycles(
+        entries, len(original))[1][1:])
+
+    size, compressed = archive.archive(path, method)
+    assert size == len(original)
+    assert compressed == os.path.getsize(path) < size
+    assert archive.compression_of(path) == method
+    assert not os.path.exists(path + archive.TEMPORARY_SUFFIX)
+    # Archiving twice leaves the log as it is
+    assert archive.archive(path, method) == (compressed, compressed)
+
+    # Readers see the original content
+    with archive.open_log(path) as file:
+        assert file.read() == original
+    assert binlog.is_binary(path) == (file_format == "binary")
+    assert logindex.read_meta(path)["path"] == path
+    assert logindex.load(path) == entries
+    assert logindex.scan(path) == logindex.scan(path)
+    assert logindex.read_range(path, *logindex.cycles(
+        entries, len(original))[1][1:]) == cycle_text
+    if file_format is None:
+        with archive.open_log(path, "r") as file:
+            assert file.read() == original.decode("utf-8")
+
+    archive.extract(path)
+    assert archive.compression_of(path) is None
+    with open(path, "rb") as file:
+        assert file.read() == original
+
+
+def test_archive_failure_keeps_log(tmp_path, monkeypatch):
+    path = str(tmp_path / "data.pyb")
+    run_protocol(path)
+    with open(path, "rb") as file:
+        original = file.read()
+
+    with pytest.raises(ValueError):
+        archive.archive(path, "bzip")
+    monkeypatch.setattr(archive, "_digest", lambda file, throttle: (0, b""))
+    with pytest.raises(ValueError):
+        archive.archive(path)
+    assert not os.path.exists(path + archive.TEMPORARY_SUFFIX)
+    with open(path, "rb") as file:
+        assert file.read() == original
+
+
+def test_throttle():
+    with pytest.raises(ValueError):
+        archive.Throttle(0)
+    throttle = archive.Throttle(0.5)
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    while time.process_time() - cpu < 0.05:
+        pass
+    throttle.pause()
+    assert throttle.slept == pytest.approx(time.process_time() - cpu,
+                                           rel=0.2)
+    assert time.perf_counter() - wall >= 2 * 0.05
@@ -0,0 +1,120 @@
+import math
+
+import pytest
+
+from cyckei.functions import binlog
+from cyckei.server import protocols
+from tests.sim_backend import SimClock, SimSource
+
+PROTOCOL = ("CCCharge(0.05, reports=(('voltage', 0.01), ('time', 60)), "
+            "ends=(('time', '>', 3600),))\n"
+            "AdvanceCycle()\n"
+            "Rest(reports=(('time', 60),), ends=(('time', '>', 600),))\n")
+
+
+def read(path):
+    with open(path) as file:
+        return file.read()
+
+
+def run_protocol(path, file_format):
+    clock = SimClock()
+    with clock.patch(protocols):
+        runner = protocols.CellRunner(channel="a", path=path, plugins={},
+                                      format=file_format)
+        runner.set_source(SimSource(clock))
+        runner.load_protocol(PROTOCOL)
+        while runner.run():
+            clock.advance_to(runner.next_time)
+    return runner
+
+
+def comparable(text):
+    # The path differs and step headers hold the wall clock time they were written at
+    return [line for line in text.splitlines()
+            if not line.startswith('#    "path"')
+            and ("date_start_timestr" not in line or line.startswith("#"))]
+
+
+def test_encode_decode_data():
+    rows = [[0., 0.1, 3.5, 0.], [1.5, None, None, None]]
+    chunk = binlog.encode_data(rows)
+    payload = chunk[5:-4]
+    decoded = binlog.decode_data(payload)
+    assert decoded[0] == (0., 0.1, 3.5, 0.)
+    assert decoded[1][0] == 1.5
+    assert all(math.isnan(value) for value in decoded[1][1:])
+    assert binlog.decode_array(payload).shape == (2, 4)
+
+
+def test_chunk_encoder():
+    encoder = binlog.ChunkEncoder(chunk_rows=3, chunk_seconds=10)
+    assert encoder.add([0., 1., 2., 3.]) == b""
+    assert encoder.add([1., 1., 2., 3.]) == b""
+    assert encoder.add([2., 1., 2., 3.]) != b""
+    assert encoder.rows == []
+    assert encoder.add([3., 1., 2., 3.]) == b""
+    assert encoder.add([13., 1., 2., 3.]) != b""
+    encoder.add([14., 1., 2., 3.])
+    chunks = encoder.marker(binlog.STEP, '{"state": "rest"}')
+    assert encoder.rows == []
+    assert chunks.endswith(binlog.encode_marker(binlog.STEP, '{"state": "rest"}'))
+    assert encoder.flush() == b""
+
+
+def test_iter_chunks(tmp_path):
+    path = tmp_path / "data.cyb"
+    content = (binlog.encode_header({"format": ["time"]})
+               + binlog.encode_marker(binlog.CYCLE, '{"cycle": 0}')
+               + binlog.encode_data([[0.], [1.]]))
+    path.write_bytes(content)
+    with open(path, "rb") as file:
+        kinds = [kind for kind, payload in binlog.iter_chunks(file)]
+    assert kinds == [binlog.HEADER, binlog.CYCLE, binlog.DATA]
+    assert binlog.is_binary(str(path))
+
+    # A chunk cut short at the end is left out
+    path.write_bytes(content[:-3])
+    meta, data, markers = binlog.load(str(path))
+    assert meta == {"format": ["time"]}
+    assert data.shape == (0, 1)
+    assert markers == [(0, binlog.CYCLE, {"cycle": 0})]
+
+    # A corrupted chunk is an error
+    path.write_bytes(content[:-6] + b"\x00" + content[-5:])
+    with pytest.raises(ValueError):
+        binlog.load(str(path))
+
+    path.write_bytes(b"#{}\n")
+    assert not binlog.is_binary(str(path))
+    with open(path, "rb") as file, pytest.raises(ValueError):
+        list(binlog.iter_chunks(file))
+
+
+def test_cellrunner_binary(tmp_path):
+    text_path = str(tmp_path / "data.pyb")
+    binary_path = str(tmp_path / "data.cyb")
+    run_protocol(text_path, None)
+    runner = run_protocol(binary_path, "binary")
+    assert binlog.is_binary(binary_path)
+
+    meta, data, markers = binlog.load(binary_path)
+    assert meta["format"] == ["time", "current", "voltage", "capacity"]
+    assert meta["cellid"] == runner.meta["cellid"]
+    assert len(data) > 50
+    assert [kind for row, kind, header in markers].count(binlog.CYCLE) == 2
+    assert markers[-1][2]["state"] == "cycle_summary"
+    assert data[-1][0] == pytest.approx(4200, abs=60)
+
+    # Converted to text it is the same file the text format gives
+    converted = str(tmp_path / "converted.pyb")
+    binlog.to_text(binary_path, converted)
+    assert comparable(read(converted)) == comparable(read(text_path))
+
+    # And back to binary and text again
+    binlog.main([text_path, str(tmp_path / "again.cyb")])
+    binlog.main([str(tmp_path / "again.cyb"), str(tmp_path / "again.pyb")])
+    assert read(str(tmp_path / "again.pyb")) == read(text_path)
+
+    with pytest.raises(ValueError):
+        protocols.CellRunner(channel="a", path=text_path, format="csv")
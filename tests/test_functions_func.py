@@ -0,0 +1,19 @@
+import configparser
+
+from cyckei.functions import func
+
+
+def test_publish_port():
+    assert func.publish_port({"port": 5556, "publish-port": 6000}) == 6000
+    assert func.publish_port({"port": "5556", "publish-port": "6000"}) == 6000
+    # Missing or empty follows the port
+    assert func.publish_port({"port": 7000}) == 7001
+    assert func.publish_port({"port": "7000", "publish-port": " "}) == 7001
+
+
+def test_default_publish_port():
+    variables = configparser.ConfigParser()
+    variables.read(func.asset_path("variables.ini"))
+    zmq_config = dict(variables["zmq"], port="6000")
+    # A server moved to another port does not keep publishing on the default one
+    assert func.publish_port(zmq_config) == 6001
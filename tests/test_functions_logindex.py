@@ -0,0 +1,95 @@
+import json
+import os
+
+import pytest
+
+from cyckei.functions import logindex
+from cyckei.server import protocols, writer
+from tests.sim_backend import SimClock, SimSource
+
+PROTOCOL = ("for i in range(3):\n"
+            "    CCCharge(0.05, reports=(('voltage', 0.01), ('time', 60)), "
+            "ends=(('time', '>', 1800),))\n"
+            "    Rest(reports=(('time', 60),), ends=(('time', '>', 600),))\n"
+            "    AdvanceCycle()\n")
+
+
+def run_protocol(path, file_format=None, data_writer=None):
+    clock = SimClock()
+    with clock.patch(protocols):
+        runner = protocols.CellRunner(channel="a", path=path, plugins={},
+                                      format=file_format)
+        runner.set_source(SimSource(clock))
+        runner.load_protocol(PROTOCOL)
+        runner.writer = data_writer
+        while runner.run():
+            clock.advance_to(runner.next_time)
+    if data_writer is not None:
+        data_writer.close()
+    return runner
+
+
+def structure(entries):
+    return [{key: value for key, value in entry.items() if key != "time"}
+            for entry in entries]
+
+
+@pytest.mark.parametrize("file_format, buffered", [
+    (None, False), (None, True), ("binary", False), ("binary", True)])
+def test_written_index(tmp_path, file_format, buffered):
+    path = str(tmp_path / "data.pyb")
+    data_writer = writer.DataWriter() if buffered else None
+    run_protocol(path, file_format, data_writer)
+
+    with open(logindex.index_path(path)) as file:
+        written = [json.loads(line) for line in file]
+    scanned = logindex.scan(path)
+    assert structure(written) == structure(scanned)
+    assert [entry["cycle"] for entry in written
+            if entry["kind"] == "cycle"] == [0, 1, 2, 3]
+    assert written[1] == dict(written[1], kind="step",
+                              state="charge_constant_current")
+
+    # The time of a header lies between the rows around it
+    for entry, rebuilt in zip(written, scanned):
+        if rebuilt["time"] is not None:
+            assert entry["time"] <= rebuilt["time"]
+
+    # Each cycle read on its own starts with its header
+    ranges = logindex.cycles(written, os.path.getsize(path))
+    assert [cycle for cycle, start, end in ranges] == [0, 1, 2, 3]
+    text = logindex.read_range(path, ranges[1][1], ranges[1][2])
+    assert text.startswith('{"cycle": 1}\n')
+    assert text.count('{"cycle"') == 1
+    rows = [line for line in text.splitlines() if line.startswith("    ")]
+    starts = [entry["row"] for entry in written if entry["kind"] == "cycle"]
+    assert len(rows) == starts[2] - starts[1]
+    assert len(rows) > 10
+    assert logindex.read_meta(path)["channel"] == "a"
+
+
+def test_load_index(tmp_path):
+    path = str(tmp_path / "data.pyb")
+    run_protocol(path)
+    complete = logindex.load(path)
+    assert structure(complete) == structure(logindex.scan(path))
+
+    # Headers missing from the index are found in the log
+    with open(logindex.index_path(path)) as file:
+        lines = file.readlines()
+    with open(logindex.index_path(path), "w") as file:
+        file.writelines(lines[:4] + [lines[4][:10]])
+    assert structure(logindex.load(path)) == structure(complete)
+
+    # A stale index is rebuilt, as is a missing one
+    with open(logindex.index_path(path), "w") as file:
+        entry = dict(complete[-1], offset=complete[-1]["offset"] + 3)
+        file.write(logindex.format_entry(entry))
+    assert structure(logindex.load(path)) == structure(complete)
+    os.remove(logindex.index_path(path))
+    assert structure(logindex.load(path)) == structure(complete)
+    assert os.path.exists(logindex.index_path(path))
+
+    with open(logindex.index_path(path), "w") as file:
+        file.write("")
+    assert structure(logindex.load(path)) == structure(complete)
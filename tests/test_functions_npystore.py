@@ -0,0 +1,77 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from cyckei.functions import logindex, npystore
+from cyckei.server import protocols
+from tests.test_functions_logindex import run_protocol
+
+
+def test_segment(tmp_path):
+    path = str(tmp_path / "segment.npy")
+    segment = npystore.Segment(path, 3, chunk_rows=4)
+    assert np.load(path).shape == (0, 3)
+    for i in range(10):
+        segment.append([float(i), None, 2. * i])
+    assert segment.capacity == 12
+    # Rows are visible once synced, the spare room never is
+    assert np.load(path, mmap_mode="r").shape == (0, 3)
+    segment.sync()
+    array = np.load(path, mmap_mode="r")
+    assert isinstance(array, np.memmap)
+    assert array.shape == (10, 3)
+    assert array[9, 2] == 18.
+    assert np.isnan(array[:, 1]).all()
+    segment.append([10., 1., 2.])
+    segment.close()
+    assert np.load(path).shape == (11, 3)
+    assert os.path.getsize(path) == npystore.HEADER_SIZE + 11 * 3 * 8
+
+    # The header keeps its size for any number of rows
+    assert len(npystore.encode_header(10 ** 15, 12)) == npystore.HEADER_SIZE
+
+
+def test_cellrunner_store(tmp_path):
+    text_path = str(tmp_path / "text.pyb")
+    run_protocol(text_path)
+    path = str(tmp_path / "data.pyb")
+    runner = run_protocol(path, "npy")
+    assert runner.meta["format"] == ["time", "current", "voltage", "capacity"]
+    with pytest.raises(ValueError):
+        protocols.CellRunner(channel="a", plugins={}, format="hdf5")
+
+    # The log keeps the meta data and headers, the rows are in the store
+    with open(path) as file:
+        lines = file.read().splitlines()
+    assert not [line for line in lines if line.startswith("    ")]
+    with open(text_path) as file:
+        text_rows = [[float(value) for value in line.split(",")]
+                     for line in file if line.startswith("    ")]
+    history = npystore.history(path)
+    assert history.shape == (len(text_rows), 4)
+    assert history.tolist() == pytest.approx(np.array(text_rows), rel=1e-7)
+
+    manifest = npystore.read_manifest(path)
+    assert manifest["log"] == "data.pyb"
+    assert manifest["columns"] == runner.meta["format"]
+    assert manifest["meta"]["path"] == path
+    entries = manifest["segments"]
+    assert [entry["state"] for entry in entries[:2]] == [
+        "charge_constant_current", "rest"]
+    assert sorted(set(entry["cycle"] for entry in entries)) == [0, 1, 2]
+    assert sum(entry["rows"] for entry in entries) == len(history)
+    assert [entry["start_row"] for entry in entries] == list(
+        np.cumsum([0] + [entry["rows"] for entry in entries[:-1]]))
+
+    # Segments are mapped, not read, and the index rows point into the store
+    mapped = npystore.segments(path, cycle=1)
+    assert len(mapped) == 2
+    assert all(isinstance(array, np.memmap) for entry, array in mapped)
+    index = [entry for entry in logindex.load(path) if entry["kind"] == "step"
+             and entry["state"] != "cycle_summary"]
+    assert [entry["row"] for entry in index[:len(entries)]] == \
+        [entry["start_row"] for entry in entries]
+    assert npystore.to_text(path, cycle=0).startswith(
+        "  " + json.dumps({"state": "charge_constant_current"}) + "\n    0,")
@@ -0,0 +1,97 @@
+import builtins
+import subprocess
+import sys
+
+import pytest
+
+from cyckei.functions import startup
+
+
+@pytest.fixture
+def package(tmp_path, monkeypatch):
+    """A package, new to sys.modules, whose modules import each other."""
+    root = tmp_path / "startup_pkg"
+    root.mkdir()
+    (root / "__init__.py").write_text("")
+    (root / "slow.py").write_text("import time\ntime.sleep(0.05)\n")
+    (root / "outer.py").write_text("from . import slow\nVALUE = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield "startup_pkg"
+    for module in list(sys.modules):
+        if module.split(".")[0] == "startup_pkg":
+            del sys.modules[module]
+
+
+def test_profiler_imports(package):
+    original = builtins.__import__
+    profiler = startup.StartupProfiler("server")
+    try:
+        from startup_pkg import outer  # noqa: F401
+    finally:
+        profiler.stop()
+    assert builtins.__import__ is original
+
+    timed = {entry[0]: entry for entry in profiler.imports}
+    # The package and the module imported from it are timed together
+    assert "startup_pkg [outer]" in timed
+    # The relative import is resolved and counted in its importer
+    _, cumulative, own, depth = timed["startup_pkg [slow]"]
+    assert cumulative >= 0.05 and own >= 0.05
+    _, outer_cumulative, outer_own, outer_depth = timed["startup_pkg [outer]"]
+    assert outer_cumulative >= cumulative
+    assert outer_own < cumulative
+    assert depth == outer_depth + 1
+
+
+def test_label():
+    assert startup._label("numpy", ["numpy"]) == "numpy"
+    assert startup._label("pkg", ["pkg.a"]) == "pkg [a]"
+    assert startup._label("pkg", ["pkg", "pkg.a", "pkg.b", "pkg.c", "pkg.d", "pkg.e"]) \
+        == "pkg [a, b, c, +2]"
+
+
+def test_profiler_phases():
+    profiler = startup.StartupProfiler("client", start=0.)
+    profiler.stop()
+    profiler.phases = [("setup", 0.2), ("connect servers", 5.), ("build window", 0.3)]
+    profiler._last = 5.5
+    assert profiler.total == 5.5
+    assert profiler.waiting == 5.
+    assert profiler.budget == startup.BUDGETS["client"]
+    # Waiting on the servers does not count against the budget
+    assert not profiler.over_budget()
+    report = profiler.report()
+    assert "connect servers" in report and "EXCEEDED" not in report
+
+    profiler.phases.append(("show window", 2.))
+    profiler._last = 7.5
+    assert profiler.over_budget()
+    assert "EXCEEDED" in profiler.report()
+
+
+def test_mark_and_finish(capsys):
+    startup.mark("nothing")
+    startup.finish("nothing")
+    assert capsys.readouterr().out == ""
+
+    original = builtins.__import__
+    profiler = startup.start("explorer")
+    startup.mark("setup")
+    startup.finish("show window")
+    assert startup.PROFILER is None
+    assert builtins.__import__ is original
+    assert [name for name, _ in profiler.phases] == ["setup", "show window"]
+    assert "Startup of explorer" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("module, heavy", [
+    ("cyckei.server.server", ("PySide2", "matplotlib", "pyvisa")),
+    ("cyckei.explorer.explorer", ("matplotlib",)),
+])
+def test_lazy_imports(module, heavy):
+    code = ("import sys, {}; "
+            "print(sorted({{m.split('.')[0] for m in sys.modules}} & {}))").format(
+        module, set(heavy))
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True,
+                            text=True, check=True).stdout
+    assert output.strip() == "[]"
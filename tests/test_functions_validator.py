@@ -0,0 +1,112 @@
+import pytest
+
+from cyckei.functions import validator
+from cyckei.server import protocols, server
+
+
+EXAMPLE = open("cyckei/assets/scripts/example").read()
+
+
+@pytest.mark.parametrize("protocol", [
+    EXAMPLE,
+    open("cyckei/assets/scripts/rapid").read(),
+    "AdvanceCycle()",
+    "for i in range(3):\n    CCCharge(0.01 * (i + 1), ends=((\"voltage\", \">\", 4.1),))",
+    "for current in (0.1, 0.2):\n    CCDischarge(current, wait_time=1)",
+    "CVCharge(4.2, ((\"current\", 0.001),), ((\"current\", \"<\", 0.01), (\"time\", \">\", 90)))",
+    "CCCharge(0.1, ends=((\"voltage\", \">\", 4.2, 5),), adaptive=(1, 30))",
+    "Rest(reports=[(\"time\", \"::15\")], ends=((\"time\", \">=\", \"1:30:00\"),))",
+])
+def test_check_passes(protocol):
+    assert validator.check(protocol) == (True, "Passed")
+    # The server loads it too
+    assert server.test(protocol) == "Passed"
+
+
+@pytest.mark.parametrize("protocol, message", [
+    ("", "An empty file can not be run."),
+    ("# Nothing to run\n", "The protocol has no steps."),
+    ("CCCharge(0.1", "Line 1: '(' was never closed."),
+    ("\nimport os", "Line 2: Only steps and for loops can be used, not \"import os\"."),
+    ("Foo(1)", "Line 1: Unknown step \"Foo\""),
+    ("CCCharge(0)", "Line 1: The current should not be 0."),
+    ("CCCharge('0.1')", "Line 1: The current should be a number, not '0.1'."),
+    ("CVCharge()", "Line 1: CVCharge needs a voltage."),
+    ("AdvanceCycle(1)", "Line 1: AdvanceCycle takes no arguments."),
+    ("CCCharge(0.1, current=1)", "Line 1: CCCharge got \"current\" twice."),
+    ("CCCharge(0.1, limit=1)", "Line 1: CCCharge has no argument \"limit\"."),
+    ("CCCharge(0.1, wait_time=x)", "Line 1: Unknown name \"x\"."),
+    ("CCCharge(abs(-0.1))", "Line 1: \"abs(-0.1)\" can not be checked"),
+    ("Rest(reports=((\"time\", \"::15\")))", "Line 1: reports should be a tuple of tuples"),
+    ("Rest(ends=((\"time\", \">\"),))", "Line 1: Each of ends takes 3 values, not 2."),
+    ("Rest(ends=((\"time\", \">\", \"5:\"),))", "Line 1: '5:' is not a time"),
+    ("Rest(ends=((\"time\", \">\", \"abc\"),))", "Line 1: 'abc' is not a time"),
+    ("Sleep(reports=((\"temperature\", 1),))", "Line 1: Unknown report \"temperature\""),
+    ("CVCharge(4.2, ends=((\"current\", \"<<\", 0.01),))", "Line 1: Unknown comparison \"<<\"."),
+    ("CCCharge(0.1, ends=((\"voltage\", \">\", \"4.2\"),))",
+     "Line 1: The voltage end should be a number, not '4.2'."),
+    ("CCCharge(0.1, adaptive=(5, 1))", "Line 1: adaptive bounds should satisfy"),
+    ("CCCharge(0.1, adaptive=(0.5, 60))", "Line 1: adaptive bounds should satisfy 1 <= min_wait"),
+    ("for i in range(2.5):\n    Rest()", "Line 1: range() takes whole numbers, not 2.5."),
+    ("for i in steps:\n    Rest()", "Line 1: Loops should be over range() or a tuple"),
+    ("for i in range(2):\n    Rest()\n    CCCharge(1 / 0)", "Line 3: Division by zero."),
+])
+def test_check_fails(protocol, message):
+    passed, result = validator.check(protocol)
+    assert not passed
+    assert result.startswith(message)
+
+
+def test_statements():
+    protocol = ("# Formation\nAdvanceCycle()\n\nCCCharge(0.1,\nends=((\"voltage\", \">\", 4.2),))\n"
+                "for i in range(2):\n    Rest()\n# End\n    Sleep()\n")
+    assert validator._statements(protocol) == [
+        (1, "# Formation\n"),
+        (2, "AdvanceCycle()\n\n"),
+        (4, "CCCharge(0.1,\nends=((\"voltage\", \">\", 4.2),))\n"),
+        (6, "for i in range(2):\n    Rest()\n# End\n    Sleep()\n")]
+    assert validator.check(protocol) == (True, "Passed")
+    # The line of what is wrong is counted from the start of the protocol
+    assert validator.check(protocol + "\nCCCharge(0)") == (
+        False, "Line 11: The current should not be 0.")
+
+
+def test_statements_split_wrong():
+    # The bracket in the string ends the first statement too early, it is parsed whole
+    protocol = "Rest(ends=((\"time\", \">\", \"))\"),\n(\"time\", \">\", 5)))\nRest()"
+    assert validator._statements(protocol)[0][1] == "Rest(ends=((\"time\", \">\", \"))\"),\n"
+    assert validator.check(protocol) == (False, "Line 1: '))' is not a time, e.g. \"1:30:00\" or 90.")
+    assert validator.check("Rest()\nelse:\n    Rest()")[0] is False
+
+
+def test_time_conversion():
+    assert validator.time_conversion(120) == 120
+    assert validator.time_conversion("1:2:3") == 3723
+    assert validator.time_conversion("::5") == 5
+    # The server reads times with the same rules
+    assert protocols.time_conversion is validator.time_conversion
+
+
+def test_check_cached(monkeypatch):
+    protocol = EXAMPLE + "\n# cached"
+    calls = []
+    check = validator._check
+    monkeypatch.setattr(validator, "_check", lambda protocol: calls.append(1) or check(protocol))
+    assert validator.check(protocol) == (True, "Passed")
+    assert validator.check(protocol) == (True, "Passed")
+    assert len(calls) == 1
+    validator.check(protocol + " edited")
+    assert len(calls) == 2
+
+
+def test_result_cache():
+    cache = validator.ResultCache(size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    # "b" is the least recently used
+    cache.put("c", 3)
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("b", "missing") == "missing"
+    assert cache.get("a") == 1 and cache.get("c") == 3
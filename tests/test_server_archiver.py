@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from cyckei.functions import archive, logindex
+from cyckei.server import archiver, writer
+from tests.test_functions_logindex import run_protocol
+
+
+def test_archiver(tmp_path):
+    with pytest.raises(ValueError):
+        archiver.Archiver("bzip")
+    with pytest.raises(ValueError):
+        archiver.Archiver(cpu_limit=2)
+
+    data_writer = writer.DataWriter()
+    paths = [str(tmp_path / "{}.pyb".format(i)) for i in range(2)]
+    contents = []
+    for path in paths:
+        run_protocol(path)
+        with open(path, "rb") as file:
+            contents.append(file.read())
+
+    log_archiver = archiver.Archiver("lzma", cpu_limit=0.5, writer=data_writer)
+    assert log_archiver.submit(paths[0])
+    assert not log_archiver.submit(paths[0])
+    log_archiver.submit(paths[1])
+    log_archiver.submit(str(tmp_path / "missing.pyb"))
+    assert log_archiver.wait(60)
+
+    # Only the logs waiting or being archived are remembered
+    assert not log_archiver._submitted
+    assert log_archiver._executor._mp_context.get_start_method() == "spawn"
+
+    stats = log_archiver.stats()
+    assert stats["archived"] == 2
+    assert stats["failed"] == 1
+    assert stats["pending"] == 0
+    assert stats["bytes_in"] == sum(len(content) for content in contents)
+    assert stats["bytes_out"] == sum(os.path.getsize(path) for path in paths)
+    for path, content in zip(paths, contents):
+        assert archive.compression_of(path) == "lzma"
+        with archive.open_log(path) as file:
+            assert file.read() == content
+        assert logindex.load(path)
+
+    log_archiver.close()
+    data_writer.close()
+    assert not log_archiver.submit(paths[0] + "x")
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from cyckei.server import batch, protocols
+from tests.sim_backend import SimClock, SimSource
+
+PROTOCOL = """from cyckei.server import protocols
+protocols.CCCharge({current}, reports=(("voltage", 0.005), ("time", ":5:")),
+                   ends=(("voltage", ">", 4.2), ("time", ">", "24::")))
+protocols.CVCharge(4.2, reports=(("current", 0.002), ("time", ":5:")),
+                   ends=(("current", "<", 0.005), ("time", ">", "24::")))
+protocols.Sleep(reports=(("time", ":5:"),), ends=(("time", ">", "::900"),))
+protocols.Rest(reports=(("time", ":5:"),), ends=(("time", ">", "::900"),))
+protocols.CCDischarge({current}, reports=(("voltage", 0.005), ("time", ":5:")),
+                      ends=(("voltage", "<", 3.5), ("time", ">", "24::")))
+"""
+
+
+def make_runners(clock, count, tmp_path, tolerance=None):
+    runners = []
+    for i in range(count):
+        source = SimSource(clock, channel=str(i), noise_v=2e-4, noise_i=2e-5,
+                           seed=i)
+        runner = protocols.CellRunner(channel=str(i), plugins={},
+                                      path=str(tmp_path / "{}.txt".format(i)),
+                                      tolerance=tolerance)
+        runner.set_source(source)
+        runner.load_protocol(PROTOCOL.format(current=0.05 + 0.02 * i))
+        runners.append(runner)
+    return runners
+
+
+def simulate(tmp_path, table=None, count=4, tolerance=None):
+    clock = SimClock()
+    with clock.patch(protocols, batch):
+        runners = make_runners(clock, count, tmp_path, tolerance)
+        for runner in runners:
+            runner.run()
+        while True:
+            started = [runner for runner in runners
+                       if runner.status == protocols.STATUS.started]
+            if not started:
+                break
+            clock.advance_to(min(runner.next_time for runner in started))
+            if table is None:
+                for runner in started:
+                    if runner.next_time <= clock.time():
+                        runner.run()
+            else:
+                table.run(started)
+    return runners
+
+
+def test_step_thresholds():
+    runner = protocols.CellRunner(channel="a", plugins={})
+    runner.load_protocol(PROTOCOL.format(current=0.1), isTest=True)
+    thresholds = batch.step_thresholds(runner.steps[0])
+    assert thresholds["delta"][0] == 300
+    assert thresholds["delta"][2] == 0.005
+    assert np.isnan(thresholds["delta"][1])
+    assert thresholds["upper"][2] == 4.2
+    assert thresholds["upper_strict"][2] == True
+    assert thresholds["min_time"] == 1.0
+    assert thresholds["total_time"] == 24 * 3600
+    assert batch.step_thresholds(runner.steps[1])["lower"][1] == 0.005
+    # Sleep has its own run()
+    assert batch.step_thresholds(runner.steps[2]) is None
+    assert batch.step_thresholds(runner.steps[3]) is not None
+    runner.steps[3].end_conditions.append(
+        protocols.ConditionTotalDelta("voltage", 1))
+    assert batch.step_thresholds(runner.steps[3]) is None
+
+
+def test_condition_table_grows():
+    table = batch.ConditionTable(capacity=1)
+    runners = []
+    for i in range(3):
+        runner = protocols.CellRunner(channel=str(i), plugins={})
+        runner.load_protocol(PROTOCOL.format(current=0.1), isTest=True)
+        runner.i_current_step = 0
+        runners.append(runner)
+        assert table.row(runner) is not None
+    assert table.capacity == 4
+    assert len(set(table.row(runner) for runner in runners)) == 3
+    table.release(runners[0])
+    assert len(table.free) == 2
+
+
+@pytest.mark.parametrize("tolerance", [None, {"voltage": 0.002}])
+def test_condition_table_matches_steps(tmp_path, tolerance):
+    expected = simulate(tmp_path, tolerance=tolerance)
+    table = batch.ConditionTable(capacity=2)
+    batched = simulate(tmp_path, table, tolerance=tolerance)
+    for a, b in zip(expected, batched):
+        assert a.status == b.status == protocols.STATUS.completed
+        for step_a, step_b in zip(a.steps, b.steps):
+            assert len(step_a.data) == len(step_b.data)
+            assert [row[0] for row in step_a.report] == pytest.approx(
+                [row[0] for row in step_b.report])
+    assert table.loaded == {}
@@ -0,0 +1,129 @@
+import math
+import random
+
+import pytest
+from cyckei.server import compression, protocols
+from tests.sim_backend import SimClock, SimSource
+
+PROTOCOL = """from cyckei.server import protocols
+protocols.CCCharge(0.1, reports=(("voltage", 0.001), ("time", ":5:")),
+                   ends=(("voltage", ">", 4.2), ("time", ">", "24::")))
+protocols.Rest(reports=(("time", ":5:"),), ends=(("time", ">", "::1800"),))
+protocols.CCDischarge(0.1, reports=(("voltage", 0.001), ("time", ":5:")),
+                      ends=(("voltage", "<", 3.5), ("time", ">", "24::")))
+"""
+
+
+def max_error(points, data, index):
+    """Largest distance of data to the linear interpolation of points."""
+    error = 0.
+    for row in data:
+        for a, b in zip(points, points[1:]):
+            if a[0] <= row[0] <= b[0]:
+                fraction = (row[0] - a[0]) / (b[0] - a[0]) if b[0] > a[0] else 0.
+                value = a[index] + fraction * (b[index] - a[index])
+                error = max(error, abs(row[index] - value))
+                break
+        else:
+            raise AssertionError("{} outside of the points".format(row[0]))
+    return error
+
+
+def compress(door, data):
+    points = []
+    for row in data[:-1]:
+        points.extend(door.add(row))
+    points.extend(door.flush(data[-1]))
+    return points
+
+
+def test_parse_tolerance():
+    assert compression.parse_tolerance({"voltage": 0.001, "time": 600}) == \
+        ({2: 0.001}, 600.)
+    assert compression.parse_tolerance({"current": "1e-4", "capacity": 0.5}) == \
+        ({1: 1e-4, 3: 0.5}, None)
+    for tolerance in ({"voltage": 0}, {"voltage": -1e-3}, {"voltage": "x"},
+                      {"temperature": 1}, {"time": 60}, {}):
+        with pytest.raises(ValueError):
+            compression.parse_tolerance(tolerance)
+
+
+def test_swinging_door_bound():
+    generator = random.Random(3)
+    data = []
+    voltage = 3.5
+    for i in range(2000):
+        # A plateau, a knee and noise
+        voltage += 1e-4 + (2e-3 if 1200 < i < 1300 else 0.) \
+            + generator.gauss(0, 2e-4)
+        data.append([10. * i, 0.1 + generator.gauss(0, 1e-5), voltage,
+                     i / 36., []])
+
+    door = compression.SwingingDoor({"voltage": 0.002, "current": 1e-4})
+    points = compress(door, data)
+    assert points[0] is data[0] and points[-1] is data[-1]
+    assert [row[0] for row in points] == sorted(row[0] for row in points)
+    assert len(points) < len(data) / 5
+    assert max_error(points, data, 2) <= 0.002 + 1e-12
+    assert max_error(points, data, 1) <= 1e-4 + 1e-12
+
+    # A linear signal only needs its end points
+    line = [[float(t), 0.1, 3. + t / 1024., None, []] for t in range(100)]
+    assert compress(compression.SwingingDoor({"voltage": 1e-6}), line) == \
+        [line[0], line[-1]]
+
+
+def test_swinging_door_interval_and_gaps():
+    line = [[10. * t, 0.1, 3.7, 0., []] for t in range(100)]
+    points = compress(compression.SwingingDoor({"voltage": 1e-3, "time": 95}),
+                      line)
+    assert all(b[0] - a[0] <= 100 for a, b in zip(points, points[1:]))
+    assert len(points) == 12
+
+    # A missing value is written along with the point held before it
+    door = compression.SwingingDoor({"current": 1e-3})
+    assert door.add(line[0]) == [line[0]]
+    assert door.add(line[1]) == []
+    missing = [20., None, 3.7, None, []]
+    assert door.add(missing) == [line[1], missing]
+    assert door.add(line[3]) == [line[3]]
+
+
+def test_cellrunner_tolerance(tmp_path):
+    with pytest.raises(ValueError):
+        protocols.CellRunner(channel="a", plugins={},
+                             tolerance={"voltage": -1})
+
+    clock = SimClock()
+    with clock.patch(protocols):
+        source = SimSource(clock, channel="a", noise_v=2e-4, noise_i=2e-5,
+                           seed=2)
+        runner = protocols.CellRunner(channel="a", plugins={},
+                                      path=str(tmp_path / "log.txt"),
+                                      tolerance={"voltage": 0.002,
+                                                 "current": 1e-4})
+        runner.set_source(source)
+        runner.load_protocol(PROTOCOL)
+        for step in runner.steps:
+            step.data_max_len = math.inf
+        while runner.run():
+            clock.advance_to(runner.next_time)
+
+    with open(runner.fpath) as file:
+        lines = file.read().splitlines()
+    assert '#    "tolerance": {' in lines
+    rows = [[float(value) for value in line.split(",")]
+            for line in lines if line.startswith("    ")]
+    reported = [[row[0] - runner.start_time] + row[1:4]
+                for step in runner.steps for row in step.report]
+    assert len(rows) == len(reported)
+    for row, point in zip(rows, reported):
+        assert row == pytest.approx(point, rel=1e-7, abs=1e-3)
+
+    for step in runner.steps:
+        assert step.report[0] is step.data[0]
+        assert step.report[-1] is step.data[-1]
+        assert not step.held_reports
+        assert len(step.report) < len(step.data) / 3
+        assert max_error(step.report, step.data, 2) <= 0.002 + 1e-12
+        assert max_error(step.report, step.data, 1) <= 1e-4 + 1e-12
@@ -0,0 +1,83 @@
+import json
+
+import zmq
+
+from cyckei.server import feed, server
+from tests.sim_backend import SimClock, SimSource
+
+
+def snapshot(count, voltage=3.7, status="started"):
+    return {str(channel): {"channel": channel, "status": status, "state": "rest",
+                           "current": 0., "voltage": voltage, "cycle": 0,
+                           "step_stats": {"points": channel}}
+            for channel in range(1, count + 1)}
+
+
+def test_changes():
+    status = feed.StatusFeed()
+    assert status.update(snapshot(3))["1"]["voltage"] == 3.7
+    assert status.version == 1
+    # Nothing changed, no new version
+    assert status.update(snapshot(3)) == {}
+    assert status.version == 1
+
+    channels = snapshot(3)
+    channels["2"]["voltage"] = 3.8
+    assert status.update(channels) == {"2": {"voltage": 3.8}}
+    channels["3"]["status"] = "available"
+    status.update(channels)
+
+    changes = status.changes(1, status.epoch)
+    assert changes["version"] == 3 and not changes["full"]
+    assert changes["channels"] == {"2": {"voltage": 3.8}, "3": {"status": "available"}}
+    assert status.changes(3, status.epoch)["channels"] == {}
+    # Unknown version or epoch, every field
+    for since, epoch in [(None, status.epoch), (1, "other"), (9, status.epoch)]:
+        changes = status.changes(since, epoch)
+        assert changes["full"]
+        assert sorted(changes["channels"]) == ["1", "2", "3"]
+        assert sorted(changes["channels"]["1"]) == sorted(feed.FIELDS)
+
+
+def test_publish():
+    context = zmq.Context.instance()
+    publisher = feed.StatusFeed("tcp://127.0.0.1:*", heartbeat=0)
+    address = publisher._socket.getsockopt_string(zmq.LAST_ENDPOINT)
+    subscriber = context.socket(zmq.SUB)
+    subscriber.setsockopt(zmq.SUBSCRIBE, feed.TOPIC)
+    subscriber.connect(address)
+    try:
+        # Heartbeats until the subscription is through
+        while not subscriber.poll(50):
+            publisher.update({})
+        subscriber.recv_multipart()
+
+        publisher.update(snapshot(2))
+        channels = snapshot(2)
+        channels["1"]["voltage"] = 3.9
+        publisher.update(channels)
+        messages = []
+        while subscriber.poll(500):
+            topic, body = subscriber.recv_multipart()
+            messages.append(json.loads(body))
+            if messages[-1]["version"] == 2:
+                break
+        assert topic == feed.TOPIC
+        assert messages[0]["previous"] == 0 and len(messages[0]["channels"]) == 2
+        assert messages[1] == {"epoch": publisher.epoch, "version": 2, "previous": 1,
+                               "channels": {"1": {"voltage": 3.9}}}
+    finally:
+        subscriber.close()
+        publisher.close()
+
+
+def test_info_changes():
+    sources = [SimSource(SimClock(), channel="1"), SimSource(SimClock(), channel="2")]
+    status = feed.StatusFeed()
+    status.update(server.info_all_channels([], sources))
+    changes = server.info_changes(status, [], sources, since=1, epoch=status.epoch)
+    assert changes["channels"] == {} and not changes["full"]
+    # Without a feed every channel is sent
+    changes = server.info_changes(None, [], sources, since=1, epoch=status.epoch)
+    assert changes["full"]
+    assert changes["channels"]["2"]["status"] == "available"
@@ -0,0 +1,172 @@
+import json
+import os
+import time
+
+import numpy as np
+import pytest
+
+from cyckei.functions import binlog, logindex, npystore
+from cyckei.server import journal, protocols
+from tests.sim_backend import SimClock, SimSource
+from tests.test_functions_logindex import PROTOCOL
+
+
+def headers(path):
+    return [entry.get("cycle", entry.get("state")) for entry in logindex.scan(path)]
+
+
+def run(runners, clock, runner_journal, until=None):
+    """Runs the runners like the server loop does, recording them at most once a second."""
+    recorded = None
+    while True:
+        started = [runner for runner in runners
+                   if runner.status in (protocols.STATUS.pending, protocols.STATUS.started)]
+        if not started:
+            break
+        runner = min(started, key=lambda runner: runner.next_time)
+        if until is not None and runner.next_time > until:
+            break
+        clock.advance_to(runner.next_time)
+        runner.run()
+        if recorded is None or clock.time() - recorded >= 1 \
+                or runner.status == protocols.STATUS.completed:
+            runner_journal.record([runner for runner in runners
+                                   if runner.status != protocols.STATUS.completed])
+            recorded = clock.time()
+
+
+@pytest.mark.parametrize("file_format", [None, "npy"])
+def test_resume(tmp_path, file_format):
+    clock = SimClock()
+    with clock.patch(protocols, journal):
+        # The same test without and with a crash half way through the second cycle
+        reference = protocols.CellRunner(channel="1", path=str(tmp_path / "reference.pyb"),
+                                          plugins={}, format=file_format)
+        reference.set_source(SimSource(clock, channel="1"))
+        reference.load_protocol(PROTOCOL)
+        run([reference], clock, journal.Journal(str(tmp_path / "reference.journal")))
+
+        clock = SimClock()
+        path = str(tmp_path / "1.pyb")
+        journal_path = str(tmp_path / journal.FILE_NAME)
+        with clock.patch(protocols, journal):
+            runner = protocols.CellRunner(channel="1", path=path, plugins={},
+                                          cellid="cell", format=file_format)
+            source = SimSource(clock, channel="1")
+            runner.set_source(source)
+            runner.load_protocol(PROTOCOL)
+            first = journal.Journal(journal_path, interval=120)
+            run([runner], clock, first, until=clock.time() + 3000)
+            assert (runner.cycle, runner.i_current_step) == (1, 3)
+            runner.handles.close()
+            if runner.store is not None:
+                runner.store.sync()
+            # A torn line left by the crash is skipped
+            with open(journal_path, "a") as file:
+                file.write('{"kind": "checkpoint", "chan')
+            first.close()
+
+            clock.advance_to(clock.time() + 60)
+            second = journal.Journal(journal_path)
+            resumed = second.recover([SimSource(clock, channel="2"), source])
+            assert len(resumed) == 1
+            runner = resumed[0]
+            assert runner.meta["cellid"] == "cell"
+            assert runner.cycle == 1
+            assert runner.last_cycle_stats.cycle == 0
+            assert runner.step.state_str == "charge_constant_current"
+            run(resumed, clock, second)
+
+    assert runner.status == protocols.STATUS.completed
+    # The log goes on where it stopped, without headers written twice
+    assert headers(path) == headers(reference.fpath)
+    summaries = [entry for entry in logindex.scan(path)
+                 if entry["kind"] == "step" and entry["state"] == "cycle_summary"]
+    assert len(summaries) == 3
+    if file_format == "npy":
+        times = npystore.history(path)[:, 0]
+    else:
+        with open(path) as file:
+            times = np.array([float(line.split(",")[0]) for line in file
+                              if line.startswith("    ")])
+    assert (np.diff(times) >= 0).all()
+    # The time down counts as a pause
+    assert runner.total_pause_time >= 60
+    # The test ended, so nothing is left to resume
+    assert journal.read(journal_path) == {}
+
+
+@pytest.mark.parametrize("file_format", [None, "binary"])
+def test_resume_torn(tmp_path, file_format):
+    clock = SimClock()
+    path = str(tmp_path / "1.pyb")
+    journal_path = str(tmp_path / journal.FILE_NAME)
+    with clock.patch(protocols, journal):
+        runner = protocols.CellRunner(channel="1", path=path, plugins={}, format=file_format)
+        source = SimSource(clock, channel="1")
+        runner.set_source(source)
+        runner.load_protocol(PROTOCOL)
+        first = journal.Journal(journal_path, interval=120)
+        run([runner], clock, first, until=clock.time() + 3000)
+        runner.handles.close()
+        first.close()
+        size = os.path.getsize(path)
+        # Rows written after the last checkpoint, then a row cut off by the crash
+        with open(path, "ab") as file:
+            if file_format == "binary":
+                file.write(binlog.encode_data([[3001., 0.1, 4., 0.]] * 3))
+                file.write(binlog.encode_data([[3002., 0.1, 4., 0.]])[:-3])
+            else:
+                file.write(b"    3001.0,0.1,4.0,0.0\n" * 3 + b"    3002.0,0.1")
+        rows = logindex.complete(path)[1]
+
+        clock.advance_to(clock.time() + 60)
+        second = journal.Journal(journal_path)
+        runner = second.recover([source])[0]
+        assert runner.file_size > size
+        assert (runner.file_size, runner.rows_written) == (os.path.getsize(path), rows)
+        run([runner], clock, second)
+
+    assert runner.status == protocols.STATUS.completed
+    # The whole log can be read again
+    assert logindex.complete(path) == (os.path.getsize(path), runner.rows_written)
+    if file_format == "binary":
+        with open(path, "rb") as file:
+            assert all(kind for kind, _ in binlog.iter_chunks(file))
+
+
+def test_recover_many(tmp_path):
+    clock = SimClock()
+    count = 64
+    journal_path = str(tmp_path / journal.FILE_NAME)
+    with clock.patch(protocols, journal):
+        sources = [SimSource(clock, channel=str(i), seed=i) for i in range(count)]
+        runners = []
+        for source in sources:
+            runner = protocols.CellRunner(channel=source.channel, plugins={},
+                                          path=str(tmp_path / "{}.pyb".format(source.channel)))
+            runner.set_source(source)
+            runner.load_protocol(PROTOCOL)
+            runners.append(runner)
+        runner_journal = journal.Journal(journal_path, compact_size=50000)
+        run(runners, clock, runner_journal, until=clock.time() + 900)
+        runners[0].pause()
+        runners[1].stop()
+        runner_journal.record(runners)
+        runner_journal.close()
+        for runner in runners:
+            runner.handles.close()
+        # The journal was compacted along the way
+        with open(journal_path) as file:
+            lines = [json.loads(line) for line in file]
+        assert len(lines) <= 3 * count
+
+        start = time.perf_counter()
+        resumed = journal.Journal(journal_path).recover(sources)
+        elapsed = time.perf_counter() - start
+
+    assert elapsed < 5
+    assert len(resumed) == count - 1
+    assert resumed[0].status == protocols.STATUS.paused
+    assert resumed[0].step.status == protocols.STATUS.paused
+    assert all(runner.status == protocols.STATUS.started for runner in resumed[1:])
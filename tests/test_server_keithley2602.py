@@ -0,0 +1,39 @@
+from cyckei.server import keithley2602
+
+
+class FakeMeter(object):
+    def __init__(self, reply):
+        self.reply = reply
+        self.writes = []
+        self.queries = []
+
+    def write(self, text):
+        self.writes.append(text)
+
+    def query(self, text):
+        self.queries.append(text)
+        if self.reply is None:
+            raise IOError("Timed out")
+        return self.reply
+
+
+def test_measure_many():
+    first = FakeMeter("1e-9\t3.71\t-0.002\t9.91e+37")
+    second = FakeMeter(None)
+    sources = [keithley2602.Source(first, "b", channel=2),
+               keithley2602.Source(first, "a", channel=1),
+               keithley2602.Source(second, "a", channel=3)]
+
+    readings = keithley2602.Source.measure_many(sources)
+    # One query per Keithley, the outputs left off
+    assert first.queries == ["print(ib, vb, ia, va)"]
+    assert readings == [(0.0, 3.71), (-0.002, 9.91e+37), (None, None)]
+    script = [write for write in first.writes if "measure.iv" in write][0]
+    assert "smua.source.output = smua.OUTPUT_OFF" in script
+    assert script.endswith("smua.source.offmode = smua.OUTPUT_HIGH_Z")
+    assert first.writes[-1] == "safetycutoff(120)"
+
+
+def test_clean_iv():
+    assert keithley2602.clean_iv(9.91e+37, 1e-4) == (0.0, 0.0)
+    assert keithley2602.clean_iv(0.1, 4.2) == (0.1, 4.2)
@@ -244,6 +244,42 @@ def test_cellrunner_advance_cycle(basic_cellrunner):
     basic_cellrunner.advance_cycle()
     assert basic_cellrunner.cycle == 1
 
+def test_cellrunner_cycle_stats(basic_cellrunner):
+    charge = protocols.CCCharge(0.1)
+    discharge = protocols.CCDischarge(0.1)
+    for step, current in ((charge, 0.1), (discharge, 0.08)):
+        for t in range(4):
+            step.stats.add(1000. * t, current, 3.5 + 0.1 * t)
+        basic_cellrunner.cycle_stats.add_step(step)
+
+    summary = basic_cellrunner.cycle_stats.summary()
+    assert summary["cycle"] == 0
+    assert summary["count"] == 8
+    assert summary["charge_capacity"] == pytest.approx(3000 * 0.1 / 3.6)
+    assert summary["discharge_capacity"] == pytest.approx(3000 * 0.08 / 3.6)
+    assert summary["coulombic_efficiency"] == pytest.approx(0.8)
+    assert summary["voltage_min"] == 3.5
+    assert summary["voltage_max"] == pytest.approx(3.8)
+
+    # The running step is included in the summary without being merged
+    rest = protocols.Rest()
+    rest.stats.add(5000., 0., 3.4)
+    assert basic_cellrunner.cycle_stats.summary(rest)["voltage_min"] == 3.4
+    assert basic_cellrunner.cycle_stats.summary()["voltage_min"] == 3.5
+
+    basic_cellrunner.write_header()
+    basic_cellrunner.advance_cycle()
+    assert basic_cellrunner.last_cycle_stats.cycle == 0
+    assert basic_cellrunner.cycle_stats.cycle == 1
+    assert basic_cellrunner.cycle_stats.total.count == 0
+    with open(basic_cellrunner.fpath) as file:
+        lines = file.read().splitlines()
+    assert json.loads(lines[-1]) == {"cycle": 1}
+    written = json.loads(lines[-2])
+    assert lines[-2].startswith("  {")
+    assert written["state"] == "cycle_summary"
+    assert written["coulombic_efficiency"] == pytest.approx(0.8)
+
 def test_cellrunner_write_header(basic_cellrunner):
     basic_cellrunner.write_header()
     # This will fail depending on where pytest is run from
@@ -394,6 +430,7 @@ def test_make_protocolstep(basic_protocolstep, basic_cellrunner):
     assert basic_protocolstep.next_time == -1
     assert basic_protocolstep.starting_capacity == 0.
     assert basic_protocolstep.wait_time == 10.0
+    assert basic_protocolstep.adaptive == None
     assert basic_protocolstep.end_conditions == []
     assert basic_protocolstep.report_conditions == []
     assert basic_protocolstep.in_control == True
@@ -402,6 +439,37 @@ def test_protocolstep__start(basic_protocolstep):
     with pytest.raises(NotImplementedError):
         basic_protocolstep._start()
 
+def test_protocolstep_adaptive(basic_cellrunner):
+    step = protocols.ProtocolStep(10.0, basic_cellrunner, adaptive=(2, 300))
+    assert step.adaptive == (2.0, 300.0)
+    with pytest.raises(ValueError):
+        protocols.ProtocolStep(10.0, basic_cellrunner, adaptive=(0, 300))
+    # Faster than the fastest measurements
+    with pytest.raises(ValueError):
+        protocols.ProtocolStep(10.0, basic_cellrunner, adaptive=(0.5, 300))
+    with pytest.raises(ValueError):
+        protocols.ProtocolStep(10.0, basic_cellrunner, adaptive=(300, 2))
+
+def test_protocolstep_measurement_interval(basic_cellrunner):
+    step = protocols.ProtocolStep(10.0, basic_cellrunner)
+    assert step.measurement_interval() == 10.0
+
+    step = protocols.ProtocolStep(10.0, basic_cellrunner, adaptive=(2, 300))
+    step.report_conditions = protocols.process_reports(
+        (("voltage", 0.01), ("time", ":5:")))
+    # No trend yet
+    assert step.measurement_interval() == 2
+    # Plateau
+    step.data = [[t, 0.1, 4.0, 0] for t in range(0, 100, 10)]
+    assert step.measurement_interval() == 300
+    # 1 mV/s
+    step.data = [[t, 0.1, 4.0 + 0.001 * t, 0] for t in range(0, 100, 10)]
+    assert step.measurement_interval() == pytest.approx(
+        protocols.ADAPTIVE_FRACTION * 10)
+    # Knee
+    step.data = [[t, 0.1, 4.0 + 0.1 * t, 0] for t in range(0, 100, 10)]
+    assert step.measurement_interval() == 2
+
 def test_protocolstep_header(basic_protocolstep):
     assert basic_protocolstep.header() == False
 
@@ -509,6 +577,36 @@ def test_protocolstep_read_data(basic_cellrunner, basic_protocolstep):
     assert test_currentstep.data[1][2] - 3.4317575866132595 <= 0.002
     assert test_currentstep.data[1][3] - 0.008333381017049155 <= 0.0002
 
+def test_stepstats():
+    stats = protocols.StepStats()
+    assert stats.as_dict()["count"] == 0
+    assert stats.mean_current is None
+
+    stats.add(0., -0.1, 3.0)
+    stats.add(10., None, None)
+    stats.add(36., 0.1, 4.0)
+    assert stats.count == 2
+    assert stats.duration == 36.
+    assert stats.capacity == pytest.approx(1.0)
+    assert stats.energy == pytest.approx(36 * 0.35 / 3600)
+    assert stats.mean_current == pytest.approx(0.1)
+    assert stats.voltage_min == 3.0
+    assert stats.voltage_max == 4.0
+
+    # Nothing is integrated across an interruption
+    stats.interrupt()
+    stats.add(1000., 0.2, 3.5)
+    assert stats.capacity == pytest.approx(1.0)
+    assert stats.current_max == 0.2
+
+    merged = protocols.StepStats()
+    merged.merge(stats)
+    merged.merge(stats.copy())
+    assert merged.count == 6
+    assert merged.capacity == pytest.approx(2.0)
+    assert merged.duration == 1000.
+    assert stats.count == 3
+
 def test_protocolstep_pause(basic_cellrunner, basic_protocolstep):
     test_device = mock_device.MockDevice()
     basic_cellrunner.channel = 'a'
@@ -1130,6 +1228,44 @@ def test_conditionabsolute_check(basic_cellrunner):
     test_condition_absolute = protocols.ConditionAbsolute("voltage", "<", 2.6)
     assert test_condition_absolute.check(test_cvcharge) == False
 
+def test_condition_compile(basic_protocolstep):
+    step = basic_protocolstep
+    now = 1000.0
+    # Nothing reported yet
+    assert protocols.ConditionDelta("voltage", 0.01).compile()(step, now) == (True, now)
+    assert protocols.ConditionTotalTime(60).compile()(step, now) == (False, float('inf'))
+
+    step.data = [[990.0, 0.1, 4.0, 0.0, []], [1000.0, 0.1, 4.005, 0.0, []]]
+    step.report = [step.data[0]]
+    met, next_time = protocols.ConditionDelta("voltage", 0.01).compile()(step, now)
+    assert met == False
+    assert next_time == pytest.approx(1010.0)
+    met, next_time = protocols.ConditionTotalTime(60).compile()(step, now)
+    assert met == False
+    assert next_time == pytest.approx(1050.0)
+    met, next_time = protocols.ConditionAbsolute("voltage", ">", 4.02, min_time=5).compile()(step, now)
+    assert met == False
+    assert next_time == pytest.approx(1030.0)
+
+    # Failed reads are not met rather than raising
+    step.data.append([1010.0, None, None, None, []])
+    assert protocols.ConditionDelta("voltage", 0.01).compile()(step, now) == (False, float('inf'))
+    assert protocols.ConditionAbsolute("voltage", ">", 4.02).compile()(step, now) == (False, float('inf'))
+    assert protocols.ConditionTotalDelta("current", 1).compile()(step, now) == (False, float('inf'))
+
+def test_condition_evaluator(basic_protocolstep):
+    conditions = [ConditionTest(False), protocols.ConditionTotalTime(60), ConditionTest(True)]
+    evaluator = protocols.ConditionEvaluator(conditions)
+    assert evaluator.conditions is conditions
+    assert len(evaluator.functions) == 3
+
+    basic_protocolstep.report = [[1000.0, 0.1, 4.0, 0.0, []]]
+    assert evaluator.evaluate(basic_protocolstep, 1010.0) == (True, 1060.0)
+    assert evaluator.evaluate(basic_protocolstep, 1010.0, stop_on_met=True) == (True, 1060.0)
+    evaluator = protocols.ConditionEvaluator(conditions[:2])
+    assert evaluator.evaluate(basic_protocolstep, 1010.0) == (False, 1060.0)
+    assert evaluator.evaluate(basic_protocolstep, 1070.0) == (True, float('inf'))
+
 def test_condition_end_voltage():
     test_condition_end_voltage = protocols.condition_end_voltage(4.2, ">=")
     assert test_condition_end_voltage.value == 4.2
@@ -1226,6 +1362,38 @@ def test_extrapolate_time():
     assert protocols.extrapolate_time(data, 4.2, 2) == float('inf')
     data = [[10, 0.02, 4], [11, 0.02, 4.05], []]
     assert protocols.extrapolate_time(data, 4.2, 2) == float('inf')
+    # Falling values are extrapolated downwards, moving away never hits
+    data = [[10, 0.02, 4.1], [11, 0.02, 4.05], [12, 0.02, 4]]
+    assert int(protocols.extrapolate_time(data, 3.9, 2)) == 14
+    assert protocols.extrapolate_time(data, 4.2, 2) == float('inf')
+
+def test_fit_trend():
+    data = [[t, 0.02, 4 + 0.01 * t] for t in range(20)]
+    t_ref, v_ref, slope, slope_error = protocols.fit_trend(data, 2)
+    assert t_ref == 19
+    assert v_ref == pytest.approx(4.19)
+    assert slope == pytest.approx(0.01)
+    assert slope_error == pytest.approx(0)
+    data[-1][2] = None
+    assert protocols.fit_trend(data, 2)[0] == 18
+    assert protocols.fit_trend([[10, 0.02, 4]], 2) is None
+    assert protocols.fit_trend([[10, 0.02, 4], [10, 0.02, 4.1]], 2) is None
+
+def test_project_time():
+    assert protocols.project_time(None, 4.2) == float('inf')
+    assert protocols.project_time((10, 4.0, 0.1, 0.0), 4.2) == pytest.approx(12)
+    assert protocols.project_time((10, 4.2, 0.1, 0.0), 4.2) == 10
+    # An uncertain slope makes the estimate earlier, never later
+    assert protocols.project_time((10, 4.0, 0.1, 0.1), 4.2, 1) == pytest.approx(11)
+    assert protocols.project_time((10, 4.0, -0.1, 0.05), 4.2, 1) == float('inf')
+    assert protocols.project_time((10, 4.0, -0.1, 0.2), 4.2, 1) == pytest.approx(12)
+
+def test_extrapolate_delta_time():
+    data = [[10, 0.02, 4], [11, 0.02, 4.05], [12, 0.02, 4.1]]
+    assert protocols.extrapolate_delta_time(data, 4.1, 0.1, 2) == pytest.approx(14)
+    data = [[10, 0.02, 4.1], [11, 0.02, 4.05], [12, 0.02, 4]]
+    assert protocols.extrapolate_delta_time(data, 4.05, 0.1, 2) == pytest.approx(13)
+    assert protocols.extrapolate_delta_time(data[:1], 4.1, 0.1, 2) == float('inf')
 
 def test_time_conversion():
     test_convert = protocols.time_conversion(120)
@@ -0,0 +1,120 @@
+import math
+
+import numpy as np
+import pytest
+
+from cyckei.server import protocols, pyramid, server
+from tests.sim_backend import SimClock, SimSource
+from tests.test_functions_logindex import PROTOCOL
+
+START = 1.6e9
+
+
+def make_rows(count, interval=7.):
+    times = START + interval * np.arange(count)
+    voltage = 3.7 + 0.3 * np.sin(np.arange(count) / 500.)
+    current = np.abs(np.cos(np.arange(count) / 300.))
+    capacity = np.arange(count) / 10.
+    return times, np.column_stack([current, voltage, capacity])
+
+
+def expected(times, values, t0, t1, width):
+    """Brute force min, max and mean per width bucket of the rows in [t0, t1]."""
+    starts = np.floor(times / width) * width
+    keep = (starts + width > t0) & (starts <= t1)
+    result = {}
+    for start in np.unique(starts[keep]):
+        bucket = values[keep & (starts == start)]
+        result[start] = (bucket.min(axis=0), bucket.max(axis=0), bucket.mean(axis=0))
+    return result
+
+
+@pytest.mark.parametrize("memory", [None, 16])
+def test_series(tmp_path, memory):
+    times, values = make_rows(40000)
+    if memory is None:
+        summary = pyramid.Pyramid()
+    else:
+        summary = pyramid.Pyramid(str(tmp_path / "log.pyb.pyr"), memory=memory)
+    for time, row in zip(times, values.tolist()):
+        summary.add(time, row)
+    assert summary.rows == len(times)
+
+    # The finest level fitting max_points is picked, rows not yet merged up included
+    for t0, t1, max_points, width in [
+            (START + 1000, START + 1600, 1000, 1),
+            (START + 1000, START + 50000, 1000, 60),
+            (None, None, 100, 3600),
+            (START + 270000, None, 1000, 60)]:
+        series = summary.series(t0, t1, max_points)
+        assert series["level"] == width
+        assert len(series["time"]) <= max_points
+        truth = expected(times, values, -math.inf if t0 is None else t0,
+                         math.inf if t1 is None else t1, width)
+        assert series["time"] == sorted(truth)
+        for i, column in enumerate(pyramid.COLUMNS):
+            assert series["min"][column] == pytest.approx(
+                [truth[start][0][i] for start in series["time"]])
+            assert series["max"][column] == pytest.approx(
+                [truth[start][1][i] for start in series["time"]])
+            assert series["mean"][column] == pytest.approx(
+                [truth[start][2][i] for start in series["time"]])
+        assert sum(series["count"]) == sum(
+            ((times >= start) & (times < start + width)).sum() for start in truth)
+
+    # Even the coarsest level is merged down to max_points
+    series = summary.series(max_points=10)
+    assert len(series["time"]) <= 10
+    assert series["level"] % 3600 == 0
+    assert sum(series["count"]) == len(times)
+    assert series["max"]["capacity"][-1] == values[-1, 2]
+
+    if memory is not None:
+        # Memory stays bounded, the rest is on disk and read back when reopened
+        assert all(len(level.rows) < 2 * memory for level in summary.levels)
+        summary.flush()
+        reopened = pyramid.Pyramid(summary.path)
+        old = summary.series(None, START + 200000, 500)
+        new = reopened.series(None, START + 200000, 500)
+        assert new["level"] == old["level"]
+        assert new["time"] == old["time"][:len(new["time"])]
+
+
+def test_missing_values():
+    summary = pyramid.Pyramid(levels=(1, 60))
+    summary.add(START, [None, 3.7, None])
+    summary.add(START + 0.5, [0.1, 3.8, None])
+    summary.add(START + 70, [0.2, 3.9, 1.])
+    series = summary.series(max_points=5)
+    assert series["level"] == 1
+    assert series["count"] == [2, 1]
+    assert series["min"]["current"] == [0.1, 0.2]
+    assert series["mean"]["voltage"] == pytest.approx([3.75, 3.9])
+    assert series["mean"]["capacity"] == [None, 1.]
+    with pytest.raises(ValueError):
+        pyramid.Pyramid(levels=(60, 90))
+
+
+def test_runner_pyramid(tmp_path):
+    path = str(tmp_path / "data.pyb")
+    clock = SimClock()
+    with clock.patch(protocols):
+        runner = protocols.CellRunner(channel="1", path=path, plugins={})
+        runner.set_source(SimSource(clock, channel="1"))
+        runner.load_protocol(PROTOCOL)
+        runner.pyramid = pyramid.Pyramid(pyramid.pyramid_path(path))
+        while runner.run():
+            clock.advance_to(runner.next_time)
+
+    # Every row written is summarized
+    with open(path) as file:
+        rows = [[float(value) for value in line.split(",")]
+                for line in file if line.startswith("    ")]
+    pyramids = {"1": runner.pyramid}
+    series = server.get_series(1, pyramids, max_points=50)
+    assert series["channel"] == "1"
+    assert series["time"][0] == math.floor(runner.start_time / series["level"]) \
+        * series["level"]
+    assert sum(series["count"]) == len(rows)
+    assert max(series["max"]["voltage"]) == pytest.approx(max(row[2] for row in rows))
+    assert server.get_series(2, pyramids) == "Channel 2 has no data series."
@@ -0,0 +1,50 @@
+import numpy as np
+
+from cyckei.server.recent import RecentWindow, decimate, decode
+
+
+def test_since():
+    window = RecentWindow(size=8)
+    for i in range(5):
+        window.add(100. + i, 0.1, 3.0 + i / 10)
+    reply = window.since()
+    assert (reply["first"], reply["next"], reply["reset"]) == (0, 5, True)
+    assert reply["t0"] == 100.
+    rows = decode(reply["data"])
+    assert rows.shape == (5, 3)
+    assert np.allclose(rows[:, 0], range(5)) and np.allclose(rows[-1, 1:], (0.1, 3.4))
+
+    # Only the new measurements follow
+    window.add(105., None, 3.5)
+    reply = window.since(reply["next"], reply["epoch"])
+    assert (reply["first"], reply["next"], reply["reset"], reply["points"]) == \
+        (5, 6, False, 1)
+    assert np.isnan(decode(reply["data"])[0, 1])
+    assert window.since(6, window.epoch)["points"] == 0
+
+    # Measurements dropped from the window, or from another window, start over
+    for i in range(10):
+        window.add(106. + i, 0.1, 3.6)
+    reply = window.since(6, window.epoch)
+    assert (reply["first"], reply["next"], reply["reset"], reply["points"]) == \
+        (8, 16, True, 8)
+    assert window.since(16, "other")["reset"]
+
+
+def test_decimate():
+    values = np.full(1000, 3.7)
+    values[123] = 4.2
+    values[800] = 2.5
+    values[900] = np.nan
+    picked = decimate(values, 20)
+    assert len(picked) <= 20 and list(picked) == sorted(picked)
+    assert 123 in picked and 800 in picked and 900 not in picked
+    assert list(decimate(values[:10], 20)) == list(range(10))
+
+    window = RecentWindow()
+    for i in range(1000):
+        window.add(float(i), 0.1, values[i])
+    reply = window.since(max_points=50)
+    assert reply["points"] <= 50
+    assert len(reply["data"]) < 50 * 12 * 4 / 3 + 4
+    assert decode(reply["data"])[:, 2].max() == np.float32(4.2)
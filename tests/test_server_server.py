@@ -1,3 +1,4 @@
+import json
 import sys
 import os
 import pytest
@@ -70,6 +71,13 @@ def test_info_channel(basic_cellrunner):
     assert test_dict["current"] == 0.01
     assert test_dict["voltage"] > 2.800
     assert test_dict["voltage"] < 2.802
+    assert test_dict["cycle"] == 0
+    assert test_dict["step_stats"]["count"] == 1
+    assert test_dict["step_stats"]["current_max"] == 0.01
+    assert test_dict["cycle_stats"]["count"] == 1
+    assert test_dict["cycle_stats"]["charge_capacity"] == 0.0
+    assert test_dict["last_cycle_stats"] is None
+    json.dumps(test_dict)
 
 
 def test_start(basic_cellrunner):
@@ -164,3 +172,87 @@ def test_get_runner_by_channel(basic_cellrunner):
     assert server.get_runner_by_channel(
         "a", [basic_cellrunner], 0) == basic_cellrunner
     assert server.get_runner_by_channel("a", [basic_cellrunner], 1) == None
+
+
+def test_start_many(basic_cellrunner, tmp_path, monkeypatch):
+    tested = []
+    real_test = server.test
+    monkeypatch.setattr(server, "test",
+                        lambda protocol: tested.append(protocol) or real_test(protocol))
+    test_protocol = "from cyckei.server import protocols\nprotocols.CurrentStep(0.01)"
+    entries = []
+    for name, protocol in (("first", test_protocol), ("second", test_protocol),
+                           ("broken", "protocols.NoSuchStep(1)")):
+        meta = {"path": str(tmp_path / "{}.txt".format(name)), "cellid": name,
+                "comment": "", "package": "", "celltype": "", "requester": "",
+                "plugins": {}, "protocol_name": name, "cycler": "", "start_cycle": 0,
+                "format": []}
+        entries.append({"channel": 'a', "meta": meta, "protocol": protocol})
+    runners = []
+    results = server.start_many(entries, runners, [basic_cellrunner.source], [])
+    # The shared protocol is tested once
+    assert tested == [test_protocol, "protocols.NoSuchStep(1)"]
+    assert [result["response"] for result in results[:2]] == [
+        "Succeeded in starting channel a.", "Channel a already in use."]
+    assert results[2]["response"].startswith("Server failed to run script.")
+    assert len(runners) == 1
+
+    assert server.control_many("pause_many", ['a'], []) == [
+        {"channel": 'a', "response": "Failed in pausing channel a"}]
+    assert server.control_many("stop_many", ['a'], runners) == [
+        {"channel": 'a', "response": "Succeeded in stopping channel a"}]
+
+
+def test_start_many_same_path(basic_cellrunner, tmp_path):
+    sources = [mock_device.MockDevice().get_source(None) for i in range(3)]
+    for number, source in enumerate(sources, 1):
+        source.channel = str(number)
+    protocol = "from cyckei.server import protocols\nprotocols.CurrentStep(0.01)"
+    entries = []
+    for channel, name in (('1', "shared"), ('2', "shared"), ('3', "own")):
+        meta = {"path": str(tmp_path / "{}.pyb".format(name)), "cellid": name,
+                "comment": "", "package": "", "celltype": "", "requester": "",
+                "plugins": {}, "protocol_name": name, "cycler": "", "start_cycle": 0,
+                "format": []}
+        entries.append({"channel": channel, "meta": meta, "protocol": protocol})
+    runners = []
+    results = server.start_many(entries, runners, sources, [])
+    assert [result["response"] for result in results] == [
+        "Succeeded in starting channel 1.", "Log file 'shared.pyb' already in use.",
+        "Succeeded in starting channel 3."]
+    assert [runner.channel for runner in runners] == ['1', '3']
+
+    # Nor can a later request log to a file a running channel writes, before it exists
+    assert not (tmp_path / "own.pyb").exists()
+    meta = dict(entries[2]["meta"])
+    assert server.start('2', meta, protocol, runners, sources, []) == \
+        "Log file 'own.pyb' already in use."
+
+
+def test_measure(basic_cellrunner):
+    sources = [mock_device.MockDevice().get_source(None) for i in range(3)]
+    for number, source in enumerate(sources, 1):
+        source.channel = str(number)
+    basic_cellrunner.channel = '2'
+    runners = [basic_cellrunner]
+
+    results = server.measure(['1', '2', '4'], runners, sources)
+    assert [result["response"] for result in results] == [
+        "Read channel 1.", "Cannot read channel 2 during a test.", "Channel 4 not found."]
+    assert results[0]["voltage"] == sources[0].voltage
+    assert results[1]["voltage"] is None
+    # Without channels every idle channel is read
+    assert [result["channel"] for result in server.measure(None, runners, sources)] == \
+        ['1', '3']
+    assert runners == [basic_cellrunner]
+
+
+def test_get_recent(basic_cellrunner):
+    basic_cellrunner.channel = '2'
+    for i in range(10):
+        basic_cellrunner.recent.add(100. + i, 0.1, 3.7)
+    recent = server.get_recent({'1': None, '2': None}, [basic_cellrunner], max_points=4)
+    assert recent['1'] is None
+    assert recent['2']["next"] == 10 and recent['2']["points"] <= 4
+    cursor = {"since": 10, "epoch": recent['2']["epoch"]}
+    assert server.get_recent({'2': cursor}, [basic_cellrunner])['2']["points"] == 0
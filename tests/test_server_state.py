@@ -0,0 +1,106 @@
+import json
+import time
+
+from cyckei.server import protocols, server, state
+from tests.sim_backend import SimClock, SimSource
+from tests.test_functions_logindex import PROTOCOL
+
+
+def run_channels(tmp_path, store):
+    """Runs a test on channel "1" while "2" stays idle, recording every loop like the server."""
+    clock = SimClock()
+    with clock.patch(protocols):
+        sources = [SimSource(clock, channel="1"), SimSource(clock, channel="2")]
+        runner = protocols.CellRunner(channel="1", path=str(tmp_path / "1.pyb"),
+                                      cellid="cell 1", plugins={})
+        runner.set_source(sources[0])
+        runner.load_protocol(PROTOCOL)
+        store.update(server.info_all_channels([], sources))
+        while runner.run():
+            # The server drops completed runners
+            runners = [runner] if runner.status != protocols.STATUS.completed else []
+            store.update(server.info_all_channels(runners, sources))
+            clock.advance_to(runner.next_time)
+        store.update(server.info_all_channels([], sources))
+    return runner
+
+
+def test_state_store(tmp_path):
+    path = str(tmp_path / state.FILE_NAME)
+    store = state.StateStore(path, batch_interval=60)
+    start = time.time()
+    runner = run_channels(tmp_path, store)
+    assert store.flush(10)
+    # Every snapshot queued before the flush went in one transaction
+    assert store.transactions == 1
+    assert store.errors == 0
+
+    channels = store.channels()
+    assert [item["channel"] for item in channels["items"]] == ["1", "2"]
+    assert channels["total"] == 2 and channels["next"] is None
+    # A channel whose test ended keeps its details
+    first = channels["items"][0]
+    assert first["status"] == "available"
+    assert first["path"] == runner.meta["path"]
+    assert first["info"]["cellid"] == "cell 1"
+    assert store.channels(status="available", limit=1)["next"] == 1
+    assert store.channels(status="started")["total"] == 0
+
+    states = [item["state_to"] for item in store.transitions(channel="1")["items"]]
+    assert states[:3] == [None, "charge_constant_current", "rest"]
+    assert states.count("charge_constant_current") == 3
+    assert states[-1] is None
+    page = store.transitions(channel="1", offset=1, limit=3)
+    assert [item["state_to"] for item in page["items"]] == states[1:4]
+    assert page["next"] == 4
+    assert store.transitions(since=start)["total"] == len(states) + 1
+    assert store.transitions(since=time.time())["total"] == 0
+
+    cycles = store.cycles(channel="1")["items"]
+    assert [item["cycle"] for item in cycles] == [0, 1, 2]
+    assert cycles[0]["summary"]["charge_capacity"] > 0
+    assert store.cycles(path="other")["total"] == 0
+
+    runners = store.runners()["items"]
+    assert len(runners) == 1
+    assert runners[0]["status"] == "available"
+    assert runners[0]["finished"] >= runners[0]["started"]
+    assert runners[0]["meta"]["cellid"] == "cell 1"
+
+    server_file = server.info_server_file(store)
+    assert sorted(server_file) == ["1", "2"]
+    assert server_file["1"]["path"] == runner.meta["path"]
+    store.close()
+
+    # Reopening keeps the state, without a new transition for unchanged channels
+    store = state.StateStore(path)
+    total = store.transitions()["total"]
+    store.update(server_file)
+    assert store.flush(10)
+    assert store.transitions()["total"] == total
+    assert server.query(store, "query_cycles", {"channel": "1", "limit": 2})["next"] == 2
+    store.close()
+
+
+def test_server_file_first_snapshot(tmp_path):
+    store = state.StateStore(str(tmp_path / state.FILE_NAME), batch_interval=60)
+    try:
+        assert server.info_server_file(store) is None
+        channels = {"1": {"channel": "1", "path": None, "status": "available"}}
+        store.update(channels)
+        # Without waiting for the batch
+        assert server.info_server_file(store) == channels
+        assert store.transactions == 1
+    finally:
+        store.close()
+
+
+def test_legacy_import(tmp_path):
+    legacy = {"1": {"channel": "1", "path": "old.pyb", "status": "available",
+                    "state": "rest"}}
+    with open(tmp_path / state.LEGACY_FILE_NAME, "w") as file:
+        json.dump(legacy, file)
+    store = state.StateStore(str(tmp_path / state.FILE_NAME))
+    assert server.info_server_file(store) == legacy
+    assert store.channels(state="rest")["items"][0]["path"] == "old.pyb"
+    store.close()
@@ -0,0 +1,206 @@
+import time
+
+import pytest
+
+from cyckei.server import writer, protocols
+from tests.sim_backend import SimClock, SimSource
+
+
+def read(path):
+    with open(path) as file:
+        return file.read()
+
+
+def test_writer_buffers_until_flush_points(tmp_path):
+    path = str(tmp_path / "data.txt")
+    data_writer = writer.DataWriter(flush_points=3, flush_interval=60)
+    try:
+        data_writer.write(path, "header\n", mode="w", flush=True)
+        assert data_writer.flush(wait=True, timeout=5)
+        assert read(path) == "header\n"
+
+        data_writer.write(path, "1\n")
+        data_writer.write(path, "2\n")
+        data_writer.flush(path="other", wait=True, timeout=5)
+        assert read(path) == "header\n"
+
+        data_writer.write(path, "3\n")
+        data_writer.flush(path="other", wait=True, timeout=5)
+        assert read(path) == "header\n1\n2\n3\n"
+
+        # Truncating replaces whatever was buffered or written
+        data_writer.write(path, "4\n")
+        data_writer.write(path, "new\n", mode="w")
+        data_writer.flush(path, wait=True, timeout=5)
+        assert read(path) == "new\n"
+    finally:
+        data_writer.close()
+
+    stats = data_writer.stats()
+    assert stats["queued"] == 6
+    assert stats["written"] == 5
+    assert stats["queue_depth"] == 0
+    assert stats["errors"] == 0
+    assert stats["latency_max"] >= stats["latency_mean"] >= 0
+
+
+def test_writer_flush_interval(tmp_path):
+    path = str(tmp_path / "data.txt")
+    data_writer = writer.DataWriter(flush_points=100, flush_interval=0.1)
+    try:
+        data_writer.write(path, "1\n")
+        deadline = time.time() + 5
+        while not (tmp_path / "data.txt").exists() and time.time() < deadline:
+            time.sleep(0.01)
+        assert read(path) == "1\n"
+    finally:
+        data_writer.close()
+
+
+def test_writer_close(tmp_path):
+    data_writer = writer.DataWriter(flush_points=100, flush_interval=60,
+                                    fsync=True, queue_size=2)
+    paths = [str(tmp_path / "{}.txt".format(i)) for i in range(3)]
+    for i in range(10):
+        for path in paths:
+            data_writer.write(path, "{}\n".format(i))
+    data_writer.close()
+    assert not data_writer.running
+    for path in paths:
+        assert read(path) == "".join("{}\n".format(i) for i in range(10))
+    assert data_writer.stats()["queue_max"] <= 2
+
+    # Once closed, writes go straight to the file
+    data_writer.write(paths[0], "10\n")
+    assert read(paths[0]).endswith("9\n10\n")
+
+
+def test_writer_errors(tmp_path):
+    data_writer = writer.DataWriter()
+    data_writer.write(str(tmp_path / "missing" / "data.txt"), "1\n")
+    data_writer.close()
+    assert data_writer.stats()["errors"] == 1
+    assert data_writer.stats()["written"] == 0
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_writer_retries(tmp_path):
+    folder = tmp_path / "later"
+    path = str(folder / "data.txt")
+    data_writer = writer.DataWriter(flush_points=2, flush_interval=0.05)
+    try:
+        data_writer.write(path, "1\n")
+        data_writer.write(path, "2\n")
+        assert wait_for(lambda: data_writer.stats()["errors"] >= 1)
+        data_writer.write(path, "3\n")
+        # The rows are kept until the file can be written
+        folder.mkdir()
+        assert wait_for(lambda: folder.joinpath("data.txt").exists())
+    finally:
+        data_writer.close()
+    assert read(path) == "1\n2\n3\n"
+    assert data_writer.stats()["written"] == 3
+    assert data_writer.stats()["dropped"] == 0
+    assert data_writer.failure(path) is None
+
+
+def test_writer_drops(tmp_path, monkeypatch):
+    monkeypatch.setattr(writer, "FLUSH_RETRIES", 2)
+    path = str(tmp_path / "missing" / "data.txt")
+    data_writer = writer.DataWriter(flush_points=100, flush_interval=0.02)
+    runner = protocols.CellRunner(channel="a", path=path, plugins={})
+    runner.writer = data_writer
+    try:
+        runner.write_text("1\n")
+        runner.write_text("2\n")
+        # Written, then tried again twice
+        assert wait_for(lambda: data_writer.stats()["dropped"] == 2)
+        assert data_writer.stats()["errors"] == 3
+        assert runner.write_error is None
+        # The runner hears of it on its next write
+        runner.write_text("3\n")
+        assert "No such file" in runner.write_error
+        assert data_writer.failure(path) is None
+    finally:
+        data_writer.close()
+
+
+def test_cellrunner_writer(tmp_path):
+    protocol = ("CCCharge(0.05, reports=(('voltage', 0.01), ('time', 60)), "
+                "ends=(('time', '>', 3600),))\n"
+                "AdvanceCycle()\n"
+                "Rest(reports=(('time', 60),), ends=(('time', '>', 600),))\n")
+    contents = []
+    for data_writer in (None, writer.DataWriter(flush_points=5)):
+        clock = SimClock()
+        with clock.patch(protocols):
+            path = str(tmp_path / "{}.txt".format(len(contents)))
+            runner = protocols.CellRunner(channel="a", path=path, plugins={})
+            runner.set_source(SimSource(clock))
+            runner.load_protocol(protocol)
+            runner.writer = data_writer
+            while runner.run():
+                clock.advance_to(runner.next_time)
+        if data_writer is not None:
+            data_writer.close()
+        # Step headers hold the wall clock time they were written at
+        contents.append([line for line in read(path).splitlines()
+                         if not line.startswith('#    "path"')
+                         and ("date_start_timestr" not in line
+                              or line.startswith("#"))])
+    assert len(contents[0]) > 50
+    assert contents[0] == contents[1]
+
+
+def test_handle_pool(tmp_path):
+    pool = writer.HandlePool(max_open=2)
+    paths = [str(tmp_path / "{}.txt".format(i)) for i in range(3)]
+
+    pool.write(paths[0], "header\n", mode="w")
+    pool.write(paths[0], "0\n")
+    pool.write(paths[1], "1\n")
+    assert read(paths[0]) == "header\n0\n"
+    assert pool.opens == 2
+
+    # The least recently used file is closed and reopened on its next write
+    pool.write(paths[0], "0\n")
+    pool.write(paths[2], "2\n")
+    assert paths[1] not in pool
+    assert len(pool) == 2
+    assert pool.evictions == 1
+    pool.write(paths[1], "1\n")
+    assert read(paths[1]) == "1\n1\n"
+    assert pool.opens == 4
+
+    pool.write(paths[1], "new\n", mode="w")
+    assert read(paths[1]) == "new\n"
+
+    pool.fsync(paths[1])
+    pool.close(paths[1])
+    assert paths[1] not in pool
+    pool.close()
+    assert len(pool) == 0
+    assert pool.closes == pool.opens
+
+    with pytest.raises(IOError):
+        pool.write(str(tmp_path / "missing" / "data.txt"), "1\n")
+    assert len(pool) == 0
+
+
+def test_cellrunner_handles(tmp_path):
+    path = str(tmp_path / "data.txt")
+    runner = protocols.CellRunner(channel="a", path=path, plugins={})
+    runner.set_source(SimSource(SimClock()))
+    runner.handles = writer.HandlePool()
+    runner.write_header()
+    runner.write_cycle_header()
+    assert path in runner.handles
+    assert read(path).endswith('{"cycle": 0}\n')
+    runner.stop()
+    assert path not in runner.handles